@@ -0,0 +1,318 @@
+import math
+import os
+import time
+import numpy as np
+import pandas as pd
+from db import get_analyze_price_trends, get_fare_rollup, get_fare_sketch_data, get_flight_data_for_clustering
+from db import iter_flight_data_for_clustering, get_correlation_sums, get_correlation_sample
+from db import iter_data_for_apriori, get_apriori_data_version
+
+# Heavy data mining tasks shared by the synchronous endpoints and the background jobs in jobs.py.
+# Every task takes a dict of request parameters plus an optional progress(fraction, message) callback,
+# and returns a JSON-serializable result (or a DataFrame of rows, which serialization.py encodes without a
+# dict per row), or None when there was no data to work on.
+
+
+def _report(progress, fraction, message):
+    if progress is not None:
+        progress(fraction, message)
+
+
+# ------- Clustering ------
+# -------------------------
+
+def cluster_flights(params, progress=None):
+    from sklearn.cluster import KMeans
+    from sklearn.preprocessing import StandardScaler
+
+    features = params.get('features', 'baseFare,totalFare,travelDuration')
+    n_clusters = int(params.get('n_clusters', 3))
+    selected_view = params.get('view', 'vFlightPrices')
+
+    # Convert features from comma-separated string to list
+    feature_list = features.split(',')
+
+    # mode=sampled streams the view instead of loading it, and returns a summary instead of every row
+    if params.get('mode') == 'sampled':
+        return cluster_flights_sampled(feature_list, selected_view, n_clusters, params, progress)
+
+    _report(progress, 0.1, f"Loading {selected_view}")
+    df = get_flight_data_for_clustering(feature_list, selected_view)
+    if df.empty:
+        return None
+
+    _report(progress, 0.5, f"Clustering {len(df):,} flights")
+    scaler = StandardScaler()
+    # Only scale and fit features that exist in the dataframe
+    valid_features = [feature for feature in feature_list if feature in df.columns]
+    scaled = scaler.fit_transform(df[valid_features])
+    kmeans = KMeans(n_clusters=n_clusters)
+    df['cluster'] = kmeans.fit_predict(scaled)
+
+    return df
+
+
+def cluster_flights_sampled(feature_list, selected_view, n_clusters, params, progress=None):
+    from clustering import cluster_sampled, validate_request, CHUNK_SIZE, POINTS_PER_CLUSTER
+
+    validate_request(feature_list, selected_view)
+    points_per_cluster = int(params.get('points_per_cluster', POINTS_PER_CLUSTER))
+    refit = str(params.get('refit', '0')).lower() in ('1', 'true')
+
+    return cluster_sampled(
+        lambda: iter_flight_data_for_clustering(feature_list, selected_view, CHUNK_SIZE),
+        feature_list, selected_view, n_clusters, refit=refit,
+        points_per_cluster=points_per_cluster, progress=progress)
+
+
+# ------- Correlations -----
+# --------------------------
+
+# Features /correlations accepts, and the vNonStopFlights column each one is computed from
+CORRELATION_FEATURES = {
+    'totalFare': 'totalFare',
+    'baseFare': 'baseFare',
+    'seatsRemaining': 'seatsRemaining',
+    'travelDuration': 'travelMinutes',
+}
+CORRELATION_METHODS = ('pearson', 'spearman')
+
+# Spearman needs ranks, so it runs on a sample of about this many rows
+SPEARMAN_SAMPLE_SIZE = 100000
+CORRELATION_CACHE_TTL = int(os.getenv('CORRELATION_CACHE_TTL', '600'))
+
+_correlation_cache = {}
+
+
+def correlation_from_sums(n, sums, products):
+    """
+    Pearson correlation matrix from the row count, column sums and cross-product sums.
+    Entries for constant columns are NaN.
+    """
+    if n < 2:
+        return np.full(products.shape, np.nan)
+
+    mean = sums / n
+    covariance = (products - n * np.outer(mean, mean)) / (n - 1)
+    std = np.sqrt(np.clip(np.diag(covariance), 0, None))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        correlation = covariance / np.outer(std, std)
+
+    return np.clip(correlation, -1, 1)
+
+
+def _cached(key, compute):
+    entry = _correlation_cache.get(key)
+    if entry is not None and time.time() - entry[0] < CORRELATION_CACHE_TTL:
+        return entry[1]
+
+    value = compute()
+    if value is not None:
+        _correlation_cache[key] = (time.time(), value)
+
+    return value
+
+
+def _pearson(features):
+    stats = get_correlation_sums([CORRELATION_FEATURES[feature] for feature in features])
+    if stats is None or stats[0] == 0:
+        return None
+
+    return pd.DataFrame(correlation_from_sums(*stats), index=features, columns=features)
+
+
+def _spearman(features):
+    columns = [CORRELATION_FEATURES[feature] for feature in features]
+    stats = get_correlation_sums(columns[:1])
+    if stats is None or stats[0] == 0:
+        return None
+
+    sample = get_correlation_sample(columns, min(1.0, SPEARMAN_SAMPLE_SIZE / stats[0]), SPEARMAN_SAMPLE_SIZE)
+    if sample.empty:
+        return None
+    sample.columns = features
+
+    return sample.corr(method='spearman')
+
+
+def correlation_matrix(features, method='pearson'):
+    """
+    Correlation matrix of features as {feature: {feature: value}}, like DataFrame.corr().to_dict().
+    Pearson is computed from sums aggregated in SQL; Spearman from a sample. Results are cached per
+    feature set for CORRELATION_CACHE_TTL seconds.
+    """
+    features = list(dict.fromkeys(features))
+    unknown = [feature for feature in features if feature not in CORRELATION_FEATURES]
+    if unknown:
+        raise ValueError(f"Unknown features: {', '.join(unknown)}")
+    if method not in CORRELATION_METHODS:
+        raise ValueError(f"method must be one of {', '.join(CORRELATION_METHODS)}")
+
+    # Cached under the sorted feature set, so any ordering of the same features hits
+    key = (method, tuple(sorted(features)))
+    compute = _pearson if method == 'pearson' else _spearman
+    matrix = _cached(key, lambda: compute(list(key[1])))
+    if matrix is None:
+        return None
+
+    matrix = matrix.loc[features, features]
+
+    return {col: {row: (None if np.isnan(value) else float(value)) for row, value in matrix[col].items()}
+            for col in features}
+
+
+# --------- Apriori --------
+# --------------------------
+
+def _json_safe_rules(rules):
+    # Itemsets are frozensets, which JSON can't represent
+    rules = rules.copy()
+    for col in ['antecedents', 'consequents']:
+        rules[col] = rules[col].apply(sorted)
+
+    return rules.to_dict(orient='records')
+
+
+# Frequent itemsets per (min_support, max_len), kept until TransactionTable's row count or max ID changes
+_itemset_cache = {}
+
+
+def transaction_matrix(chunks):
+    """
+    Sparse boolean transaction x item matrix built from (transaction_id, item) chunks, without ever
+    holding the rows as lists. Returns the CSR matrix and the item of each column.
+    """
+    from scipy.sparse import csr_matrix
+
+    transactions, items = {}, {}
+    rows, cols = [], []
+    for chunk in chunks:
+        chunk = chunk.dropna()
+        # Ids of transactions and items seen before keep their row and column
+        rows.append(np.fromiter((transactions.setdefault(t, len(transactions)) for t in chunk['transaction_id']),
+                                dtype=np.int64, count=len(chunk)))
+        cols.append(np.fromiter((items.setdefault(i, len(items)) for i in chunk['item']),
+                                dtype=np.int64, count=len(chunk)))
+
+    if not transactions:
+        return None, []
+    rows, cols = np.concatenate(rows), np.concatenate(cols)
+    matrix = csr_matrix((np.ones(len(rows), dtype=bool), (rows, cols)), shape=(len(transactions), len(items)))
+
+    return matrix, list(items)
+
+
+def frequent_itemsets(min_support, max_len=None, progress=None):
+    """
+    FP-Growth frequent itemsets of TransactionTable (with a 'support' column, as mlxtend returns them)
+    and the number of transactions, cached until the table changes. None when there are no transactions.
+    """
+    from mlxtend.frequent_patterns import fpgrowth
+
+    version = get_apriori_data_version()
+    key = (min_support, max_len)
+    entry = _itemset_cache.get(key)
+    if version is not None and entry is not None and entry[0] == version:
+        return entry[1], entry[2]
+
+    _report(progress, 0.1, "Loading transactions")
+    matrix, items = transaction_matrix(iter_data_for_apriori())
+    if matrix is None:
+        return None
+
+    _report(progress, 0.4, f"Finding frequent itemsets in {matrix.shape[0]:,} transactions of {len(items):,} items")
+    df = pd.DataFrame.sparse.from_spmatrix(matrix, columns=items)
+    itemsets = fpgrowth(df, min_support=min_support, use_colnames=True, max_len=max_len)
+
+    if version is not None:
+        _itemset_cache[key] = (version, itemsets, matrix.shape[0])
+
+    return itemsets, matrix.shape[0]
+
+
+def apriori_analysis(params, progress=None):
+    from mlxtend.frequent_patterns import association_rules
+
+    min_support = float(params.get('min_support', 0.01))
+    min_confidence = float(params.get('min_confidence', 0.1))
+    max_len = int(params['max_len']) if params.get('max_len') else None
+    if not 0 < min_support <= 1 or not 0 <= min_confidence <= 1:
+        raise ValueError("min_support must be in (0, 1] and min_confidence in [0, 1]")
+
+    result = frequent_itemsets(min_support, max_len, progress)
+    if result is None:
+        return None
+    itemsets, transactions = result
+    if itemsets.empty:
+        return []
+
+    _report(progress, 0.8, "Deriving association rules")
+    rules = association_rules(itemsets, num_itemsets=transactions, metric="confidence", min_threshold=min_confidence)
+
+    return _json_safe_rules(rules)
+
+
+# --------- Validation -----
+# --------------------------
+
+def cross_validate_model(params, progress=None):
+    from sklearn.model_selection import cross_val_score
+    from sklearn.ensemble import RandomForestClassifier
+    from data_preparation import MODEL_FEATURES, load_prepared_data
+
+    cv = int(params.get('cv', 5))
+
+    _report(progress, 0.1, "Loading prepared data")
+    df = load_prepared_data(columns=MODEL_FEATURES + ['ArrDelayMinutes'])
+    if df.empty:
+        return None
+
+    _report(progress, 0.3, f"Cross-validating on {len(df):,} flights ({cv} folds)")
+    model = RandomForestClassifier()
+    scores = cross_val_score(model, df[MODEL_FEATURES], df['ArrDelayMinutes'], cv=cv)
+
+    return {'scores': scores.tolist(), 'average': float(scores.mean())}
+
+
+# -------- Price trends ----
+# --------------------------
+
+def analyze_price_trends(params, progress=None):
+    from sqlalchemy.exc import SQLAlchemyError
+
+    # Optional comma-separated breakdowns, e.g. group_by=route,airline
+    group_by = [group for group in params.get('group_by', '').split(',') if group]
+
+    _report(progress, 0.1, "Aggregating fares")
+    try:
+        return get_fare_rollup(params.get('start_date'), params.get('end_date'), group_by)
+    except SQLAlchemyError as e:
+        # Databases without fare_rollup.sql applied still have the stored procedure, minus the breakdowns
+        if group_by:
+            raise ValueError(f"Breakdowns need the FareWeeklyRollup table (fare_rollup.sql): {str(e)}")
+        print(f"Error reading FareWeeklyRollup, falling back to AnalyzePriceTrends: {str(e)}")
+
+        return get_analyze_price_trends(params.get('start_date'), params.get('end_date'))
+
+
+def fare_distribution(params, progress=None):
+    from fare_sketch import FareSketch, HISTOGRAM_BIN_WIDTH
+
+    origin, destination = params.get('origin'), params.get('destination')
+    if not origin or not destination:
+        raise ValueError("origin and destination are required")
+    fare = params.get('fare')
+    fare = float(fare) if fare not in (None, '') else None
+    bin_width = float(params.get('bin_width', HISTOGRAM_BIN_WIDTH))
+    if not (math.isfinite(bin_width) and bin_width > 0):
+        raise ValueError("bin_width must be a positive number")
+
+    _report(progress, 0.1, "Merging fare sketches")
+    counts, fares = get_fare_sketch_data(origin, destination, params.get('start_date'), params.get('end_date'),
+                                         params.get('cabin') or None)
+    sketch = FareSketch(counts)
+    sketch.add(fares)
+    if not sketch.count:
+        return None
+
+    return sketch.summary(bin_width, fare)
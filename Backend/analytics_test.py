@@ -0,0 +1,227 @@
+import datetime
+import random
+import unittest
+from unittest.mock import patch
+import numpy as np
+import pandas as pd
+from sqlalchemy import create_engine, event
+import analytics
+import db
+from fare_sketch import FareSketch, bucket_index
+
+
+class TestCorrelations(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        fares = rng.gamma(4.0, 80.0, 2000)
+        self.view = pd.DataFrame({
+            'totalFare': fares,
+            'baseFare': fares * 0.85 + rng.normal(0, 5, len(fares)),
+            'seatsRemaining': rng.integers(0, 10, len(fares)),
+            'travelMinutes': rng.normal(300, 60, len(fares)),
+        })
+        self.view.loc[::50, 'travelMinutes'] = np.nan
+
+        # SQLite stands in for MySQL; the aggregate query is plain SQL
+        self.engine = create_engine('sqlite://')
+        event.listen(self.engine, 'connect', lambda connection, _: connection.create_function('RAND', 0, random.random))
+        self.view.to_sql('vNonStopFlights', self.engine, index=False)
+        patcher = patch.object(db, 'engine', self.engine)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(analytics._correlation_cache.clear)
+
+    def test_matches_pandas(self):
+        features = ['totalFare', 'baseFare', 'seatsRemaining', 'travelDuration']
+        result = pd.DataFrame(analytics.correlation_matrix(features))
+
+        expected = self.view.dropna().corr()
+        expected.index = expected.columns = features
+        pd.testing.assert_frame_equal(result.loc[features, features], expected, atol=1e-9)
+
+    def test_two_features_keep_to_dict_format(self):
+        result = analytics.correlation_matrix(['totalFare', 'seatsRemaining'])
+
+        self.assertEqual(set(result), {'totalFare', 'seatsRemaining'})
+        self.assertEqual(result['totalFare']['totalFare'], 1.0)
+        self.assertAlmostEqual(result['totalFare']['seatsRemaining'], result['seatsRemaining']['totalFare'])
+
+    def test_cached_per_feature_set(self):
+        with patch('analytics.get_correlation_sums', wraps=db.get_correlation_sums) as sums:
+            first = analytics.correlation_matrix(['totalFare', 'baseFare'])
+            second = analytics.correlation_matrix(['baseFare', 'totalFare'])
+
+        self.assertEqual(sums.call_count, 1)
+        self.assertEqual(first['totalFare']['baseFare'], second['baseFare']['totalFare'])
+
+    def test_spearman_on_sample(self):
+        with patch.object(analytics, 'SPEARMAN_SAMPLE_SIZE', 500):
+            result = pd.DataFrame(analytics.correlation_matrix(['totalFare', 'baseFare'], 'spearman'))
+
+        self.assertGreater(result.loc['totalFare', 'baseFare'], 0.9)
+
+    def test_rejects_unknown_features(self):
+        self.assertRaises(ValueError, analytics.correlation_matrix, ['totalFare', 'legID; DROP TABLE Legs'])
+        self.assertRaises(ValueError, analytics.correlation_matrix, ['totalFare'], 'kendall')
+
+    def test_constant_column(self):
+        correlation = analytics.correlation_from_sums(3, np.array([3.0, 6.0]), np.array([[3.0, 6.0], [6.0, 14.0]]))
+
+        self.assertTrue(np.isnan(correlation[0, 1]))
+
+
+def year_week(value):
+    # MySQL YEARWEEK(date) (mode 0): weeks start on Sunday
+    day = datetime.date.fromisoformat(value)
+    sunday = day - datetime.timedelta(days=day.isoweekday() % 7)
+
+    return sunday.year * 100 + (sunday.timetuple().tm_yday - 1) // 7 + 1
+
+
+class TestPriceTrends(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(1)
+        n = 3000
+        dates = pd.Timestamp('2022-04-01') + pd.to_timedelta(rng.integers(0, 90, n), unit='D')
+        self.legs = pd.DataFrame({
+            'flightDate': dates.strftime('%Y-%m-%d'),
+            'startingAirport': rng.choice(['ATL', 'BOS', 'JFK'], n),
+            'destinationAirport': rng.choice(['LAX', 'ORD'], n),
+            'segmentsCabinCode': rng.choice(['coach', 'first'], n),
+            'segmentsAirlineCode': rng.choice(['AA', 'DL', 'UA'], n),
+            'isNonStop': rng.integers(0, 2, n),
+            'baseFare': rng.gamma(4.0, 60.0, n).round(2),
+        })
+        self.legs['totalFare'] = (self.legs['baseFare'] * 1.1).round(2)
+
+        # What RebuildFareWeeklyRollup in fare_rollup.sql produces
+        legs = self.legs.assign(
+            weekStart=(dates - pd.to_timedelta((dates.dayofweek.to_numpy() + 1) % 7, unit='D')).strftime('%Y-%m-%d'),
+            yearWeek=self.legs['flightDate'].map(year_week))
+        rollup = legs.groupby(['weekStart', 'yearWeek', 'isNonStop', 'startingAirport', 'destinationAirport',
+                               'segmentsCabinCode', 'segmentsAirlineCode']).agg(
+            fareCount=('baseFare', 'size'), baseFareSum=('baseFare', 'sum'), baseFareMin=('baseFare', 'min'),
+            baseFareMax=('baseFare', 'max'), totalFareSum=('totalFare', 'sum'), totalFareMin=('totalFare', 'min'),
+            totalFareMax=('totalFare', 'max')).reset_index()
+        rollup = rollup.rename(columns={'segmentsCabinCode': 'cabinClass', 'segmentsAirlineCode': 'airlineCode'})
+
+        self.engine = create_engine('sqlite://')
+        event.listen(self.engine, 'connect', lambda connection, _: connection.create_function('YEARWEEK', 1, year_week))
+        self.legs.to_sql('Legs', self.engine, index=False)
+        rollup.to_sql('FareWeeklyRollup', self.engine, index=False)
+        # ... and RebuildFareSketches in fare_sketch.sql
+        sketches = legs.assign(bucket=bucket_index(legs['totalFare'])).groupby(
+            ['startingAirport', 'destinationAirport', 'segmentsCabinCode', 'weekStart', 'bucket']).size()
+        sketches = sketches.rename('fareCount').reset_index().rename(columns={'segmentsCabinCode': 'cabinClass'})
+        sketches.to_sql('FareSketchBuckets', self.engine, index=False)
+        patcher = patch.object(db, 'engine', self.engine)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def expected(self, start, end, groups):
+        legs = self.legs[(self.legs['flightDate'] >= start) & (self.legs['flightDate'] <= end) & (self.legs['isNonStop'] == 1)]
+        legs = legs.assign(month=legs['flightDate'].map(year_week))
+
+        return legs.groupby(['segmentsCabinCode'] + groups + ['month']).agg(
+            flights=('baseFare', 'size'), avgTotalFare=('totalFare', 'mean'), maxBaseFare=('baseFare', 'max'))
+
+    def test_matches_legs_for_partial_weeks(self):
+        # Wednesday to Thursday: partial weeks at both ends, whole weeks from the rollup in between
+        result = pd.DataFrame(analytics.analyze_price_trends({'start_date': '2022-04-06', 'end_date': '2022-06-16'}))
+        result = result.set_index(['cabinClass', 'month']).sort_index()
+
+        expected = self.expected('2022-04-06', '2022-06-16', [])
+        self.assertEqual(result['flights'].tolist(), expected['flights'].tolist())
+        np.testing.assert_allclose(result['avgTotalFare'], expected['avgTotalFare'])
+        np.testing.assert_allclose(result['maxBaseFare'], expected['maxBaseFare'])
+
+    def test_breakdown_by_route_and_airline(self):
+        params = {'start_date': '2022-04-10', 'end_date': '2022-04-13', 'group_by': 'route,airline'}
+        result = pd.DataFrame(analytics.analyze_price_trends(params))
+
+        expected = self.expected('2022-04-10', '2022-04-13', ['startingAirport', 'destinationAirport', 'segmentsAirlineCode'])
+        self.assertEqual(len(result), len(expected))
+        self.assertEqual(result['flights'].sum(), expected['flights'].sum())
+        self.assertEqual({'startingAirport', 'destinationAirport', 'airline'} - set(result.columns), set())
+
+    def test_whole_weeks(self):
+        self.assertEqual(db.whole_weeks(datetime.date(2022, 4, 6), datetime.date(2022, 4, 23)),
+                         (datetime.date(2022, 4, 10), datetime.date(2022, 4, 17)))
+        self.assertEqual(db.whole_weeks(datetime.date(2022, 4, 10), datetime.date(2022, 4, 16)),
+                         (datetime.date(2022, 4, 10), datetime.date(2022, 4, 10)))
+        self.assertIsNone(db.whole_weeks(datetime.date(2022, 4, 11), datetime.date(2022, 4, 16)))
+
+    def test_fare_distribution_merges_weeks_and_edge_days(self):
+        params = {'origin': 'ATL', 'destination': 'LAX', 'cabin': 'coach',
+                  'start_date': '2022-04-06', 'end_date': '2022-06-16', 'fare': '250'}
+        result = analytics.fare_distribution(params)
+
+        legs = self.legs[(self.legs['flightDate'] >= '2022-04-06') & (self.legs['flightDate'] <= '2022-06-16')
+                         & (self.legs['startingAirport'] == 'ATL') & (self.legs['destinationAirport'] == 'LAX')
+                         & (self.legs['segmentsCabinCode'] == 'coach')]
+        expected = FareSketch.from_fares(legs['totalFare'])
+        self.assertEqual(result['count'], len(legs))
+        self.assertEqual(result['quantiles']['p50'], expected.quantile(0.5))
+        self.assertEqual(result['fareRank'], expected.rank(250))
+        self.assertEqual(sum(result['histogram']['counts']), len(legs))
+
+    def test_fare_distribution_needs_route(self):
+        self.assertRaises(ValueError, analytics.fare_distribution, {'origin': 'ATL'})
+
+    def test_rejects_unknown_breakdown(self):
+        params = {'start_date': '2022-04-10', 'end_date': '2022-04-13', 'group_by': 'passenger'}
+        self.assertRaises(ValueError, analytics.analyze_price_trends, params)
+
+
+class TestApriori(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(2)
+        rows = []
+        for transaction in range(500):
+            basket = {'bread'} if rng.random() < 0.6 else set()
+            if 'bread' in basket and rng.random() < 0.8:
+                basket.add('butter')
+            basket.update(rng.choice([f'item{i}' for i in range(200)], 3))
+            rows += [(transaction, item) for item in basket]
+        self.transactions = pd.DataFrame(rows, columns=['transaction_id', 'item'])
+
+        self.engine = create_engine('sqlite://')
+        self.transactions.to_sql('TransactionTable', self.engine, index=False)
+        patcher = patch.object(db, 'engine', self.engine)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(analytics._itemset_cache.clear)
+
+    def test_rules_match_dense_apriori(self):
+        from mlxtend.frequent_patterns import apriori
+        from mlxtend.preprocessing import TransactionEncoder
+
+        rules = analytics.apriori_analysis({'min_support': '0.2', 'min_confidence': '0.5'})
+
+        baskets = self.transactions.groupby('transaction_id')['item'].apply(list).tolist()
+        encoder = TransactionEncoder()
+        dense = pd.DataFrame(encoder.fit(baskets).transform(baskets), columns=encoder.columns_)
+        expected = apriori(dense, min_support=0.2, use_colnames=True)
+        self.assertEqual(len(analytics.frequent_itemsets(0.2)[0]), len(expected))
+        self.assertIn((['bread'], ['butter']), [(rule['antecedents'], rule['consequents']) for rule in rules])
+
+    def test_itemsets_cached_until_table_changes(self):
+        from mlxtend import frequent_patterns
+
+        with patch.object(frequent_patterns, 'fpgrowth', wraps=frequent_patterns.fpgrowth) as fpgrowth:
+            analytics.apriori_analysis({'min_support': '0.2'})
+            analytics.apriori_analysis({'min_support': '0.2', 'min_confidence': '0.9'})
+            self.assertEqual(fpgrowth.call_count, 1)
+
+            pd.DataFrame({'transaction_id': [1000], 'item': ['bread']}).to_sql(
+                'TransactionTable', self.engine, index=False, if_exists='append')
+            analytics.apriori_analysis({'min_support': '0.2'})
+            self.assertEqual(fpgrowth.call_count, 2)
+
+    def test_rejects_bad_thresholds(self):
+        self.assertRaises(ValueError, analytics.apriori_analysis, {'min_support': '0'})
+        self.assertRaises(ValueError, analytics.apriori_analysis, {'min_confidence': '1.5'})
+
+
+if __name__ == '__main__':
+    unittest.main()
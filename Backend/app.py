@@ -1,63 +1,76 @@
 from flask import Flask, jsonify, request
 from db import query_routes, query_airline_routes, query_routes_by_countries, query_by_country
 from db import create_user, add_preferences_to_db, query_flight_details, get_user_preferences, add_itinerary_to_db
-from db import get_analyze_price_trends, get_flight_data_for_clustering, get_data_for_apriori, get_data_for_correlation
-from db import get_predict_flight
+from db import get_predict_flight, get_predict_flights
+from data_preparation import MODEL_FEATURES
+import analytics
+import db
+import http_cache
+import jobs
+import metrics
+import pagination
+import profiling
+import route_index
+import serialization
+import itertools
 import json
+import os
 import urllib.parse
-from sklearn.cluster import KMeans
-from sklearn.preprocessing import StandardScaler
-from mlxtend.frequent_patterns import apriori, association_rules
-from mlxtend.preprocessing import TransactionEncoder
-from sklearn.model_selection import cross_val_score
-from sklearn.ensemble import RandomForestClassifier
 import joblib
+from tree_model import load_tree
 
 app = Flask(__name__)
 
-# ------- Clustering Methods ------
-# ---------------------------------
+# Request, SQL and JSON timings plus the slow-query log, served on /metrics
+metrics.init_app(app, db.engine)
+# Opt-in cProfile + stack-sampling profiles of single requests (PROFILING=1, X-Profile: 1)
+profiling.init_app(app)
+# gzip/brotli compression of large responses; the read endpoints below also get ETags and Cache-Control
+http_cache.init_app(app)
 
-@app.route('/cluster_flights', methods=['GET'])
-def cluster_flights():
-    features = request.args.get('features', 'baseFare,totalFare,travelDuration')
-    n_clusters = int(request.args.get('n_clusters', 3))
-    selected_view = request.args.get('view', 'vFlightPrices')  # Get the selected view from query parameters
+# ------- Data mining -------
+# ---------------------------
+# The work lives in analytics.py; these endpoints run it in the request thread, while
+# /jobs/<task> below runs the same tasks in the background job pool
 
-    # Convert features from comma-separated string to list
-    feature_list = features.split(',')
+def run_analytics(task):
+    try:
+        result = task(request.args.to_dict())
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
 
-    df = get_flight_data_for_clustering(feature_list, selected_view)
+    if result is None:
+        return jsonify({'error': 'Failed to fetch data or data is empty'}), 500
 
-    if not df.empty:
-        scaler = StandardScaler()
-        # Only scale and fit features that exist in the dataframe
-        valid_features = [
-            feature for feature in feature_list if feature in df.columns]
-        features = scaler.fit_transform(df[valid_features])
-        kmeans = KMeans(n_clusters=n_clusters)
-        df['cluster'] = kmeans.fit_predict(features)
+    # Tables in the form the Accept header asks for: records, columns or streamed NDJSON
+    return serialization.result_response(result)
 
-        # Accessing the cluster centers
-        centers = kmeans.cluster_centers_
-        print("Cluster Centers:", centers)
 
-        return jsonify(df.to_dict(orient='records'))
-    else:
-        return jsonify({'error': 'Failed to fetch data or data is empty'}), 500
+@app.route('/cluster_flights', methods=['GET'])
+def cluster_flights():
+    return run_analytics(analytics.cluster_flights)
 
 # ------- Finding correlations -----
 # ----------------------------------
 
 @app.route('/correlations', methods=['GET'])
 def correlations():
-    feature1 = request.args.get('feature1', 'totalFare')  # Default to 'totalFare' if not specified
-    feature2 = request.args.get('feature2', 'seatsRemaining')  # Default to 'seatsRemaining' if not specified
-    
-    df = get_data_for_correlation([feature1, feature2])
-    if not df.empty:
-        correlation_matrix = df[[feature1, feature2]].corr()
-        return jsonify(correlation_matrix.to_dict())
+    # Any number of comma-separated features, or the older feature1/feature2 pair
+    features = request.args.get('features')
+    if features:
+        feature_list = [feature for feature in features.split(',') if feature]
+    else:
+        feature1 = request.args.get('feature1', 'totalFare')  # Default to 'totalFare' if not specified
+        feature2 = request.args.get('feature2', 'seatsRemaining')  # Default to 'seatsRemaining' if not specified
+        feature_list = [feature1, feature2]
+
+    try:
+        correlation_matrix = analytics.correlation_matrix(feature_list, request.args.get('method', 'pearson'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    if correlation_matrix is not None:
+        return jsonify(correlation_matrix)
     else:
         return jsonify({'error': 'Failed to fetch data or data is empty'}), 500
 
@@ -67,17 +80,7 @@ def correlations():
 
 @app.route('/apriori', methods=['GET'])
 def apriori_analysis():
-    df = get_data_for_apriori()
-    if not df.empty:
-        te = TransactionEncoder()
-        te_ary = te.fit(df).transform(df)
-        df = pd.DataFrame(te_ary, columns=te.columns_)
-        frequent_itemsets = apriori(df, min_support=0.01, use_colnames=True)
-        rules = association_rules(
-            frequent_itemsets, metric="confidence", min_threshold=0.1)
-        return jsonify(rules.to_dict(orient='records'))
-    else:
-        return jsonify({'error': 'Failed to fetch data or data is empty'}), 500
+    return run_analytics(analytics.apriori_analysis)
 
 # --------- Validation -----
 # --------------------------
@@ -85,25 +88,70 @@ def apriori_analysis():
 
 @app.route('/cross_validate', methods=['GET'])
 def cross_validate_model():
-    X, y = get_model_training_data()
-    if not X.empty and not y.empty:
-        model = RandomForestClassifier()
-        scores = cross_val_score(model, X, y, cv=5)
-        return jsonify({'scores': scores.tolist(), 'average': scores.mean()})
-    else:
-        return jsonify({'error': 'Failed to fetch data or data is empty'}), 500
+    return run_analytics(analytics.cross_validate_model)
+
+# --------- Background jobs --------
+# ----------------------------------
+
+@app.route('/jobs/<task>', methods=['POST'])
+def submit_job(task):
+    if task not in jobs.TASKS:
+        return jsonify({'error': f'Unknown task: {task}'}), 404
+
+    # Parameters come from the JSON body, or the query string like the synchronous endpoints
+    params = request.get_json(silent=True) or request.args.to_dict()
+    job = jobs.submit(task, params)
+
+    return jsonify(jobs.get_status(job)), 202
+
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job_status(job_id):
+    status = jobs.get_status(job_id)
+
+    if status is None:
+        return jsonify({'error': 'Unknown or expired job'}), 404
+
+    return jsonify(status)
+
+
+@app.route('/jobs/<job_id>/result', methods=['GET'])
+def get_job_result(job_id):
+    status = jobs.get_status(job_id)
+
+    if status is None:
+        return jsonify({'error': 'Unknown or expired job'}), 404
+    if status['status'] == jobs.FAILED:
+        return jsonify({'error': status.get('error', 'Job failed')}), 500
+    if status['status'] != jobs.DONE:
+        return jsonify(status), 202
+
+    result = jobs.get_result(job_id)
+    if result is None:
+        return jsonify({'error': 'Unknown or expired job'}), 404
+
+    return serialization.result_response(result)
 
 # --------- Classification ---------
 # ----------------------------------
-model = joblib.load('flight_delay_predictor.joblib')
+# The heavy analytics libraries are imported inside the analytics tasks, and the delay model is served
+# from the flattened tree written by train_model.py, so starting the app doesn't pull in scikit-learn
+COMPILED_MODEL_FILE = 'flight_delay_predictor.npz'
+
+def load_delay_model():
+    if os.path.exists(COMPILED_MODEL_FILE):
+        return load_tree(COMPILED_MODEL_FILE)
+
+    return joblib.load('flight_delay_predictor.joblib')
+
+model = load_delay_model()
 
 @app.route('/predict_delay/<legID>', methods=['GET'])
 def predict_delay(legID):
     # Fetch processed flight data
     processed_data = get_predict_flight(legID)
     processed_data = processed_data.drop(['FlightDate'], axis=1)
-    print('processed_data',processed_data)
-    
+
     if processed_data is not None:
         prediction = model.predict(processed_data)
         
@@ -111,6 +159,34 @@ def predict_delay(legID):
     else:
         return jsonify({'error': 'Failed to fetch or process flight data'}), 500
 
+# Upper bound on legIDs per batch request, keeps the IN list and the response reasonably sized
+MAX_PREDICTION_BATCH = 1000
+
+@app.route('/predict_delay_batch', methods=['POST'])
+def predict_delay_batch():
+    leg_ids = (request.get_json(silent=True) or {}).get('legIDs')
+
+    if not leg_ids or not isinstance(leg_ids, list):
+        return jsonify({'error': 'Expected a JSON body with a non-empty legIDs list'}), 400
+    if not all(isinstance(leg_id, str) and leg_id for leg_id in leg_ids):
+        return jsonify({'error': 'legIDs must be non-empty strings'}), 400
+    if len(leg_ids) > MAX_PREDICTION_BATCH:
+        return jsonify({'error': f'At most {MAX_PREDICTION_BATCH} legIDs per request'}), 400
+
+    processed_data = get_predict_flights(leg_ids)
+
+    if processed_data is None:
+        return jsonify({'error': 'Failed to fetch or process flight data'}), 500
+
+    # One vectorized predict over every leg that was found
+    predictions = model.predict(processed_data[MODEL_FEATURES]) if not processed_data.empty else []
+    delayed = dict(zip(processed_data['legID'], predictions))
+
+    return jsonify({
+        'predictions': [{'legID': leg_id, 'delayed': bool(delayed[leg_id])} for leg_id in leg_ids if leg_id in delayed],
+        'missing': [leg_id for leg_id in leg_ids if leg_id not in delayed],
+    })
+
 # --------- Other Routes ---------
 # --------------------------------
 
@@ -122,7 +198,6 @@ def add_to_itinerary():
     try:
         # Call to a function that will execute the SQL command
         result = add_itinerary_to_db(itinerary_data)
-        print(result)
         if result:
             return jsonify({'message': 'Itinerary added successfully'}), 201
         else:
@@ -170,6 +245,7 @@ def get_preferences():
 
 
 @app.route('/airports')
+@http_cache.cached(http_cache.HTTP_CACHE_MAX_AGE, version=route_index.data_version)
 def get_routes():
     source_iata = request.args.get('source')
     destination_iata = request.args.get('destination')
@@ -178,22 +254,51 @@ def get_routes():
         routes = query_routes(source_iata, destination_iata)
 
         if not routes.empty:
-            return jsonify(routes.to_dict(orient='records'))
+            return serialization.rows_response(routes)
 
         return jsonify({'message': 'No routes found'}), 404
 
     return jsonify({'message': 'Missing parameters'}), 400
 
 
+def requested_fields(allowed):
+    # Columns asked for with ?fields=a,b,c (None when absent); unknown names are a ValueError
+    if 'fields' not in request.args:
+        return None
+
+    fields = [field.strip() for field in request.args['fields'].split(',') if field.strip()]
+    unknown = [field for field in fields if field not in allowed]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+
+    return fields
+
+
+def paged_response(rows, limit, key_columns):
+    # One keyset page of rows fetched with limit + 1; the next page's cursor goes in the X-Next-Cursor header
+    page, cursor = pagination.split_page(rows, limit, key_columns)
+    headers = {pagination.NEXT_CURSOR_HEADER: cursor} if cursor is not None else None
+
+    return serialization.rows_response(page, headers=headers)
+
+
 @app.route('/airline')
+@http_cache.cached(http_cache.HTTP_CACHE_MAX_AGE, version=route_index.data_version)
 def get_airline_routes():
     airline_name = request.args.get('airline_name')
 
     if airline_name:
-        routes = query_airline_routes(airline_name)
+        # Optional keyset pages: ?limit=N, then &cursor=<X-Next-Cursor of the previous page>
+        try:
+            limit, after = pagination.page_request(request.args, len(db.AIRLINE_ROUTES_PAGE_KEY))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
 
-        if not routes.empty:
-            return jsonify(routes.to_dict(orient='records'))
+        routes = query_airline_routes(airline_name, after, None if limit is None else limit + 1)
+
+        # A later page past the last route is empty rather than missing
+        if not routes.empty or after is not None:
+            return paged_response(routes, limit, db.AIRLINE_ROUTES_PAGE_KEY)
 
         return jsonify({'message': 'No routes found'}), 404
 
@@ -201,17 +306,26 @@ def get_airline_routes():
 
 
 @app.route('/country')
+@http_cache.cached(http_cache.HTTP_CACHE_MAX_AGE, version=route_index.data_version)
 def get_country_routes():
     source_country = request.args.get('source_country')
-    routes = query_by_country(source_country)
 
-    if not routes.empty:
-        return jsonify(routes.to_dict(orient='records'))
+    # Optional keyset pages, as for /airline
+    try:
+        limit, after = pagination.page_request(request.args, len(db.COUNTRY_ROUTES_PAGE_KEY))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    routes = query_by_country(source_country, after, None if limit is None else limit + 1)
+
+    if not routes.empty or after is not None:
+        return paged_response(routes, limit, db.COUNTRY_ROUTES_PAGE_KEY)
 
     return jsonify({'message': 'No routes found'}), 404
 
 
 @app.route('/countries')
+@http_cache.cached(http_cache.HTTP_CACHE_MAX_AGE, version=route_index.data_version)
 def get_routes_by_countries():
     source_country = request.args.get('source')
     destination_country = request.args.get('destination')
@@ -220,13 +334,66 @@ def get_routes_by_countries():
         routes = query_routes_by_countries(source_country, destination_country)
 
         if not routes.empty:
-            return jsonify(routes.to_dict(orient='records'))
+            return serialization.rows_response(routes)
 
         return jsonify({'message': 'No routes found'}), 404
 
     return jsonify({'message': 'Missing parameters'}), 400
 
 
+@app.route('/refresh_routes', methods=['POST'])
+def refresh_routes():
+    try:
+        index = route_index.refresh_route_index()
+
+        return jsonify({'message': 'Route index refreshed', 'routes': len(index)})
+    except Exception as e:
+        print(str(e))
+
+        return jsonify({'message': str(e)}), 500
+
+
+@app.route('/connections')
+def get_connections():
+    # Always answered from the route index, which is loaded on first use even with ROUTE_INDEX=0 (then
+    # reloaded only by POST /refresh_routes)
+    source_iata = request.args.get('source')
+    destination_iata = request.args.get('destination')
+
+    if not (source_iata and destination_iata):
+        return jsonify({'message': 'Missing parameters'}), 400
+
+    try:
+        max_stops = int(request.args.get('max_stops', route_index.MAX_CONNECTION_STOPS))
+        limit = int(request.args.get('limit', 10))
+    except ValueError:
+        return jsonify({'message': 'max_stops and limit must be integers'}), 400
+    if not 1 <= limit <= route_index.MAX_CONNECTIONS:
+        return jsonify({'message': f'limit must be between 1 and {route_index.MAX_CONNECTIONS}'}), 400
+
+    sort = request.args.get('sort', 'hops')
+    if sort not in ('hops', 'distance'):
+        return jsonify({'message': 'sort must be hops or distance'}), 400
+
+    alliance = request.args.get('alliance')
+    if alliance and alliance.lower() not in route_index.ALLIANCES:
+        return jsonify({'message': f'Unknown alliance: {alliance}'}), 400
+
+    airlines = [name for name in request.args.get('airlines', '').split(',') if name]
+    same_airline = request.args.get('same_airline', '0') in ('1', 'true')
+
+    index = route_index.get_route_index()
+    connections = index.find_connections(
+        source_iata, destination_iata, max_stops=max_stops,
+        airline_codes=index.airline_codes(airlines, alliance), same_airline=same_airline,
+        sort=sort, limit=limit)
+
+    if connections:
+        return serialization.rows_response(connections)
+
+    return jsonify({'message': 'No routes found'}), 404
+
+
 @app.route('/flight_details')
 def get_flight_details():
     source_iata = request.args.get('source_iata')
@@ -242,33 +409,60 @@ def get_flight_details():
     except json.JSONDecodeError:
         return jsonify({'error': 'Invalid JSON'}), 400
 
-    # Now use `preferences` as a normal dictionary
-    print(preferences)
+    # Optional keyset pages, as for /airline, and a projection onto the columns the client shows
+    try:
+        limit, after = pagination.page_request(request.args, len(db.FLIGHT_DETAILS_PAGE_KEY))
+        fields = requested_fields(db.FLIGHT_DETAILS_COLUMNS)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    # Whole results asked for as NDJSON are streamed from the database cursor, a batch at a time
+    if limit is None and serialization.response_type() == serialization.NDJSON:
+        batches = db.iter_flight_details(source_iata, destination_iata, airline_name, is_non_stop, preferences,
+                                         fields, chunksize=serialization.STREAM_BATCH_ROWS)
+        first = next(batches, None)
+        if first is not None:
+            return serialization.ndjson_response(itertools.chain([first], batches))
+
+        return jsonify({'message': 'No flight details found'}), 404
 
     flight_details = query_flight_details(
-        source_iata, destination_iata, airline_name, is_non_stop, preferences)
+        source_iata, destination_iata, airline_name, is_non_stop, preferences, after,
+        None if limit is None else limit + 1, fields)
 
-    if flight_details:
-        return jsonify(flight_details)
+    if flight_details is None:
+        return jsonify({'error': 'Failed to retrieve flight details or database error'}), 500
+    if flight_details or after is not None:
+        return paged_response(flight_details, limit, db.FLIGHT_DETAILS_PAGE_KEY)
 
     return jsonify({'message': 'No flight details found'}), 404
 
 
 @app.route('/analyze_price_trends', methods=['GET'])
+@http_cache.cached()  # revalidated on every use: the rollup changes with every new leg
 def analyze_price_trends_endpoint():
     start_date = request.args.get('start_date')
     end_date = request.args.get('end_date')
+    group_by = request.args.get('group_by', '')  # Optional breakdowns: route, airline
 
     try:
-        # Call the stored procedure and get the result
-        result = get_analyze_price_trends(start_date, end_date)
+        # Summed from the weekly fare rollup
+        result = analytics.analyze_price_trends({'start_date': start_date, 'end_date': end_date, 'group_by': group_by})
 
         return jsonify(result)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         print(str(e))
 
         return jsonify({'message': str(e)}), 500
 
 
+@app.route('/fare_distribution', methods=['GET'])
+def fare_distribution():
+    # origin, destination, start_date, end_date, optional cabin, fare (to rank) and bin_width
+    return run_analytics(analytics.fare_distribution)
+
+
 if __name__ == '__main__':
     app.run(debug=True)
@@ -0,0 +1,29 @@
+import unittest
+from unittest.mock import MagicMock, patch
+
+
+class TestPredictDelayBatch(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        # The app loads the delay model on import; the routes tested here reject the request before using it
+        with patch('joblib.load', return_value=MagicMock()):
+            import app
+        cls.app = app
+        cls.client = app.app.test_client()
+
+    def test_leg_ids_must_be_non_empty_strings(self):
+        for leg_ids in (['a1', ['a2']], ['a1', {'legID': 'a2'}], [1, 2], ['a1', ''], [None]):
+            with patch.object(self.app, 'get_predict_flights') as get_predict_flights:
+                response = self.client.post('/predict_delay_batch', json={'legIDs': leg_ids})
+
+            self.assertEqual(response.status_code, 400, leg_ids)
+            get_predict_flights.assert_not_called()
+
+    def test_batches_are_bounded(self):
+        response = self.client.post('/predict_delay_batch', json={'legIDs': ['a1'] * (self.app.MAX_PREDICTION_BATCH + 1)})
+
+        self.assertEqual(response.status_code, 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
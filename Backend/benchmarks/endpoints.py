@@ -0,0 +1,430 @@
+"""
+End-to-end benchmark of every Flask route, through the Flask test client against a local database
+(see synthetic_data.py and local_db.py).
+
+Each route is called --repeat times (--heavy-repeat for the analytics routes) after a warm-up call,
+recording p50/p95/p99 latency, rows returned per second and the peak RSS of this process during its
+calls. Job workers run in their own processes, so their memory is not included. Results are written as
+JSON; with --compare, p50 latencies are checked against an earlier results file and the exit status is 1
+when any route got slower by more than --tolerance.
+
+The delay model, prepared data and job results live in --workdir, next to the database by default;
+a model is trained from the database's Delays when none is there yet.
+
+Usage (from the Backend directory):
+    python benchmarks/synthetic_data.py --legs 1M --backend sqlite --path bench.sqlite
+    python benchmarks/endpoints.py --backend sqlite --path bench.sqlite --output results.json
+    python benchmarks/endpoints.py --backend sqlite --path bench.sqlite --compare results.json
+"""
+import argparse
+import contextlib
+import datetime
+import gzip
+import json
+import os
+import platform
+import re
+import runpy
+import subprocess
+import sys
+import threading
+import time
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BACKEND_DIR)
+
+from serialization import COLUMNS, NDJSON  # noqa: E402 (needs BACKEND_DIR on the path)
+
+# Routes are timed with their first matching case; heavy cases run --heavy-repeat times
+HEAVY = {'cluster_flights', 'apriori', 'cross_validate'}
+
+# Latency regressions under this many milliseconds are treated as noise by --compare
+MIN_REGRESSION_MS = 1.0
+
+# Rows per page of the paginated cases
+PAGE_SIZE = 100
+
+# ---- Memory ----
+
+def current_rss():
+    # Resident set size in bytes, or None when it can't be read on this platform
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        pass
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+class PeakRss:
+    """
+    Highest RSS seen while the block runs, sampled every interval seconds by a background thread.
+    """
+
+    def __init__(self, interval=0.002):
+        self.interval = interval
+        self.peak = None
+        self._stop = threading.Event()
+
+    def _sample(self):
+        while True:
+            rss = current_rss()
+            if rss is not None:
+                self.peak = max(self.peak or 0, rss)
+            if self._stop.wait(self.interval):
+                break
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+# ---- Cases ----
+
+def sample_parameters(engine):
+    """
+    Route parameters taken from the data: a busy non-stop route with its airline, some legs and users,
+    and the flight date range.
+    """
+    import pandas as pd
+
+    with engine.connect() as connection:
+        legs = pd.read_sql("SELECT legID, startingAirport, destinationAirport, segmentsAirlineCode, totalFare "
+                           "FROM Legs WHERE isNonStop = 1 LIMIT 1000", connection)
+        first, last = pd.read_sql("SELECT MIN(flightDate) AS first, MAX(flightDate) AS last FROM Legs",
+                                  connection).iloc[0]
+        users = pd.read_sql("SELECT userID FROM Users ORDER BY userID LIMIT 100", connection)['userID'].tolist()
+        airlines = pd.read_sql("SELECT iata, airlineName FROM Airline", connection)
+        countries = pd.read_sql("SELECT c.country, COUNT(*) AS airports FROM Airports a "
+                                "JOIN Cities c ON a.cityID = c.cityID GROUP BY c.country ORDER BY airports DESC",
+                                connection)
+
+    if legs.empty or not users:
+        raise SystemExit("The database needs non-stop Legs and Users; generate it with synthetic_data.py")
+
+    route = legs.groupby(['startingAirport', 'destinationAirport', 'segmentsAirlineCode']).size().idxmax()
+    route_legs = legs[(legs['startingAirport'] == route[0]) & (legs['destinationAirport'] == route[1])]
+    airline_names = dict(zip(airlines['iata'], airlines['airlineName']))
+
+    return {
+        'origin': route[0], 'destination': route[1], 'airline': airline_names.get(route[2], route[2]),
+        'fare': float(route_legs['totalFare'].median()),
+        'leg_ids': legs['legID'].tolist(), 'users': users,
+        'first_date': str(first)[:10], 'last_date': str(last)[:10],
+        'country': countries['country'].iloc[0] if not countries.empty else 'United States',
+    }
+
+
+def build_cases(sample, run_token):
+    """
+    One case per route and method: method, route (as in app.url_map), and the path, query string
+    and JSON body of call i (values or functions of i), plus optional request headers; revalidate
+    sends the ETag of the warm-up answer in If-None-Match. Writes use run_token and i to stay unique.
+    A variant names extra cases of a route, such as its paginated form or another response format.
+    """
+    leg_ids, users = sample['leg_ids'], sample['users']
+    route = {'source': sample['origin'], 'destination': sample['destination']}
+    dates = {'start_date': sample['first_date'], 'end_date': sample['last_date']}
+
+    def new_user(i):
+        return {'fullName': f'Benchmark {i}', 'phoneNumber': f'+{run_token}{i:06d}',
+                'addressFirstLine': '1 Main Street', 'addressLastLine': None, 'addressPostcode': '10001',
+                'billingFirstLine': '1 Main Street', 'billingLastLine': None, 'billingPostcode': '10001',
+                'birthDate': '1990-01-01', 'gender': 'F', 'email': f'bench{run_token}.{i}@example.com'}
+
+    def preferences(i):
+        return {'userID': users[i % len(users)], 'preferredFlyingClass': 'coach', 'preferredLayoverTime': None,
+                'preferredDepartureTime': '09:00:00', 'preferredArrivalTime': None, 'preferredDuration': None,
+                'preferLowEmission': None, 'preferredGroundTransportation': None, 'preferredHotelChain': None}
+
+    def itinerary(i):
+        # (user, leg) pairs are unique for len(users) * len(leg_ids) calls
+        return {'userID': users[i % len(users)], 'legID': leg_ids[(i // len(users) + run_token) % len(leg_ids)]}
+
+    return [
+        {'method': 'GET', 'route': '/airports', 'query': route},
+        {'method': 'GET', 'route': '/airline', 'query': {'airline_name': sample['airline']}},
+        {'method': 'GET', 'route': '/airline', 'variant': 'page',
+         'query': {'airline_name': sample['airline'], 'limit': PAGE_SIZE}},
+        {'method': 'GET', 'route': '/country', 'query': {'source_country': sample['country']}},
+        {'method': 'GET', 'route': '/country', 'variant': 'page',
+         'query': {'source_country': sample['country'], 'limit': PAGE_SIZE}},
+        {'method': 'GET', 'route': '/country', 'variant': 'columns', 'headers': {'Accept': COLUMNS},
+         'query': {'source_country': sample['country']}},
+        {'method': 'GET', 'route': '/country', 'variant': 'ndjson', 'headers': {'Accept': NDJSON},
+         'query': {'source_country': sample['country']}},
+        {'method': 'GET', 'route': '/country', 'variant': 'gzip', 'headers': {'Accept-Encoding': 'gzip'},
+         'query': {'source_country': sample['country']}},
+        {'method': 'GET', 'route': '/country', 'variant': 'revalidate', 'revalidate': True, 'status': 304,
+         'query': {'source_country': sample['country']}},
+        {'method': 'GET', 'route': '/countries', 'query': {'source': sample['country'], 'destination': sample['country']}},
+        {'method': 'POST', 'route': '/refresh_routes'},
+        {'method': 'GET', 'route': '/connections', 'query': dict(route, max_stops=1)},
+        {'method': 'GET', 'route': '/flight_details',
+         'query': {'source_iata': sample['origin'], 'destination_iata': sample['destination'],
+                   'airline_name': sample['airline'], 'is_non_stop': 1, 'prefs': '{}'}},
+        {'method': 'GET', 'route': '/flight_details', 'variant': 'page',
+         'query': {'source_iata': sample['origin'], 'destination_iata': sample['destination'],
+                   'airline_name': sample['airline'], 'is_non_stop': 1, 'prefs': '{}', 'limit': PAGE_SIZE}},
+        {'method': 'GET', 'route': '/flight_details', 'variant': 'ndjson', 'headers': {'Accept': NDJSON},
+         'query': {'source_iata': sample['origin'], 'destination_iata': sample['destination'],
+                   'airline_name': sample['airline'], 'is_non_stop': 1, 'prefs': '{}'}},
+        {'method': 'GET', 'route': '/flight_details', 'variant': 'page+fields',
+         'query': {'source_iata': sample['origin'], 'destination_iata': sample['destination'],
+                   'airline_name': sample['airline'], 'is_non_stop': 1, 'prefs': '{}', 'limit': PAGE_SIZE,
+                   'fields': 'legID,flightDate,totalFare,baseFare,seatsRemaining,segmentsCabinCode'}},
+        {'method': 'GET', 'route': '/analyze_price_trends', 'query': dict(dates, group_by='route')},
+        {'method': 'GET', 'route': '/fare_distribution',
+         'query': dict(dates, origin=sample['origin'], destination=sample['destination'], fare=sample['fare'])},
+        {'method': 'GET', 'route': '/correlations', 'query': {'features': 'totalFare,baseFare,seatsRemaining,travelDuration'}},
+        {'method': 'GET', 'route': '/cluster_flights',
+         'query': {'mode': 'sampled', 'features': 'baseFare,totalFare,seatsRemaining', 'view': 'vNonStopFlights'}},
+        {'method': 'GET', 'route': '/apriori', 'query': {'min_support': 0.05, 'min_confidence': 0.3}},
+        {'method': 'GET', 'route': '/cross_validate', 'query': {'cv': 3}},
+        # Every submission is a new job (the token parameter is ignored by the task)
+        {'method': 'POST', 'route': '/jobs/<task>', 'path': '/jobs/analyze_price_trends',
+         'json': lambda i: dict(dates, benchmark=f'{run_token}-{i}'), 'status': 202},
+        {'method': 'GET', 'route': '/jobs/<job_id>', 'path': lambda i: f'/jobs/{sample["job"]}'},
+        {'method': 'GET', 'route': '/jobs/<job_id>/result', 'path': lambda i: f'/jobs/{sample["job"]}/result'},
+        {'method': 'GET', 'route': '/predict_delay/<legID>', 'path': lambda i: f'/predict_delay/{leg_ids[i % len(leg_ids)]}'},
+        {'method': 'POST', 'route': '/predict_delay_batch', 'json': {'legIDs': leg_ids[:100]}},
+        {'method': 'POST', 'route': '/create_user', 'json': new_user, 'status': 201},
+        {'method': 'POST', 'route': '/add_preferences', 'json': preferences, 'status': 201},
+        {'method': 'GET', 'route': '/get_preferences', 'query': lambda i: {'userID': users[i % len(users)]}},
+        {'method': 'POST', 'route': '/add_to_itinerary', 'json': itinerary, 'status': 201},
+        {'method': 'GET', 'route': '/metrics'},
+    ]
+
+
+def uncovered_routes(app, cases):
+    # (method, route) pairs of app.url_map without a case
+    covered = {(case['method'], case['route']) for case in cases}
+    routes = {(method, rule.rule) for rule in app.url_map.iter_rules() if rule.endpoint != 'static'
+              for method in rule.methods - {'HEAD', 'OPTIONS'}}
+
+    return sorted(routes - covered, key=lambda route: (route[1], route[0]))
+
+
+def count_rows(payload):
+    # Records in a JSON response: list length, or the longest list among a dict's values, else one
+    if isinstance(payload, list):
+        return len(payload)
+    if isinstance(payload, dict):
+        lists = [len(value) for value in payload.values() if isinstance(value, list)]
+        return max(lists) if lists else 1
+
+    return 0
+
+
+def _value(value, i):
+    return value(i) if callable(value) else value
+
+# ---- Running ----
+
+def run_case(client, case, repeat, warmup=1):
+    """
+    Time repeat calls of a case (after warmup untimed ones) and summarize them.
+    """
+    times, rows, errors = [], 0, []
+    expected = case.get('status', 200)
+    headers = dict(case.get('headers', {}))
+
+    def call(i):
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            response = client.open(_value(case.get('path', case['route']), i), method=case['method'],
+                                   query_string=_value(case.get('query'), i), json=_value(case.get('json'), i),
+                                   headers=headers)
+            # Streamed responses are only encoded while their body is read
+            response.get_data()
+            return response
+
+    for i in range(warmup):
+        response = call(i)
+    # Revalidating cases send back the ETag of the warm-up answer, as a client with it cached would
+    if case.get('revalidate') and 'ETag' in response.headers:
+        headers['If-None-Match'] = response.headers['ETag']
+
+    with PeakRss() as rss:
+        for i in range(warmup, warmup + repeat):
+            started = time.perf_counter()
+            response = call(i)
+            times.append(time.perf_counter() - started)
+            if response.status_code != expected:
+                errors.append(response.status_code)
+            elif response.mimetype == NDJSON:
+                rows += response.get_data().count(b'\n')
+            elif response.is_json or response.mimetype == COLUMNS:
+                data = response.get_data()
+                if response.headers.get('Content-Encoding') == 'gzip':
+                    data = gzip.decompress(data)
+                rows += count_rows(json.loads(data))
+
+    latencies = np.array(times) * 1000
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+
+    return {
+        'name': f"{case['method']} {case['route']}" + (f" [{case['variant']}]" if case.get('variant') else ''),
+        'method': case['method'],
+        'route': case['route'],
+        'runs': repeat,
+        'errors': len(errors),
+        'errorStatuses': sorted(set(errors)),
+        'p50_ms': round(float(p50), 3),
+        'p95_ms': round(float(p95), 3),
+        'p99_ms': round(float(p99), 3),
+        'mean_ms': round(float(latencies.mean()), 3),
+        'rows': rows,
+        'rows_per_sec': round(rows / sum(times), 1) if sum(times) else None,
+        'peak_rss_mb': round(rss.peak / 2 ** 20, 1) if rss.peak else None,
+    }
+
+
+def wait_for_job(client, job, timeout=600):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        status = client.get(f'/jobs/{job}').get_json()
+        if status['status'] in ('done', 'failed'):
+            return status
+        time.sleep(0.05)
+
+    raise SystemExit(f"Job {job} did not finish within {timeout}s")
+
+
+def ensure_delay_model(workdir):
+    # app.py loads the delay model when it is imported; train one from the benchmark database if needed
+    if os.path.exists(os.path.join(workdir, 'flight_delay_predictor.npz')):
+        return
+
+    from data_preparation import prepare_data_parquet
+
+    print("Training the delay model from the benchmark database")
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        prepare_data_parquet()
+        runpy.run_path(os.path.join(BACKEND_DIR, 'train_model.py'))
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline, tolerance):
+    """
+    Print p50 changes against a baseline results dict; returns the names of routes that regressed.
+    """
+    before = {result['name']: result for result in baseline['results']}
+    regressions = []
+    print(f"\nCompared with {baseline.get('commit') or 'baseline'} ({baseline.get('timestamp', '')}):")
+    for result in results:
+        old = before.get(result['name'])
+        if not old or not old['p50_ms']:
+            continue
+        ratio = result['p50_ms'] / old['p50_ms']
+        regressed = ratio > 1 + tolerance and result['p50_ms'] - old['p50_ms'] > MIN_REGRESSION_MS
+        if regressed:
+            regressions.append(result['name'])
+        print(f"  {result['name']:<32} {old['p50_ms']:>10.2f} -> {result['p50_ms']:>10.2f} ms "
+              f"({ratio - 1:+.0%}){'  REGRESSION' if regressed else ''}")
+
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--backend', default=os.getenv('DB_BACKEND', 'sqlite'), choices=['mysql', 'sqlite', 'duckdb'])
+    parser.add_argument('--path', default=os.getenv('DB_PATH', 'bench.sqlite'), help="Database file (local backends)")
+    parser.add_argument('--workdir', help="Model, prepared data and job results (default: <path>_artifacts)")
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--heavy-repeat', type=int, default=3, help="Calls of " + ', '.join(sorted(HEAVY)))
+    parser.add_argument('--only', help="Only routes matching this regular expression")
+    parser.add_argument('--output', help="Write the results as JSON to this file")
+    parser.add_argument('--compare', help="Earlier results JSON to check p50 latencies against")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="Allowed p50 slowdown for --compare")
+    args = parser.parse_args()
+
+    output = os.path.abspath(args.output) if args.output else None
+    baseline_path = os.path.abspath(args.compare) if args.compare else None
+    path = os.path.abspath(args.path)
+    workdir = os.path.abspath(args.workdir or os.path.splitext(path)[0] + '_artifacts')
+    os.makedirs(workdir, exist_ok=True)
+
+    # db.py, jobs.py and app.py read their settings when imported; artifacts are relative to the workdir
+    os.environ['DB_BACKEND'] = args.backend
+    os.environ['DB_PATH'] = path
+    os.environ.setdefault('JOB_WORKERS', '1')
+    os.chdir(workdir)
+
+    import db
+    ensure_delay_model(workdir)
+    from app import app
+    import jobs
+
+    client = app.test_client()
+    run_token = int(time.time()) % 10 ** 8
+    sample = sample_parameters(db.engine)
+    cases = build_cases(sample, run_token)
+    for method, route in uncovered_routes(app, cases):
+        print(f"No benchmark case for {method} {route}")
+    if args.only:
+        cases = [case for case in cases if re.search(args.only, f"{case['method']} {case['route']}")]
+
+    # The job status/result routes read one finished job
+    job = client.post('/jobs/analyze_price_trends', json={'start_date': sample['first_date'],
+                                                          'end_date': sample['last_date']}).get_json()['jobID']
+    wait_for_job(client, job)
+    sample['job'] = job
+
+    results = []
+    print(f"{'route':<34}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'rows/s':>12}{'RSS MB':>9}")
+    try:
+        for case in cases:
+            name = case['route'].strip('/').split('/')[0]
+            result = run_case(client, case, args.heavy_repeat if name in HEAVY else args.repeat)
+            results.append(result)
+            print(f"{result['name']:<34}{result['p50_ms']:>10.2f}{result['p95_ms']:>10.2f}{result['p99_ms']:>10.2f}"
+                  f"{result['rows_per_sec'] or 0:>12,.0f}{result['peak_rss_mb'] or 0:>9.0f}"
+                  + (f"  {result['errors']} errors {result['errorStatuses']}" if result['errors'] else ''))
+    finally:
+        jobs.shutdown()
+
+    with db.engine.connect() as connection:
+        from sqlalchemy import text
+        dataset = {table: connection.execute(text(f"SELECT COUNT(*) FROM {table}")).scalar()
+                   for table in ('Legs', 'Delays', 'AirlineRoutes', 'Users')}
+
+    report = {
+        'commit': git_commit(),
+        'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+        'backend': args.backend,
+        'dataset': dataset,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'results': results,
+    }
+    if output:
+        with open(output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {output}")
+
+    if baseline_path:
+        with open(baseline_path) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} routes regressed by more than {args.tolerance:.0%}")
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
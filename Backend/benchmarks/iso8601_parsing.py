@@ -0,0 +1,92 @@
+"""
+Row-by-row vs vectorized parsing of Legs timestamp and duration columns.
+
+Generates synthetic segmentsDepartureTimeRaw / travelDuration columns (a share of them
+||-joined multi-segment values) and times
+  row-by-row: the old per-element .apply of pd.to_datetime / re.match
+  vectorized: time_parsing.minutes_of_day / durations_to_minutes on the whole column
+The row-by-row baseline is timed on --baseline-rows rows and scaled up to --rows.
+
+Usage (from the Backend directory):
+    python benchmarks/iso8601_parsing.py --rows 1000000
+"""
+import argparse
+import os
+import re
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # Backend folder
+from time_parsing import durations_to_minutes, minutes_of_day
+
+
+def row_minutes_of_day(datetime_str):
+    # Previous convert_iso8601_to_minutes
+    try:
+        datetime_obj = pd.to_datetime(datetime_str, utc=True).tz_convert(None)
+    except Exception:
+        return None
+
+    return datetime_obj.hour * 60 + datetime_obj.minute
+
+
+def row_duration_minutes(duration_str):
+    # Previous iso8601_duration_to_minutes, which compiled its pattern on every call
+    parts = re.compile(r'PT(?:(\d+)H)?(?:(\d+)M)?').match(duration_str)
+    if not parts:
+        return 0
+    hours, minutes = parts.groups()
+
+    return int(hours or 0) * 60 + int(minutes or 0)
+
+
+def generate_columns(rows, multi_share, seed=0):
+    rng = np.random.default_rng(seed)
+    departures = pd.Timestamp('2022-04-16') + pd.to_timedelta(rng.integers(0, 60 * 1440, rows), unit='min')
+    offsets = rng.choice(['-04:00', '-05:00', '-07:00'], rows)
+    timestamps = [f"{departure:%Y-%m-%dT%H:%M:%S}.000{offset}" for departure, offset in zip(departures, offsets)]
+    durations = [f"PT{hours}H{minutes}M" for hours, minutes in zip(rng.integers(0, 20, rows), rng.integers(0, 60, rows))]
+
+    for i in np.flatnonzero(rng.random(rows) < multi_share):
+        timestamps[i] += '||' + timestamps[i]
+
+    return pd.Series(timestamps), pd.Series(durations)
+
+
+def time_call(function, *args):
+    start = time.perf_counter()
+    function(*args)
+
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--baseline-rows', type=int, default=20000)
+    parser.add_argument('--multi-share', type=float, default=0.3, help="Share of ||-joined multi-segment values")
+    args = parser.parse_args()
+
+    timestamps, durations = generate_columns(args.rows, args.multi_share)
+    scale = args.rows / min(args.baseline_rows, args.rows)
+    sample = slice(0, min(args.baseline_rows, args.rows))
+
+    # The old scalar parser only handles single segment timestamps
+    single = timestamps[sample].str.partition('||')[0]
+    results = {
+        'timestamps': (time_call(lambda: single.apply(row_minutes_of_day)) * scale,
+                       time_call(minutes_of_day, timestamps)),
+        'durations': (time_call(lambda: durations[sample].apply(row_duration_minutes)) * scale,
+                      time_call(durations_to_minutes, durations)),
+    }
+
+    print(f"Rows: {args.rows:,} ({args.multi_share:.0%} multi-segment), baseline scaled from {sample.stop:,} rows")
+    for name, (row_by_row, vectorized) in results.items():
+        print(f"{name:<10} row-by-row {row_by_row:8.2f} s   vectorized {vectorized:6.3f} s   "
+              f"speedup {row_by_row / vectorized:,.0f}x")
+
+
+if __name__ == '__main__':
+    main()
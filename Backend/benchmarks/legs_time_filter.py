@@ -0,0 +1,203 @@
+"""
+Before/after benchmark for the preference-filtered query_flight_details search.
+
+Builds a synthetic LegsBenchmark table in the configured MySQL database, then times
+  before: TIME(STR_TO_DATE(...)) filters with only the foreign-key style indexes
+  after:  depMinute/arrMinute range predicates on idx_legs_route_dep
+
+Usage (from the Backend directory):
+    python benchmarks/legs_time_filter.py --rows 2000000 --queries 50
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+import numpy as np
+from sqlalchemy import text
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # Backend folder
+from db import engine
+
+AIRPORTS = ['ATL', 'BOS', 'CLT', 'DEN', 'DFW', 'DTW', 'EWR', 'IAD', 'JFK', 'LAX', 'LGA', 'MIA', 'OAK', 'ORD', 'PHL', 'SFO']
+AIRLINES = ['AA', 'AS', 'B6', 'DL', 'F9', 'NK', 'UA']
+
+CREATE_TABLE = """
+    CREATE TABLE LegsBenchmark (
+      legID VARCHAR(35),
+      startingAirport VARCHAR(5),
+      destinationAirport VARCHAR(5),
+      flightDate DATE NOT NULL,
+      isNonStop tinyint(1) NOT NULL,
+      baseFare FLOAT NOT NULL,
+      totalFare FLOAT NOT NULL,
+      segmentsDepartureTimeRaw VARCHAR(128) NOT NULL,
+      segmentsArrivalTimeRaw VARCHAR(128) NOT NULL,
+      segmentsAirlineCode VARCHAR(128) NOT NULL,
+      segmentsCabinCode VARCHAR(128) NOT NULL,
+      depMinute SMALLINT,
+      arrMinute SMALLINT,
+
+      PRIMARY KEY (legID),
+      INDEX idx_bench_starting (startingAirport),
+      INDEX idx_bench_destination (destinationAirport)
+    )
+"""
+
+INSERT = text("""
+    INSERT INTO LegsBenchmark VALUES (
+      :legID, :startingAirport, :destinationAirport, :flightDate, :isNonStop, :baseFare, :totalFare,
+      :segmentsDepartureTimeRaw, :segmentsArrivalTimeRaw, :segmentsAirlineCode, :segmentsCabinCode,
+      :depMinute, :arrMinute
+    )
+""")
+
+BEFORE_QUERY = text("""
+    SELECT legID, flightDate, totalFare, segmentsDepartureTimeRaw, segmentsArrivalTimeRaw
+    FROM LegsBenchmark
+    WHERE startingAirport = :source AND destinationAirport = :destination
+      AND segmentsAirlineCode = :airline AND isNonStop = 1
+      AND TIME(STR_TO_DATE(segmentsArrivalTimeRaw, '%Y-%m-%dT%H:%i:%s')) <= TIME(:arrival_time)
+      AND TIME(STR_TO_DATE(segmentsDepartureTimeRaw, '%Y-%m-%dT%H:%i:%s'))
+          BETWEEN TIME(:departure_time) - INTERVAL 1 HOUR AND TIME(:departure_time) + INTERVAL 1 HOUR
+    ORDER BY flightDate, segmentsDepartureTimeRaw
+""")
+
+AFTER_QUERY = text("""
+    SELECT legID, flightDate, totalFare, segmentsDepartureTimeRaw, segmentsArrivalTimeRaw
+    FROM LegsBenchmark
+    WHERE startingAirport = :source AND destinationAirport = :destination
+      AND segmentsAirlineCode = :airline AND isNonStop = 1
+      AND arrMinute <= :arrival_minute
+      AND depMinute BETWEEN :departure_from AND :departure_to
+    ORDER BY flightDate, segmentsDepartureTimeRaw
+""")
+
+
+def generate_rows(start, count, rng):
+    # Single segment legs look like the Expedia dump: 2022-04-17T12:57:00.000-04:00
+    dep_minute = rng.integers(0, 1440, count)
+    duration = rng.integers(45, 420, count)
+    arr_minute = (dep_minute + duration) % 1440
+    day = rng.integers(0, 60, count)
+    dates = np.datetime64('2022-04-16') + day.astype('timedelta64[D]')
+    fares = np.round(rng.gamma(4.0, 80.0, count), 2)
+    airports = rng.choice(len(AIRPORTS), (count, 2))
+
+    rows = []
+    for i in range(count):
+        date = str(dates[i])
+        rows.append({
+            'legID': f"{start + i:032x}",
+            'startingAirport': AIRPORTS[airports[i, 0]],
+            'destinationAirport': AIRPORTS[airports[i, 1]],
+            'flightDate': date,
+            'isNonStop': int(rng.random() < 0.3),
+            'baseFare': float(fares[i] * 0.85),
+            'totalFare': float(fares[i]),
+            'segmentsDepartureTimeRaw': f"{date}T{dep_minute[i] // 60:02}:{dep_minute[i] % 60:02}:00.000-04:00",
+            'segmentsArrivalTimeRaw': f"{date}T{arr_minute[i] // 60:02}:{arr_minute[i] % 60:02}:00.000-04:00",
+            'segmentsAirlineCode': AIRLINES[rng.integers(len(AIRLINES))],
+            'segmentsCabinCode': 'coach',
+            'depMinute': int(dep_minute[i]),
+            'arrMinute': int(arr_minute[i]),
+        })
+
+    return rows
+
+
+def build_table(row_count, batch_size=20000, seed=0):
+    rng = np.random.default_rng(seed)
+
+    with engine.begin() as connection:
+        connection.execute(text("DROP TABLE IF EXISTS LegsBenchmark"))
+        connection.execute(text(CREATE_TABLE))
+
+    for start in range(0, row_count, batch_size):
+        with engine.begin() as connection:
+            connection.execute(INSERT, generate_rows(start, min(batch_size, row_count - start), rng))
+        print(f"Inserted {min(start + batch_size, row_count):,} / {row_count:,} rows", end='\r')
+    print()
+
+
+def random_searches(count, seed=1):
+    rng = np.random.default_rng(seed)
+    searches = []
+    for _ in range(count):
+        source, destination = [str(code) for code in rng.choice(AIRPORTS, 2, replace=False)]
+        departure = int(rng.integers(6 * 60, 20 * 60))
+        arrival = min(departure + int(rng.integers(120, 600)), 1439)
+        searches.append({
+            'source': source, 'destination': destination, 'airline': AIRLINES[rng.integers(len(AIRLINES))],
+            'departure_time': f"{departure // 60:02}:{departure % 60:02}:00",
+            'arrival_time': f"{arrival // 60:02}:{arrival % 60:02}:00",
+            'departure_from': departure - 60, 'departure_to': departure + 60, 'arrival_minute': arrival,
+        })
+
+    return searches
+
+
+def time_query(query, searches, repeat):
+    timings = []
+    rows = 0
+    with engine.connect() as connection:
+        for _ in range(repeat):
+            for params in searches:
+                start = time.perf_counter()
+                rows += len(connection.execute(query, params).fetchall())
+                timings.append((time.perf_counter() - start) * 1000)
+
+    timings.sort()
+    return {
+        'median_ms': statistics.median(timings),
+        'p95_ms': timings[int(0.95 * (len(timings) - 1))],
+        'rows': rows,
+    }
+
+
+def explain(query, params):
+    with engine.connect() as connection:
+        plan = connection.execute(text("EXPLAIN " + query.text), params).mappings().first()
+
+    return f"key={plan['key']} rows={plan['rows']} extra={plan['Extra']}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=2000000)
+    parser.add_argument('--queries', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--keep', action='store_true', help="Keep LegsBenchmark after the run")
+    args = parser.parse_args()
+
+    build_table(args.rows)
+    searches = random_searches(args.queries)
+
+    with engine.begin() as connection:
+        connection.execute(text("ANALYZE TABLE LegsBenchmark"))
+    before = time_query(BEFORE_QUERY, searches, args.repeat)
+    before_plan = explain(BEFORE_QUERY, searches[0])
+
+    with engine.begin() as connection:
+        connection.execute(text(
+            "CREATE INDEX idx_bench_route_dep ON LegsBenchmark"
+            "(startingAirport, destinationAirport, segmentsAirlineCode, isNonStop, depMinute)"))
+        connection.execute(text("ANALYZE TABLE LegsBenchmark"))
+    after = time_query(AFTER_QUERY, searches, args.repeat)
+    after_plan = explain(AFTER_QUERY, searches[0])
+
+    if before['rows'] != after['rows']:
+        print(f"WARNING: result sizes differ (before {before['rows']}, after {after['rows']})")
+
+    print(f"Legs rows: {args.rows:,}, searches: {args.queries} x {args.repeat}")
+    print(f"before: median {before['median_ms']:.2f} ms, p95 {before['p95_ms']:.2f} ms ({before_plan})")
+    print(f"after:  median {after['median_ms']:.2f} ms, p95 {after['p95_ms']:.2f} ms ({after_plan})")
+    print(f"speedup (median): {before['median_ms'] / after['median_ms']:.1f}x")
+
+    if not args.keep:
+        with engine.begin() as connection:
+            connection.execute(text("DROP TABLE LegsBenchmark"))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,407 @@
+"""
+Reproducible synthetic FlightsApp dataset, written straight into a local SQLite or DuckDB database.
+
+Generates Cities, Airports, Airline, AirlineRoutes, Legs (with their materialized time columns),
+Delays, Users with Preferences and the TransactionTable /apriori mines, then builds the indexes and
+fare tables the same way local_db.py does after loading the CSV dumps. Legs use the 16 hub airports
+and 7 airlines of the real itineraries data; the same --seed always gives the same rows.
+Counts accept k/M suffixes; Legs and Delays are generated chunk by chunk, so 100M legs fit in memory.
+
+Usage (from the Backend directory):
+    python benchmarks/synthetic_data.py --legs 1M --backend sqlite --path bench.sqlite
+"""
+import argparse
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # Backend folder
+import local_db
+from route_index import haversine_km
+
+# IATA code, city, UTC offset in summer (the real data covers April-October 2022), latitude, longitude
+HUBS = [
+    ('ATL', 'Atlanta', -4, 33.6367, -84.4281), ('BOS', 'Boston', -4, 42.3643, -71.0052),
+    ('CLT', 'Charlotte', -4, 35.2140, -80.9431), ('DEN', 'Denver', -6, 39.8617, -104.6730),
+    ('DFW', 'Dallas-Fort Worth', -5, 32.8968, -97.0380), ('DTW', 'Detroit', -4, 42.2124, -83.3534),
+    ('EWR', 'Newark', -4, 40.6925, -74.1687), ('IAD', 'Washington', -4, 38.9445, -77.4558),
+    ('JFK', 'New York', -4, 40.6398, -73.7789), ('LAX', 'Los Angeles', -7, 33.9425, -118.4081),
+    ('LGA', 'New York', -4, 40.7772, -73.8726), ('MIA', 'Miami', -4, 25.7932, -80.2906),
+    ('OAK', 'Oakland', -7, 37.7213, -122.2207), ('ORD', 'Chicago', -5, 41.9786, -87.9048),
+    ('PHL', 'Philadelphia', -4, 39.8719, -75.2411), ('SFO', 'San Francisco', -7, 37.6190, -122.3750),
+]
+HUB_CODES = np.array([hub[0] for hub in HUBS], dtype=object)
+HUB_OFFSETS = np.array([hub[2] for hub in HUBS])
+HUB_OFFSET_TEXT = np.array([f"{hub[2]:+03d}:00" for hub in HUBS], dtype=object)
+HUB_LATITUDES = np.array([hub[3] for hub in HUBS])
+HUB_LONGITUDES = np.array([hub[4] for hub in HUBS])
+HUB_DISTANCES_KM = haversine_km(HUB_LATITUDES[:, None], HUB_LONGITUDES[:, None], HUB_LATITUDES, HUB_LONGITUDES)
+
+# IATA code, name (as Airline.airlineName and segmentsAirlineName), minutes added to its typical delay
+AIRLINES = [
+    ('AA', 'American Airlines', 4), ('AS', 'Alaska Airlines', -2), ('B6', 'JetBlue Airways', 9),
+    ('DL', 'Delta', -4), ('F9', 'Frontier Airlines', 7), ('NK', 'Spirit Airlines', 6), ('UA', 'United Airlines', 2),
+]
+AIRLINE_CODES = np.array([airline[0] for airline in AIRLINES], dtype=object)
+AIRLINE_NAMES = np.array([airline[1] for airline in AIRLINES], dtype=object)
+AIRLINE_DELAY_BIAS = np.array([airline[2] for airline in AIRLINES])
+
+CABINS = np.array(['coach', 'premium coach', 'business', 'first'], dtype=object)
+CABIN_SHARES = [0.8, 0.08, 0.09, 0.03]
+CABIN_FARE_FACTORS = np.array([1.0, 1.6, 3.2, 4.5])
+EQUIPMENT = np.array(['Airbus A320', 'Airbus A321', 'Boeing 737-800', 'Boeing 757-200', 'Embraer 175'], dtype=object)
+COUNTRIES = ['United States', 'Canada', 'Mexico', 'United Kingdom', 'France', 'Germany', 'Spain', 'Italy',
+             'Japan', 'Brazil', 'Australia', 'India']
+
+FIRST_FLIGHT_DATE = pd.Timestamp('2022-04-17')
+FLIGHT_DAYS = 172  # Up to 2022-10-05, like the real itineraries
+NON_STOP_SHARE = 0.35
+CANCELLED_SHARE = 0.015
+
+# Seeds are derived per chunk, so the chunk size is fixed to keep datasets identical between runs
+CHUNK_ROWS = 250000
+
+
+def parse_count(value):
+    # 10000, 10k or 100M
+    value = value.strip().lower()
+    factor = {'k': 1000, 'm': 1000000}.get(value[-1:], 1)
+
+    return int(float(value.rstrip('km')) * factor)
+
+
+def _rng(seed, *stream):
+    return np.random.default_rng([seed, *stream])
+
+
+def _chunks(total):
+    for index, start in enumerate(range(0, total, CHUNK_ROWS)):
+        yield index, start, min(CHUNK_ROWS, total - start)
+
+
+def _local_times(epochs, airports):
+    # ISO-8601 local time with the airport's offset, as in segmentsDepartureTimeRaw
+    local = pd.to_datetime(epochs + HUB_OFFSETS[airports] * 3600, unit='s')
+
+    return pd.Series(local.strftime('%Y-%m-%dT%H:%M:%S.000'), dtype=object) + HUB_OFFSET_TEXT[airports]
+
+
+def _join(first, second, non_stop):
+    # ||-joined per-segment values for connecting legs
+    first, second = pd.Series(first, dtype=object).astype(str), pd.Series(second, dtype=object).astype(str)
+
+    return first.where(non_stop, first + '||' + second)
+
+
+def _clock(minutes):
+    # Minutes since midnight as HH:MM:00
+    minutes = np.asarray(minutes) % 1440
+    hours = np.char.zfill((minutes // 60).astype(str), 2)
+
+    return pd.Series(np.char.add(np.char.add(hours, ':'), np.char.zfill((minutes % 60).astype(str), 2))) + ':00'
+
+
+def _flight_minutes(distance_km, rng):
+    return np.maximum(30 + distance_km / 13 + rng.normal(0, 10, len(distance_km)), 30).astype(int)
+
+# ---- Reference tables ----
+
+def reference_tables(seed, airports=500, routes_per_airport=10):
+    """
+    Cities, Airports, Airline and AirlineRoutes. The hubs come first, followed by generated airports
+    around the world; every hub airline flies between every pair of hubs.
+    """
+    rng = _rng(seed, 0)
+    extra = max(airports - len(HUBS), 0)
+
+    cities = pd.DataFrame({
+        'cityName': [hub[1] for hub in HUBS] + [f'City {n}' for n in range(extra)],
+        'country': ['United States'] * len(HUBS) + list(rng.choice(COUNTRIES, extra)),
+        'timezone': [str(hub[2] - 1) for hub in HUBS] + [str(offset) for offset in rng.integers(-10, 11, extra)],
+    }).drop_duplicates(['cityName', 'country']).reset_index(drop=True)
+    cities.insert(0, 'cityID', np.arange(1, len(cities) + 1))
+    city_ids = dict(zip(cities['cityName'], cities['cityID']))
+
+    # Generated codes start at AAA and skip the hubs
+    letters = np.array(list('ABCDEFGHIJKLMNOPQRSTUVWXYZ'))
+    codes = [''.join(letters[[n // 676 % 26, n // 26 % 26, n % 26]]) for n in range(extra + len(HUBS))]
+    codes = [code for code in codes if code not in set(HUB_CODES)][:extra]
+    airport_ids = np.arange(1, len(HUBS) + extra + 1)
+    airports_df = pd.DataFrame({
+        'airportID': airport_ids,
+        'airportName': [f'{hub[1]} International Airport' for hub in HUBS] + [f'{code} Airport' for code in codes],
+        'cityID': [city_ids[hub[1]] for hub in HUBS] + [city_ids[f'City {n}'] for n in range(extra)],
+        'iata': list(HUB_CODES) + codes,
+        'icao': ['K' + code for code in HUB_CODES] + [None] * extra,
+        'latitude': np.concatenate([HUB_LATITUDES, rng.uniform(-60, 70, extra)]),
+        'longitude': np.concatenate([HUB_LONGITUDES, rng.uniform(-180, 180, extra)]),
+    })
+
+    extra_airlines = max(len(airport_ids) // 10, 0)
+    airline_ids = np.arange(1, len(AIRLINES) + extra_airlines + 1)
+    airlines = pd.DataFrame({
+        'airlineID': airline_ids,
+        'airlineName': list(AIRLINE_NAMES) + [f'Airline {n}' for n in range(extra_airlines)],
+        'iata': list(AIRLINE_CODES) + [f'{letters[n // 26 % 26]}{n % 10}' for n in range(extra_airlines)],
+        'icao': [None] * len(airline_ids),
+        'country': ['United States'] * len(AIRLINES) + list(rng.choice(COUNTRIES, extra_airlines)),
+    })
+
+    hub_ids = np.arange(1, len(HUBS) + 1)
+    source, destination = np.meshgrid(hub_ids, hub_ids)
+    pairs = source.ravel() != destination.ravel()
+    hub_routes = pd.DataFrame({
+        'airlineID': np.repeat(np.arange(1, len(AIRLINES) + 1), pairs.sum()),
+        'sourceAirportID': np.tile(source.ravel()[pairs], len(AIRLINES)),
+        'destinationAirportID': np.tile(destination.ravel()[pairs], len(AIRLINES)),
+    })
+    count = len(airport_ids) * routes_per_airport
+    other_routes = pd.DataFrame({
+        'airlineID': rng.choice(airline_ids, count),
+        'sourceAirportID': rng.choice(airport_ids, count),
+        'destinationAirportID': rng.choice(airport_ids, count),
+    })
+    other_routes = other_routes[other_routes['sourceAirportID'] != other_routes['destinationAirportID']]
+    routes = pd.concat([hub_routes, other_routes]).drop_duplicates().reset_index(drop=True)
+
+    return cities, airports_df, airlines, routes
+
+# ---- Legs ----
+
+def leg_ids(seed, start, rows):
+    # 32 hex digits, like the real legIds
+    return pd.Series(np.char.add(f'{seed:08x}', np.char.mod('%024x', np.arange(start, start + rows))), dtype=object)
+
+
+def legs_chunk(seed, index, start, rows):
+    """
+    Legs rows start to start + rows, with the columns transform_legs would produce from the CSV.
+    Connecting legs have two segments through a third hub.
+    """
+    rng = _rng(seed, 1, index)
+    origin = rng.integers(0, len(HUBS), rows)
+    destination = (origin + rng.integers(1, len(HUBS), rows)) % len(HUBS)
+    via = rng.integers(0, len(HUBS), rows)
+    for _ in range(2):
+        via = np.where((via == origin) | (via == destination), (via + 1) % len(HUBS), via)
+    non_stop = rng.random(rows) < NON_STOP_SHARE
+    airline = rng.integers(0, len(AIRLINES), rows)
+    cabin = rng.choice(len(CABINS), rows, p=CABIN_SHARES)
+
+    day = rng.integers(0, FLIGHT_DAYS, rows)
+    flight_date = FIRST_FLIGHT_DATE + pd.to_timedelta(day, unit='D')
+    day_epoch = (flight_date - pd.Timestamp('1970-01-01')) // pd.Timedelta(seconds=1)
+    dep_minute = rng.integers(60, 276, rows) * 5  # 05:00 to 22:55
+    dep_epoch = day_epoch.to_numpy() + dep_minute * 60 - HUB_OFFSETS[origin] * 3600
+
+    # First segment to the destination (non-stop) or the connecting hub, then on to the destination
+    first_stop = np.where(non_stop, destination, via)
+    first_minutes = _flight_minutes(HUB_DISTANCES_KM[origin, first_stop], rng)
+    second_minutes = np.where(non_stop, 0, _flight_minutes(HUB_DISTANCES_KM[via, destination], rng))
+    first_arrival = dep_epoch + first_minutes * 60
+    second_departure = first_arrival + rng.integers(9, 48, rows) * 300  # 45 minute to 4 hour layovers
+    arr_epoch = np.where(non_stop, first_arrival, second_departure + second_minutes * 60)
+    travel_minutes = (arr_epoch - dep_epoch) // 60
+    local_arrival = arr_epoch + HUB_OFFSETS[destination] * 3600
+
+    distance = np.where(non_stop, HUB_DISTANCES_KM[origin, destination],
+                        HUB_DISTANCES_KM[origin, via] + HUB_DISTANCES_KM[via, destination])
+    base_fare = np.round((25 + 0.08 * distance * rng.gamma(4, 0.25, rows)) * CABIN_FARE_FACTORS[cabin], 2)
+    segments = np.where(non_stop, 1, 2)
+
+    return pd.DataFrame({
+        'legID': leg_ids(seed, start, rows),
+        'startingAirport': HUB_CODES[origin],
+        'destinationAirport': HUB_CODES[destination],
+        'flightDate': flight_date.strftime('%Y-%m-%d'),
+        'travelDuration': 'PT' + pd.Series(travel_minutes // 60).astype(str) + 'H'
+                          + pd.Series(travel_minutes % 60).astype(str) + 'M',
+        'elapsedDays': local_arrival // 86400 - day_epoch.to_numpy() // 86400,
+        'isBasicEconomy': ((cabin == 0) & (rng.random(rows) < 0.2)).astype(int),
+        'isRefundable': (rng.random(rows) < 0.05).astype(int),
+        'isNonStop': non_stop.astype(int),
+        'baseFare': base_fare,
+        'totalFare': np.round(base_fare * 1.075 + 5.6 * segments, 2),
+        'seatsRemaining': rng.integers(0, 10, rows),
+        'segmentsDepartureTimeRaw': _join(_local_times(dep_epoch, origin), _local_times(second_departure, via), non_stop),
+        'segmentsArrivalTimeRaw': _join(_local_times(first_arrival, first_stop), _local_times(arr_epoch, destination),
+                                        non_stop),
+        'segmentsArrivalAirportCode': _join(HUB_CODES[first_stop], HUB_CODES[destination], non_stop),
+        'segmentsDepartureAirportCode': _join(HUB_CODES[origin], HUB_CODES[via], non_stop),
+        'segmentsAirlineName': _join(AIRLINE_NAMES[airline], AIRLINE_NAMES[airline], non_stop),
+        'segmentsAirlineCode': _join(AIRLINE_CODES[airline], AIRLINE_CODES[airline], non_stop),
+        'segmentsEquipmentDescription': _join(rng.choice(EQUIPMENT, rows), rng.choice(EQUIPMENT, rows), non_stop),
+        'segmentsDurationInSeconds': _join(first_minutes * 60, second_minutes * 60, non_stop),
+        'segmentsCabinCode': _join(CABINS[cabin], CABINS[cabin], non_stop),
+        'depMinute': dep_minute,
+        'arrMinute': (local_arrival % 86400) // 60,
+        'depEpoch': dep_epoch,
+        'arrEpoch': arr_epoch,
+    })
+
+
+def transactions_chunk(legs, start, limit):
+    """
+    TransactionTable rows for the legs numbered below limit: one transaction per leg, with its airline,
+    cabin, stops, origin and fare band as items.
+    """
+    legs = legs.iloc[:max(limit - start, 0)]
+    if legs.empty:
+        return pd.DataFrame(columns=['transaction_id', 'item'])
+
+    bands = pd.cut(legs['totalFare'], [0, 200, 500, np.inf], labels=['fare<200', 'fare200-500', 'fare500+'])
+    items = pd.DataFrame({
+        'airline': 'airline:' + legs['segmentsAirlineCode'].str.split('|').str[0],
+        'cabin': 'cabin:' + legs['segmentsCabinCode'].str.split('|').str[0],
+        'stops': np.where(legs['isNonStop'] == 1, 'nonstop', 'connecting'),
+        'origin': 'origin:' + legs['startingAirport'],
+        'fare': bands.astype(str),
+    })
+    items.insert(0, 'transaction_id', np.arange(start, start + len(legs)) + 1)
+
+    return items.melt(id_vars='transaction_id', value_name='item')[['transaction_id', 'item']]
+
+# ---- Delays ----
+
+def delays_chunk(seed, index, rows):
+    """
+    Delays rows between the hubs; an airline's delays are offset by its AIRLINE_DELAY_BIAS, so the delay
+    model has something to learn.
+    """
+    rng = _rng(seed, 2, index)
+    origin = rng.integers(0, len(HUBS), rows)
+    destination = (origin + rng.integers(1, len(HUBS), rows)) % len(HUBS)
+    airline = rng.integers(0, len(AIRLINES), rows)
+    flight_date = FIRST_FLIGHT_DATE + pd.to_timedelta(rng.integers(0, FLIGHT_DAYS, rows), unit='D')
+    distance_km = HUB_DISTANCES_KM[origin, destination]
+
+    scheduled = rng.integers(60, 276, rows) * 5
+    dep_delay = np.round(rng.gamma(1.2, 12, rows) - 8 + AIRLINE_DELAY_BIAS[airline])
+    arr_delay = np.round(dep_delay + rng.normal(0, 8, rows))
+    arrival = scheduled + _flight_minutes(distance_km, rng) + (HUB_OFFSETS[destination] - HUB_OFFSETS[origin]) * 60
+    cancelled = rng.random(rows) < CANCELLED_SHARE
+
+    delays = pd.DataFrame({
+        'Year': flight_date.year, 'Quarter': flight_date.quarter, 'Month': flight_date.month,
+        'DayofMonth': flight_date.day, 'DayOfWeek': flight_date.dayofweek + 1,
+        'FlightDate': flight_date.strftime('%Y-%m-%d'),
+        'Marketing_Airline_Network': AIRLINE_CODES[airline],
+        'IATA_Code_Marketing_Airline': AIRLINE_CODES[airline],
+        'Operating_Airline': AIRLINE_CODES[airline],
+        'IATA_Code_Operating_Airline': AIRLINE_CODES[airline],
+        'Tail_Number': pd.Series(np.char.mod('N%03d', rng.integers(100, 1000, rows))) + AIRLINE_CODES[airline],
+        'Flight_Number_Operating_Airline': rng.integers(1, 3000, rows).astype(str),
+        'Origin': HUB_CODES[origin], 'OriginCityName': np.array([hub[1] for hub in HUBS])[origin],
+        'Dest': HUB_CODES[destination], 'DestCityName': np.array([hub[1] for hub in HUBS])[destination],
+        'DepTime': _clock(scheduled + dep_delay.astype(int)),
+        'DepDelay': dep_delay,
+        'DepDelayMinutes': np.maximum(dep_delay, 0),
+        'ArrTime': _clock(arrival + arr_delay.astype(int)),
+        'ArrDelay': arr_delay,
+        'ArrDelayMinutes': np.maximum(arr_delay, 0),
+        'Cancelled': cancelled.astype(int),
+        'Diverted': 0,
+        'Flights': 1,
+        'Distance': np.round(distance_km / 1.609),
+    })
+    delays.loc[cancelled, ['DepTime', 'DepDelay', 'DepDelayMinutes', 'ArrTime', 'ArrDelay', 'ArrDelayMinutes']] = None
+
+    return delays
+
+# ---- Users ----
+
+def users_tables(seed, users):
+    # Users (IDs assigned by the database, 1 to users on a new schema) and one Preferences row each
+    rng = _rng(seed, 3)
+    numbers = np.arange(1, users + 1)
+    users_df = pd.DataFrame({
+        'fullName': [f'User {n}' for n in numbers],
+        'phoneNumber': [f'+1555{n:09d}' for n in numbers],
+        'addressFirstLine': [f'{n} Main Street' for n in numbers],
+        'addressLastLine': None,
+        'addressPostcode': rng.integers(10000, 99999, users).astype(str),
+        'billingFirstLine': [f'{n} Main Street' for n in numbers],
+        'billingLastLine': None,
+        'billingPostcode': rng.integers(10000, 99999, users).astype(str),
+        'birthDate': (pd.Timestamp('1950-01-01') + pd.to_timedelta(rng.integers(0, 20000, users), unit='D'))
+        .strftime('%Y-%m-%d'),
+        'gender': rng.choice(['M', 'F', 'NB'], users, p=[0.49, 0.49, 0.02]),
+        'email': [f'user{n}@example.com' for n in numbers],
+    })
+    preferences = pd.DataFrame({
+        'preferenceNumber': 1,
+        'userID': numbers,
+        'preferredFlyingClass': rng.choice(CABINS, users, p=CABIN_SHARES),
+        'preferredDepartureTime': _clock(rng.integers(6, 22, users) * 60).where(rng.random(users) < 0.7),
+        'preferredDuration': np.where(rng.random(users) < 0.3, rng.integers(3, 12, users) * 60, None),
+    })
+
+    return users_df, preferences
+
+# ---- Generation ----
+
+def generate(engine, legs, seed=0, airports=500, delays=None, users=1000, transactions=None):
+    """
+    Create the schema on engine and fill it; delays defaults to one row per leg and transactions
+    to the first 100k legs. Returns the row count per table.
+    """
+    delays = legs if delays is None else delays
+    transactions = min(legs, 100000) if transactions is None else transactions
+    counts = {}
+
+    local_db.create_schema(engine)
+    with engine.begin() as connection:
+        cities, airports_df, airlines, routes = reference_tables(seed, airports)
+        users_df, preferences = users_tables(seed, users)
+        for table, df in [('Cities', cities), ('Airports', airports_df), ('Airline', airlines),
+                          ('AirlineRoutes', routes), ('Users', users_df), ('Preferences', preferences)]:
+            local_db.append_rows(connection, table, df)
+            counts[table] = len(df)
+    print(f"Generated {counts['Airports']:,} airports, {counts['AirlineRoutes']:,} routes, {users:,} users")
+
+    started = time.perf_counter()
+    for index, start, rows in _chunks(legs):
+        chunk = legs_chunk(seed, index, start, rows)
+        with engine.begin() as connection:
+            local_db.append_rows(connection, 'Legs', chunk)
+            local_db.append_rows(connection, 'TransactionTable', transactions_chunk(chunk, start, transactions))
+        print(f"Generated {start + rows:,} Legs rows ({time.perf_counter() - started:.0f}s)", end='\r')
+    print()
+
+    for index, start, rows in _chunks(delays):
+        with engine.begin() as connection:
+            local_db.append_rows(connection, 'Delays', delays_chunk(seed, index, rows))
+        print(f"Generated {start + rows:,} Delays rows", end='\r')
+    print()
+    counts.update({'Legs': legs, 'Delays': delays, 'TransactionTable': transactions})
+
+    local_db.create_indexes(engine)
+    local_db.rebuild_fare_tables(engine)
+    print("Built indexes, FareWeeklyRollup and FareSketchBuckets")
+
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--legs', type=parse_count, default='10k', help="Legs rows, 10k to 100M")
+    parser.add_argument('--delays', type=parse_count, help="Delays rows (default: as many as legs)")
+    parser.add_argument('--users', type=parse_count, default='1000')
+    parser.add_argument('--airports', type=parse_count, default='500', help="Airports, the 16 hubs included")
+    parser.add_argument('--transactions', type=parse_count, help="Legs turned into /apriori transactions "
+                                                                 "(default: 100k)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--backend', choices=local_db.LOCAL_BACKENDS, default='sqlite')
+    parser.add_argument('--path', default='bench.sqlite')
+    args = parser.parse_args()
+
+    engine = local_db.create_local_engine(args.backend, args.path)
+    generate(engine, args.legs, seed=args.seed, airports=args.airports, delays=args.delays, users=args.users,
+             transactions=args.transactions)
+    print(f"{args.backend} database ready at {args.path}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,206 @@
+import hashlib
+import os
+import time
+import uuid
+import joblib
+import numpy as np
+import pandas as pd
+
+# Views /cluster_flights may read, and the columns treated as categorical (one-hot encoded)
+CLUSTERING_VIEWS = ('vFlightPrices', 'vNonStopFlights')
+CATEGORICAL_FEATURES = ('segmentsCabinCode',)
+
+# Sampled mode: rows the model is fitted on, labelled points returned per cluster, rows per streamed chunk
+SAMPLE_SIZE = int(os.getenv('CLUSTER_SAMPLE_SIZE', '50000'))
+POINTS_PER_CLUSTER = 200
+CHUNK_SIZE = 50000
+
+# Fitted scaler + model per (view, features, k), kept in memory and on disk; models older than
+# CLUSTER_MODEL_TTL seconds are fitted again, so they follow the flights added since (0 = kept until refit=1)
+CLUSTER_MODEL_DIR = os.getenv('CLUSTER_MODEL_DIR', 'cluster_models')
+CLUSTER_MODEL_TTL = int(os.getenv('CLUSTER_MODEL_TTL', '86400'))
+
+_models = {}  # key -> (time fitted, model)
+
+
+def validate_request(features, view):
+    if view not in CLUSTERING_VIEWS:
+        raise ValueError(f"Unknown view: {view}")
+    for feature in features:
+        if not feature.isidentifier():
+            raise ValueError(f"Invalid feature: {feature}")
+
+
+def reservoir_update(sample, chunk, size, rng):
+    """
+    Keep a uniform random sample of size rows over a stream of chunks: every row gets a random key
+    and the rows with the smallest keys seen so far are kept.
+    """
+    chunk = chunk.assign(_key=rng.random(len(chunk)))
+    if sample is not None:
+        chunk = pd.concat([sample, chunk], ignore_index=True)
+
+    return chunk.nsmallest(size, '_key') if len(chunk) > size else chunk
+
+
+def stratified_update(sample, chunk, per_cluster, rng):
+    # Same as reservoir_update, with a separate reservoir of per_cluster rows for every cluster
+    chunk = chunk.assign(_key=rng.random(len(chunk)))
+    if sample is not None:
+        chunk = pd.concat([sample, chunk], ignore_index=True)
+
+    return chunk.sort_values('_key').groupby('cluster', sort=False).head(per_cluster)
+
+
+def encode(df, categories):
+    # One-hot encode with the categories found when fitting, so every chunk gets the same columns
+    # (named like pd.get_dummies(..., drop_first=True) in the full mode)
+    df = df.copy()
+    for col, values in categories.items():
+        encoded = pd.get_dummies(pd.Categorical(df.pop(col), categories=values), prefix=col, drop_first=True)
+        encoded.index = df.index
+        df = df.join(encoded.astype(float))
+
+    return df
+
+
+class ClusterModel:
+    """
+    StandardScaler + MiniBatchKMeans fitted on a sample of a view, with the categories used to encode it.
+    """
+
+    def __init__(self, scaler, kmeans, categories, columns):
+        self.scaler = scaler
+        self.kmeans = kmeans
+        self.categories = categories
+        self.columns = columns
+
+    @classmethod
+    def fit(cls, sample, n_clusters, seed=0):
+        from sklearn.cluster import MiniBatchKMeans
+        from sklearn.preprocessing import StandardScaler
+
+        categories = {col: sorted(sample[col].dropna().unique()) for col in CATEGORICAL_FEATURES if col in sample}
+        encoded = encode(sample, categories).fillna(0)
+
+        scaler = StandardScaler()
+        kmeans = MiniBatchKMeans(n_clusters=n_clusters, random_state=seed, n_init=3, batch_size=4096)
+        kmeans.fit(scaler.fit_transform(encoded))
+
+        return cls(scaler, kmeans, categories, list(encoded.columns))
+
+    def predict(self, chunk):
+        encoded = encode(chunk, self.categories).reindex(columns=self.columns, fill_value=0).fillna(0)
+
+        return self.kmeans.predict(self.scaler.transform(encoded)), encoded
+
+    def centroids(self):
+        # Cluster centres in the original units of each feature
+        centres = self.scaler.inverse_transform(self.kmeans.cluster_centers_)
+
+        return [dict(zip(self.columns, centre.tolist())) for centre in centres]
+
+
+def _model_path(key):
+    digest = hashlib.sha256(repr(key).encode()).hexdigest()[:20]
+
+    return os.path.join(CLUSTER_MODEL_DIR, f"{digest}.joblib")
+
+
+def _fresh(fitted_at, now):
+    return not CLUSTER_MODEL_TTL or now - fitted_at < CLUSTER_MODEL_TTL
+
+
+def get_cluster_model(key, fit):
+    """
+    Cached model for key, or fit() it and cache the result.
+    """
+    now = time.time()
+    entry = _models.get(key)
+    if entry is not None and _fresh(entry[0], now):
+        return entry[1]
+
+    path = _model_path(key)
+    try:
+        fitted_at = os.path.getmtime(path)
+    except OSError:
+        fitted_at = None
+    if fitted_at is not None and _fresh(fitted_at, now):
+        model = joblib.load(path)
+    else:
+        model = fit()
+        if model is None:
+            return None
+        # Written under a temporary name and renamed, so job workers never load a half-written file
+        os.makedirs(CLUSTER_MODEL_DIR, exist_ok=True)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        joblib.dump(model, tmp_path)
+        os.replace(tmp_path, path)
+        fitted_at = now
+
+    _models[key] = (fitted_at, model)
+    return model
+
+
+def clear_cluster_models():
+    _models.clear()
+    if os.path.isdir(CLUSTER_MODEL_DIR):
+        for name in os.listdir(CLUSTER_MODEL_DIR):
+            os.remove(os.path.join(CLUSTER_MODEL_DIR, name))
+
+
+def cluster_sampled(chunks, features, view, n_clusters, refit=False, sample_size=SAMPLE_SIZE,
+                    points_per_cluster=POINTS_PER_CLUSTER, progress=None, seed=0):
+    """
+    Cluster a whole view without holding it in memory.
+
+    chunks() returns a fresh iterator of DataFrame chunks of the view. Unless a model for
+    (view, features, n_clusters) is cached, one pass draws a reservoir sample to fit it on; a second
+    pass labels every row. Returns centroids, cluster sizes and up to points_per_cluster labelled points
+    per cluster.
+    """
+    key = (view, tuple(features), n_clusters)
+    rng = np.random.default_rng(seed)
+
+    def fit():
+        sample = None
+        seen = 0
+        for chunk in chunks():
+            sample = reservoir_update(sample, chunk, sample_size, rng)
+            seen += len(chunk)
+            if progress is not None:
+                progress(0.1, f"Sampling {view} ({seen:,} rows read)")
+
+        if sample is None or sample.empty:
+            return None
+
+        return ClusterModel.fit(sample.drop(columns='_key'), n_clusters, seed)
+
+    if refit:
+        _models.pop(key, None)
+        if os.path.exists(_model_path(key)):
+            os.remove(_model_path(key))
+
+    model = get_cluster_model(key, fit)
+    if model is None:
+        return None
+
+    sizes = np.zeros(n_clusters, dtype=np.int64)
+    points = None
+    rows = 0
+    for chunk in chunks():
+        labels, encoded = model.predict(chunk)
+        sizes += np.bincount(labels, minlength=n_clusters)
+        points = stratified_update(points, encoded.assign(cluster=labels), points_per_cluster, rng)
+        rows += len(chunk)
+        if progress is not None:
+            progress(0.5, f"Labelled {rows:,} flights")
+
+    points = points.drop(columns='_key').sort_values('cluster') if points is not None else pd.DataFrame()
+
+    return {
+        'centroids': model.centroids(),
+        'sizes': sizes.tolist(),
+        'rows': rows,
+        'sample': points.to_dict(orient='records'),
+    }
@@ -0,0 +1,97 @@
+import os
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+import numpy as np
+import pandas as pd
+import clustering
+from clustering import cluster_sampled, reservoir_update
+
+
+def make_view(rows, rng):
+    # Three well separated fare/duration groups, like the cabins in vNonStopFlights
+    group = rng.integers(0, 3, rows)
+    return pd.DataFrame({
+        'totalFare': np.array([150.0, 600.0, 2500.0])[group] + rng.normal(0, 20, rows),
+        'travelDuration': np.array([90.0, 300.0, 700.0])[group] + rng.normal(0, 10, rows),
+        'segmentsCabinCode': np.array(['coach', 'premium coach', 'first'])[group],
+    })
+
+
+class TestSampledClustering(unittest.TestCase):
+    def setUp(self):
+        self.rng = np.random.default_rng(0)
+        self.view = make_view(30000, self.rng)
+        self.directory = tempfile.TemporaryDirectory()
+        patcher = patch.object(clustering, 'CLUSTER_MODEL_DIR', self.directory.name)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(clustering._models.clear)
+        self.passes = 0
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def chunks(self):
+        self.passes += 1
+        for start in range(0, len(self.view), 7000):
+            yield self.view.iloc[start:start + 7000]
+
+    def test_reservoir_is_bounded_and_uniform(self):
+        sample = None
+        for chunk in self.chunks():
+            sample = reservoir_update(sample, chunk, 1000, self.rng)
+
+        self.assertEqual(len(sample), 1000)
+        shares = sample['segmentsCabinCode'].value_counts(normalize=True)
+        expected = self.view['segmentsCabinCode'].value_counts(normalize=True)
+        self.assertTrue(np.allclose(shares.sort_index(), expected.sort_index(), atol=0.05))
+
+    def test_finds_groups_and_summarizes(self):
+        features = ['totalFare', 'travelDuration', 'segmentsCabinCode']
+        result = cluster_sampled(self.chunks, features, 'vNonStopFlights', 3, sample_size=2000, points_per_cluster=50)
+
+        self.assertEqual(result['rows'], len(self.view))
+        self.assertEqual(sorted(result['sizes']), sorted(self.view['segmentsCabinCode'].value_counts().tolist()))
+        fares = sorted(centroid['totalFare'] for centroid in result['centroids'])
+        np.testing.assert_allclose(fares, [150, 600, 2500], atol=30)
+
+        sample = pd.DataFrame(result['sample'])
+        self.assertEqual(sample.groupby('cluster').size().tolist(), [50, 50, 50])
+        self.assertIn('segmentsCabinCode_premium coach', sample.columns)
+
+    def test_model_is_cached(self):
+        features = ['totalFare', 'travelDuration']
+        cluster_sampled(self.chunks, features, 'vNonStopFlights', 3, sample_size=2000)
+        self.assertEqual(self.passes, 2)
+        self.assertEqual(len(os.listdir(self.directory.name)), 1)
+
+        clustering._models.clear()  # still cached on disk
+        cluster_sampled(self.chunks, features, 'vNonStopFlights', 3, sample_size=2000)
+        self.assertEqual(self.passes, 3)
+
+        cluster_sampled(self.chunks, features, 'vNonStopFlights', 3, sample_size=2000, refit=True)
+        self.assertEqual(self.passes, 5)
+
+    def test_models_expire(self):
+        features = ['totalFare', 'travelDuration']
+        with patch.object(clustering, 'CLUSTER_MODEL_TTL', 3600):
+            with patch('clustering.time.time', return_value=time.time() + 60):
+                cluster_sampled(self.chunks, features, 'vNonStopFlights', 3, sample_size=2000)
+            self.assertEqual(self.passes, 2)
+
+            clustering._models.clear()
+            with patch('clustering.time.time', return_value=time.time() + 7200):
+                cluster_sampled(self.chunks, features, 'vNonStopFlights', 3, sample_size=2000)
+            self.assertEqual(self.passes, 4)
+
+        self.assertEqual([name for name in os.listdir(self.directory.name) if not name.endswith('.joblib')], [])
+
+    def test_rejects_unknown_view(self):
+        self.assertRaises(ValueError, clustering.validate_request, ['totalFare'], 'Users')
+        self.assertRaises(ValueError, clustering.validate_request, ['totalFare; DROP TABLE Legs'], 'vFlightPrices')
+
+
+if __name__ == '__main__':
+    unittest.main()
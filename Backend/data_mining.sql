@@ -59,7 +59,8 @@ SELECT
   s.segmentsDepartureTimeRaw, 
   s.segmentsArrivalTimeRaw, 
   s.segmentsDurationInSeconds, 
-  s.segmentsCabinCode
+  s.segmentsCabinCode,
+  (s.arrEpoch - s.depEpoch) / 60 AS travelMinutes  -- travelDuration in minutes, so correlations can be aggregated in SQL
 FROM 
   Legs s
 WHERE 
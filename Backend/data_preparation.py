@@ -1,7 +1,25 @@
+import os
+import shutil
 import pandas as pd
-from db import get_flight_delay_data
-from sklearn.preprocessing import LabelEncoder
+from db import get_flight_delay_data, iter_flight_delay_data
 import joblib
+from time_parsing import minutes_of_day
+
+CATEGORICAL_COLS = ['IATA_Code_Operating_Airline', 'Origin', 'Dest']
+MODEL_FEATURES = ['DepTime', 'ArrTime', 'IATA_Code_Operating_Airline', 'Origin', 'Dest']
+
+# Code given to categories that were not seen when the vocabulary was built
+UNKNOWN_CATEGORY = -1
+CATEGORY_VOCAB_FILE = 'category_vocab.joblib'
+
+# Partitioned Parquet dataset written by prepare_data_parquet, and its state: the last FlightDate
+# prepared (watermark) plus running sums/counts of the numeric columns used to fill missing values
+PREPARED_DATASET = 'prepared_data'
+FEATURE_STATS_FILE = 'prepared_stats.joblib'
+FILL_COLS = ['DepTime', 'ArrTime', 'DepDelayMinutes', 'ArrDelayMinutes']
+PARTITION_COLS = ['Year', 'Month']
+
+_category_vocab = None
 
 def prepare_data():
     df = get_flight_delay_data()
@@ -11,32 +29,147 @@ def prepare_data():
     df_prepared.to_csv('prepared_data.csv', index=False)
     print("Data types after conversion:", df_prepared.dtypes)
 
-def dump_labelencoder(label_encoder):
-    joblib.dump(label_encoder, 'label_encoder_IATA_Code_Operating_Airline.joblib')
+def prepare_data_parquet(path=PREPARED_DATASET, chunksize=100000, incremental=False):
+    """
+    Write the prepared delay data to a Parquet dataset partitioned by Year/Month.
+    With incremental, only flights after the saved watermark are extracted and appended,
+    and the category vocabulary and fill statistics are extended rather than rebuilt.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
 
-def load_labelencoder():    
-    label_encoder = joblib.load('label_encoder_IATA_Code_Operating_Airline.joblib')
-    return label_encoder
+    stats = load_feature_stats() if incremental and os.path.exists(path) else None
+    if stats is None:
+        # Full rebuild: codes and statistics start from scratch
+        if os.path.exists(path):
+            shutil.rmtree(path)
+        vocab = None
+        stats = {'watermark': None, 'sum': {}, 'count': {}}
+    else:
+        vocab = load_category_vocab() or None
+        print(f"Preparing flights after {stats['watermark']}")
 
-def convert_iso8601_to_minutes(datetime_str):
-    
+    rows = 0
+    for chunk in iter_flight_delay_data(chunksize, since=stats['watermark']):
+        chunk, vocab = transform_delay_chunk(chunk, vocab)
+        stats = update_feature_stats(stats, chunk)
+
+        pq.write_to_dataset(pa.Table.from_pandas(chunk, preserve_index=False), root_path=path,
+                            partition_cols=PARTITION_COLS)
+        rows += len(chunk)
+        print(f"Prepared {rows:,} rows", end='\r')
+
+    print(f"Prepared {rows:,} rows, watermark {stats['watermark']}")
+    dump_category_vocab(vocab or build_category_vocab(pd.DataFrame(columns=CATEGORICAL_COLS)))
+    joblib.dump(stats, FEATURE_STATS_FILE)
+
+def transform_delay_chunk(chunk, vocab=None):
+    # Same transformation as preprocess_data, minus the mean fill, which needs statistics over every chunk
+    for col in ['DepTime', 'ArrTime']:
+        if not pd.api.types.is_timedelta64_dtype(chunk[col]):
+            chunk[col] = pd.to_timedelta(chunk[col].astype('string'), errors='coerce')
+        chunk[col] = convert_timedelta_to_minutes(chunk[col])
+
+    vocab = build_category_vocab(chunk, vocab)
+    chunk = encode_categoricals(chunk, vocab)
+
+    flight_date = pd.to_datetime(chunk['FlightDate'])
+    chunk['FlightDate'] = flight_date.dt.date
+    chunk['Year'] = flight_date.dt.year.astype('int16')
+    chunk['Month'] = flight_date.dt.month.astype('int8')
+    chunk[FILL_COLS] = chunk[FILL_COLS].astype('float32')
+
+    return chunk, vocab
+
+def update_feature_stats(stats, chunk):
+    # Sums/counts merge across chunks and runs, so means never need a pass over the history
+    for col in FILL_COLS:
+        values = chunk[col].astype('float64')
+        stats['sum'][col] = stats['sum'].get(col, 0.0) + float(values.sum())
+        stats['count'][col] = stats['count'].get(col, 0) + int(values.count())
+
+    if len(chunk):
+        latest = chunk['FlightDate'].max()
+        stats['watermark'] = latest if stats.get('watermark') is None else max(stats['watermark'], latest)
+
+    return stats
+
+def load_feature_stats():
     try:
-        datetime_obj = pd.to_datetime(datetime_str, utc=True)
-        datetime_obj = datetime_obj.tz_convert(None)
-    except Exception as e:
-        print(f"Failed to parse datetime: {e}")
+        return joblib.load(FEATURE_STATS_FILE)
+    except FileNotFoundError:
+        print(f"{FEATURE_STATS_FILE} not found; rebuilding {PREPARED_DATASET} from scratch")
         return None
- 
-    minutes_since_midnight = datetime_obj.hour * 60 + datetime_obj.minute
-    return minutes_since_midnight
+
+def feature_means(stats):
+    return {col: stats['sum'][col] / stats['count'][col] for col in stats['count'] if stats['count'][col]}
+
+def load_prepared_data(columns=None, path=PREPARED_DATASET):
+    """
+    Read the prepared training data, only loading the requested columns.
+    Uses the Parquet dataset when it exists and falls back to prepared_data.csv.
+    """
+    if not os.path.exists(path):
+        return pd.read_csv('prepared_data.csv', usecols=columns)
+
+    df = pd.read_parquet(path, columns=columns)
+    means = feature_means(joblib.load(FEATURE_STATS_FILE))
+    fill = {col: mean for col, mean in means.items() if col in df.columns}
+
+    return df.fillna(fill)
+
+def build_category_vocab(data, vocab=None):
+    # Per-column {value: code} maps; existing codes are kept and unseen values appended in sorted order
+    vocab = {col: dict(vocab.get(col, {})) for col in CATEGORICAL_COLS} if vocab else {col: {} for col in CATEGORICAL_COLS}
+    for col in CATEGORICAL_COLS:
+        mapping = vocab[col]
+        for value in sorted(set(data[col].dropna().unique()) - mapping.keys()):
+            mapping[value] = len(mapping)
+
+    return vocab
+
+def encode_categoricals(data, vocab):
+    for col in CATEGORICAL_COLS:
+        data[col] = data[col].map(vocab.get(col, {})).fillna(UNKNOWN_CATEGORY).astype('int32')
+
+    return data
+
+def dump_category_vocab(vocab):
+    global _category_vocab
+
+    joblib.dump(vocab, CATEGORY_VOCAB_FILE)
+    _category_vocab = vocab
+
+def load_category_vocab():
+    # Loaded once per process; an empty vocabulary encodes everything as UNKNOWN_CATEGORY
+    global _category_vocab
+
+    if _category_vocab is None:
+        try:
+            _category_vocab = joblib.load(CATEGORY_VOCAB_FILE)
+        except FileNotFoundError:
+            print(f"{CATEGORY_VOCAB_FILE} not found; run data_preparation.py first")
+            return {}
+
+    return _category_vocab
+
+def convert_iso8601_to_minutes(datetime_str):
+    # Scalar wrapper; columns go through time_parsing.minutes_of_day directly
+    minutes_since_midnight = minutes_of_day([datetime_str])[0]
+
+    if minutes_since_midnight != minutes_since_midnight:  # NaN
+        print(f"Failed to parse datetime: {datetime_str}")
+        return None
+
+    return int(minutes_since_midnight)
+
+# Multi-segment legs depart with their first segment and arrive with their last
+TIMESTAMP_SEGMENTS = {'segmentsDepartureTimeRaw': 'first', 'segmentsArrivalTimeRaw': 'last'}
 
 def preprocess_data(data, is_prediction=False):
     if is_prediction:
-        print(data)
-        for col in ['segmentsDepartureTimeRaw', 'segmentsArrivalTimeRaw']:
-            print(data[col])
-            data[col] = data[col].apply(convert_iso8601_to_minutes)
-            print(data[col])
+        for col, segment in TIMESTAMP_SEGMENTS.items():
+            data[col] = minutes_of_day(data[col], segment)
         rename_dict = {
             'flightDate':'FlightDate',
             'segmentsDepartureTimeRaw': 'DepTime',
@@ -54,15 +187,15 @@ def preprocess_data(data, is_prediction=False):
                 data[col] = pd.to_timedelta(data[col], errors='coerce')   
             if pd.api.types.is_timedelta64_dtype(data[col]):
                 data[col] = convert_timedelta_to_minutes(data[col])
-                print(data[col].dtype)
-                print(data[col][0])
 
     
-    categorical_cols = ['IATA_Code_Operating_Airline', 'Origin', 'Dest']
-    label_encoder = LabelEncoder()
-    for col in categorical_cols:
-        data[col] = label_encoder.fit_transform(data[col])
-    dump_labelencoder(label_encoder)
+    # Training builds and saves the vocabulary; prediction reuses the saved one
+    if is_prediction:
+        vocab = load_category_vocab()
+    else:
+        vocab = build_category_vocab(data)
+        dump_category_vocab(vocab)
+    data = encode_categoricals(data, vocab)
 
     # Fill missing values with mean for numeric columns as done in training
     numeric_cols = data.select_dtypes(include=['number']).columns
@@ -71,10 +204,8 @@ def preprocess_data(data, is_prediction=False):
     return data
 
 def preprocess_data_predict(data):
-    for col in ['segmentsDepartureTimeRaw', 'segmentsArrivalTimeRaw']:
-            print(data[col])
-            data[col] = data[col].apply(convert_iso8601_to_minutes)
-            print(data[col])
+    for col, segment in TIMESTAMP_SEGMENTS.items():
+            data[col] = minutes_of_day(data[col], segment)
     rename_dict = {
             'flightDate':'FlightDate',
             'segmentsDepartureTimeRaw': 'DepTime',
@@ -85,10 +216,7 @@ def preprocess_data_predict(data):
         }
     data.rename(columns=rename_dict, inplace=True)
     
-    categorical_cols = ['IATA_Code_Operating_Airline', 'Origin', 'Dest']
-    label_encoder = LabelEncoder()
-    for col in categorical_cols:
-        data[col] = label_encoder.fit_transform(data[col])
+    data = encode_categoricals(data, load_category_vocab())
 
     numeric_cols = data.select_dtypes(include=['number']).columns
     data[numeric_cols] = data[numeric_cols].fillna(data[numeric_cols].mean())
@@ -101,4 +229,17 @@ def convert_timedelta_to_minutes(timedelta_series):
     return timedelta_series.dt.total_seconds() / 60
 
 if __name__ == '__main__':
-    prepare_data()
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Prepare the flight delay training data")
+    parser.add_argument('--parquet', action='store_true',
+                        help=f"Stream Delays in chunks into the partitioned {PREPARED_DATASET}/ Parquet dataset")
+    parser.add_argument('--incremental', action='store_true',
+                        help="Only append flights newer than the last prepared FlightDate (implies --parquet)")
+    parser.add_argument('--chunksize', type=int, default=100000)
+    args = parser.parse_args()
+
+    if args.parquet or args.incremental:
+        prepare_data_parquet(chunksize=args.chunksize, incremental=args.incremental)
+    else:
+        prepare_data()
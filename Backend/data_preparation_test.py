@@ -1,4 +1,5 @@
 from data_preparation import convert_iso8601_to_minutes, convert_timedelta_to_minutes, preprocess_data
+from data_preparation import build_category_vocab, encode_categoricals, UNKNOWN_CATEGORY
 import pandas as pd
 
 def test_convert_iso8601_to_minutes():
@@ -27,3 +28,84 @@ def test_preprocess_data():
 test_preprocess_data()
 
 
+def test_category_vocab():
+    train = pd.DataFrame({
+        'IATA_Code_Operating_Airline': ['UA', 'AA', 'UA'],
+        'Origin': ['JFK', 'LAX', 'JFK'],
+        'Dest': ['LAX', 'JFK', 'SFO']
+    })
+    vocab = build_category_vocab(train)
+    assert vocab['IATA_Code_Operating_Airline'] == {'AA': 0, 'UA': 1}, "Codes should follow sorted order like LabelEncoder"
+
+    # Extending keeps existing codes stable
+    extended = build_category_vocab(pd.DataFrame({
+        'IATA_Code_Operating_Airline': ['B6'], 'Origin': ['JFK'], 'Dest': ['BOS']}), vocab)
+    assert extended['IATA_Code_Operating_Airline'] == {'AA': 0, 'UA': 1, 'B6': 2}
+    assert extended['Dest'] == {'JFK': 0, 'LAX': 1, 'SFO': 2, 'BOS': 3}
+
+    encoded = encode_categoricals(pd.DataFrame({
+        'IATA_Code_Operating_Airline': ['UA', 'B6'], 'Origin': ['JFK', 'BOS'], 'Dest': ['SFO', 'SFO']}), vocab)
+    assert list(encoded['IATA_Code_Operating_Airline']) == [1, UNKNOWN_CATEGORY], "Unseen values map to the unknown code"
+    assert list(encoded['Origin']) == [0, UNKNOWN_CATEGORY]
+
+test_category_vocab()
+
+
+import os
+import tempfile
+from data_preparation import prepare_data_parquet, load_prepared_data
+
+def delay_chunks():
+    return [
+        pd.DataFrame({
+            'FlightDate': ['2022-01-03', '2022-02-07'], 'DepTime': ['07:30:00', None], 'ArrTime': ['09:30:00', '11:00:00'],
+            'DepDelayMinutes': [0.0, 20.0], 'ArrDelayMinutes': [5.0, 25.0],
+            'IATA_Code_Operating_Airline': ['UA', 'AA'], 'Origin': ['JFK', 'LAX'], 'Dest': ['LAX', 'JFK']}),
+        pd.DataFrame({
+            'FlightDate': ['2022-02-08'], 'DepTime': ['08:30:00'], 'ArrTime': ['10:00:00'],
+            'DepDelayMinutes': [40.0], 'ArrDelayMinutes': [30.0],
+            'IATA_Code_Operating_Airline': ['B6'], 'Origin': ['BOS'], 'Dest': ['JFK']}),
+    ]
+
+def test_prepare_data_parquet():
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as directory, \
+            patch('data_preparation.iter_flight_delay_data', return_value=iter(delay_chunks())):
+        os.chdir(directory)
+        try:
+            prepare_data_parquet(chunksize=2)
+            df = load_prepared_data(columns=['DepTime', 'IATA_Code_Operating_Airline', 'ArrDelayMinutes', 'Month'])
+        finally:
+            os.chdir(cwd)
+
+    df = df.sort_values('ArrDelayMinutes').reset_index(drop=True)
+    assert list(df['ArrDelayMinutes']) == [5.0, 25.0, 30.0]
+    assert list(df['DepTime']) == [450.0, 480.0, 510.0], "Missing times are filled with the mean over every chunk"
+    assert list(df['IATA_Code_Operating_Airline']) == [1, 0, 2], "Codes stay stable across chunks"
+    assert list(df['Month'].astype(int)) == [1, 2, 2]
+
+test_prepare_data_parquet()
+
+
+import datetime
+
+def test_prepare_data_incremental():
+    first, second = delay_chunks()
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        try:
+            with patch('data_preparation.iter_flight_delay_data', return_value=iter([first])):
+                prepare_data_parquet(incremental=True)
+            with patch('data_preparation.iter_flight_delay_data', return_value=iter([second])) as extract:
+                prepare_data_parquet(incremental=True)
+            df = load_prepared_data(columns=['DepTime', 'IATA_Code_Operating_Airline', 'ArrDelayMinutes'])
+        finally:
+            os.chdir(cwd)
+
+    assert extract.call_args.kwargs['since'] == datetime.date(2022, 2, 7), "Only flights after the watermark are extracted"
+    df = df.sort_values('ArrDelayMinutes').reset_index(drop=True)
+    assert list(df['DepTime']) == [450.0, 480.0, 510.0], "Running means match a full rebuild"
+    assert list(df['IATA_Code_Operating_Airline']) == [1, 0, 2]
+
+test_prepare_data_incremental()
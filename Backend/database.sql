@@ -73,6 +73,8 @@ CREATE TABLE Airports (
   cityID INT NOT NULL,
   iata VARCHAR(5) NOT NULL,
   icao VARCHAR(5),
+  latitude DOUBLE, -- Decimal degrees, used for route distances
+  longitude DOUBLE,
 
   PRIMARY KEY (airportID),
   FOREIGN KEY (cityID) REFERENCES Cities (cityID) ON DELETE CASCADE
@@ -162,11 +164,22 @@ CREATE TABLE Legs (
   segmentsDurationInSeconds VARCHAR(128) NOT NULL,
   segmentsCabinCode VARCHAR(128) NOT NULL,
 
+  -- Materialized from the segment strings so searches don't parse them per row
+  depMinute SMALLINT, -- Local departure time of the first segment, minutes since midnight
+  arrMinute SMALLINT, -- Local arrival time of the last segment, minutes since midnight
+  depEpoch BIGINT, -- First segment departure, seconds since epoch
+  arrEpoch BIGINT, -- Last segment arrival, seconds since epoch
+
   PRIMARY KEY (legID),
   FOREIGN KEY (startingAirport) REFERENCES Airports (iata),
   FOREIGN KEY (destinationAirport) REFERENCES Airports (iata)
 );
 
+-- Matches the filters of query_flight_details
+CREATE INDEX idx_legs_route_dep ON Legs(startingAirport, destinationAirport, segmentsAirlineCode, isNonStop, depMinute);
+-- Serves the ordered keyset pages of query_flight_details
+CREATE INDEX idx_legs_route_page ON Legs(startingAirport, destinationAirport, segmentsAirlineCode, isNonStop, flightDate, segmentsDepartureTimeRaw, legID);
+
 CREATE TABLE LegPassengers (
   legID VARCHAR(35),
   passengerID int,
@@ -388,7 +401,9 @@ CREATE TABLE TempAirports (
   cityName VARCHAR(85) NOT NULL,
   country VARCHAR(64) NOT NULL,
   iata VARCHAR(5) NOT NULL,
-  icao VARCHAR(5)
+  icao VARCHAR(5),
+  latitude DOUBLE,
+  longitude DOUBLE
 );
 
 -- Load data into the temporary table
@@ -398,11 +413,11 @@ FIELDS TERMINATED BY ','
 OPTIONALLY ENCLOSED BY '"'
 LINES TERMINATED BY '\n'
 IGNORE 1 LINES
-(airportID, airportName, cityName, country, iata, icao, @dummy, @dummy, @dummy, @dummy, @dummy, @dummy, @dummy, @dummy);
+(airportID, airportName, cityName, country, iata, icao, latitude, longitude, @dummy, @dummy, @dummy, @dummy, @dummy, @dummy);
 
 -- Insert data into Airports with a join to get cityID
-INSERT INTO Airports (airportID, airportName, cityID, iata, icao)
-SELECT t.airportID, t.airportName, c.cityID, t.iata, t.icao
+INSERT INTO Airports (airportID, airportName, cityID, iata, icao, latitude, longitude)
+SELECT t.airportID, t.airportName, c.cityID, t.iata, t.icao, t.latitude, t.longitude
 FROM TempAirports t
 JOIN Cities c ON t.cityName = c.cityName AND t.country = c.country;
 
@@ -474,9 +489,9 @@ IGNORE 1 LINES
   seatsRemaining,
   @totalTravelDistance,
   @segmentsDepartureTimeEpochSeconds,
-  segmentsDepartureTimeRaw,
+  @segmentsDepartureTimeRaw,
   @segmentsArrivalTimeEpochSeconds,
-  segmentsArrivalTimeRaw,
+  @segmentsArrivalTimeRaw,
   segmentsArrivalAirportCode,
   segmentsDepartureAirportCode,
   segmentsAirlineName,
@@ -494,7 +509,16 @@ SET
                 END,
   isBasicEconomy = CASE WHEN @isNonStop = 'TRUE' THEN 1 ELSE 0 END,              
   isRefundable = CASE WHEN @isNonStop = 'TRUE' THEN 1 ELSE 0 END,
-  isNonStop = CASE WHEN @isNonStop = 'TRUE' THEN 1 ELSE 0 END;
+  isNonStop = CASE WHEN @isNonStop = 'TRUE' THEN 1 ELSE 0 END,
+  segmentsDepartureTimeRaw = @segmentsDepartureTimeRaw,
+  segmentsArrivalTimeRaw = @segmentsArrivalTimeRaw,
+  -- Raw times look like 2022-04-17T12:57:00.000-04:00, segments are joined with ||
+  depMinute = SUBSTRING(SUBSTRING_INDEX(@segmentsDepartureTimeRaw, '||', 1), 12, 2) * 60
+            + SUBSTRING(SUBSTRING_INDEX(@segmentsDepartureTimeRaw, '||', 1), 15, 2),
+  arrMinute = SUBSTRING(SUBSTRING_INDEX(@segmentsArrivalTimeRaw, '||', -1), 12, 2) * 60
+            + SUBSTRING(SUBSTRING_INDEX(@segmentsArrivalTimeRaw, '||', -1), 15, 2),
+  depEpoch = SUBSTRING_INDEX(@segmentsDepartureTimeEpochSeconds, '||', 1),
+  arrEpoch = SUBSTRING_INDEX(@segmentsArrivalTimeEpochSeconds, '||', -1);
 
 LOAD DATA INFILE 'C:/ProgramData/MySQL/MySQL Server 8.0/Uploads/Flights_2022_2.csv'
 INTO TABLE Delays
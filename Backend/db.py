@@ -1,15 +1,24 @@
 import os
+import numpy as np
 import pandas as pd
 from sqlalchemy import create_engine
 from dotenv import load_dotenv
-from sqlalchemy import create_engine, text
+from sqlalchemy import create_engine, text, bindparam
 from sqlalchemy.exc import SQLAlchemyError
 import datetime
-import re
+import route_index
+import local_db
+import pagination
+import query_cache
+from time_parsing import durations_to_minutes, minutes_between
 
 # Load environment variables
 load_dotenv()
 
+# DB_BACKEND=sqlite or duckdb runs on an embedded database file (DB_PATH) instead of MySQL, see local_db.py
+db_backend = os.getenv('DB_BACKEND', 'mysql')
+db_path = os.getenv('DB_PATH', 'flights.db')
+
 # Define the connection parameters
 db_username = os.getenv('DB_USERNAME')
 db_password = os.getenv('DB_PASSWORD')
@@ -20,12 +29,36 @@ db_name = os.getenv('DB_NAME')
 # Create a connection string
 connection_string = f"mysql+pymysql://{db_username}:{db_password}@{db_host}:{db_port}/{db_name}"
 
-# Create an engine to connect to the MySQL database
-engine = create_engine(connection_string)
+# Create an engine to connect to the MySQL database (or the embedded one)
+if db_backend in local_db.LOCAL_BACKENDS:
+    engine = local_db.create_local_engine(db_backend, db_path)
+elif db_backend == 'mysql':
+    engine = create_engine(connection_string)
+else:
+    raise ValueError(f"DB_BACKEND must be one of {', '.join(local_db.BACKENDS)}")
+
+# Seconds query results are cached for with QUERY_CACHE=1 (see query_cache.py): route reference data changes
+# rarely, seats and fares often; preferences are also dropped whenever that user's preferences are written
+ROUTES_CACHE_TTL = 3600
+FLIGHT_DETAILS_CACHE_TTL = 60
+PREFERENCES_CACHE_TTL = 600
+PRICE_TRENDS_CACHE_TTL = 300
 
 # ------------------- Query functions -----------------------
 # -----------------------------------------------------------
 
+def get_route_reference_data():
+    # Reference tables backing the in-memory route index (see route_index.py)
+    queries = [
+        "SELECT airportID, airportName, cityID, iata, latitude, longitude FROM Airports",
+        "SELECT cityID, cityName, country FROM Cities",
+        "SELECT airlineID, airlineName, iata FROM Airline",
+        "SELECT airlineID, sourceAirportID, destinationAirportID FROM AirlineRoutes",
+    ]
+
+    with engine.connect() as connection:
+        return [pd.read_sql(sql, connection) for sql in queries]
+
 def get_flight_delay_data():
     sql = """
         SELECT FlightDate, DepTime, ArrTime, DepDelayMinutes, ArrDelayMinutes, IATA_Code_Operating_Airline, Origin, Dest
@@ -42,6 +75,26 @@ def get_flight_delay_data():
         
         return pd.DataFrame()
 
+def iter_flight_delay_data(chunksize=100000, since=None):
+    """
+    Stream the delay data in DataFrame chunks through a server-side cursor, so the
+    whole Delays table never has to fit in memory. With since, only flights after that
+    FlightDate are read (a range scan on the primary key).
+    """
+    sql = """
+        SELECT FlightDate, DepTime, ArrTime, DepDelayMinutes, ArrDelayMinutes, IATA_Code_Operating_Airline, Origin, Dest
+        FROM Delays
+        WHERE DepDelayMinutes IS NOT NULL AND ArrDelayMinutes IS NOT NULL
+    """
+    params = {}
+    if since is not None:
+        sql += " AND FlightDate > :since"
+        params['since'] = since
+
+    with engine.connect().execution_options(stream_results=True, max_row_buffer=chunksize) as connection:
+        for chunk in pd.read_sql(text(sql), connection, params=params, chunksize=chunksize):
+            yield chunk
+
 def get_predict_flight(legID):
     from data_preparation import preprocess_data_predict
 
@@ -52,13 +105,25 @@ def get_predict_flight(legID):
     try:
         with engine.connect() as connection:
             result = pd.read_sql(sql_query, connection, params={'legID': legID})
-            print(result)
-            print(type(result['segmentsDepartureTimeRaw'][0]))
 
-            processed_data = preprocess_data_predict(result)
-            print(processed_data)
+            return preprocess_data_predict(result)
+    except Exception as e:
+        print(f"Error fetching prediction data: {str(e)}")
+        return None
+
+
+def get_predict_flights(leg_ids):
+    from data_preparation import preprocess_data_predict
+
+    # Same as get_predict_flight, but for many legs in a single round trip; legID is kept to match results
+    sql_query = text("""SELECT legID, flightDate, segmentsDepartureTimeRaw, segmentsArrivalTimeRaw, segmentsAirlineCode, startingAirport, destinationAirport
+                     FROM Legs WHERE legID IN :legIDs""").bindparams(bindparam('legIDs', expanding=True))
+
+    try:
+        with engine.connect() as connection:
+            result = pd.read_sql(sql_query, connection, params={'legIDs': list(leg_ids)})
 
-            return processed_data
+            return preprocess_data_predict(result)
     except Exception as e:
         print(f"Error fetching prediction data: {str(e)}")
         return None
@@ -72,8 +137,7 @@ def get_flight_data_for_clustering(features, selected_view):
             df = pd.read_sql(sql, connection)
 
             if 'travelDuration' in features:
-                df['travelDuration'] = df['travelDuration'].apply(
-                    iso8601_duration_to_minutes)
+                df['travelDuration'] = durations_to_minutes(df['travelDuration']).fillna(0)
                 
             # Automatically handle one-hot encoding if 'segmentsCabinCode' is included
             if 'segmentsCabinCode' in features:
@@ -85,6 +149,20 @@ def get_flight_data_for_clustering(features, selected_view):
 
         return pd.DataFrame()
 
+def iter_flight_data_for_clustering(features, selected_view, chunksize=50000):
+    """
+    Stream the clustering features of a view in DataFrame chunks through a server-side cursor.
+    Categorical columns are left as they are, so callers can encode every chunk the same way.
+    """
+    sql = f"SELECT {', '.join(features)} FROM {selected_view}"
+
+    with engine.connect().execution_options(stream_results=True, max_row_buffer=chunksize) as connection:
+        for chunk in pd.read_sql(text(sql), connection, chunksize=chunksize):
+            if 'travelDuration' in features:
+                chunk['travelDuration'] = durations_to_minutes(chunk['travelDuration']).fillna(0)
+
+            yield chunk
+
 def get_data_for_correlation(features):
     sql = f"SELECT {', '.join(features)} FROM vNonStopFlights"
 
@@ -93,15 +171,53 @@ def get_data_for_correlation(features):
             result = pd.read_sql(sql, connection)
 
             if 'travelDuration' in features:
-                result['travelDuration'] = result['travelDuration'].apply(
-                    iso8601_duration_to_minutes)
+                result['travelDuration'] = durations_to_minutes(result['travelDuration']).fillna(0)
 
             return result
     except Exception as e:
         print(f"Error fetching data for correlation: {str(e)}")
         return pd.DataFrame()
 
-    
+
+def get_correlation_sums(columns):
+    """
+    Sufficient statistics for correlations between columns of vNonStopFlights, aggregated in the
+    database: the row count, per-column sums and the matrix of cross-product sums.
+    Columns must come from a whitelist, they are placed in the SQL as they are.
+    """
+    pairs = [(i, j) for i in range(len(columns)) for j in range(i, len(columns))]
+    selects = (['COUNT(*) AS n']
+               + [f"SUM({column}) AS s{i}" for i, column in enumerate(columns)]
+               + [f"SUM({columns[i]} * {columns[j]}) AS p{i}_{j}" for i, j in pairs])
+    where = ' AND '.join(f"{column} IS NOT NULL" for column in columns)
+    sql = f"SELECT {', '.join(selects)} FROM vNonStopFlights WHERE {where}"
+
+    try:
+        with engine.connect() as connection:
+            row = connection.execute(text(sql)).mappings().one()
+    except Exception as e:
+        print(f"Error fetching correlation sums: {str(e)}")
+        return None
+
+    sums = np.array([float(row[f"s{i}"] or 0) for i in range(len(columns))])
+    products = np.zeros((len(columns), len(columns)))
+    for i, j in pairs:
+        products[i, j] = products[j, i] = float(row[f"p{i}_{j}"] or 0)
+
+    return int(row['n']), sums, products
+
+def get_correlation_sample(columns, fraction, limit):
+    # Bernoulli sample of roughly fraction of the rows, capped at limit; columns as in get_correlation_sums
+    where = ' AND '.join(f"{column} IS NOT NULL" for column in columns)
+    sql = text(f"SELECT {', '.join(columns)} FROM vNonStopFlights WHERE RAND() < :fraction AND {where} LIMIT :limit")
+
+    try:
+        with engine.connect() as connection:
+            return pd.read_sql(sql, connection, params={'fraction': fraction, 'limit': limit})
+    except Exception as e:
+        print(f"Error fetching correlation sample: {str(e)}")
+        return pd.DataFrame()
+
 def get_data_for_apriori():
     # This would ideally fetch transactional data; adjust the SQL as necessary
     sql = "SELECT transaction_id, item FROM TransactionTable"
@@ -113,6 +229,29 @@ def get_data_for_apriori():
         print(f"Error fetching data for Apriori: {str(e)}")
         return pd.DataFrame()
 
+def iter_data_for_apriori(chunksize=100000):
+    # Same rows as get_data_for_apriori, streamed in DataFrame chunks through a server-side cursor
+    sql = "SELECT transaction_id, item FROM TransactionTable"
+
+    with engine.connect().execution_options(stream_results=True, max_row_buffer=chunksize) as connection:
+        for chunk in pd.read_sql(text(sql), connection, chunksize=chunksize):
+            yield chunk
+
+def get_apriori_data_version():
+    """
+    (row count, max transaction_id) of TransactionTable; changes whenever transactions are added or removed,
+    so it tells when frequent itemsets mined from the table are stale. None on error.
+    """
+    try:
+        with engine.connect() as connection:
+            row = connection.execute(text("SELECT COUNT(*), MAX(transaction_id) FROM TransactionTable")).fetchone()
+    except Exception as e:
+        print(f"Error fetching TransactionTable version: {str(e)}")
+        return None
+
+    return int(row[0]), row[1]
+
+@query_cache.invalidates('preferences')  # an ID looked up before it existed may be cached as empty
 def create_user(user_data):
     sql = text("""
         INSERT INTO Users (
@@ -124,10 +263,15 @@ def create_user(user_data):
         )
     """)
 
+    # DuckDB has no lastrowid, the new ID is returned by the INSERT itself
+    returning = engine.dialect.name == 'duckdb'
+    if returning:
+        sql = text(sql.text + " RETURNING userID")
+
     try:
         with engine.begin() as connection:
             result = connection.execute(sql, user_data)
-            user_id = result.lastrowid
+            user_id = result.scalar() if returning else result.lastrowid
             return user_id
         return True
     except SQLAlchemyError as e:
@@ -147,6 +291,7 @@ def clean_preferences_data(data):
     
     return data
 
+@query_cache.invalidates('preferences:{prefs_data[userID]}')
 def add_preferences_to_db(prefs_data):
     prefs_data = clean_preferences_data(prefs_data)
 
@@ -185,6 +330,11 @@ def add_preferences_to_db(prefs_data):
         return False
 
 
+# TIME columns of Preferences, returned as seconds since midnight
+PREFERENCE_TIME_COLUMNS = ('preferredLayoverTime', 'preferredDepartureTime', 'preferredArrivalTime')
+
+
+@query_cache.cached(PREFERENCES_CACHE_TTL, tags=('preferences:{user_id}',))
 def get_user_preferences(user_id):
     sql = text("""
         SELECT *
@@ -204,6 +354,9 @@ def get_user_preferences(user_id):
                     if isinstance(row[idx], datetime.timedelta):
                         # Convert timedelta to a total number of seconds
                         preference[column] = row[idx].total_seconds()
+                    elif column in PREFERENCE_TIME_COLUMNS and row[idx] is not None:
+                        # Embedded databases return TIME as a time (DuckDB) or HH:MM:SS text (SQLite)
+                        preference[column] = pd.to_timedelta(str(row[idx])).total_seconds()
                     else:
                         preference[column] = row[idx]
                 preferences.append(preference)
@@ -213,10 +366,14 @@ def get_user_preferences(user_id):
         return None
 
 
+@query_cache.cached(ROUTES_CACHE_TTL, tags=('routes',))
 def query_routes(source_iata, destination_iata):
     """
     Query available routes from source to destination using IATA codes.
     """
+    if route_index.is_enabled():
+        return route_index.get_route_index().query_routes(source_iata, destination_iata)
+
     query = f"""
         SELECT a1.iata AS sourceIATA, a2.iata AS destinationIATA, al.airlineName
         FROM AirlineRoutes hr
@@ -230,27 +387,62 @@ def query_routes(source_iata, destination_iata):
     return result
 
 
-def query_airline_routes(airline_name):
+# Keyset order of /airline pages; pages hold distinct routes, which this key is unique over
+AIRLINE_ROUTES_PAGE_KEY = ('sourceIATA', 'destinationIATA')
+
+
+@query_cache.cached(ROUTES_CACHE_TTL, tags=('routes',))
+def query_airline_routes(airline_name, after=None, limit=None):
     """
-    Query available routes for a specific airline.
+    Query available routes for a specific airline; with a limit, at most limit routes in
+    AIRLINE_ROUTES_PAGE_KEY order, starting after the key values in after.
     """
+    if route_index.is_enabled():
+        routes = route_index.get_route_index().query_airline_routes(airline_name)
+        if limit is None:
+            return routes
+
+        return pagination.page_frame(routes, AIRLINE_ROUTES_PAGE_KEY, after, limit).reset_index(drop=True)
+
+    if limit is None:
+        query = """
+            SELECT al.airlineName, a1.iata AS sourceIATA, a2.iata AS destinationIATA
+            FROM AirlineRoutes hr
+            JOIN Airports a1 ON hr.sourceAirportID = a1.airportID
+            JOIN Airports a2 ON hr.destinationAirportID = a2.airportID
+            JOIN Airline al ON hr.airlineID = al.airlineID
+            WHERE al.airlineName = :airline_name;
+        """
+
+        return pd.read_sql(text(query), engine, params={'airline_name': airline_name})
+
+    params = {'airline_name': airline_name, 'limit': limit}
+    keyset = ''
+    if after is not None:
+        keyset = f"AND {pagination.keyset_condition(['a1.iata', 'a2.iata'])}"
+        params.update(pagination.keyset_params(after))
     query = f"""
-        SELECT al.airlineName, a1.iata AS sourceIATA, a2.iata AS destinationIATA
+        SELECT DISTINCT al.airlineName, a1.iata AS sourceIATA, a2.iata AS destinationIATA
         FROM AirlineRoutes hr
         JOIN Airports a1 ON hr.sourceAirportID = a1.airportID
         JOIN Airports a2 ON hr.destinationAirportID = a2.airportID
         JOIN Airline al ON hr.airlineID = al.airlineID
-        WHERE al.airlineName = '{airline_name}';
+        WHERE al.airlineName = :airline_name {keyset}
+        ORDER BY a1.iata, a2.iata
+        LIMIT :limit;
     """
-    result = pd.read_sql(query, engine)
 
-    return result
+    return pd.read_sql(text(query), engine, params=params)
 
 
+@query_cache.cached(ROUTES_CACHE_TTL, tags=('routes',))
 def query_routes_by_countries(source_country, destination_country):
     """
     Query available routes between source and destination countries.
     """
+    if route_index.is_enabled():
+        return route_index.get_route_index().query_routes_by_countries(source_country, destination_country)
+
     query = f"""
         SELECT c1.country AS sourceCountry, c2.country AS destinationCountry, a1.iata AS sourceIATA, a2.iata AS destinationIATA, al.airlineName
         FROM AirlineRoutes hr
@@ -266,10 +458,50 @@ def query_routes_by_countries(source_country, destination_country):
     return result
 
 
-def query_by_country(country_name):
+# Keyset order of /country pages, which hold distinct routes like /airline pages
+COUNTRY_ROUTES_PAGE_KEY = ('sourceIATA', 'destinationIATA')
+
+
+@query_cache.cached(ROUTES_CACHE_TTL, tags=('routes',))
+def query_by_country(country_name, after=None, limit=None):
     """
-    Query all airports within a specific country and the routes they offer.
+    Query all airports within a specific country and the routes they offer; with a limit, at most limit
+    routes in COUNTRY_ROUTES_PAGE_KEY order, starting after the key values in after.
     """
+    if route_index.is_enabled():
+        routes = route_index.get_route_index().query_by_country(country_name)
+        if limit is None:
+            return routes
+
+        return pagination.page_frame(routes, COUNTRY_ROUTES_PAGE_KEY, after, limit).reset_index(drop=True)
+
+    if limit is not None:
+        params = {'country_name': country_name, 'limit': limit}
+        keyset = ''
+        if after is not None:
+            keyset = f"AND {pagination.keyset_condition(['a1.iata', 'a2.iata'])}"
+            params.update(pagination.keyset_params(after))
+        query = f"""
+            SELECT DISTINCT
+                a1.airportID AS sourceAirportID,
+                a1.iata AS sourceIATA,
+                a1.airportName AS sourceAirportName,
+                c1.cityName AS sourceCityName,
+                a2.iata AS destinationIATA,
+                a2.airportName AS destinationAirportName,
+                c2.cityName AS destinationCityName
+            FROM Airports a1
+            JOIN Cities c1 ON a1.cityID = c1.cityID
+            JOIN AirlineRoutes hr ON a1.airportID = hr.sourceAirportID
+            JOIN Airports a2 ON hr.destinationAirportID = a2.airportID
+            JOIN Cities c2 ON a2.cityID = c2.cityID
+            WHERE c1.country = :country_name {keyset}
+            ORDER BY a1.iata, a2.iata
+            LIMIT :limit;
+        """
+
+        return pd.read_sql(text(query), engine, params=params)
+
     query = f"""
         SELECT 
             a1.airportID AS sourceAirportID, 
@@ -291,118 +523,158 @@ def query_by_country(country_name):
     return result
 
 
-def query_flight_details(source_iata, destination_iata, airline_name, is_non_stop, preferences):
+# Order of /flight_details results; legID makes it unique, so it doubles as the keyset of pages
+FLIGHT_DETAILS_PAGE_KEY = ('flightDate', 'segmentsDepartureTimeRaw', 'legID')
+
+# Legs columns /flight_details returns, all of them unless the client asks for fewer (?fields=)
+FLIGHT_DETAILS_COLUMNS = (
+    'legID', 'startingAirport', 'destinationAirport', 'flightDate',
+    'travelDuration', 'elapsedDays', 'isBasicEconomy', 'isRefundable',
+    'isNonStop', 'baseFare', 'totalFare', 'seatsRemaining',
+    'segmentsDepartureTimeRaw', 'segmentsArrivalTimeRaw',
+    'segmentsArrivalAirportCode', 'segmentsDepartureAirportCode',
+    'segmentsAirlineCode', 'segmentsEquipmentDescription',
+    'segmentsDurationInSeconds', 'segmentsCabinCode'
+)
+
+
+def flight_details_statement(connection, source_iata, destination_iata, airline_name, is_non_stop, preferences,
+                             after=None, limit=None, fields=None):
+    """
+    SQL, parameters and column names of a query_flight_details query; None for an unknown airline.
+    """
+    # Get airline IATA code from the airline name
+    airline_iata = connection.execute(
+        text("SELECT iata FROM Airline WHERE airlineName = :airline_name"),
+        {'airline_name': airline_name}
+    ).scalar()
+
+    if not airline_iata:
+        return None  # No airline found with the given name
+
+    # Only the requested columns are read and sent, in FLIGHT_DETAILS_COLUMNS order
+    column_names = [column for column in FLIGHT_DETAILS_COLUMNS
+                    if fields is None or column in fields or column in FLIGHT_DETAILS_PAGE_KEY]
+
+    # Base SQL query
+    sql_query = f"""
+        SELECT {', '.join(column_names)}
+        FROM Legs
+        WHERE startingAirport = :source_iata
+          AND destinationAirport = :destination_iata
+          AND segmentsAirlineCode = :airline_iata
+          AND isNonStop = :is_non_stop
+    """
+
+    # Dynamic parameters for the SQL query
+    params = {
+        "source_iata": source_iata,
+        "destination_iata": destination_iata,
+        "airline_iata": airline_iata,
+        "is_non_stop": is_non_stop,
+    }
+
+    # Add preference-based filters dynamically
+    if 'preferredFlyingClass' in preferences and preferences['preferredFlyingClass']:
+        sql_query += " AND segmentsCabinCode = :flying_class"
+        params['flying_class'] = preferences['preferredFlyingClass']
+
+    # Length of the flight
+    if 'preferredDuration' in preferences and preferences['preferredDuration']:
+        sql_query += " AND segmentsDurationInSeconds <= :duration"
+        params['duration'] = preferences['preferredDuration'] * 60
+
+    # Times are compared as minutes since midnight against the materialized depMinute/arrMinute
+    # columns, which keeps the predicates sargable on idx_legs_route_dep
+    if 'preferredArrivalTime' in preferences and preferences['preferredArrivalTime']:
+        sql_query += " AND arrMinute <= :arrival_minute"
+        # Preference times are expressed in seconds since midnight
+        params['arrival_minute'] = int(preferences['preferredArrivalTime'] // 60)
+
+    if 'preferredDepartureTime' in preferences and preferences['preferredDepartureTime']:
+        # Preferred departure time +/- 1 hour
+        departure_minute = int(preferences['preferredDepartureTime'] // 60)
+        sql_query += " AND depMinute BETWEEN :departure_from AND :departure_to"
+        params['departure_from'] = departure_minute - 60
+        params['departure_to'] = departure_minute + 60
+
+    if 'preferredLayoverTime' in preferences and preferences['preferredLayoverTime']:
+        # Convert seconds to minutes for easier comparison and readability in SQL
+        minutes = preferences['preferredLayoverTime'] // 60
+
+        # SQL condition to match the layover time
+        sql_query += """
+        AND layoverDurationMinutes = :layover_minutes
+        """
+        params['layover_minutes'] = minutes
+
+    # Keyset pages continue after the last flight of the previous page
+    if after is not None:
+        sql_query += f" AND {pagination.keyset_condition(FLIGHT_DETAILS_PAGE_KEY)}"
+        params.update(pagination.keyset_params(after))
+
+    # Order the results
+    sql_query += f" ORDER BY {', '.join(FLIGHT_DETAILS_PAGE_KEY)}"
+    if limit is not None:
+        sql_query += " LIMIT :limit"
+        params['limit'] = limit
+
+    return sql_query, params, column_names
+
+
+@query_cache.cached(FLIGHT_DETAILS_CACHE_TTL, tags=('legs',))
+def query_flight_details(source_iata, destination_iata, airline_name, is_non_stop, preferences, after=None,
+                         limit=None, fields=None):
     """
     Query flight details including times and prices for a given route and airline,
-    potentially incorporating user preferences.
+    potentially incorporating user preferences. With a limit, returns at most limit flights
+    following the FLIGHT_DETAILS_PAGE_KEY values in after. fields selects a subset of
+    FLIGHT_DETAILS_COLUMNS; the page key columns are always included. Returns None on a database error.
     """
     from sqlalchemy.sql import text
 
     try:
         with engine.connect() as connection:
-            # Get airline IATA code from the airline name
-            airline_iata = connection.execute(
-                text("SELECT iata FROM Airline WHERE airlineName = :airline_name"),
-                {'airline_name': airline_name}
-            ).scalar()
-
-            if not airline_iata:
+            statement = flight_details_statement(connection, source_iata, destination_iata, airline_name,
+                                                 is_non_stop, preferences, after, limit, fields)
+            if statement is None:
                 return []  # No airline found with the given name
-
-            # Base SQL query
-            sql_query = """
-                SELECT
-                    legID, startingAirport, destinationAirport, flightDate,
-                    travelDuration, elapsedDays, isBasicEconomy, isRefundable,
-                    isNonStop, baseFare, totalFare, seatsRemaining,
-                    segmentsDepartureTimeRaw, segmentsArrivalTimeRaw,
-                    segmentsArrivalAirportCode, segmentsDepartureAirportCode,
-                    segmentsAirlineCode, segmentsEquipmentDescription,
-                    segmentsDurationInSeconds, segmentsCabinCode
-                FROM Legs
-                WHERE startingAirport = :source_iata
-                  AND destinationAirport = :destination_iata
-                  AND segmentsAirlineCode = :airline_iata
-                  AND isNonStop = :is_non_stop
-            """
-
-            # Dynamic parameters for the SQL query
-            params = {
-                "source_iata": source_iata,
-                "destination_iata": destination_iata,
-                "airline_iata": airline_iata,
-                "is_non_stop": is_non_stop,
-            }
-
-            # Add preference-based filters dynamically
-            if 'preferredFlyingClass' in preferences and preferences['preferredFlyingClass']:
-                sql_query += " AND segmentsCabinCode = :flying_class"
-                params['flying_class'] = preferences['preferredFlyingClass']
-
-            # Length of the flight
-            if 'preferredDuration' in preferences and preferences['preferredDuration']:
-                sql_query += " AND segmentsDurationInSeconds <= :duration"
-                params['duration'] = preferences['preferredDuration'] * 60
-
-            if 'preferredArrivalTime' in preferences and preferences['preferredArrivalTime']:
-                sql_query += """
-                AND TIME(STR_TO_DATE(segmentsArrivalTimeRaw, '%Y-%m-%dT%H:%i:%s')) <= TIME(:arrival_time)
-                """
-                # Convert float time (expressed in seconds since midnight) to HH:MM:SS format for SQL
-                hours = int(preferences['preferredArrivalTime'] // 3600)
-                minutes = int((preferences['preferredArrivalTime'] % 3600) // 60)
-                formatted_time = f"{hours:02}:{minutes:02}:00"  # Format to HH:MM:SS
-                params['arrival_time'] = formatted_time
-
-            if 'preferredDepartureTime' in preferences and preferences['preferredDepartureTime']:
-                # Convert float time (expressed in seconds since midnight) to HH:MM:SS format for SQL
-                hours = int(preferences['preferredDepartureTime'] // 3600)
-                minutes = int((preferences['preferredDepartureTime'] % 3600) // 60)
-                formatted_time = f"{hours:02}:{minutes:02}:00"  # Format to HH:MM:SS
-
-                # SQL condition to check the preferred departure time +/- 1 hour
-                sql_query += """
-                AND TIME(STR_TO_DATE(segmentsDepartureTimeRaw, '%Y-%m-%dT%H:%i:%s')) 
-                BETWEEN TIME(:departure_time) - INTERVAL 1 HOUR AND TIME(:departure_time) + INTERVAL 1 HOUR
-                """
-                params['departure_time'] = formatted_time
-
-            if 'preferredLayoverTime' in preferences and preferences['preferredLayoverTime']:
-                # Convert seconds to minutes for easier comparison and readability in SQL
-                minutes = preferences['preferredLayoverTime'] // 60
-
-                # SQL condition to match the layover time
-                sql_query += """
-                AND layoverDurationMinutes = :layover_minutes
-                """
-                params['layover_minutes'] = minutes
-
-            # Order the results
-            sql_query += " ORDER BY flightDate, segmentsDepartureTimeRaw;"
-
-            print(sql_query)
+            sql_query, params, column_names = statement
 
             # Execute the dynamic query
             legs_result = connection.execute(text(sql_query), params).fetchall()
 
             # Prepare data for return
-            column_names = [
-                'legID', 'startingAirport', 'destinationAirport', 'flightDate',
-                'travelDuration', 'elapsedDays', 'isBasicEconomy', 'isRefundable',
-                'isNonStop', 'baseFare', 'totalFare', 'seatsRemaining',
-                'segmentsDepartureTimeRaw', 'segmentsArrivalTimeRaw',
-                'segmentsArrivalAirportCode', 'segmentsDepartureAirportCode',
-                'segmentsAirlineCode', 'segmentsEquipmentDescription',
-                'segmentsDurationInSeconds', 'segmentsCabinCode'
-            ]
-
             return [dict(zip(column_names, row)) for row in legs_result]
 
     except SQLAlchemyError as e:
         print(f"An error occurred: {e}")
-        return []
+        return None
 
 
+def iter_flight_details(source_iata, destination_iata, airline_name, is_non_stop, preferences, fields=None,
+                        chunksize=5000):
+    """
+    Stream the flights of query_flight_details in lists of at most chunksize records through a
+    server-side cursor, for responses that are sent while the rows are still being read.
+    """
+    with engine.connect().execution_options(stream_results=True, max_row_buffer=chunksize) as connection:
+        statement = flight_details_statement(connection, source_iata, destination_iata, airline_name,
+                                             is_non_stop, preferences, fields=fields)
+        if statement is None:
+            return
+        sql_query, params, column_names = statement
+
+        result = connection.execute(text(sql_query), params)
+        while True:
+            rows = result.fetchmany(chunksize)
+            if not rows:
+                break
+            yield [dict(zip(column_names, row)) for row in rows]
+
+
+# No cached query reads Itineraries yet; the tag keeps one added later from outliving a booking
+@query_cache.invalidates('itineraries:{itinerary_data[userID]}')
 def add_itinerary_to_db(itinerary_data):
     # Fetch flight details based on legID
     flight_query = text("""
@@ -478,9 +750,13 @@ def add_itinerary_to_db(itinerary_data):
         print(f"An error occurred: {e}")
         return False
 
+@query_cache.cached(PRICE_TRENDS_CACHE_TTL, tags=('legs',))
 def get_analyze_price_trends(start_date, end_date):
-    # SQL to call the stored procedure
-    sql = text("CALL AnalyzePriceTrends(:start, :end)")
+    # SQL to call the stored procedure; embedded databases have no procedures and run its query instead
+    if engine.dialect.name == 'mysql':
+        sql = text("CALL AnalyzePriceTrends(:start, :end)")
+    else:
+        sql = text(local_db.PRICE_TRENDS_SQL)
     
     with engine.connect() as conn:
         # Execute the stored procedure passing the parameters as a dictionary
@@ -496,31 +772,147 @@ def get_analyze_price_trends(start_date, end_date):
         
         return trends
 
+# Breakdowns get_fare_rollup can add to the price trends, and the FareWeeklyRollup columns they group by
+FARE_ROLLUP_GROUPS = {
+    'route': ['startingAirport', 'destinationAirport'],
+    'airline': ['airlineCode'],
+}
+
+def whole_weeks(start_date, end_date):
+    """
+    First and last Sunday of the whole Sunday-Saturday weeks inside [start_date, end_date],
+    or None when the range doesn't cover a whole week.
+    """
+    first = start_date + datetime.timedelta(days=(6 - start_date.weekday()) % 7)
+    last = end_date - datetime.timedelta(days=(end_date.weekday() - 5) % 7 + 6)
+    if last < first:
+        return None
+
+    return first, last
+
+def week_range_params(start, end):
+    # Query parameters splitting [start, end] into whole weeks (week_first..week_last, read from a weekly table)
+    # and the days before and after them (head, tail, read from Legs); empty ranges have start > end
+    weeks = whole_weeks(start, end)
+    if weeks is None:
+        day = datetime.timedelta(days=1)
+        return {'week_first': end + day, 'week_last': end, 'head_start': start, 'head_end': end,
+                'tail_start': end + day, 'tail_end': end}
+
+    first, last = weeks
+    return {'week_first': first, 'week_last': last,
+            'head_start': start, 'head_end': first - datetime.timedelta(days=1),
+            'tail_start': last + datetime.timedelta(days=7), 'tail_end': end}
+
+@query_cache.cached(PRICE_TRENDS_CACHE_TTL, tags=('legs',))
+def get_fare_rollup(start_date, end_date, group_by=(), non_stop=True):
+    """
+    Weekly fare statistics per cabin class (plus any FARE_ROLLUP_GROUPS breakdowns) for flights
+    between start_date and end_date. Whole weeks are summed from FareWeeklyRollup (see fare_rollup.sql);
+    only the partial weeks at either end of the range are aggregated from Legs.
+    """
+    start = datetime.date.fromisoformat(str(start_date))
+    end = datetime.date.fromisoformat(str(end_date))
+    unknown = [group for group in group_by if group not in FARE_ROLLUP_GROUPS]
+    if unknown:
+        raise ValueError(f"group_by must be one of {', '.join(FARE_ROLLUP_GROUPS)}")
+
+    params = week_range_params(start, end)
+    params['non_stop'] = int(non_stop)
+
+    group_columns = [col for group in group_by for col in FARE_ROLLUP_GROUPS[group]]
+    legs_columns = {'startingAirport': 'startingAirport', 'destinationAirport': 'destinationAirport',
+                    'airlineCode': 'segmentsAirlineCode'}
+    groups = ''.join(f", {col}" for col in group_columns)
+    legs_select = ''.join(f", {legs_columns[col]} AS {col}" for col in group_columns)
+    legs_groups = ''.join(f", {legs_columns[col]}" for col in group_columns)
+
+    sql = text(f"""
+        SELECT yearWeek, cabinClass{groups}, SUM(fareCount) AS flights,
+               SUM(baseFareSum) / SUM(fareCount) AS avgBaseFare, SUM(totalFareSum) / SUM(fareCount) AS avgTotalFare,
+               MIN(baseFareMin) AS minBaseFare, MAX(baseFareMax) AS maxBaseFare,
+               MIN(totalFareMin) AS minTotalFare, MAX(totalFareMax) AS maxTotalFare
+        FROM (
+            SELECT yearWeek, cabinClass{groups}, fareCount, baseFareSum, baseFareMin, baseFareMax,
+                   totalFareSum, totalFareMin, totalFareMax
+            FROM FareWeeklyRollup
+            WHERE weekStart BETWEEN :week_first AND :week_last AND isNonStop = :non_stop
+            UNION ALL
+            SELECT YEARWEEK(flightDate) AS yearWeek, segmentsCabinCode AS cabinClass{legs_select}, COUNT(*),
+                   SUM(baseFare), MIN(baseFare), MAX(baseFare), SUM(totalFare), MIN(totalFare), MAX(totalFare)
+            FROM Legs
+            WHERE ((flightDate BETWEEN :head_start AND :head_end) OR (flightDate BETWEEN :tail_start AND :tail_end))
+              AND isNonStop = :non_stop AND startingAirport IS NOT NULL AND destinationAirport IS NOT NULL
+            GROUP BY YEARWEEK(flightDate), segmentsCabinCode{legs_groups}
+        ) buckets
+        GROUP BY yearWeek, cabinClass{groups}
+        ORDER BY cabinClass{groups}, yearWeek
+    """)
+
+    with engine.connect() as conn:
+        rows = conn.execute(sql, params).mappings().fetchall()
+
+    trends = []
+    for row in rows:
+        # Same keys as get_analyze_price_trends, plus counts, min/max and the breakdown columns
+        trend = {'month': int(row['yearWeek']), 'cabinClass': row['cabinClass'],
+                 'avgBaseFare': row['avgBaseFare'], 'avgTotalFare': row['avgTotalFare'], 'flights': int(row['flights']),
+                 'minBaseFare': row['minBaseFare'], 'maxBaseFare': row['maxBaseFare'],
+                 'minTotalFare': row['minTotalFare'], 'maxTotalFare': row['maxTotalFare']}
+        for col in group_columns:
+            trend['airline' if col == 'airlineCode' else col] = row[col]
+        trends.append(trend)
+
+    return trends
+
+def get_fare_sketch_data(origin, destination, start_date, end_date, cabin=None):
+    """
+    What a fare sketch of a route between start_date and end_date is built from: bucket counts of the
+    whole weeks from FareSketchBuckets (see fare_sketch.sql), and the fares of the days around them from Legs.
+    Returns ({bucket: count}, array of fares).
+    """
+    params = week_range_params(datetime.date.fromisoformat(str(start_date)), datetime.date.fromisoformat(str(end_date)))
+    params.update({'origin': origin, 'destination': destination, 'cabin': cabin})
+    cabin_filter = "" if cabin is None else " AND cabinClass = :cabin"
+    legs_cabin_filter = "" if cabin is None else " AND segmentsCabinCode = :cabin"
+
+    buckets_sql = text(f"""
+        SELECT bucket, SUM(fareCount) AS fareCount
+        FROM FareSketchBuckets
+        WHERE startingAirport = :origin AND destinationAirport = :destination
+          AND weekStart BETWEEN :week_first AND :week_last{cabin_filter}
+        GROUP BY bucket
+    """)
+    fares_sql = text(f"""
+        SELECT totalFare
+        FROM Legs
+        WHERE startingAirport = :origin AND destinationAirport = :destination
+          AND ((flightDate BETWEEN :head_start AND :head_end) OR (flightDate BETWEEN :tail_start AND :tail_end))
+          {legs_cabin_filter}
+    """)
+
+    with engine.connect() as conn:
+        counts = {int(row[0]): int(row[1]) for row in conn.execute(buckets_sql, params).fetchall()}
+        fares = np.array([row[0] for row in conn.execute(fares_sql, params).fetchall()], dtype=float)
+
+    return counts, fares
+
 
 def convert_row_to_dict(row, column_names):
     return dict(zip(column_names, row))
 
 def iso8601_duration_to_minutes(duration_str):
-    # Regex to extract hours and minutes from the ISO 8601 duration format
-    pattern = re.compile(r'PT(?:(\d+)H)?(?:(\d+)M)?')
-    parts = pattern.match(duration_str)
-    
-    if not parts:
+    # Scalar wrapper; columns should go through time_parsing.durations_to_minutes directly
+    total_minutes = durations_to_minutes([duration_str])[0]
+
+    if total_minutes != total_minutes:  # NaN
         print(f"No match for {duration_str}")
         return 0
-    
-    parts = parts.groups()
-    hours = int(parts[0]) if parts[0] else 0
-    minutes = int(parts[1]) if parts[1] else 0
-    
-    total_minutes = hours * 60 + minutes
-    
-    return total_minutes
+
+    return int(total_minutes)
 
 def calculate_layover_time(previous_arrival, current_departure):
-    from datetime import datetime
-    fmt = '%Y-%m-%dT%H:%M:%S.%f%z'  # Adjust this format to match your timestamp format
-    previous_arrival_dt = datetime.strptime(previous_arrival, fmt)
-    current_departure_dt = datetime.strptime(current_departure, fmt)
+    # From the last segment of the previous leg to the first segment of the next one
+    layover = minutes_between([previous_arrival], [current_departure])[0]
 
-    return int((current_departure_dt - previous_arrival_dt).total_seconds() / 60)  # Layover time in minutes
\ No newline at end of file
+    return int(layover)  # Layover time in minutes
@@ -201,11 +201,11 @@ class TestDatabaseFunctions(unittest.TestCase):
 
         pd.testing.assert_frame_equal(result_df, expected_df)
 
-    @patch('sqlalchemy.create_engine')
+    @patch('db.engine')
     def test_query_flight_details(self, mock_engine):
         from db import query_flight_details
         
-        mock_conn = mock_engine.return_value.connect.return_value.__enter__.return_value
+        mock_conn = mock_engine.connect.return_value.__enter__.return_value
         mock_conn.execute.return_value.fetchall.return_value = []  
         
         result = query_flight_details("JFK", "LAX", "Delta", True, {})
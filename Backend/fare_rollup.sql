@@ -0,0 +1,143 @@
+-- Weekly fare rollup behind /analyze_price_trends: fare count, sum, min and max per
+-- (week, non-stop, route, cabin class, airline), kept current by triggers on Legs.
+-- Run after database.sql (or on an existing database); it builds the rollup from the Legs already loaded.
+-- Weeks start on Sunday, matching YEARWEEK(flightDate) in AnalyzePriceTrends.
+
+DROP TABLE IF EXISTS FareWeeklyRollup;
+
+CREATE TABLE FareWeeklyRollup (
+  weekStart DATE NOT NULL, -- Sunday the week starts on
+  yearWeek INT NOT NULL, -- YEARWEEK(flightDate), e.g. 202216
+  isNonStop tinyint(1) NOT NULL,
+  startingAirport VARCHAR(5) NOT NULL,
+  destinationAirport VARCHAR(5) NOT NULL,
+  cabinClass VARCHAR(128) NOT NULL, -- segmentsCabinCode
+  airlineCode VARCHAR(128) NOT NULL, -- segmentsAirlineCode
+  fareCount INT NOT NULL,
+  baseFareSum DOUBLE NOT NULL,
+  baseFareMin FLOAT NOT NULL,
+  baseFareMax FLOAT NOT NULL,
+  totalFareSum DOUBLE NOT NULL,
+  totalFareMin FLOAT NOT NULL,
+  totalFareMax FLOAT NOT NULL,
+
+  PRIMARY KEY (weekStart, isNonStop, startingAirport, destinationAirport, cabinClass, airlineCode)
+);
+
+-- Partial weeks at the edges of a requested date range are aggregated from Legs directly
+CREATE INDEX idx_legs_flight_date ON Legs(flightDate);
+
+DROP TRIGGER IF EXISTS fare_rollup_after_insert;
+DROP TRIGGER IF EXISTS fare_rollup_after_update;
+DROP TRIGGER IF EXISTS fare_rollup_after_delete;
+DROP PROCEDURE IF EXISTS AddFareToRollup;
+DROP PROCEDURE IF EXISTS RemoveFareFromRollup;
+DROP PROCEDURE IF EXISTS RebuildFareWeeklyRollup;
+
+DELIMITER $$
+
+CREATE PROCEDURE AddFareToRollup(IN legDate DATE, IN nonStop TINYINT, IN origin VARCHAR(5), IN destination VARCHAR(5),
+                                 IN cabin VARCHAR(128), IN airline VARCHAR(128), IN base FLOAT, IN total FLOAT)
+BEGIN
+  IF origin IS NOT NULL AND destination IS NOT NULL THEN
+    INSERT INTO FareWeeklyRollup
+    VALUES (legDate - INTERVAL (DAYOFWEEK(legDate) - 1) DAY, YEARWEEK(legDate), nonStop, origin, destination,
+            cabin, airline, 1, base, base, base, total, total, total)
+    ON DUPLICATE KEY UPDATE
+      fareCount = fareCount + 1,
+      baseFareSum = baseFareSum + base,
+      baseFareMin = LEAST(baseFareMin, base),
+      baseFareMax = GREATEST(baseFareMax, base),
+      totalFareSum = totalFareSum + total,
+      totalFareMin = LEAST(totalFareMin, total),
+      totalFareMax = GREATEST(totalFareMax, total);
+  END IF;
+END$$
+
+CREATE PROCEDURE RemoveFareFromRollup(IN legDate DATE, IN nonStop TINYINT, IN origin VARCHAR(5), IN destination VARCHAR(5),
+                                      IN cabin VARCHAR(128), IN airline VARCHAR(128), IN base FLOAT, IN total FLOAT)
+BEGIN
+  DECLARE bucketStart DATE DEFAULT legDate - INTERVAL (DAYOFWEEK(legDate) - 1) DAY;
+
+  UPDATE FareWeeklyRollup
+  SET fareCount = fareCount - 1,
+      baseFareSum = baseFareSum - base,
+      totalFareSum = totalFareSum - total
+  WHERE weekStart = bucketStart AND isNonStop = nonStop AND startingAirport = origin
+    AND destinationAirport = destination AND cabinClass = cabin AND airlineCode = airline;
+
+  DELETE FROM FareWeeklyRollup
+  WHERE weekStart = bucketStart AND isNonStop = nonStop AND startingAirport = origin
+    AND destinationAirport = destination AND cabinClass = cabin AND airlineCode = airline AND fareCount <= 0;
+
+  -- Min/max can't be decremented; recompute them from the bucket's remaining legs (an idx_legs_route_dep range)
+  UPDATE FareWeeklyRollup r
+  JOIN (
+    SELECT MIN(baseFare) AS baseMin, MAX(baseFare) AS baseMax, MIN(totalFare) AS totalMin, MAX(totalFare) AS totalMax
+    FROM Legs
+    WHERE startingAirport = origin AND destinationAirport = destination AND segmentsAirlineCode = airline
+      AND isNonStop = nonStop AND segmentsCabinCode = cabin
+      AND flightDate BETWEEN bucketStart AND bucketStart + INTERVAL 6 DAY
+  ) m
+  SET r.baseFareMin = m.baseMin, r.baseFareMax = m.baseMax, r.totalFareMin = m.totalMin, r.totalFareMax = m.totalMax
+  WHERE r.weekStart = bucketStart AND r.isNonStop = nonStop AND r.startingAirport = origin
+    AND r.destinationAirport = destination AND r.cabinClass = cabin AND r.airlineCode = airline
+    AND (base IN (r.baseFareMin, r.baseFareMax) OR total IN (r.totalFareMin, r.totalFareMax));
+END$$
+
+-- Repopulates the rollup from scratch, e.g. after a bulk load with the triggers dropped
+CREATE PROCEDURE RebuildFareWeeklyRollup()
+BEGIN
+  DELETE FROM FareWeeklyRollup WHERE weekStart IS NOT NULL; -- Keeps MySQL Workbench safe-update mode happy
+
+  INSERT INTO FareWeeklyRollup
+  SELECT
+    flightDate - INTERVAL (DAYOFWEEK(flightDate) - 1) DAY AS weekStart,
+    MIN(YEARWEEK(flightDate)),
+    isNonStop,
+    startingAirport,
+    destinationAirport,
+    segmentsCabinCode,
+    segmentsAirlineCode,
+    COUNT(*),
+    SUM(baseFare), MIN(baseFare), MAX(baseFare),
+    SUM(totalFare), MIN(totalFare), MAX(totalFare)
+  FROM Legs
+  WHERE startingAirport IS NOT NULL AND destinationAirport IS NOT NULL
+  GROUP BY weekStart, isNonStop, startingAirport, destinationAirport, segmentsCabinCode, segmentsAirlineCode;
+END$$
+
+CREATE TRIGGER fare_rollup_after_insert
+AFTER INSERT ON Legs
+FOR EACH ROW
+BEGIN
+  CALL AddFareToRollup(NEW.flightDate, NEW.isNonStop, NEW.startingAirport, NEW.destinationAirport,
+                       NEW.segmentsCabinCode, NEW.segmentsAirlineCode, NEW.baseFare, NEW.totalFare);
+END$$
+
+CREATE TRIGGER fare_rollup_after_update
+AFTER UPDATE ON Legs
+FOR EACH ROW
+BEGIN
+  IF NOT (NEW.flightDate <=> OLD.flightDate AND NEW.isNonStop <=> OLD.isNonStop
+          AND NEW.startingAirport <=> OLD.startingAirport AND NEW.destinationAirport <=> OLD.destinationAirport
+          AND NEW.segmentsCabinCode <=> OLD.segmentsCabinCode AND NEW.segmentsAirlineCode <=> OLD.segmentsAirlineCode
+          AND NEW.baseFare <=> OLD.baseFare AND NEW.totalFare <=> OLD.totalFare) THEN
+    CALL RemoveFareFromRollup(OLD.flightDate, OLD.isNonStop, OLD.startingAirport, OLD.destinationAirport,
+                              OLD.segmentsCabinCode, OLD.segmentsAirlineCode, OLD.baseFare, OLD.totalFare);
+    CALL AddFareToRollup(NEW.flightDate, NEW.isNonStop, NEW.startingAirport, NEW.destinationAirport,
+                         NEW.segmentsCabinCode, NEW.segmentsAirlineCode, NEW.baseFare, NEW.totalFare);
+  END IF;
+END$$
+
+CREATE TRIGGER fare_rollup_after_delete
+AFTER DELETE ON Legs
+FOR EACH ROW
+BEGIN
+  CALL RemoveFareFromRollup(OLD.flightDate, OLD.isNonStop, OLD.startingAirport, OLD.destinationAirport,
+                            OLD.segmentsCabinCode, OLD.segmentsAirlineCode, OLD.baseFare, OLD.totalFare);
+END$$
+
+DELIMITER ;
+
+CALL RebuildFareWeeklyRollup();
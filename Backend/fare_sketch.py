@@ -0,0 +1,127 @@
+import math
+import numpy as np
+
+# Fares are counted in logarithmic buckets (as in DDSketch): any quantile read from the buckets is within
+# RELATIVE_ACCURACY of a true fare. Must match the bucket formula in fare_sketch.sql.
+RELATIVE_ACCURACY = 0.01
+GAMMA = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+# Fares below MIN_FARE all go to bucket 0, which reads back as 0
+MIN_FARE = 1.0
+
+# Default width in dollars of the fixed histogram bins, and the quantiles /fare_distribution reports
+HISTOGRAM_BIN_WIDTH = 50
+# Most bins a histogram may have; narrower bins over the fares asked about are rejected
+MAX_HISTOGRAM_BINS = 1000
+QUANTILES = {'p10': 0.1, 'p50': 0.5, 'p90': 0.9}
+
+
+def bucket_index(fares):
+    # CEIL(LN(fare) / LN(gamma)), or 0 below MIN_FARE
+    fares = np.asarray(fares, dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        index = np.ceil(np.log(fares) / math.log(GAMMA))
+
+    return np.where(fares >= MIN_FARE, index, 0).astype(np.int64)
+
+
+def bucket_value(index):
+    # Midpoint (in relative terms) of the bucket's (gamma^(i-1), gamma^i] range
+    index = np.asarray(index, dtype=float)
+
+    return np.where(index > 0, 2 * GAMMA ** index / (GAMMA + 1), 0.0)
+
+
+class FareSketch:
+    """
+    Mergeable quantile sketch of fares: a count per logarithmic bucket.
+
+    Sketches of different weeks, routes or cabin classes add up to the sketch of their union,
+    so /fare_distribution merges stored per-week buckets instead of scanning Legs.
+    """
+
+    def __init__(self, counts=None):
+        self.counts = dict(counts or {})
+
+    @classmethod
+    def from_fares(cls, fares):
+        sketch = cls()
+        sketch.add(fares)
+
+        return sketch
+
+    def add(self, fares):
+        indexes, counts = np.unique(bucket_index(fares), return_counts=True)
+        for index, count in zip(indexes.tolist(), counts.tolist()):
+            self.counts[index] = self.counts.get(index, 0) + count
+
+    def merge(self, other):
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+
+        return self
+
+    @property
+    def count(self):
+        return sum(self.counts.values())
+
+    def _sorted(self):
+        indexes = np.array(sorted(self.counts), dtype=np.int64)
+        counts = np.array([self.counts[index] for index in indexes.tolist()], dtype=np.int64)
+
+        return bucket_value(indexes), counts
+
+    def quantile(self, q):
+        """
+        Fare at quantile q (0-1), or None for an empty sketch.
+        """
+        if not self.count:
+            return None
+        values, counts = self._sorted()
+        # Bucket holding the fare of rank q * (n - 1), counting from 0
+        position = int(np.searchsorted(np.cumsum(counts), q * (self.count - 1), side='right'))
+
+        return float(values[min(position, len(values) - 1)])
+
+    def rank(self, fare):
+        """
+        Share of fares (0-1) cheaper than fare; fares in fare's own bucket count half.
+        """
+        if not self.count:
+            return None
+        own = int(bucket_index([fare])[0])
+        below = sum(count for index, count in self.counts.items() if index < own)
+
+        return (below + self.counts.get(own, 0) / 2) / self.count
+
+    def histogram(self, bin_width=HISTOGRAM_BIN_WIDTH):
+        """
+        Fixed-width histogram: left bin edges from 0 and a count per bin, up to the most expensive fare.
+        Raises ValueError for a width that isn't a positive number or would need more than
+        MAX_HISTOGRAM_BINS bins.
+        """
+        if not (math.isfinite(bin_width) and bin_width > 0):
+            raise ValueError("bin_width must be a positive number")
+        if not self.count:
+            return {'binWidth': bin_width, 'edges': [], 'counts': []}
+        values, counts = self._sorted()
+        if values[-1] // bin_width >= MAX_HISTOGRAM_BINS:
+            raise ValueError(f"bin_width must be at least {values[-1] / MAX_HISTOGRAM_BINS:.2f} "
+                             f"(at most {MAX_HISTOGRAM_BINS} bins)")
+        bins = (values // bin_width).astype(np.int64)
+        histogram = np.bincount(bins, weights=counts, minlength=bins.max() + 1).astype(np.int64)
+
+        return {'binWidth': bin_width, 'edges': (np.arange(len(histogram)) * bin_width).tolist(),
+                'counts': histogram.tolist()}
+
+    def summary(self, bin_width=HISTOGRAM_BIN_WIDTH, fare=None):
+        # The /fare_distribution response
+        result = {
+            'count': self.count,
+            'quantiles': {name: self.quantile(q) for name, q in QUANTILES.items()},
+            'histogram': self.histogram(bin_width),
+        }
+        if fare is not None:
+            result['fare'] = fare
+            result['fareRank'] = self.rank(fare)
+
+        return result
@@ -0,0 +1,98 @@
+-- Fare distribution sketches behind /fare_distribution: the number of totalFare values per logarithmic
+-- bucket, per (route, cabin class, week), kept current by triggers on Legs. Summing the buckets of any
+-- set of weeks gives quantiles within 1% of the true fares (see fare_sketch.py).
+-- Run after database.sql (or on an existing database); it builds the buckets from the Legs already loaded
+-- in a single pass. Weeks start on Sunday, as in fare_rollup.sql.
+
+DROP TABLE IF EXISTS FareSketchBuckets;
+
+CREATE TABLE FareSketchBuckets (
+  startingAirport VARCHAR(5) NOT NULL,
+  destinationAirport VARCHAR(5) NOT NULL,
+  cabinClass VARCHAR(128) NOT NULL, -- segmentsCabinCode
+  weekStart DATE NOT NULL, -- Sunday the week starts on
+  bucket SMALLINT NOT NULL, -- CEIL(LN(totalFare) / LN(1.01 / 0.99)); 0 for fares under $1
+  fareCount INT NOT NULL,
+
+  PRIMARY KEY (startingAirport, destinationAirport, cabinClass, weekStart, bucket)
+);
+
+DROP TRIGGER IF EXISTS fare_sketch_after_insert;
+DROP TRIGGER IF EXISTS fare_sketch_after_update;
+DROP TRIGGER IF EXISTS fare_sketch_after_delete;
+DROP FUNCTION IF EXISTS FareSketchBucket;
+DROP PROCEDURE IF EXISTS CountFareInSketch;
+DROP PROCEDURE IF EXISTS RebuildFareSketches;
+
+DELIMITER $$
+
+-- fare_sketch.RELATIVE_ACCURACY = 0.01
+CREATE FUNCTION FareSketchBucket(fare FLOAT) RETURNS SMALLINT DETERMINISTIC
+BEGIN
+  RETURN IF(fare >= 1, CEIL(LN(fare) / LN(1.01 / 0.99)), 0);
+END$$
+
+-- Adds delta (1 or -1) fares to the bucket of a leg
+CREATE PROCEDURE CountFareInSketch(IN legDate DATE, IN origin VARCHAR(5), IN destination VARCHAR(5),
+                                   IN cabin VARCHAR(128), IN fare FLOAT, IN delta INT)
+BEGIN
+  IF origin IS NOT NULL AND destination IS NOT NULL THEN
+    INSERT INTO FareSketchBuckets
+    VALUES (origin, destination, cabin, legDate - INTERVAL (DAYOFWEEK(legDate) - 1) DAY, FareSketchBucket(fare), delta)
+    ON DUPLICATE KEY UPDATE fareCount = fareCount + delta;
+
+    IF delta < 0 THEN
+      DELETE FROM FareSketchBuckets
+      WHERE startingAirport = origin AND destinationAirport = destination AND cabinClass = cabin
+        AND weekStart = legDate - INTERVAL (DAYOFWEEK(legDate) - 1) DAY AND bucket = FareSketchBucket(fare)
+        AND fareCount <= 0;
+    END IF;
+  END IF;
+END$$
+
+CREATE PROCEDURE RebuildFareSketches()
+BEGIN
+  DELETE FROM FareSketchBuckets WHERE weekStart IS NOT NULL; -- Keeps MySQL Workbench safe-update mode happy
+
+  INSERT INTO FareSketchBuckets
+  SELECT
+    startingAirport,
+    destinationAirport,
+    segmentsCabinCode,
+    flightDate - INTERVAL (DAYOFWEEK(flightDate) - 1) DAY AS weekStart,
+    FareSketchBucket(totalFare) AS bucket,
+    COUNT(*)
+  FROM Legs
+  WHERE startingAirport IS NOT NULL AND destinationAirport IS NOT NULL
+  GROUP BY startingAirport, destinationAirport, segmentsCabinCode, weekStart, bucket;
+END$$
+
+CREATE TRIGGER fare_sketch_after_insert
+AFTER INSERT ON Legs
+FOR EACH ROW
+BEGIN
+  CALL CountFareInSketch(NEW.flightDate, NEW.startingAirport, NEW.destinationAirport, NEW.segmentsCabinCode, NEW.totalFare, 1);
+END$$
+
+CREATE TRIGGER fare_sketch_after_update
+AFTER UPDATE ON Legs
+FOR EACH ROW
+BEGIN
+  IF NOT (NEW.flightDate <=> OLD.flightDate AND NEW.startingAirport <=> OLD.startingAirport
+          AND NEW.destinationAirport <=> OLD.destinationAirport AND NEW.segmentsCabinCode <=> OLD.segmentsCabinCode
+          AND NEW.totalFare <=> OLD.totalFare) THEN
+    CALL CountFareInSketch(OLD.flightDate, OLD.startingAirport, OLD.destinationAirport, OLD.segmentsCabinCode, OLD.totalFare, -1);
+    CALL CountFareInSketch(NEW.flightDate, NEW.startingAirport, NEW.destinationAirport, NEW.segmentsCabinCode, NEW.totalFare, 1);
+  END IF;
+END$$
+
+CREATE TRIGGER fare_sketch_after_delete
+AFTER DELETE ON Legs
+FOR EACH ROW
+BEGIN
+  CALL CountFareInSketch(OLD.flightDate, OLD.startingAirport, OLD.destinationAirport, OLD.segmentsCabinCode, OLD.totalFare, -1);
+END$$
+
+DELIMITER ;
+
+CALL RebuildFareSketches();
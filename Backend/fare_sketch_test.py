@@ -0,0 +1,52 @@
+import unittest
+import numpy as np
+from fare_sketch import FareSketch, MAX_HISTOGRAM_BINS, RELATIVE_ACCURACY, bucket_index
+
+
+class TestFareSketch(unittest.TestCase):
+    def setUp(self):
+        self.fares = np.random.default_rng(0).gamma(4.0, 80.0, 20000)
+
+    def test_quantiles_within_relative_accuracy(self):
+        sketch = FareSketch.from_fares(self.fares)
+
+        for q in (0.1, 0.5, 0.9, 0.99):
+            # The sketch returns the fare of rank q * (n - 1), like np.quantile(..., method='lower')
+            expected = np.quantile(self.fares, q, method='lower')
+            self.assertLessEqual(abs(sketch.quantile(q) - expected), RELATIVE_ACCURACY * expected * 1.0001)
+
+    def test_merge_equals_sketch_of_union(self):
+        merged = FareSketch.from_fares(self.fares[:5000]).merge(FareSketch.from_fares(self.fares[5000:]))
+
+        self.assertEqual(merged.counts, FareSketch.from_fares(self.fares).counts)
+        self.assertEqual(merged.count, len(self.fares))
+
+    def test_rank(self):
+        sketch = FareSketch.from_fares(self.fares)
+        p10 = np.quantile(self.fares, 0.1)
+
+        self.assertAlmostEqual(sketch.rank(p10), 0.1, delta=0.01)
+        self.assertEqual(sketch.rank(0.5), 0.0)
+
+    def test_histogram(self):
+        histogram = FareSketch.from_fares([10, 20, 60, 140, 149]).histogram(50)
+
+        self.assertEqual(histogram['edges'], [0, 50, 100])
+        self.assertEqual(histogram['counts'], [2, 1, 2])
+
+    def test_histogram_bin_width_is_bounded(self):
+        sketch = FareSketch.from_fares([100.0, 4000.0])
+
+        for bin_width in (0.00001, 0, -50, float('nan'), float('inf')):
+            with self.assertRaises(ValueError):
+                sketch.histogram(bin_width)
+        self.assertLessEqual(len(sketch.histogram(5)['counts']), MAX_HISTOGRAM_BINS)
+
+    def test_small_and_empty(self):
+        self.assertEqual(bucket_index([0.0, 0.5]).tolist(), [0, 0])
+        self.assertIsNone(FareSketch().quantile(0.5))
+        self.assertEqual(FareSketch().histogram()['counts'], [])
+
+
+if __name__ == '__main__':
+    unittest.main()
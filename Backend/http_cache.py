@@ -0,0 +1,117 @@
+import functools
+import gzip
+import hashlib
+import os
+from flask import Response, make_response, request
+import serialization
+
+# Brotli compresses JSON better than gzip at the same speed; without it responses are gzipped
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Seconds clients may reuse a cached answer of the reference-data endpoints before revalidating it
+HTTP_CACHE_MAX_AGE = int(os.getenv('HTTP_CACHE_MAX_AGE', '300'))
+# Responses smaller than this many bytes are sent uncompressed
+HTTP_COMPRESS_MIN_BYTES = int(os.getenv('HTTP_COMPRESS_MIN_BYTES', '1024'))
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+COMPRESSIBLE_TYPES = {'application/json', serialization.COLUMNS, 'text/plain', 'text/html'}
+
+
+def _etag(*parts):
+    # ETags are set weak: the answer gzipped, brotli-compressed or not is one representation to a cache
+    return hashlib.sha1('\x1f'.join(str(part) for part in parts).encode()).hexdigest()[:32]
+
+
+def _policy(max_age):
+    # Reusable for max_age seconds, or (max_age 0) stored but revalidated on every use
+    return f"public, max-age={max_age}" if max_age else 'no-cache'
+
+
+def _not_modified(etag, max_age):
+    response = Response(status=304)
+    response.set_etag(etag, weak=True)
+    response.headers['Cache-Control'] = _policy(max_age)
+    response.vary.update(('Accept', 'Accept-Encoding'))
+
+    return response
+
+
+def cached(max_age=0, version=None):
+    """
+    Decorate a GET view with validators and a Cache-Control policy. With version (a function returning the
+    current generation of the data the view reads, or None when it has none), the ETag is derived from that
+    generation and the request, so an If-None-Match that still matches is answered 304 without running the
+    view. Otherwise the ETag is a hash of the body, which saves the transfer but not the work.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            generation = version() if version is not None else None
+            etag = None
+            if generation is not None:
+                etag = _etag(generation, request.path, sorted(request.args.items(multi=True)),
+                             serialization.response_type())
+                if request.if_none_match.contains_weak(etag):
+                    return _not_modified(etag, max_age)
+
+            response = make_response(view(*args, **kwargs))
+            if response.status_code != 200 or response.is_streamed:
+                return response
+
+            response.set_etag(etag or _etag(response.get_data()), weak=True)
+            response.headers['Cache-Control'] = _policy(max_age)
+            response.vary.add('Accept')
+
+            return response.make_conditional(request)
+
+        return wrapper
+
+    return decorator
+
+
+# ---- Compression ----
+
+def _encoding():
+    offered = ['br', 'gzip'] if brotli is not None else ['gzip']
+
+    return request.accept_encodings.best_match(offered)
+
+
+def compress_response(response):
+    """
+    Compress a finished response body with the best encoding the client accepts, when it is large enough and
+    of a compressible type. Streamed and file responses are left alone.
+    """
+    if (response.status_code < 200 or response.status_code in (204, 304) or response.is_streamed
+            or response.direct_passthrough or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_TYPES):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    data = response.get_data()
+    if len(data) < HTTP_COMPRESS_MIN_BYTES:
+        return response
+
+    encoding = _encoding()
+    if encoding == 'br':
+        data = brotli.compress(data, quality=BROTLI_QUALITY)
+    elif encoding == 'gzip':
+        data = gzip.compress(data, compresslevel=GZIP_LEVEL)
+    else:
+        return response
+
+    response.set_data(data)
+    response.headers['Content-Encoding'] = encoding
+
+    return response
+
+
+def init_app(app):
+    """
+    Compress the responses of app (see compress_response).
+    """
+    app.after_request(compress_response)
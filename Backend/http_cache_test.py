@@ -0,0 +1,81 @@
+import gzip
+import unittest
+from unittest.mock import patch
+from flask import Flask, jsonify
+import http_cache
+
+
+class TestHttpCache(unittest.TestCase):
+    def setUp(self):
+        self.calls = 0
+        self.generation = 1
+        app = Flask(__name__)
+        http_cache.init_app(app)
+
+        @app.route('/routes')
+        @http_cache.cached(300, version=lambda: self.generation)
+        def routes():
+            self.calls += 1
+            return jsonify([{'sourceIATA': 'ATL', 'destinationIATA': f'L{i:04d}'} for i in range(100)])
+
+        @app.route('/trends')
+        @http_cache.cached()
+        def trends():
+            self.calls += 1
+            return jsonify({'month': 202216})
+
+        @app.route('/missing')
+        @http_cache.cached(300)
+        def missing():
+            return jsonify({'message': 'No routes found'}), 404
+
+        self.client = app.test_client()
+
+    def test_versioned_revalidation_skips_the_view(self):
+        first = self.client.get('/routes?airline_name=Delta')
+        etag = first.headers['ETag']
+        second = self.client.get('/routes?airline_name=Delta', headers={'If-None-Match': etag})
+        other = self.client.get('/routes?airline_name=United', headers={'If-None-Match': etag})
+
+        self.assertTrue(etag.startswith('W/'))
+        self.assertEqual(first.headers['Cache-Control'], 'public, max-age=300')
+        self.assertEqual((second.status_code, second.data, second.headers['ETag']), (304, b'', etag))
+        self.assertEqual(other.status_code, 200)
+        self.assertEqual(self.calls, 2)
+
+    def test_new_generation_changes_the_etag(self):
+        etag = self.client.get('/routes').headers['ETag']
+        self.generation = 2
+
+        self.assertEqual(self.client.get('/routes', headers={'If-None-Match': etag}).status_code, 200)
+
+    def test_unversioned_views_are_validated_by_body(self):
+        first = self.client.get('/trends')
+        second = self.client.get('/trends', headers={'If-None-Match': first.headers['ETag']})
+
+        self.assertEqual(first.headers['Cache-Control'], 'no-cache')
+        self.assertEqual(second.status_code, 304)
+        self.assertEqual(self.calls, 2)
+
+    def test_errors_are_not_cached(self):
+        response = self.client.get('/missing')
+
+        self.assertNotIn('ETag', response.headers)
+        self.assertNotIn('Cache-Control', response.headers)
+
+    def test_large_bodies_are_compressed(self):
+        with patch.object(http_cache, 'brotli', None):
+            plain = self.client.get('/routes')
+            compressed = self.client.get('/routes', headers={'Accept-Encoding': 'gzip'})
+            small = self.client.get('/trends', headers={'Accept-Encoding': 'gzip'})
+
+        self.assertNotIn('Content-Encoding', plain.headers)
+        self.assertEqual(compressed.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(compressed.data), plain.data)
+        self.assertLess(len(compressed.data), len(plain.data))
+        self.assertIn('Accept-Encoding', compressed.headers['Vary'])
+        self.assertNotIn('Content-Encoding', small.headers)
+
+
+if __name__ == '__main__':
+    unittest.main()
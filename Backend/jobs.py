@@ -0,0 +1,194 @@
+import hashlib
+import importlib
+import json
+import os
+import re
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import serialization
+
+# Results and status files of background jobs live in JOBS_DIR and are evicted JOB_RESULT_TTL seconds
+# after they were last written; JOB_WORKERS processes run the jobs
+JOBS_DIR = os.getenv('JOBS_DIR', 'job_results')
+JOB_RESULT_TTL = int(os.getenv('JOB_RESULT_TTL', '3600'))
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', '2'))
+# A DuckDB file can only be open in one process, so with DB_BACKEND=duckdb jobs run on threads of the server
+JOBS_IN_THREADS = os.getenv('DB_BACKEND') == 'duckdb'
+
+# Job task names and the 'module:function' they run; functions take (params, progress) like analytics.py
+TASKS = {
+    'cluster_flights': 'analytics:cluster_flights',
+    'apriori': 'analytics:apriori_analysis',
+    'cross_validate': 'analytics:cross_validate_model',
+    'analyze_price_trends': 'analytics:analyze_price_trends',
+}
+
+QUEUED, RUNNING, DONE, FAILED = 'queued', 'running', 'done', 'failed'
+JOB_ID_PATTERN = re.compile(r'^[0-9a-f]{20}$')
+
+_executor = None
+_futures = {}
+_lock = threading.RLock()  # done callbacks can run inside submit
+
+
+def job_id(task, params):
+    # Identical task + parameters always hash to the same job, which is how duplicates are found
+    key = json.dumps({'task': task, 'params': params}, sort_keys=True, default=str)
+
+    return hashlib.sha256(key.encode()).hexdigest()[:20]
+
+
+def _path(job, kind, directory=None):
+    return os.path.join(directory or JOBS_DIR, f"{job}.{kind}.json")
+
+
+def _write_json(path, data):
+    # Write then rename, so readers never see a half-written file
+    temporary = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temporary, 'w') as f:
+        json.dump(data, f, default=str)
+    os.replace(temporary, path)
+
+
+def _read_json(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def _write_status(job, task, state, progress=0.0, message='', error=None, directory=None):
+    status = {'jobID': job, 'task': task, 'status': state, 'progress': round(progress, 3),
+              'message': message, 'updated': time.time()}
+    if error is not None:
+        status['error'] = error
+    _write_json(_path(job, 'status', directory), status)
+
+
+def _run_job(job, task, target, params, directory):
+    # Runs in a worker process; target and directory are passed in since workers may outlive config changes
+    module_name, function_name = target.split(':')
+    function = getattr(importlib.import_module(module_name), function_name)
+
+    def progress(fraction, message=''):
+        _write_status(job, task, RUNNING, fraction, message, directory=directory)
+
+    progress(0.0, 'Started')
+    try:
+        result = function(params, progress)
+    except Exception as e:
+        _write_status(job, task, FAILED, error=str(e), directory=directory)
+        return
+
+    if result is None:
+        _write_status(job, task, FAILED, error='Failed to fetch data or data is empty', directory=directory)
+        return
+
+    _write_json(_path(job, 'result', directory), serialization.to_records(result))
+    _write_status(job, task, DONE, 1.0, 'Finished', directory=directory)
+
+
+def _init_worker():
+    # Forked workers inherit the server's pooled database connections; sharing a socket with the parent
+    # interleaves their traffic, so the worker drops its copies (leaving them open for the parent) and
+    # opens its own
+    db = sys.modules.get('db')
+    if db is not None:
+        db.engine.dispose(close=False)
+
+
+def _get_executor():
+    global _executor
+
+    if _executor is None:
+        if JOBS_IN_THREADS:
+            _executor = ThreadPoolExecutor(max_workers=JOB_WORKERS)
+        else:
+            _executor = ProcessPoolExecutor(max_workers=JOB_WORKERS, initializer=_init_worker)
+
+    return _executor
+
+
+def evict_expired(now=None):
+    """
+    Remove finished job files older than JOB_RESULT_TTL.
+    """
+    now = now if now is not None else time.time()
+    if not os.path.isdir(JOBS_DIR):
+        return
+
+    for name in os.listdir(JOBS_DIR):
+        path = os.path.join(JOBS_DIR, name)
+        job = name.split('.')[0]
+        try:
+            if job not in _futures and now - os.path.getmtime(path) > JOB_RESULT_TTL:
+                os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def submit(task, params):
+    """
+    Queue task with params and return its job ID. A job that is already queued or running, or whose
+    result is still stored, is reused instead of starting a duplicate.
+    """
+    if task not in TASKS:
+        raise KeyError(task)
+
+    job = job_id(task, params)
+    with _lock:
+        evict_expired()
+        future = _futures.get(job)
+        if future is not None and not future.done():
+            return job
+
+        status = _read_json(_path(job, 'status'))
+        if status is not None and status['status'] == DONE and os.path.exists(_path(job, 'result')):
+            return job
+
+        os.makedirs(JOBS_DIR, exist_ok=True)
+        _write_status(job, task, QUEUED)
+        directory = JOBS_DIR
+        future = _get_executor().submit(_run_job, job, task, TASKS[task], params, directory)
+        _futures[job] = future
+        future.add_done_callback(lambda done: _on_done(job, task, done, directory))
+
+    return job
+
+
+def _on_done(job, task, future, directory):
+    with _lock:
+        _futures.pop(job, None)
+
+    # A worker that died (or a task that couldn't be pickled) never wrote its own failure
+    error = future.exception()
+    if error is not None:
+        _write_status(job, task, FAILED, error=str(error), directory=directory)
+
+
+def get_status(job):
+    """
+    Status dict of a job ({jobID, task, status, progress, message[, error]}), or None if it is unknown or expired.
+    """
+    if not JOB_ID_PATTERN.match(job):
+        return None
+
+    return _read_json(_path(job, 'status'))
+
+
+def get_result(job):
+    if not JOB_ID_PATTERN.match(job):
+        return None
+
+    return _read_json(_path(job, 'result'))
+
+
+def shutdown():
+    global _executor
+
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+        _executor = None
@@ -0,0 +1,96 @@
+import os
+import tempfile
+import time
+import unittest
+from unittest.mock import Mock, patch
+import jobs
+
+
+def square(params, progress):
+    progress(0.5, 'Squaring')
+    time.sleep(float(params.get('sleep', 0)))
+
+    return {'square': params['x'] ** 2}
+
+
+def empty(params, progress):
+    return None
+
+
+class TestJobs(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        patches = [
+            patch.object(jobs, 'JOBS_DIR', self.directory.name),
+            patch.dict(jobs.TASKS, {'square': 'jobs_test:square', 'empty': 'jobs_test:empty'}),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+
+    def tearDown(self):
+        jobs.shutdown()
+        self.directory.cleanup()
+
+    def wait(self, job, timeout=30):
+        deadline = time.time() + timeout
+        while jobs.get_status(job)['status'] not in (jobs.DONE, jobs.FAILED):
+            self.assertLess(time.time(), deadline, "job did not finish")
+            time.sleep(0.05)
+
+        return jobs.get_status(job)
+
+    def test_runs_job_and_stores_result(self):
+        job = jobs.submit('square', {'x': 7})
+        status = self.wait(job)
+
+        self.assertEqual(status['status'], jobs.DONE)
+        self.assertEqual(status['progress'], 1.0)
+        self.assertEqual(jobs.get_result(job), {'square': 49})
+
+    def test_deduplicates_identical_jobs(self):
+        first = jobs.submit('square', {'x': 3, 'sleep': 0.5})
+        second = jobs.submit('square', {'sleep': 0.5, 'x': 3})
+        self.assertEqual(first, second)
+        self.assertEqual(len(jobs._futures), 1)
+
+        self.wait(first)
+        self.assertNotEqual(jobs.submit('square', {'x': 4}), first)
+
+    def test_empty_result_fails(self):
+        status = self.wait(jobs.submit('empty', {}))
+
+        self.assertEqual(status['status'], jobs.FAILED)
+        self.assertIsNone(jobs.get_result(status['jobID']))
+
+    def test_evicts_expired_results(self):
+        job = jobs.submit('square', {'x': 2})
+        self.wait(job)
+        jobs._futures.clear()
+
+        jobs.evict_expired(now=time.time() + jobs.JOB_RESULT_TTL + 1)
+        self.assertIsNone(jobs.get_status(job))
+        self.assertEqual(os.listdir(self.directory.name), [])
+
+    def test_runs_jobs_in_threads_for_duckdb(self):
+        with patch.object(jobs, 'JOBS_IN_THREADS', True):
+            status = self.wait(jobs.submit('square', {'x': 5}))
+
+        self.assertIsInstance(jobs._executor, jobs.ThreadPoolExecutor)
+        self.assertEqual(jobs.get_result(status['jobID']), {'square': 25})
+
+    def test_workers_drop_inherited_connections(self):
+        engine = Mock()
+        with patch.dict('sys.modules', {'db': Mock(engine=engine)}):
+            jobs._init_worker()
+
+        engine.dispose.assert_called_once_with(close=False)
+        self.assertIs(jobs._get_executor()._initializer, jobs._init_worker)
+
+    def test_rejects_invalid_ids(self):
+        self.assertIsNone(jobs.get_status('../app'))
+        self.assertRaises(KeyError, jobs.submit, 'unknown', {})
+
+
+if __name__ == '__main__':
+    unittest.main()
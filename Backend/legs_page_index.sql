@@ -0,0 +1,6 @@
+-- Adds the index behind keyset pages of /flight_details to an existing Legs table (new installs get it from
+-- database.sql). Pages are ordered by flightDate, segmentsDepartureTimeRaw, legID within one route and
+-- airline, so each page is an index range scan instead of a sort of every matching flight.
+
+CREATE INDEX idx_legs_route_page
+  ON Legs(startingAirport, destinationAirport, segmentsAirlineCode, isNonStop, flightDate, segmentsDepartureTimeRaw, legID);
@@ -0,0 +1,29 @@
+-- Materializes departure/arrival times on an existing Legs table (new installs get them from database.sql)
+-- so query_flight_details can filter with index range predicates instead of STR_TO_DATE per row.
+
+ALTER TABLE Legs
+  ADD COLUMN depMinute SMALLINT,
+  ADD COLUMN arrMinute SMALLINT,
+  ADD COLUMN depEpoch BIGINT,
+  ADD COLUMN arrEpoch BIGINT;
+
+-- Raw times look like 2022-04-17T12:57:00.000-04:00; multi-segment legs join them with ||.
+-- Minutes are local wall-clock time of the first departure / last arrival; epochs are UTC.
+UPDATE Legs
+SET depMinute = SUBSTRING(SUBSTRING_INDEX(segmentsDepartureTimeRaw, '||', 1), 12, 2) * 60
+              + SUBSTRING(SUBSTRING_INDEX(segmentsDepartureTimeRaw, '||', 1), 15, 2),
+    arrMinute = SUBSTRING(SUBSTRING_INDEX(segmentsArrivalTimeRaw, '||', -1), 12, 2) * 60
+              + SUBSTRING(SUBSTRING_INDEX(segmentsArrivalTimeRaw, '||', -1), 15, 2),
+    depEpoch = TIMESTAMPDIFF(SECOND, '1970-01-01 00:00:00',
+                 STR_TO_DATE(LEFT(SUBSTRING_INDEX(segmentsDepartureTimeRaw, '||', 1), 19), '%Y-%m-%dT%H:%i:%s'))
+             - IF(SUBSTRING(SUBSTRING_INDEX(segmentsDepartureTimeRaw, '||', 1), 24, 1) = '-', -1, 1)
+             * (SUBSTRING(SUBSTRING_INDEX(segmentsDepartureTimeRaw, '||', 1), 25, 2) * 3600
+                + SUBSTRING(SUBSTRING_INDEX(segmentsDepartureTimeRaw, '||', 1), 28, 2) * 60),
+    arrEpoch = TIMESTAMPDIFF(SECOND, '1970-01-01 00:00:00',
+                 STR_TO_DATE(LEFT(SUBSTRING_INDEX(segmentsArrivalTimeRaw, '||', -1), 19), '%Y-%m-%dT%H:%i:%s'))
+             - IF(SUBSTRING(SUBSTRING_INDEX(segmentsArrivalTimeRaw, '||', -1), 24, 1) = '-', -1, 1)
+             * (SUBSTRING(SUBSTRING_INDEX(segmentsArrivalTimeRaw, '||', -1), 25, 2) * 3600
+                + SUBSTRING(SUBSTRING_INDEX(segmentsArrivalTimeRaw, '||', -1), 28, 2) * 60)
+WHERE legID IS NOT NULL; -- Keeps MySQL Workbench safe-update mode happy
+
+CREATE INDEX idx_legs_route_dep ON Legs(startingAirport, destinationAirport, segmentsAirlineCode, isNonStop, depMinute);
@@ -0,0 +1,592 @@
+"""
+Embedded SQLite or DuckDB database with the tables of database.sql, so the app, its tests and the
+benchmarks can run without a MySQL server (DB_BACKEND=sqlite|duckdb, DB_PATH=<file>; see db.py).
+
+Tables keep the columns, primary keys and indexes of the MySQL schema, but not its foreign keys or
+triggers. FareWeeklyRollup and FareSketchBuckets are rebuilt by the CSV loader instead of by triggers.
+
+Usage (from the Backend directory):
+    python local_db.py --data-dir <folder with the CSV dumps database.sql loads>
+"""
+import argparse
+import datetime
+import os
+import random
+import numpy as np
+import pandas as pd
+from sqlalchemy import create_engine, event, text
+from fare_sketch import bucket_index
+from time_parsing import minutes_of_day, select_segment
+
+BACKENDS = ('mysql', 'sqlite', 'duckdb')
+LOCAL_BACKENDS = ('sqlite', 'duckdb')
+
+# ---- Schema ----
+
+# {id} becomes an auto-incrementing integer primary key in each dialect
+TABLES = {
+    'Users': """
+        CREATE TABLE Users (
+          userID {id},
+          fullName VARCHAR(128) NOT NULL,
+          phoneNumber VARCHAR(25) NOT NULL UNIQUE,
+          addressFirstLine VARCHAR(64) NOT NULL,
+          addressLastLine VARCHAR(64),
+          addressPostcode VARCHAR(10) NOT NULL,
+          billingFirstLine VARCHAR(64) NOT NULL,
+          billingLastLine VARCHAR(64),
+          billingPostcode VARCHAR(10) NOT NULL,
+          birthDate DATE NOT NULL,
+          gender VARCHAR(2) NOT NULL CHECK (gender IN ('M', 'F', 'NB')),
+          email VARCHAR(255) NOT NULL UNIQUE CHECK (email LIKE '%@%.%')
+        )""",
+    'Airline': """
+        CREATE TABLE Airline (
+          airlineID INTEGER PRIMARY KEY,
+          airlineName VARCHAR(128) NOT NULL,
+          iata VARCHAR(5) NOT NULL,
+          icao VARCHAR(5),
+          country VARCHAR(64)
+        )""",
+    'Cities': """
+        CREATE TABLE Cities (
+          cityID INTEGER PRIMARY KEY,
+          cityName VARCHAR(85) NOT NULL,
+          country VARCHAR(64) NOT NULL,
+          timezone VARCHAR(50) NOT NULL,
+          UNIQUE (cityName, country)
+        )""",
+    'Airports': """
+        CREATE TABLE Airports (
+          airportID INTEGER PRIMARY KEY,
+          airportName VARCHAR(100) NOT NULL,
+          cityID INTEGER NOT NULL,
+          iata VARCHAR(5) NOT NULL,
+          icao VARCHAR(5),
+          latitude DOUBLE,
+          longitude DOUBLE
+        )""",
+    'Preferences': """
+        CREATE TABLE Preferences (
+          preferenceNumber INTEGER,
+          userID INTEGER,
+          preferredFlyingClass VARCHAR(16) CHECK (preferredFlyingClass IN ('coach', 'premium coach', 'business', 'first')),
+          preferredLayoverTime TIME,
+          preferredDepartureTime TIME,
+          preferredArrivalTime TIME,
+          preferredDuration INTEGER,
+          preferLowEmission SMALLINT,
+          preferredGroundTransportation VARCHAR(20),
+          preferredHotelChain VARCHAR(20),
+          PRIMARY KEY (userID, preferenceNumber)
+        )""",
+    'AirlineRoutes': """
+        CREATE TABLE AirlineRoutes (
+          airlineID INTEGER,
+          sourceAirportID INTEGER,
+          destinationAirportID INTEGER,
+          PRIMARY KEY (airlineID, sourceAirportID, destinationAirportID)
+        )""",
+    'Legs': """
+        CREATE TABLE Legs (
+          legID VARCHAR(35) PRIMARY KEY,
+          startingAirport VARCHAR(5),
+          destinationAirport VARCHAR(5),
+          flightDate DATE NOT NULL,
+          travelDuration VARCHAR(50) NOT NULL,
+          elapsedDays INTEGER NOT NULL,
+          isBasicEconomy SMALLINT NOT NULL,
+          isRefundable SMALLINT NOT NULL,
+          isNonStop SMALLINT NOT NULL,
+          baseFare FLOAT NOT NULL,
+          totalFare FLOAT NOT NULL,
+          seatsRemaining INTEGER NOT NULL,
+          segmentsDepartureTimeRaw VARCHAR(128) NOT NULL,
+          segmentsArrivalTimeRaw VARCHAR(128) NOT NULL,
+          segmentsArrivalAirportCode VARCHAR(128) NOT NULL,
+          segmentsDepartureAirportCode VARCHAR(128) NOT NULL,
+          segmentsAirlineName VARCHAR(128) NOT NULL,
+          segmentsAirlineCode VARCHAR(128) NOT NULL,
+          segmentsEquipmentDescription VARCHAR(128) NOT NULL,
+          segmentsDurationInSeconds VARCHAR(128) NOT NULL,
+          segmentsCabinCode VARCHAR(128) NOT NULL,
+          depMinute SMALLINT,
+          arrMinute SMALLINT,
+          depEpoch BIGINT,
+          arrEpoch BIGINT
+        )""",
+    'Itineraries': """
+        CREATE TABLE Itineraries (
+          userID INTEGER,
+          legID VARCHAR(35),
+          airlineName VARCHAR(128) NOT NULL,
+          flyingClass VARCHAR(128) NOT NULL,
+          sourceAirport VARCHAR(5),
+          destinationAirport VARCHAR(5),
+          departureTime TIME,
+          arrivalTime TIME,
+          PRIMARY KEY (userID, legID)
+        )""",
+    'LayoverTimes': """
+        CREATE TABLE LayoverTimes (
+          userID INTEGER,
+          legID VARCHAR(35),
+          LayoverTime INTEGER,
+          PRIMARY KEY (userID, legID, LayoverTime)
+        )""",
+    # No primary key: MySQL silently turns NULL key parts (DepTime of cancelled flights) into defaults
+    'Delays': """
+        CREATE TABLE Delays (
+          Year INTEGER, Quarter INTEGER, Month INTEGER, DayofMonth INTEGER, DayOfWeek INTEGER,
+          FlightDate DATE,
+          Marketing_Airline_Network VARCHAR(50),
+          Operated_or_Branded_Code_Share_Partners VARCHAR(50),
+          IATA_Code_Marketing_Airline VARCHAR(5),
+          Originally_Scheduled_Code_Share_Airline VARCHAR(50),
+          IATA_Code_Originally_Scheduled_Code_Share_Airline VARCHAR(5),
+          Operating_Airline VARCHAR(50),
+          IATA_Code_Operating_Airline VARCHAR(5),
+          Tail_Number VARCHAR(10),
+          Flight_Number_Operating_Airline VARCHAR(10),
+          Origin VARCHAR(5), OriginCityName VARCHAR(100), OriginState VARCHAR(2), OriginStateName VARCHAR(100),
+          Dest VARCHAR(5), DestCityName VARCHAR(100), DestState VARCHAR(2), DestStateName VARCHAR(100),
+          DepTime TIME, DepDelay FLOAT, DepDelayMinutes FLOAT, TaxiOut FLOAT, WheelsOff TIME, WheelsOn TIME,
+          TaxiIn FLOAT, ArrTime TIME, ArrDelay FLOAT, ArrDelayMinutes FLOAT, Cancelled SMALLINT, Diverted SMALLINT,
+          ActualElapsedTime FLOAT, AirTime FLOAT, Flights INTEGER, Distance FLOAT,
+          CarrierDelay FLOAT, WeatherDelay FLOAT, SecurityDelay FLOAT, LateAircraftDelay FLOAT
+        )""",
+    # Mined by /apriori; not created by database.sql, benchmarks/synthetic_data.py fills it
+    'TransactionTable': """
+        CREATE TABLE TransactionTable (
+          transaction_id INTEGER NOT NULL,
+          item VARCHAR(128) NOT NULL
+        )""",
+    # fare_rollup.sql and fare_sketch.sql
+    'FareWeeklyRollup': """
+        CREATE TABLE FareWeeklyRollup (
+          weekStart DATE NOT NULL,
+          yearWeek INTEGER NOT NULL,
+          isNonStop SMALLINT NOT NULL,
+          startingAirport VARCHAR(5) NOT NULL,
+          destinationAirport VARCHAR(5) NOT NULL,
+          cabinClass VARCHAR(128) NOT NULL,
+          airlineCode VARCHAR(128) NOT NULL,
+          fareCount INTEGER NOT NULL,
+          baseFareSum DOUBLE NOT NULL,
+          baseFareMin FLOAT NOT NULL,
+          baseFareMax FLOAT NOT NULL,
+          totalFareSum DOUBLE NOT NULL,
+          totalFareMin FLOAT NOT NULL,
+          totalFareMax FLOAT NOT NULL,
+          PRIMARY KEY (weekStart, isNonStop, startingAirport, destinationAirport, cabinClass, airlineCode)
+        )""",
+    'FareSketchBuckets': """
+        CREATE TABLE FareSketchBuckets (
+          startingAirport VARCHAR(5) NOT NULL,
+          destinationAirport VARCHAR(5) NOT NULL,
+          cabinClass VARCHAR(128) NOT NULL,
+          weekStart DATE NOT NULL,
+          bucket SMALLINT NOT NULL,
+          fareCount INTEGER NOT NULL,
+          PRIMARY KEY (startingAirport, destinationAirport, cabinClass, weekStart, bucket)
+        )""",
+}
+
+# Created after loading, which is much faster than maintaining them row by row (DuckDB especially)
+INDEXES = [
+    "CREATE INDEX idx_airline_name ON Airline(airlineName)",
+    "CREATE INDEX idx_airline_iata ON Airline(iata)",
+    "CREATE INDEX idx_airports_iata ON Airports(iata)",
+    "CREATE INDEX idx_airports_airport_name ON Airports(airportName)",
+    "CREATE INDEX idx_legs_route_dep ON Legs(startingAirport, destinationAirport, segmentsAirlineCode, isNonStop, depMinute)",
+    "CREATE INDEX idx_legs_route_page ON Legs(startingAirport, destinationAirport, segmentsAirlineCode, isNonStop, "
+    "flightDate, segmentsDepartureTimeRaw, legID)",
+    "CREATE INDEX idx_legs_flight_date ON Legs(flightDate)",
+    "CREATE INDEX idx_delays_flight_date ON Delays(FlightDate)",
+]
+
+# data_mining.sql; travelMinutes divides by 60.0 since SQLite's / truncates integers
+VIEWS = [
+    """
+    CREATE VIEW vFlightPrices AS
+    SELECT s.legID, a1.airportName AS DepartureAirport, a2.airportName AS ArrivalAirport, s.flightDate,
+           s.baseFare, s.totalFare, s.segmentsCabinCode, s.isNonStop
+    FROM Legs s
+    JOIN Airports a1 ON s.startingAirport = a1.iata
+    JOIN Airports a2 ON s.destinationAirport = a2.iata
+    """,
+    """
+    CREATE VIEW vNonStopFlights AS
+    SELECT s.flightDate, s.travelDuration, s.isNonStop, s.baseFare, s.totalFare, s.seatsRemaining,
+           s.segmentsDepartureTimeRaw, s.segmentsArrivalTimeRaw, s.segmentsDurationInSeconds, s.segmentsCabinCode,
+           (s.arrEpoch - s.depEpoch) / 60.0 AS travelMinutes
+    FROM Legs s
+    WHERE s.isNonStop = 1
+    """,
+]
+
+# Body of the AnalyzePriceTrends stored procedure in data_mining.sql
+PRICE_TRENDS_SQL = """
+    SELECT YEARWEEK(s.flightDate) AS YearWeek, s.segmentsCabinCode AS CabinClass,
+           AVG(s.baseFare) AS AvgBaseFare, AVG(s.totalFare) AS AvgTotalFare
+    FROM vFlightPrices s
+    WHERE s.flightDate BETWEEN :start AND :end AND s.isNonStop = 1
+    GROUP BY YEARWEEK(s.flightDate), s.segmentsCabinCode
+    ORDER BY CabinClass, YearWeek
+"""
+
+# ---- MySQL functions ----
+
+def year_week(value):
+    # MySQL YEARWEEK(date) (mode 0): weeks start on Sunday and belong to the year of their Sunday
+    if value is None:
+        return None
+    day = datetime.date.fromisoformat(str(value)[:10])
+    sunday = day - datetime.timedelta(days=day.isoweekday() % 7)
+
+    return sunday.year * 100 + (sunday.timetuple().tm_yday - 1) // 7 + 1
+
+
+# DuckDB macros for the MySQL functions queries use; dayofweek() is 0 on Sundays, like year_week
+DUCKDB_MACROS = [
+    "CREATE OR REPLACE TEMP MACRO RAND() AS random()",
+    "CREATE OR REPLACE TEMP MACRO YEARWEEK(d) AS "
+    "year(CAST(d AS DATE) - CAST(dayofweek(CAST(d AS DATE)) AS INTEGER)) * 100 "
+    "+ (dayofyear(CAST(d AS DATE) - CAST(dayofweek(CAST(d AS DATE)) AS INTEGER)) - 1) // 7 + 1",
+]
+
+
+def install_functions(engine):
+    """
+    Make the MySQL functions used by db.py (YEARWEEK, RAND) available on every new connection.
+    """
+    if engine.dialect.name == 'sqlite':
+        def on_connect(connection, _):
+            connection.create_function('YEARWEEK', 1, year_week, deterministic=True)
+            connection.create_function('RAND', 0, random.random)
+    elif engine.dialect.name == 'duckdb':
+        def on_connect(connection, _):
+            cursor = connection.cursor()
+            for macro in DUCKDB_MACROS:
+                cursor.execute(macro)
+            cursor.close()
+    else:
+        return
+
+    event.listen(engine, 'connect', on_connect)
+
+
+def create_local_engine(backend, path):
+    if backend not in LOCAL_BACKENDS:
+        raise ValueError(f"Unknown local database backend: {backend}")
+
+    if backend == 'sqlite':
+        engine = create_engine(f"sqlite:///{path}")
+    else:
+        # DuckDB locks its file per process; jobs.py runs background jobs on threads for this backend
+        engine = create_engine(f"duckdb:///{path}")
+    install_functions(engine)
+
+    return engine
+
+
+def create_schema(engine):
+    """
+    (Re)create every table and view, empty. Indexes come from create_indexes, once data is loaded.
+    """
+    auto_id = {'sqlite': 'INTEGER PRIMARY KEY', 'duckdb': "INTEGER PRIMARY KEY DEFAULT nextval('users_id_seq')"}
+
+    with engine.begin() as connection:
+        for view in ('vFlightPrices', 'vNonStopFlights'):
+            connection.execute(text(f"DROP VIEW IF EXISTS {view}"))
+        for table in TABLES:
+            connection.execute(text(f"DROP TABLE IF EXISTS {table}"))
+        if engine.dialect.name == 'duckdb':
+            connection.execute(text("CREATE OR REPLACE SEQUENCE users_id_seq START 1"))
+
+        for ddl in TABLES.values():
+            connection.execute(text(ddl.format(id=auto_id[engine.dialect.name])))
+        for ddl in VIEWS:
+            connection.execute(text(ddl))
+
+
+def create_indexes(engine):
+    with engine.begin() as connection:
+        for ddl in INDEXES:
+            connection.execute(text(ddl.replace('CREATE INDEX', 'CREATE INDEX IF NOT EXISTS')))
+
+
+def _insert_or_ignore(table, connection, keys, data_iter):
+    # pandas to_sql method skipping rows whose primary key already exists, like MySQL's INSERT IGNORE
+    connection.execute(table.table.insert().prefix_with('OR IGNORE'), [dict(zip(keys, row)) for row in data_iter])
+
+
+def append_rows(connection, table, df, ignore_duplicates=False):
+    """
+    Append the DataFrame columns that the table has. DuckDB reads the frame directly, which is much
+    faster than inserting it row by row.
+    """
+    table_columns = set(connection.execute(text(f"SELECT * FROM {table} LIMIT 0")).keys())
+    df = df[[col for col in df.columns if col in table_columns]]
+    if df.empty:
+        return
+
+    columns = ', '.join(df.columns)
+    if connection.dialect.name == 'duckdb':
+        raw = connection.connection.driver_connection
+        raw.register('_append_rows', df)
+        or_ignore = 'OR IGNORE ' if ignore_duplicates else ''
+        raw.execute(f"INSERT {or_ignore}INTO {table} ({columns}) SELECT {columns} FROM _append_rows")
+        raw.unregister('_append_rows')
+    else:
+        df.to_sql(table, connection, if_exists='append', index=False, chunksize=10000,
+                  method=_insert_or_ignore if ignore_duplicates else None)
+
+# ---- CSV loaders ----
+# Same files, columns and conversions as the LOAD DATA statements in database.sql
+
+def _dates(values, layouts=('%Y-%m-%d', '%d/%m/%Y')):
+    # STR_TO_DATE with either layout; the result is stored as YYYY-MM-DD text
+    parsed = pd.Series(pd.NaT, index=values.index, dtype='datetime64[ns]')
+    for layout in layouts:
+        parsed = parsed.fillna(pd.to_datetime(values, format=layout, errors='coerce'))
+
+    return parsed.dt.strftime('%Y-%m-%d')
+
+
+def _times(values):
+    # INSERT(@DepTime, 3, 0, ':'): hhmm -> hh:mm:00
+    values = values.astype('string').str.zfill(4)
+
+    return (values.str.slice(0, 2) + ':' + values.str.slice(2, 4) + ':00').where(values.str.fullmatch(r'\d{4}'))
+
+
+def load_airlines(path):
+    df = pd.read_csv(path, header=None, skiprows=3, na_values=['\\N', '-'], keep_default_na=False, dtype=str,
+                     names=['airlineID', 'airlineName', 'alias', 'iata', 'icao', 'callsign', 'country', 'active'])
+    df['airlineName'] = df['airlineName'].replace({'Delta Air Lines': 'Delta', 'Unknown': None})
+    df = df.dropna(subset=['airlineID', 'airlineName']).drop_duplicates('airlineID')
+    df['iata'] = df['iata'].fillna('')
+    df['icao'] = df['icao'].replace('', None)
+
+    return df[['airlineID', 'airlineName', 'iata', 'icao', 'country']].astype({'airlineID': int})
+
+
+def load_airports(path):
+    # Returns (Cities, Airports)
+    df = pd.read_csv(path, header=0, na_values=['\\N'], keep_default_na=False, dtype=str,
+                     names=['airportID', 'airportName', 'cityName', 'country', 'iata', 'icao', 'latitude', 'longitude',
+                            'altitude', 'timezone', 'dst', 'tz', 'type', 'source'])
+    df = df.dropna(subset=['airportID', 'cityName', 'country'])
+
+    cities = df[['cityName', 'country', 'timezone']].drop_duplicates(['cityName', 'country']).reset_index(drop=True)
+    cities['timezone'] = cities['timezone'].fillna('')
+    cities.insert(0, 'cityID', np.arange(1, len(cities) + 1))
+
+    airports = df.merge(cities[['cityID', 'cityName', 'country']], on=['cityName', 'country'])
+    airports = airports.drop_duplicates('airportID')
+    airports['iata'] = airports['iata'].fillna('')
+    airports = airports.astype({'airportID': int, 'latitude': float, 'longitude': float})
+
+    return cities, airports[['airportID', 'airportName', 'cityID', 'iata', 'icao', 'latitude', 'longitude']]
+
+
+def load_routes(path, airport_ids):
+    df = pd.read_csv(path, header=0, na_values=['\\N'], keep_default_na=False, dtype=str,
+                     names=['airlineName', 'airlineID', 'sourceAirport', 'sourceAirportID', 'destinationAirport',
+                            'destinationAirportID', 'codeShare', 'stops', 'equipment'])
+    df = df[['airlineID', 'sourceAirportID', 'destinationAirportID']].dropna().astype(int)
+    df = df[df['sourceAirportID'].isin(airport_ids) & df['destinationAirportID'].isin(airport_ids)]
+
+    return df.drop_duplicates()
+
+
+LEGS_CSV_COLUMNS = [
+    'legID', 'searchDate', 'flightDate', 'startingAirport', 'destinationAirport', 'fareBasisCode', 'travelDuration',
+    'elapsedDays', 'isBasicEconomy', 'isRefundable', 'isNonStop', 'baseFare', 'totalFare', 'seatsRemaining',
+    'totalTravelDistance', 'segmentsDepartureTimeEpochSeconds', 'segmentsDepartureTimeRaw',
+    'segmentsArrivalTimeEpochSeconds', 'segmentsArrivalTimeRaw', 'segmentsArrivalAirportCode',
+    'segmentsDepartureAirportCode', 'segmentsAirlineName', 'segmentsAirlineCode', 'segmentsEquipmentDescription',
+    'segmentsDurationInSeconds', 'segmentsDistance', 'segmentsCabinCode',
+]
+
+
+def transform_legs(chunk):
+    """
+    Legs rows from a chunk of the itineraries CSV, including the materialized depMinute/arrMinute
+    (local wall-clock) and depEpoch/arrEpoch columns.
+    """
+    legs = chunk.copy()
+    legs['flightDate'] = _dates(legs['flightDate'])
+    for col in ['isBasicEconomy', 'isRefundable', 'isNonStop']:
+        legs[col] = (legs[col].astype(str).str.upper() == 'TRUE').astype(int)
+    legs['depMinute'] = minutes_of_day(legs['segmentsDepartureTimeRaw'], 'first', utc=False)
+    legs['arrMinute'] = minutes_of_day(legs['segmentsArrivalTimeRaw'], 'last', utc=False)
+    legs['depEpoch'] = pd.to_numeric(select_segment(legs['segmentsDepartureTimeEpochSeconds'], 'first'), errors='coerce')
+    legs['arrEpoch'] = pd.to_numeric(select_segment(legs['segmentsArrivalTimeEpochSeconds'], 'last'), errors='coerce')
+
+    for col in ['elapsedDays', 'baseFare', 'totalFare', 'seatsRemaining']:
+        legs[col] = pd.to_numeric(legs[col], errors='coerce')
+
+    # IGNORE INTO: only the first row of a legID is kept (see append_rows for duplicates across chunks)
+    return legs.drop_duplicates('legID')
+
+
+DELAYS_NUMERIC_COLUMNS = [
+    'Year', 'Quarter', 'Month', 'DayofMonth', 'DayOfWeek', 'DepDelay', 'DepDelayMinutes', 'TaxiOut', 'TaxiIn',
+    'ArrDelay', 'ArrDelayMinutes', 'Cancelled', 'Diverted', 'ActualElapsedTime', 'AirTime', 'Flights', 'Distance',
+    'CarrierDelay', 'WeatherDelay', 'SecurityDelay', 'LateAircraftDelay',
+]
+
+
+def transform_delays(chunk):
+    chunk = chunk.copy()
+    chunk['FlightDate'] = _dates(chunk['FlightDate'])
+    for col in ['DepTime', 'ArrTime', 'WheelsOff', 'WheelsOn']:
+        if col in chunk:
+            chunk[col] = _times(chunk[col])
+    for col in DELAYS_NUMERIC_COLUMNS:
+        if col in chunk:
+            chunk[col] = pd.to_numeric(chunk[col], errors='coerce')
+
+    return chunk
+
+
+# ---- Fare rollups ----
+
+def _week_start(dates):
+    # Sunday starting each date's week, as YYYY-MM-DD
+    dates = pd.to_datetime(dates)
+
+    return (dates - pd.to_timedelta((dates.dt.dayofweek + 1) % 7, unit='D')).dt.strftime('%Y-%m-%d')
+
+
+ROLLUP_KEY = ['weekStart', 'isNonStop', 'startingAirport', 'destinationAirport', 'cabinClass', 'airlineCode']
+SKETCH_KEY = ['startingAirport', 'destinationAirport', 'cabinClass', 'weekStart', 'bucket']
+ROLLUP_AGGREGATES = {'yearWeek': 'first', 'fareCount': 'sum', 'baseFareSum': 'sum', 'baseFareMin': 'min',
+                     'baseFareMax': 'max', 'totalFareSum': 'sum', 'totalFareMin': 'min', 'totalFareMax': 'max'}
+
+
+def fare_aggregates(legs):
+    """
+    FareWeeklyRollup and FareSketchBuckets rows of a batch of Legs rows. Batches combine with combine_fare_aggregates,
+    so the tables can be built while streaming Legs.
+    """
+    legs = legs.dropna(subset=['startingAirport', 'destinationAirport'])
+    legs = legs.assign(weekStart=_week_start(legs['flightDate']), cabinClass=legs['segmentsCabinCode'],
+                       airlineCode=legs['segmentsAirlineCode'], bucket=bucket_index(legs['totalFare']))
+
+    rollup = legs.groupby(ROLLUP_KEY).agg(
+        fareCount=('totalFare', 'size'), baseFareSum=('baseFare', 'sum'), baseFareMin=('baseFare', 'min'),
+        baseFareMax=('baseFare', 'max'), totalFareSum=('totalFare', 'sum'), totalFareMin=('totalFare', 'min'),
+        totalFareMax=('totalFare', 'max')).reset_index()
+    rollup.insert(1, 'yearWeek', rollup['weekStart'].map(year_week))
+    sketches = legs.groupby(SKETCH_KEY).size().rename('fareCount').reset_index()
+
+    return rollup, sketches
+
+
+def combine_fare_aggregates(first, second):
+    if first is None:
+        return second
+
+    rollup = pd.concat([first[0], second[0]]).groupby(ROLLUP_KEY).agg(ROLLUP_AGGREGATES).reset_index()
+    sketches = pd.concat([first[1], second[1]]).groupby(SKETCH_KEY)['fareCount'].sum().reset_index()
+
+    return rollup, sketches
+
+
+def rebuild_fare_tables(engine, chunksize=500000):
+    """
+    Rebuild FareWeeklyRollup and FareSketchBuckets from Legs, like RebuildFareWeeklyRollup() and RebuildFareSketches().
+    """
+    columns = 'flightDate, isNonStop, startingAirport, destinationAirport, segmentsCabinCode, segmentsAirlineCode, baseFare, totalFare'
+    aggregates = None
+    with engine.connect() as connection:
+        for chunk in pd.read_sql(text(f"SELECT {columns} FROM Legs"), connection, chunksize=chunksize):
+            aggregates = combine_fare_aggregates(aggregates, fare_aggregates(chunk))
+
+    with engine.begin() as connection:
+        connection.execute(text("DELETE FROM FareWeeklyRollup"))
+        connection.execute(text("DELETE FROM FareSketchBuckets"))
+        if aggregates is not None:
+            append_rows(connection, 'FareWeeklyRollup', aggregates[0])
+            append_rows(connection, 'FareSketchBuckets', aggregates[1])
+
+# ---- Loading ----
+
+# CSV dumps of database.sql (found in the MySQL Uploads folder there)
+CSV_FILES = {
+    'airlines': 'airlines.csv',
+    'airplanes': 'Airplanes.csv',
+    'airports': 'airports.csv',
+    'routes': 'routes.csv',
+    'legs': 'Itineraries_small.csv',
+    'delays': 'Flights_2022_2.csv',
+}
+
+
+def load_csv_dumps(engine, data_dir, chunksize=200000, files=CSV_FILES):
+    """
+    Create the schema and load every CSV dump found in data_dir. The large Legs and Delays files
+    are streamed in chunks.
+    """
+    def path(name):
+        found = os.path.join(data_dir, files[name])
+        return found if os.path.exists(found) else None
+
+    create_schema(engine)
+    with engine.begin() as connection:
+        if path('airlines'):
+            append_rows(connection, 'Airline', load_airlines(path('airlines')))
+            print("Loaded Airline")
+
+        airport_ids = []
+        if path('airports'):
+            cities, airports = load_airports(path('airports'))
+            append_rows(connection, 'Cities', cities)
+            append_rows(connection, 'Airports', airports)
+            airport_ids = airports['airportID'].tolist()
+            print("Loaded Cities and Airports")
+
+        if path('routes'):
+            append_rows(connection, 'AirlineRoutes', load_routes(path('routes'), airport_ids))
+            print("Loaded AirlineRoutes")
+
+    for name, table, transform in [('legs', 'Legs', transform_legs), ('delays', 'Delays', transform_delays)]:
+        if not path(name):
+            continue
+        read_options = {'names': LEGS_CSV_COLUMNS, 'header': 0} if name == 'legs' else {}
+        rows = 0
+        for chunk in pd.read_csv(path(name), dtype=str, chunksize=chunksize, **read_options):
+            chunk = transform(chunk)
+            with engine.begin() as connection:
+                append_rows(connection, table, chunk, ignore_duplicates=(table == 'Legs'))
+            rows += len(chunk)
+            print(f"Loaded {rows:,} {table} rows", end='\r')
+        print()
+
+    create_indexes(engine)
+    rebuild_fare_tables(engine)
+    print("Built FareWeeklyRollup and FareSketchBuckets")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--backend', choices=LOCAL_BACKENDS, default=os.getenv('DB_BACKEND', 'sqlite'))
+    parser.add_argument('--path', default=os.getenv('DB_PATH', 'flights.db'))
+    parser.add_argument('--data-dir', help="Folder with the CSV dumps; without it an empty schema is created")
+    parser.add_argument('--chunksize', type=int, default=200000)
+    args = parser.parse_args()
+
+    engine = create_local_engine(args.backend, args.path)
+    if args.data_dir:
+        load_csv_dumps(engine, args.data_dir, args.chunksize)
+    else:
+        create_schema(engine)
+        create_indexes(engine)
+    print(f"{args.backend} database ready at {args.path}")
+
+
+if __name__ == '__main__':
+    main()
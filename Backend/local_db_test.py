@@ -0,0 +1,194 @@
+import importlib.util
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+from sqlalchemy.exc import OperationalError
+import analytics
+import db
+import local_db
+import pagination
+import query_cache
+
+ITINERARIES = """legId,searchDate,flightDate,startingAirport,destinationAirport,fareBasisCode,travelDuration,elapsedDays,isBasicEconomy,isRefundable,isNonStop,baseFare,totalFare,seatsRemaining,totalTravelDistance,segmentsDepartureTimeEpochSeconds,segmentsDepartureTimeRaw,segmentsArrivalTimeEpochSeconds,segmentsArrivalTimeRaw,segmentsArrivalAirportCode,segmentsDepartureAirportCode,segmentsAirlineName,segmentsAirlineCode,segmentsEquipmentDescription,segmentsDurationInSeconds,segmentsDistance,segmentsCabinCode
+a1,2022-04-16,2022-04-17,ATL,LAX,X,PT4H30M,0,False,False,True,200.0,230.5,5,1900,1650200400,2022-04-17T09:00:00.000-04:00,1650216600,2022-04-17T10:30:00.000-07:00,LAX,ATL,Delta,DL,Boeing,16200,1900,coach
+a2,2022-04-16,18/04/2022,ATL,LAX,X,PT5H,0,False,True,True,300.0,340.0,2,1900,1650301200,2022-04-18T13:00:00.000-04:00,1650319200,2022-04-18T15:00:00.000-07:00,LAX,ATL,Delta,DL,Boeing,18000,1900,coach
+a2,2022-04-16,2022-04-18,ATL,LAX,X,PT5H,0,False,True,True,999.0,999.0,2,1900,1650301200,2022-04-18T13:00:00.000-04:00,1650319200,2022-04-18T15:00:00.000-07:00,LAX,ATL,Delta,DL,Boeing,18000,1900,coach
+a3,2022-04-16,2022-04-25,JFK,LAX,X,PT8H,0,True,False,False,150.0,180.0,9,2500,1650888000||1650906000,2022-04-25T08:00:00.000-04:00||2022-04-25T13:00:00.000-04:00,1650900000||1650920000,2022-04-25T11:20:00.000-04:00||2022-04-25T16:53:20.000-07:00,ORD||LAX,JFK||ORD,Delta||Delta,DL||DL,A||B,12000||14000,700||1800,coach||coach
+"""
+
+AIRLINES = """Airline ID,Name,Alias,IATA,ICAO,Callsign,Country,Active
+-1,Unknown,\\N,-,N/A,\\N,\\N,Y
+1,Private flight,\\N,-,N/A,,,Y
+24,American Airlines,\\N,AA,AAL,AMERICAN,United States,Y
+2009,Delta Air Lines,\\N,DL,DAL,DELTA,United States,Y
+"""
+
+AIRPORTS = """Airport ID,Name,City,Country,IATA,ICAO,Latitude,Longitude,Altitude,Timezone,DST,Tz,Type,Source
+3682,Hartsfield Jackson Atlanta International Airport,Atlanta,United States,ATL,KATL,33.6367,-84.428101,1026,-5,A,America/New_York,airport,OurAirports
+3484,Los Angeles International Airport,Los Angeles,United States,LAX,KLAX,33.94250107,-118.4079971,125,-8,A,America/Los_Angeles,airport,OurAirports
+"""
+
+ROUTES = """Airline,Airline ID,Source airport,Source airport ID,Destination airport,Destination airport ID,Codeshare,Stops,Equipment
+AA,24,ATL,3682,LAX,3484,,0,321
+DL,2009,ATL,3682,LAX,3484,,0,757
+"""
+
+DELAYS = """FlightDate,IATA_Code_Operating_Airline,Origin,Dest,DepTime,DepDelayMinutes,ArrTime,ArrDelayMinutes,Cancelled,Diverted
+2022-04-17,DL,ATL,LAX,905,5.00,1035,0.00,0.00,0.00
+2022-04-18,DL,ATL,LAX,,,,,1.00,0.00
+"""
+
+
+class TestLocalDatabase(unittest.TestCase):
+    backend = 'sqlite'
+
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp()
+        for name, content in [('legs', ITINERARIES), ('airlines', AIRLINES), ('airports', AIRPORTS),
+                              ('routes', ROUTES), ('delays', DELAYS)]:
+            with open(os.path.join(self.data_dir, local_db.CSV_FILES[name]), 'w') as f:
+                f.write(content)
+
+        self.engine = local_db.create_local_engine(self.backend, os.path.join(self.data_dir, f'flights.{self.backend}'))
+        with patch('builtins.print'):
+            local_db.load_csv_dumps(self.engine, self.data_dir)
+        patcher = patch.object(db, 'engine', self.engine)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.engine.dispose()
+        shutil.rmtree(self.data_dir)
+
+    def test_routes_and_countries(self):
+        routes = db.query_routes('ATL', 'LAX')
+        self.assertEqual(sorted(routes['airlineName']), ['American Airlines', 'Delta'])
+        self.assertEqual(len(db.query_by_country('United States')), 2)
+
+    def test_duplicate_legs_are_ignored(self):
+        with patch('builtins.print'):
+            flights = db.query_flight_details('ATL', 'LAX', 'Delta', 1, {})
+        self.assertEqual([flight['legID'] for flight in flights], ['a1', 'a2'])
+        # The first a2 row wins, as with LOAD DATA IGNORE; its date was in the DD/MM/YYYY layout
+        self.assertEqual(flights[1]['totalFare'], 340.0)
+        self.assertEqual(str(flights[1]['flightDate']), '2022-04-18')
+
+    def test_flight_details_keyset_pages(self):
+        first = db.query_flight_details('ATL', 'LAX', 'Delta', 1, {}, limit=2)
+        page, cursor = pagination.split_page(first, 1, db.FLIGHT_DETAILS_PAGE_KEY)
+        after = pagination.decode_cursor(cursor, len(db.FLIGHT_DETAILS_PAGE_KEY))
+        rest = db.query_flight_details('ATL', 'LAX', 'Delta', 1, {}, after=after, limit=2)
+
+        self.assertEqual([flight['legID'] for flight in page + rest], ['a1', 'a2'])
+        self.assertEqual(after[0], '2022-04-17')
+
+    def test_airline_route_pages(self):
+        first = db.query_airline_routes('Delta', limit=1)
+        after = first[list(db.AIRLINE_ROUTES_PAGE_KEY)].iloc[-1].tolist()
+
+        self.assertEqual(first['sourceIATA'].tolist(), ['ATL'])
+        self.assertTrue(db.query_airline_routes('Delta', after=after, limit=1).empty)
+
+    def test_country_route_pages_are_distinct(self):
+        first = db.query_by_country('United States', limit=5)
+        after = first[list(db.COUNTRY_ROUTES_PAGE_KEY)].iloc[-1].tolist()
+
+        self.assertEqual(first[['sourceIATA', 'destinationIATA']].values.tolist(), [['ATL', 'LAX']])
+        self.assertTrue(db.query_by_country('United States', after=after, limit=5).empty)
+
+    def test_flight_details_fields_keep_page_key(self):
+        flights = db.query_flight_details('ATL', 'LAX', 'Delta', 1, {}, fields=['totalFare'])
+
+        self.assertEqual(list(flights[0]), ['legID', 'flightDate', 'totalFare', 'segmentsDepartureTimeRaw'])
+
+    def test_flight_details_stream_in_chunks(self):
+        chunks = list(db.iter_flight_details('ATL', 'LAX', 'Delta', 1, {}, fields=['totalFare'], chunksize=1))
+
+        self.assertEqual([[flight['legID'] for flight in chunk] for chunk in chunks], [['a1'], ['a2']])
+        self.assertEqual(list(db.iter_flight_details('ATL', 'LAX', 'Nobody', 1, {})), [])
+
+    def test_flight_details_filter_on_departure_minute(self):
+        with patch('builtins.print'):
+            flights = db.query_flight_details('ATL', 'LAX', 'Delta', 1, {'preferredDepartureTime': 9 * 3600})
+        self.assertEqual([flight['legID'] for flight in flights], ['a1'])
+
+    def test_price_trends_match_rollup(self):
+        stored = db.get_analyze_price_trends('2022-04-01', '2022-04-30')
+        self.assertEqual(stored, [{'month': 202216, 'avgBaseFare': 250.0, 'avgTotalFare': 285.25, 'cabinClass': 'coach'}])
+
+        # 2022-04-17 to 2022-04-23 is a whole week, so it is read from FareWeeklyRollup
+        rolled_up = analytics.analyze_price_trends({'start_date': '2022-04-17', 'end_date': '2022-04-23'})
+        self.assertEqual([(row['month'], row['avgTotalFare'], row['flights']) for row in rolled_up],
+                         [(202216, 285.25, 2)])
+
+    def test_fare_sketch_buckets(self):
+        distribution = analytics.fare_distribution({'origin': 'ATL', 'destination': 'LAX', 'start_date': '2022-04-01',
+                                                    'end_date': '2022-04-30', 'fare': '300'})
+        self.assertEqual(distribution['count'], 2)
+        self.assertAlmostEqual(distribution['fareRank'], 0.5)
+        with self.assertRaises(ValueError):
+            analytics.fare_distribution({'origin': 'ATL', 'destination': 'LAX', 'bin_width': '0.00001'})
+
+    def test_create_user_returns_id(self):
+        user = {'fullName': 'A', 'phoneNumber': '1', 'addressFirstLine': 'x', 'addressLastLine': None,
+                'addressPostcode': '1', 'billingFirstLine': 'x', 'billingLastLine': None, 'billingPostcode': '1',
+                'birthDate': '1990-01-01', 'gender': 'F', 'email': 'a@b.co'}
+        first = db.create_user(user)
+        second = db.create_user(dict(user, phoneNumber='2', email='c@d.co'))
+        self.assertEqual(second, first + 1)
+        self.assertTrue(db.add_itinerary_to_db({'userID': first, 'legID': 'a1'}))
+
+    def test_preference_times_are_seconds(self):
+        db.add_preferences_to_db({'userID': 1, 'preferredFlyingClass': 'coach', 'preferredLayoverTime': None,
+                                  'preferredDepartureTime': '09:30:00', 'preferredArrivalTime': None,
+                                  'preferredDuration': None, 'preferLowEmission': None,
+                                  'preferredGroundTransportation': None, 'preferredHotelChain': None})
+        preferences = db.get_user_preferences(1)
+        self.assertEqual(preferences[0]['preferredDepartureTime'], 9.5 * 3600)
+        self.assertIsNone(preferences[0]['preferredArrivalTime'])
+
+    def test_cached_preferences_follow_writes(self):
+        prefs = {'userID': 1, 'preferredFlyingClass': 'coach', 'preferredLayoverTime': None,
+                 'preferredDepartureTime': None, 'preferredArrivalTime': None, 'preferredDuration': None,
+                 'preferLowEmission': None, 'preferredGroundTransportation': None, 'preferredHotelChain': None}
+        self.addCleanup(query_cache.clear)
+        with patch.object(query_cache, 'QUERY_CACHE_ENABLED', True):
+            query_cache.clear()
+            self.assertEqual(db.get_user_preferences(1), [])
+            self.assertIs(db.get_user_preferences(1), db.get_user_preferences(1))
+            db.add_preferences_to_db(dict(prefs))
+            self.assertEqual(len(db.get_user_preferences(1)), 1)
+            flights = db.query_flight_details('ATL', 'LAX', 'Delta', 1, {}, limit=2)
+            self.assertIs(db.query_flight_details('ATL', 'LAX', 'Delta', is_non_stop=1, preferences={}, limit=2),
+                          flights)
+
+            # /analyze_price_trends reads the rollup, which is cached like the stored procedure it replaced
+            trends = analytics.analyze_price_trends({'start_date': '2022-04-17', 'end_date': '2022-04-23'})
+            self.assertIs(db.get_fare_rollup('2022-04-17', '2022-04-23'), trends)
+
+    def test_failed_flight_queries_are_not_cached(self):
+        self.addCleanup(query_cache.clear)
+        with patch.object(query_cache, 'QUERY_CACHE_ENABLED', True):
+            query_cache.clear()
+            with patch.object(db, 'flight_details_statement', side_effect=OperationalError('SELECT', {}, None)), \
+                    patch('builtins.print'):
+                self.assertIsNone(db.query_flight_details('ATL', 'LAX', 'Delta', 1, {}))
+
+            self.assertEqual(len(db.query_flight_details('ATL', 'LAX', 'Delta', 1, {})), 2)
+
+    def test_delay_times_are_converted(self):
+        # HHMM becomes a time; the cancelled flight has no times and is left out
+        delays = db.get_flight_delay_data()
+        self.assertEqual(len(delays), 1)
+        self.assertEqual(str(delays['DepTime'][0]), '09:05:00')
+
+
+@unittest.skipUnless(importlib.util.find_spec('duckdb_engine'), "duckdb-engine is not installed")
+class TestLocalDuckDB(TestLocalDatabase):
+    backend = 'duckdb'
+
+
+if __name__ == '__main__':
+    unittest.main()
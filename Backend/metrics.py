@@ -0,0 +1,281 @@
+import json
+import logging
+import os
+import re
+import threading
+import time
+from flask import Response, g, request
+from sqlalchemy import event
+import serialization
+
+# Statements slower than SLOW_QUERY_MS milliseconds are written to SLOW_QUERY_LOG, one JSON object per line
+# (an empty SLOW_QUERY_LOG writes them to stderr instead)
+SLOW_QUERY_MS = float(os.getenv('SLOW_QUERY_MS', '200'))
+SLOW_QUERY_LOG = os.getenv('SLOW_QUERY_LOG', 'slow_queries.log')
+# Longest statement text kept in the slow-query log
+SLOW_QUERY_MAX_LENGTH = 2000
+
+# Histogram upper bounds in seconds
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Request time is split into SQL statements (db), JSON encoding (serialize) and everything else (app:
+# pandas, models and Python)
+REQUEST_PHASES = ('db', 'serialize', 'app')
+
+# Per-thread timings of the request (or background job) being handled, filled by the SQLAlchemy events
+_current = threading.local()
+
+
+class Histogram:
+    """
+    Prometheus histogram with a fixed label set: cumulative bucket counts, sum and count per label values.
+    """
+
+    def __init__(self, name, documentation, labels, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels[label]) for label in self.labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {'buckets': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series['buckets'][i] += 1
+            series['sum'] += value
+            series['count'] += 1
+
+    def series(self):
+        with self._lock:
+            return {key: {'buckets': list(series['buckets']), 'sum': series['sum'], 'count': series['count']}
+                    for key, series in self._series.items()}
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+    def expose(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for key, series in sorted(self.series().items()):
+            labels = list(zip(self.labels, key))
+            for bound, count in zip(self.buckets, series['buckets']):
+                lines.append(f"{self.name}_bucket{_labels(labels + [('le', _number(bound))])} {count}")
+            lines.append(f"{self.name}_bucket{_labels(labels + [('le', '+Inf')])} {series['count']}")
+            lines.append(f"{self.name}_sum{_labels(labels)} {_number(series['sum'])}")
+            lines.append(f"{self.name}_count{_labels(labels)} {series['count']}")
+
+        return lines
+
+
+class Counter:
+    def __init__(self, name, documentation, labels):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels[label]) for label in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(tuple(str(labels[label]) for label in self.labels), 0)
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+    def expose(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = sorted(self._values.items())
+        for key, value in values:
+            lines.append(f"{self.name}_total{_labels(list(zip(self.labels, key)))} {_number(value)}")
+
+        return lines
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(pairs):
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}' if pairs else ''
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+REQUEST_SECONDS = Histogram('flights_request_duration_seconds', "Flask request latency",
+                            ['endpoint', 'method', 'status'])
+REQUEST_PHASE_SECONDS = Histogram('flights_request_phase_seconds',
+                                  "Request time spent in SQL (db), JSON encoding (serialize) and the rest (app)",
+                                  ['endpoint', 'phase'])
+QUERY_SECONDS = Histogram('flights_db_query_seconds', "SQL statement execution time", ['endpoint', 'operation'])
+SLOW_QUERIES = Counter('flights_db_slow_queries', "SQL statements slower than SLOW_QUERY_MS", ['endpoint', 'operation'])
+QUERY_CACHE_LOOKUPS = Counter('flights_query_cache_lookups',
+                              "db.py result cache lookups by function and outcome (hit, disk_hit, miss)",
+                              ['function', 'outcome'])
+QUERY_CACHE_EVICTIONS = Counter('flights_query_cache_evictions',
+                                "Results dropped to keep the query result cache within QUERY_CACHE_MB", ['function'])
+METRICS = [REQUEST_SECONDS, REQUEST_PHASE_SECONDS, QUERY_SECONDS, SLOW_QUERIES, QUERY_CACHE_LOOKUPS,
+           QUERY_CACHE_EVICTIONS]
+
+
+def reset():
+    for metric in METRICS:
+        metric.clear()
+
+
+def expose():
+    # Every metric in the Prometheus text exposition format
+    return '\n'.join(line for metric in METRICS for line in metric.expose()) + '\n'
+
+# ---- Request timing ----
+
+def current_endpoint():
+    # Route pattern of the request being handled (bounded label values); statements outside requests,
+    # such as background jobs, are labelled background
+    return getattr(_current, 'endpoint', None) or 'background'
+
+
+def _add_time(phase, seconds):
+    timings = getattr(_current, 'timings', None)
+    if timings is not None:
+        timings[phase] = timings.get(phase, 0.0) + seconds
+
+
+def start_timing(endpoint):
+    # Collect phase timings on this thread until stop_timing
+    _current.endpoint = endpoint
+    _current.timings = {}
+
+
+def stop_timing():
+    timings = getattr(_current, 'timings', None) or {}
+    _current.endpoint = None
+    _current.timings = None
+
+    return timings
+
+
+def _before_request():
+    g.metrics_started = time.perf_counter()
+    start_timing(request.url_rule.rule if request.url_rule else 'unmatched')
+
+
+def _after_request(response):
+    started = g.pop('metrics_started', None)
+    if started is None:
+        return response
+
+    endpoint = current_endpoint()
+    total = time.perf_counter() - started
+    timings = stop_timing()
+    timings['app'] = max(total - timings.get('db', 0.0) - timings.get('serialize', 0.0), 0.0)
+
+    REQUEST_SECONDS.observe(total, endpoint=endpoint, method=request.method, status=response.status_code)
+    for phase in REQUEST_PHASES:
+        REQUEST_PHASE_SECONDS.observe(timings.get(phase, 0.0), endpoint=endpoint, phase=phase)
+    # Same split for browser dev tools and curl -v
+    response.headers['Server-Timing'] = ', '.join(
+        f"{phase};dur={timings.get(phase, 0.0) * 1000:.1f}" for phase in REQUEST_PHASES) + f", total;dur={total * 1000:.1f}"
+
+    return response
+
+
+class TimedJSONProvider(serialization.FastJSONProvider):
+    # jsonify through this provider counts its encoding time as the request's serialize phase
+    def dumps(self, obj, **kwargs):
+        started = time.perf_counter()
+        try:
+            return super().dumps(obj, **kwargs)
+        finally:
+            _add_time('serialize', time.perf_counter() - started)
+
+# ---- SQL timing ----
+
+_slow_query_logger = None
+
+
+def slow_query_logger():
+    global _slow_query_logger
+
+    if _slow_query_logger is None:
+        logger = logging.getLogger('flights.slow_queries')
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+        handler = logging.FileHandler(SLOW_QUERY_LOG) if SLOW_QUERY_LOG else logging.StreamHandler()
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        logger.addHandler(handler)
+        _slow_query_logger = logger
+
+    return _slow_query_logger
+
+
+def _operation(statement):
+    match = re.match(r'\s*(\w+)', statement)
+
+    return match.group(1).upper() if match else 'UNKNOWN'
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('metrics_query_started', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get('metrics_query_started')
+    if not started:
+        return
+    seconds = time.perf_counter() - started.pop()
+
+    endpoint, operation = current_endpoint(), _operation(statement)
+    QUERY_SECONDS.observe(seconds, endpoint=endpoint, operation=operation)
+    _add_time('db', seconds)
+
+    if seconds * 1000 >= SLOW_QUERY_MS:
+        SLOW_QUERIES.inc(endpoint=endpoint, operation=operation)
+        # Parameter names only; values can hold personal data (create_user)
+        names = sorted(parameters) if isinstance(parameters, dict) else None
+        slow_query_logger().info(json.dumps({
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'duration_ms': round(seconds * 1000, 2),
+            'endpoint': endpoint,
+            'operation': operation,
+            'statement': ' '.join(statement.split())[:SLOW_QUERY_MAX_LENGTH],
+            'parameters': names,
+            'rowcount': getattr(cursor, 'rowcount', None),
+            'executemany': executemany,
+        }))
+
+
+def instrument_engine(engine):
+    if not event.contains(engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+
+
+def init_app(app, engine):
+    """
+    Time every request of app and every statement run on engine, and serve the metrics on /metrics.
+    """
+    app.json_provider_class = TimedJSONProvider
+    app.json = TimedJSONProvider(app)
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    instrument_engine(engine)
+
+    @app.route('/metrics')
+    def prometheus_metrics():
+        return Response(expose(), content_type=PROMETHEUS_CONTENT_TYPE)
@@ -0,0 +1,112 @@
+import json
+import logging
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+from flask import Flask, jsonify
+from sqlalchemy import create_engine, text
+import metrics
+
+
+class TestHistogram(unittest.TestCase):
+    def test_buckets_are_cumulative(self):
+        histogram = metrics.Histogram('latency_seconds', "Latency", ['endpoint'], buckets=(0.1, 1.0))
+        for value in (0.05, 0.5, 5.0):
+            histogram.observe(value, endpoint='/a')
+
+        lines = histogram.expose()
+        self.assertIn('latency_seconds_bucket{endpoint="/a",le="0.1"} 1', lines)
+        self.assertIn('latency_seconds_bucket{endpoint="/a",le="1.0"} 2', lines)
+        self.assertIn('latency_seconds_bucket{endpoint="/a",le="+Inf"} 3', lines)
+        self.assertIn('latency_seconds_count{endpoint="/a"} 3', lines)
+        self.assertIn('# TYPE latency_seconds histogram', lines)
+
+    def test_label_values_are_escaped(self):
+        counter = metrics.Counter('queries', "Queries", ['statement'])
+        counter.inc(statement='say "hi"\n')
+
+        self.assertEqual(counter.expose()[-1], 'queries_total{statement="say \\"hi\\"\\n"} 1')
+
+
+class TestRequestMetrics(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.log_path = os.path.join(self.directory.name, 'slow.log')
+        patches = [
+            patch.object(metrics, 'SLOW_QUERY_LOG', self.log_path),
+            patch.object(metrics, '_slow_query_logger', None),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+        metrics.reset()
+
+        self.engine = create_engine('sqlite://')
+        app = Flask(__name__)
+        metrics.init_app(app, self.engine)
+
+        @app.route('/legs/<leg>')
+        def leg(leg):
+            with self.engine.connect() as connection:
+                value = connection.execute(text("SELECT :leg AS legID"), {'leg': leg}).scalar()
+            return jsonify({'legID': value})
+
+        self.client = app.test_client()
+
+    def tearDown(self):
+        logger = logging.getLogger('flights.slow_queries')
+        for handler in list(logger.handlers):
+            handler.close()
+            logger.removeHandler(handler)
+        self.directory.cleanup()
+
+    def test_records_latency_per_route_and_status(self):
+        response = self.client.get('/legs/a1')
+        self.client.get('/missing')
+
+        self.assertEqual(response.get_json(), {'legID': 'a1'})
+        self.assertIn('db;dur=', response.headers['Server-Timing'])
+        series = metrics.REQUEST_SECONDS.series()
+        self.assertEqual(series[('/legs/<leg>', 'GET', '200')]['count'], 1)
+        self.assertEqual(series[('unmatched', 'GET', '404')]['count'], 1)
+
+    def test_splits_db_serialize_and_app_time(self):
+        self.client.get('/legs/a1')
+
+        phases = metrics.REQUEST_PHASE_SECONDS.series()
+        for phase in metrics.REQUEST_PHASES:
+            self.assertEqual(phases[('/legs/<leg>', phase)]['count'], 1)
+        self.assertGreater(phases[('/legs/<leg>', 'db')]['sum'], 0)
+        self.assertGreater(phases[('/legs/<leg>', 'serialize')]['sum'], 0)
+        self.assertEqual(metrics.QUERY_SECONDS.series()[('/legs/<leg>', 'SELECT')]['count'], 1)
+
+    def test_logs_slow_queries_without_parameter_values(self):
+        with patch.object(metrics, 'SLOW_QUERY_MS', 0):
+            self.client.get('/legs/secret-leg')
+
+        with open(self.log_path) as f:
+            entry = json.loads(f.readline())
+        self.assertEqual(entry['endpoint'], '/legs/<leg>')
+        self.assertEqual(entry['statement'], 'SELECT ? AS legID')
+        self.assertNotIn('secret-leg', json.dumps(entry))
+        self.assertEqual(metrics.SLOW_QUERIES.value(endpoint='/legs/<leg>', operation='SELECT'), 1)
+
+    def test_fast_queries_are_not_logged(self):
+        self.client.get('/legs/a1')
+
+        self.assertFalse(os.path.exists(self.log_path))
+
+    def test_metrics_endpoint(self):
+        self.client.get('/legs/a1')
+        response = self.client.get('/metrics')
+
+        self.assertEqual(response.content_type, metrics.PROMETHEUS_CONTENT_TYPE)
+        body = response.get_data(as_text=True)
+        self.assertIn('flights_request_duration_seconds_count{endpoint="/legs/<leg>",method="GET",status="200"} 1',
+                      body)
+        self.assertIn('flights_db_query_seconds_bucket{endpoint="/legs/<leg>",operation="SELECT",le="+Inf"} 1', body)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+import base64
+import binascii
+import json
+import numpy as np
+
+# Rows per page when a client pages without giving a limit, and the most it may ask for
+DEFAULT_PAGE_SIZE = 200
+MAX_PAGE_SIZE = 2000
+
+# Response header holding the cursor of the next page; absent on the last page
+NEXT_CURSOR_HEADER = 'X-Next-Cursor'
+
+# Keyset pagination: rows are ordered by a unique key, and a page starts after the key of the previous
+# page's last row. The cursor is that key, JSON in URL-safe base64, so it is opaque to clients but needs no
+# server-side state, and deep pages cost the same as the first (no OFFSET scan).
+
+
+def encode_cursor(values):
+    data = json.dumps(list(values), default=str, separators=(',', ':')).encode()
+
+    return base64.urlsafe_b64encode(data).decode().rstrip('=')
+
+
+def decode_cursor(cursor, size):
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except (ValueError, binascii.Error):
+        raise ValueError("Invalid cursor")
+
+    if not isinstance(values, list) or len(values) != size:
+        raise ValueError("Invalid cursor")
+
+    return values
+
+
+def page_request(args, key_size):
+    """
+    The (limit, after) asked for by the limit and cursor query parameters; (None, None) when neither is
+    given, which asks for the whole result as before.
+    """
+    limit, cursor = args.get('limit'), args.get('cursor')
+    if limit is None and cursor is None:
+        return None, None
+
+    try:
+        limit = DEFAULT_PAGE_SIZE if limit is None else int(limit)
+    except ValueError:
+        raise ValueError("limit must be an integer")
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise ValueError(f"limit must be between 1 and {MAX_PAGE_SIZE}")
+
+    return limit, decode_cursor(cursor, key_size) if cursor else None
+
+
+def keyset_condition(columns, prefix='after'):
+    # (k1 > :after_0) OR (k1 = :after_0 AND k2 > :after_1) OR ...; spelled out rather than as a row-value
+    # comparison, which older MySQL versions don't use indexes for
+    clauses = []
+    for i, column in enumerate(columns):
+        terms = [f"{columns[j]} = :{prefix}_{j}" for j in range(i)] + [f"{column} > :{prefix}_{i}"]
+        clauses.append('(' + ' AND '.join(terms) + ')')
+
+    return '(' + ' OR '.join(clauses) + ')'
+
+
+def keyset_params(after, prefix='after'):
+    return {f"{prefix}_{i}": value for i, value in enumerate(after)}
+
+
+def page_frame(df, key_columns, after=None, limit=None):
+    """
+    Keyset page of an in-memory result (the route index): distinct rows in key order after the given key.
+    """
+    df = df.drop_duplicates().sort_values(list(key_columns), kind='stable')
+
+    if after is not None:
+        later = np.zeros(len(df), dtype=bool)
+        equal = np.ones(len(df), dtype=bool)
+        for column, value in zip(key_columns, after):
+            values = df[column].to_numpy()
+            later |= equal & (values > value)
+            equal &= values == value
+        df = df[later]
+
+    return df if limit is None else df.head(limit)
+
+
+def split_page(rows, limit, key_columns):
+    """
+    Trim rows (records or a DataFrame) fetched with limit + 1 to the page, and return it with the next
+    page's cursor (None on the last page).
+    """
+    if limit is None or len(rows) <= limit:
+        return rows, None
+
+    page = rows[:limit]
+    last = page.iloc[-1] if hasattr(page, 'iloc') else page[-1]
+
+    return page, encode_cursor(last[column] for column in key_columns)
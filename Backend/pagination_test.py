@@ -0,0 +1,64 @@
+import datetime
+import unittest
+import pandas as pd
+import pagination
+
+
+class TestCursor(unittest.TestCase):
+    def test_round_trip(self):
+        cursor = pagination.encode_cursor([datetime.date(2022, 4, 17), '2022-04-17T09:00:00.000-04:00', 'a1'])
+
+        self.assertNotIn('=', cursor)
+        self.assertEqual(pagination.decode_cursor(cursor, 3), ['2022-04-17', '2022-04-17T09:00:00.000-04:00', 'a1'])
+
+    def test_rejects_tampered_cursors(self):
+        for cursor in ('not base64!', pagination.encode_cursor(['a']), 'e30'):
+            with self.assertRaises(ValueError):
+                pagination.decode_cursor(cursor, 2)
+
+
+class TestPageRequest(unittest.TestCase):
+    def test_no_parameters_means_whole_result(self):
+        self.assertEqual(pagination.page_request({}, 2), (None, None))
+
+    def test_limit_and_cursor(self):
+        cursor = pagination.encode_cursor(['ATL', 'LAX'])
+
+        self.assertEqual(pagination.page_request({'limit': '50', 'cursor': cursor}, 2), (50, ['ATL', 'LAX']))
+        self.assertEqual(pagination.page_request({'cursor': cursor}, 2),
+                         (pagination.DEFAULT_PAGE_SIZE, ['ATL', 'LAX']))
+
+    def test_invalid_limits(self):
+        for limit in ('0', 'ten', str(pagination.MAX_PAGE_SIZE + 1)):
+            with self.assertRaises(ValueError):
+                pagination.page_request({'limit': limit}, 2)
+
+
+class TestKeyset(unittest.TestCase):
+    def test_condition(self):
+        self.assertEqual(pagination.keyset_condition(['a', 'b']), "((a > :after_0) OR (a = :after_0 AND b > :after_1))")
+        self.assertEqual(pagination.keyset_params(['x', 'y']), {'after_0': 'x', 'after_1': 'y'})
+
+    def test_frame_pages_cover_every_distinct_row_once(self):
+        df = pd.DataFrame({'sourceIATA': ['LAX', 'ATL', 'ATL', 'ATL', 'JFK'],
+                           'destinationIATA': ['JFK', 'LAX', 'JFK', 'LAX', 'ATL']})
+        key = ['sourceIATA', 'destinationIATA']
+
+        seen, after = [], None
+        while True:
+            rows = pagination.page_frame(df, key, after, 3).to_dict(orient='records')
+            page, cursor = pagination.split_page(rows, 2, key)
+            seen += [(row['sourceIATA'], row['destinationIATA']) for row in page]
+            if cursor is None:
+                break
+            after = pagination.decode_cursor(cursor, 2)
+
+        self.assertEqual(seen, [('ATL', 'JFK'), ('ATL', 'LAX'), ('JFK', 'ATL'), ('LAX', 'JFK')])
+
+    def test_last_page_has_no_cursor(self):
+        self.assertEqual(pagination.split_page([{'id': 1}], 1, ['id']), ([{'id': 1}], None))
+        self.assertEqual(pagination.split_page([{'id': 1}], None, ['id']), ([{'id': 1}], None))
+
+
+if __name__ == '__main__':
+    unittest.main()
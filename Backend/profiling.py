@@ -0,0 +1,211 @@
+import cProfile
+import json
+import os
+import re
+import secrets
+import sys
+import threading
+import time
+from flask import g, jsonify, request, send_file
+
+# Requests sent with an X-Profile: 1 header or a _profile=1 query parameter are profiled when PROFILING=1;
+# otherwise no hooks are installed at all
+PROFILING_ENABLED = os.getenv('PROFILING', '0') == '1'
+# Profiles are written to PROFILES_DIR, which keeps the newest PROFILES_KEEP of them
+PROFILES_DIR = os.getenv('PROFILES_DIR', 'profiles')
+PROFILES_KEEP = int(os.getenv('PROFILES_KEEP', '50'))
+# How often the request thread's stack is sampled for the collapsed-stack output
+PROFILE_SAMPLE_MS = float(os.getenv('PROFILE_SAMPLE_MS', '5'))
+
+PROFILE_ID_PATTERN = re.compile(r'^[0-9a-f]{20}$')
+# Files written per profile: pstats for snakeviz/pstats, collapsed stacks for flamegraph.pl or speedscope
+PROFILE_FILES = {'pstats': 'prof', 'collapsed': 'collapsed'}
+
+# Only one cProfile profiler can be active in the interpreter, so concurrent requests asking for a profile
+# are served unprofiled
+_active = threading.Lock()
+
+
+class StackSampler:
+    """
+    Samples the call stack of one thread from a background thread and counts identical stacks, which is
+    the collapsed-stack format flame graphs are drawn from.
+    """
+
+    def __init__(self, thread_id, interval=PROFILE_SAMPLE_MS / 1000):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='profile-sampler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    @property
+    def samples(self):
+        return sum(self.stacks.values())
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            key = ';'.join(reversed(stack))
+            self.stacks[key] = self.stacks.get(key, 0) + 1
+
+    def collapsed(self):
+        # Root frame first, one 'frame;frame;frame count' line per distinct stack
+        return ''.join(f"{stack} {count}\n" for stack, count in sorted(self.stacks.items()))
+
+
+def _requested():
+    flag = request.headers.get('X-Profile') or request.args.get('_profile')
+
+    return flag is not None and flag.lower() in ('1', 'true', 'yes')
+
+
+def _path(profile, kind, directory=None):
+    return os.path.join(directory or PROFILES_DIR, f"{profile}.{kind}")
+
+
+def _before_request():
+    if not _requested() or not _active.acquire(blocking=False):
+        return
+
+    sampler = StackSampler(threading.get_ident())
+    profiler = cProfile.Profile()
+    g.profile = {'started': time.perf_counter(), 'profiler': profiler, 'sampler': sampler}
+    sampler.start()
+    profiler.enable()
+
+
+def _stop(status):
+    state = g.pop('profile', None)
+    if state is None:
+        return None
+
+    try:
+        state['profiler'].disable()
+        state['sampler'].stop()
+        duration = time.perf_counter() - state['started']
+
+        return save_profile(state['profiler'], state['sampler'], {
+            'endpoint': request.url_rule.rule if request.url_rule else 'unmatched',
+            'method': request.method,
+            'path': request.path,
+            'status': status,
+            'duration_ms': round(duration * 1000, 2),
+        })
+    finally:
+        _active.release()
+
+
+def _after_request(response):
+    profile = _stop(response.status_code)
+    if profile is not None:
+        response.headers['X-Profile-Id'] = profile
+    elif _requested():
+        response.headers['X-Profile-Id'] = 'busy'
+
+    return response
+
+
+def _teardown_request(error):
+    # after_request is skipped when the response could not be built; never leave the profiler running
+    if 'profile' in g:
+        _stop(500)
+
+
+def save_profile(profiler, sampler, details, directory=None):
+    """
+    Write the pstats file, the collapsed stacks and a JSON summary of one profiled request, and return the
+    profile id.
+    """
+    directory = directory or PROFILES_DIR
+    os.makedirs(directory, exist_ok=True)
+    profile = secrets.token_hex(10)
+
+    profiler.dump_stats(_path(profile, PROFILE_FILES['pstats'], directory))
+    with open(_path(profile, PROFILE_FILES['collapsed'], directory), 'w') as f:
+        f.write(sampler.collapsed())
+    summary = dict(details, id=profile, created=time.time(), samples=sampler.samples)
+    with open(_path(profile, 'json', directory), 'w') as f:
+        json.dump(summary, f)
+
+    prune_profiles(directory)
+
+    return profile
+
+
+def list_profiles(directory=None):
+    # Summaries of the stored profiles, newest first
+    directory = directory or PROFILES_DIR
+    summaries = []
+    if not os.path.isdir(directory):
+        return summaries
+
+    for name in os.listdir(directory):
+        if not name.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(directory, name)) as f:
+                summaries.append(json.load(f))
+        except (OSError, json.JSONDecodeError):
+            continue
+
+    return sorted(summaries, key=lambda summary: summary.get('created', 0), reverse=True)
+
+
+def prune_profiles(directory=None, keep=None):
+    keep = PROFILES_KEEP if keep is None else keep
+    directory = directory or PROFILES_DIR
+
+    for summary in list_profiles(directory)[keep:]:
+        for kind in list(PROFILE_FILES.values()) + ['json']:
+            try:
+                os.remove(_path(summary['id'], kind, directory))
+            except FileNotFoundError:
+                pass
+
+
+def init_app(app):
+    """
+    Profile requests that ask for it and list the stored profiles on /profiles, when PROFILING=1.
+    """
+    if not PROFILING_ENABLED:
+        return
+
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
+
+    @app.route('/profiles')
+    def profiles():
+        limit = request.args.get('limit', 20, type=int)
+        summaries = list_profiles()[:limit]
+        for summary in summaries:
+            summary['files'] = {kind: f"/profiles/{summary['id']}/{kind}" for kind in PROFILE_FILES}
+
+        return jsonify(summaries)
+
+    @app.route('/profiles/<profile_id>/<kind>')
+    def profile_file(profile_id, kind):
+        if not PROFILE_ID_PATTERN.match(profile_id) or kind not in PROFILE_FILES:
+            return jsonify({'error': 'Unknown profile'}), 404
+
+        path = os.path.abspath(_path(profile_id, PROFILE_FILES[kind]))
+        if not os.path.exists(path):
+            return jsonify({'error': 'Unknown or pruned profile'}), 404
+
+        return send_file(path, mimetype='text/plain' if kind == 'collapsed' else 'application/octet-stream',
+                         as_attachment=kind == 'pstats')
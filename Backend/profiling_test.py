@@ -0,0 +1,106 @@
+import os
+import pstats
+import shutil
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+from flask import Flask, jsonify
+import profiling
+
+
+def busy(seconds):
+    deadline = time.perf_counter() + seconds
+    total = 0
+    while time.perf_counter() < deadline:
+        total += sum(range(100))
+
+    return total
+
+
+class TestProfiling(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        patches = [patch.object(profiling, 'PROFILES_DIR', self.directory),
+                   patch.object(profiling, 'PROFILING_ENABLED', True)]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+
+        app = Flask(__name__)
+        profiling.init_app(app)
+
+        @app.route('/work/<int:n>')
+        def work(n):
+            return jsonify({'total': busy(0.05)})
+
+        @app.route('/fail')
+        def fail():
+            raise RuntimeError('boom')
+
+        self.client = app.test_client()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_unprofiled_requests_write_nothing(self):
+        response = self.client.get('/work/1')
+
+        self.assertNotIn('X-Profile-Id', response.headers)
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def test_header_writes_pstats_and_collapsed_stacks(self):
+        response = self.client.get('/work/1', headers={'X-Profile': '1'})
+        profile = response.headers['X-Profile-Id']
+
+        stats = pstats.Stats(os.path.join(self.directory, f'{profile}.prof'))
+        self.assertTrue(any(function[2] == 'busy' for function in stats.stats))
+        with open(os.path.join(self.directory, f'{profile}.collapsed')) as f:
+            lines = f.read().splitlines()
+        self.assertTrue(lines)
+        self.assertTrue(all(line.rsplit(' ', 1)[1].isdigit() for line in lines))
+        self.assertTrue(any('busy (profiling_test.py:' in line for line in lines))
+
+    def test_index_lists_newest_first(self):
+        first = self.client.get('/work/1?_profile=1').headers['X-Profile-Id']
+        second = self.client.get('/work/2', headers={'X-Profile': 'true'}).headers['X-Profile-Id']
+
+        index = self.client.get('/profiles').get_json()
+        self.assertEqual([summary['id'] for summary in index], [second, first])
+        self.assertEqual(index[0]['endpoint'], '/work/<int:n>')
+        self.assertEqual(index[0]['status'], 200)
+        self.assertGreaterEqual(index[0]['duration_ms'], 50)
+
+        collapsed = self.client.get(index[0]['files']['collapsed'])
+        self.assertEqual(collapsed.status_code, 200)
+        self.assertIn(b'busy', collapsed.data)
+        self.assertEqual(self.client.get('/profiles/0123456789abcdef0123/pstats').status_code, 404)
+        self.assertEqual(self.client.get('/profiles/../json').status_code, 404)
+
+    def test_failed_request_is_profiled_and_profiler_released(self):
+        self.client.application.testing = False
+        response = self.client.get('/fail', headers={'X-Profile': '1'})
+
+        self.assertEqual(response.status_code, 500)
+        self.assertEqual(profiling.list_profiles()[0]['status'], 500)
+        self.assertIn('X-Profile-Id', self.client.get('/work/1', headers={'X-Profile': '1'}).headers)
+
+    def test_old_profiles_are_pruned(self):
+        with patch.object(profiling, 'PROFILES_KEEP', 2):
+            for _ in range(3):
+                self.client.get('/work/1', headers={'X-Profile': '1'})
+
+        self.assertEqual(len(profiling.list_profiles()), 2)
+        self.assertEqual(len(os.listdir(self.directory)), 6)
+
+    def test_disabled_installs_no_hooks(self):
+        app = Flask(__name__)
+        with patch.object(profiling, 'PROFILING_ENABLED', False):
+            profiling.init_app(app)
+
+        self.assertFalse(app.before_request_funcs)
+        self.assertNotIn('profiles', app.view_functions)
+
+
+if __name__ == '__main__':
+    unittest.main()
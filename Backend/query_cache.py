@@ -0,0 +1,349 @@
+import functools
+import hashlib
+import inspect
+import os
+import pickle
+import sys
+import threading
+import time
+import uuid
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+import metrics
+
+# Enable with QUERY_CACHE=1; results of the decorated db.py queries are then kept in memory, the least
+# recently used dropped beyond QUERY_CACHE_MB megabytes
+QUERY_CACHE_ENABLED = os.getenv('QUERY_CACHE', '0') == '1'
+QUERY_CACHE_MB = float(os.getenv('QUERY_CACHE_MB', '256'))
+# Optional second tier on local disk (a directory), shared by the app and the job worker processes;
+# empty = memory only. Files beyond QUERY_CACHE_DISK_MB megabytes are removed oldest first
+QUERY_CACHE_DIR = os.getenv('QUERY_CACHE_DIR', '')
+QUERY_CACHE_DISK_MB = float(os.getenv('QUERY_CACHE_DISK_MB', '1024'))
+# The disk tier is trimmed to its bound once every this many writes
+DISK_PRUNE_EVERY = 64
+# With the disk tier, tag generations written by other processes are re-read at most this often (seconds)
+TAG_CHECK_INTERVAL = 1.0
+# Rows of a list of records measured to estimate the size of the whole list
+SIZE_SAMPLE_ROWS = 20
+
+# function name and normalized arguments -> (expires at, tag versions, size in bytes, value)
+_entries = OrderedDict()
+_bytes = 0
+# Per-tag counters bumped by invalidate; an entry stored under older counters is stale. With the disk tier
+# the generation is a token in a file per tag instead, shared by every process, last read at _disk_generations
+_generations = {}
+_disk_generations = {}
+_disk_writes = 0
+_lock = threading.Lock()
+
+
+def _normalize(value):
+    # Hashable, order-independent form of an argument: dicts by sorted items, sequences as tuples
+    if isinstance(value, dict):
+        return tuple(sorted((str(key), _normalize(item)) for key, item in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_normalize(item) for item in value)
+    if isinstance(value, (set, frozenset)):
+        return tuple(sorted(_normalize(item) for item in value))
+    if isinstance(value, np.generic):
+        return value.item()
+
+    return value
+
+
+def _size(value):
+    # Estimated memory held by a result
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    if isinstance(value, list) and value and isinstance(value[0], dict):
+        sample = value[:SIZE_SAMPLE_ROWS]
+        row = sum(sys.getsizeof(record) + sum(sys.getsizeof(item) for item in record.values())
+                  for record in sample) / len(sample)
+        return sys.getsizeof(value) + int(row * len(value))
+
+    return len(pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+
+
+def _format(template, arguments):
+    # A tag template filled in from the call's arguments, e.g. 'preferences:{user_id}'; the family alone
+    # ('preferences') when the arguments don't have what it names
+    try:
+        return template.format(**arguments)
+    except (KeyError, IndexError, AttributeError, TypeError):
+        return template.split(':')[0]
+
+
+def _tags(templates, arguments):
+    # A tagged entry also belongs to its family, so invalidate('preferences') reaches every user's
+    tags = set()
+    for template in templates:
+        tag = _format(template, arguments)
+        tags.update((tag, tag.split(':')[0]))
+
+    return tags
+
+
+def _bound_arguments(signature, args, kwargs):
+    bound = signature.bind(*args, **kwargs)
+    bound.apply_defaults()
+
+    return bound.arguments
+
+
+# ---- Disk tier ----
+
+def _disk_path(*parts):
+    return os.path.join(QUERY_CACHE_DIR, *parts)
+
+
+def _digest(value):
+    return hashlib.sha1(repr(value).encode()).hexdigest()
+
+
+def _disk_generation(tag):
+    # tag -> (monotonic time read, token); '' until the tag is first invalidated
+    read = _disk_generations.get(tag)
+    now = time.monotonic()
+    if read is not None and now - read[0] < TAG_CHECK_INTERVAL:
+        return read[1]
+
+    try:
+        with open(_disk_path('tags', _digest(tag))) as f:
+            generation = f.read()
+    except OSError:
+        generation = ''
+    _disk_generations[tag] = (now, generation)
+
+    return generation
+
+
+def _version(tag):
+    # Invalidations of this process or, with the disk tier, of every process sharing QUERY_CACHE_DIR
+    if QUERY_CACHE_DIR:
+        return _disk_generation(tag)
+
+    return _generations.get(tag, 0)
+
+
+def _current(versions):
+    return all(_version(tag) == version for tag, version in versions.items())
+
+
+def _read_disk(key):
+    path = _disk_path(f"{_digest(key)}.pkl")
+    try:
+        with open(path, 'rb') as f:
+            stored_key, expires, versions, value = pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError, ValueError):
+        return None
+    if stored_key != key or expires < time.time():
+        if stored_key == key:
+            _remove(path)
+        return None
+
+    return expires, versions, value
+
+
+def _write_disk(key, expires, versions, value):
+    global _disk_writes
+
+    path = _disk_path(f"{_digest(key)}.pkl")
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    try:
+        os.makedirs(_disk_path('tags'), exist_ok=True)
+        with open(tmp_path, 'wb') as f:
+            pickle.dump((key, expires, versions, value), f, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+    except (OSError, pickle.PicklingError, TypeError, AttributeError):
+        _remove(tmp_path)
+        return
+
+    with _lock:
+        _disk_writes += 1
+        prune = _disk_writes % DISK_PRUNE_EVERY == 0
+    if prune:
+        prune_disk()
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def prune_disk():
+    """
+    Remove the oldest result files of the disk tier until it is within QUERY_CACHE_DISK_MB.
+    """
+    files = []
+    try:
+        for entry in os.scandir(QUERY_CACHE_DIR):
+            if entry.name.endswith('.pkl'):
+                stat = entry.stat()
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+    except OSError:
+        return
+    total = sum(size for _, size, _ in files)
+    for _, size, path in sorted(files):
+        if total <= QUERY_CACHE_DISK_MB * 1024 * 1024:
+            break
+        _remove(path)
+        total -= size
+
+
+# ---- Memory tier ----
+
+def _get(key):
+    entry = _entries.get(key)
+    if entry is None:
+        return None
+    expires, versions, _, value = entry
+    if expires < time.time() or not _current(versions):
+        _drop(key)
+        return None
+    _entries.move_to_end(key)
+
+    return value
+
+
+def _drop(key):
+    global _bytes
+
+    entry = _entries.pop(key, None)
+    if entry is not None:
+        _bytes -= entry[2]
+
+
+def _put(key, expires, versions, value, size):
+    global _bytes
+
+    limit = QUERY_CACHE_MB * 1024 * 1024
+    if size > limit:
+        return
+    _drop(key)
+    _entries[key] = (expires, versions, size, value)
+    _bytes += size
+    while _bytes > limit:
+        evicted, _ = next(iter(_entries.items()))
+        _drop(evicted)
+        metrics.QUERY_CACHE_EVICTIONS.inc(function=evicted[0])
+
+
+def cached(ttl, tags=()):
+    """
+    Cache the results of a query function for ttl seconds, keyed by the function and its normalized
+    arguments, while QUERY_CACHE is enabled. tags name the data the results depend on, as templates
+    filled in from the arguments ('preferences:{user_id}'); invalidate drops the entries of a tag.
+    None (a failed query) is never cached. Cached results are shared between callers, who must not
+    modify them.
+    """
+    def decorator(function):
+        signature = inspect.signature(function)
+        name = function.__name__
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not QUERY_CACHE_ENABLED:
+                return function(*args, **kwargs)
+
+            arguments = _bound_arguments(signature, args, kwargs)
+            key = (name, _normalize(arguments))
+            with _lock:
+                value = _get(key)
+            if value is not None:
+                metrics.QUERY_CACHE_LOOKUPS.inc(function=name, outcome='hit')
+                return value
+
+            if QUERY_CACHE_DIR:
+                stored = _read_disk(key)
+                if stored is not None and _current(stored[1]):
+                    metrics.QUERY_CACHE_LOOKUPS.inc(function=name, outcome='disk_hit')
+                    size = _size(stored[2])
+                    with _lock:
+                        _put(key, *stored, size)
+                    return stored[2]
+
+            metrics.QUERY_CACHE_LOOKUPS.inc(function=name, outcome='miss')
+            # Versions are read before the query, so an invalidation racing it leaves the entry stale
+            versions = {tag: _version(tag) for tag in _tags(tags, arguments)}
+            value = function(*args, **kwargs)
+            if value is None:
+                return value
+
+            expires = time.time() + ttl
+            size = _size(value)
+            with _lock:
+                _put(key, expires, versions, value, size)
+            if QUERY_CACHE_DIR:
+                _write_disk(key, expires, versions, value)
+
+            return value
+
+        return wrapper
+
+    return decorator
+
+
+def invalidate(*tags):
+    """
+    Make the cached results of the given tags stale, in this process and (with the disk tier) in
+    every process sharing QUERY_CACHE_DIR.
+    """
+    if QUERY_CACHE_DIR:
+        for tag in tags:
+            generation = uuid.uuid4().hex
+            path = _disk_path('tags', _digest(tag))
+            tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+            try:
+                os.makedirs(_disk_path('tags'), exist_ok=True)
+                with open(tmp_path, 'w') as f:
+                    f.write(generation)
+                os.replace(tmp_path, path)
+            except OSError:
+                _remove(tmp_path)
+            _disk_generations[tag] = (time.monotonic(), generation)
+
+    with _lock:
+        for tag in tags:
+            _generations[tag] = _generations.get(tag, 0) + 1
+        stale = [key for key, entry in _entries.items() if any(tag in entry[1] for tag in tags)]
+        for key in stale:
+            _drop(key)
+
+
+def invalidates(*templates):
+    """
+    Decorate a write function to invalidate the given tags (templates filled in from its arguments,
+    as for cached) once it has run, whether or not it succeeded.
+    """
+    def decorator(function):
+        signature = inspect.signature(function)
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            try:
+                return function(*args, **kwargs)
+            finally:
+                if QUERY_CACHE_ENABLED:
+                    arguments = _bound_arguments(signature, args, kwargs)
+                    invalidate(*{_format(template, arguments) for template in templates})
+
+        return wrapper
+
+    return decorator
+
+
+def clear():
+    # Drops every entry of the memory tier
+    global _bytes
+
+    with _lock:
+        _entries.clear()
+        _bytes = 0
+
+
+def stats():
+    with _lock:
+        return {'entries': len(_entries), 'bytes': _bytes}
@@ -0,0 +1,149 @@
+import os
+import shutil
+import tempfile
+import unittest
+from collections import OrderedDict
+from unittest.mock import patch
+import pandas as pd
+import metrics
+import query_cache
+
+
+class QueryCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.calls = []
+        for name, value in [('QUERY_CACHE_ENABLED', True), ('_generations', {}), ('_disk_generations', {})]:
+            patcher = patch.object(query_cache, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        query_cache.clear()
+        self.addCleanup(query_cache.clear)
+        metrics.reset()
+
+        @query_cache.cached(60, tags=('preferences:{user_id}',))
+        def get_user_preferences(user_id, options=None):
+            self.calls.append(user_id)
+            return [{'userID': user_id, 'preferredFlyingClass': 'coach'}]
+
+        @query_cache.invalidates('preferences:{prefs_data[userID]}')
+        def add_preferences_to_db(prefs_data):
+            return True
+
+        @query_cache.invalidates('preferences')
+        def create_user(user_data):
+            return 7
+
+        self.get_user_preferences = get_user_preferences
+        self.add_preferences_to_db = add_preferences_to_db
+        self.create_user = create_user
+
+
+class TestQueryCache(QueryCacheTestCase):
+    def test_hits_and_misses_are_counted(self):
+        first = self.get_user_preferences(1, {'a': 1, 'b': [2]})
+        second = self.get_user_preferences(user_id=1, options={'b': [2], 'a': 1})
+
+        self.assertIs(first, second)
+        self.assertEqual(self.calls, [1])
+        self.assertEqual(metrics.QUERY_CACHE_LOOKUPS.value(function='get_user_preferences', outcome='hit'), 1)
+        self.assertEqual(metrics.QUERY_CACHE_LOOKUPS.value(function='get_user_preferences', outcome='miss'), 1)
+        self.assertIn('flights_query_cache_lookups_total', metrics.expose())
+
+    def test_disabled_cache_calls_through(self):
+        with patch.object(query_cache, 'QUERY_CACHE_ENABLED', False):
+            self.get_user_preferences(1)
+            self.get_user_preferences(1)
+
+        self.assertEqual(self.calls, [1, 1])
+
+    def test_entries_expire(self):
+        with patch('query_cache.time.time', return_value=1000.0):
+            self.get_user_preferences(1)
+        with patch('query_cache.time.time', return_value=1061.0):
+            self.get_user_preferences(1)
+
+        self.assertEqual(self.calls, [1, 1])
+
+    def test_writes_invalidate_their_user(self):
+        self.get_user_preferences(1)
+        self.get_user_preferences(2)
+        self.add_preferences_to_db({'userID': 1})
+        self.get_user_preferences(1)
+        self.get_user_preferences(2)
+        self.assertEqual(self.calls, [1, 2, 1])
+
+        self.create_user({'fullName': 'A'})
+        self.get_user_preferences(2)
+        self.assertEqual(self.calls, [1, 2, 1, 2])
+
+    def test_least_recently_used_are_evicted(self):
+        @query_cache.cached(60)
+        def query_routes(source_iata):
+            self.calls.append(source_iata)
+            return pd.DataFrame({'sourceIATA': [source_iata] * 1000, 'distance': range(1000)})
+
+        size = query_cache._size(query_routes('ATL'))
+        with patch.object(query_cache, 'QUERY_CACHE_MB', 2.5 * size / (1024 * 1024)):
+            query_routes('JFK')
+            query_routes('ATL')
+            query_routes('LAX')
+            query_routes('ATL')
+            query_routes('JFK')
+
+        self.assertEqual(self.calls, ['ATL', 'JFK', 'LAX', 'JFK'])
+        self.assertEqual(metrics.QUERY_CACHE_EVICTIONS.value(function='query_routes'), 2)
+        self.assertLessEqual(query_cache.stats()['bytes'], 2.5 * size)
+
+
+class TestDiskTier(QueryCacheTestCase):
+    def setUp(self):
+        super().setUp()
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir, ignore_errors=True)
+        patcher = patch.object(query_cache, 'QUERY_CACHE_DIR', self.cache_dir)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def other_process(self):
+        # A process with its own (empty) memory tier and tag generations, sharing the cache directory
+        return patch.multiple(query_cache, _entries=OrderedDict(), _bytes=0, _generations={}, _disk_generations={})
+
+    def test_other_processes_share_results_and_invalidations(self):
+        self.get_user_preferences(1)
+        with self.other_process():
+            self.assertEqual(self.get_user_preferences(1)[0]['userID'], 1)
+            self.add_preferences_to_db({'userID': 1})
+            # Results written after an invalidation are current for every process
+            self.get_user_preferences(1)
+        self.assertEqual(metrics.QUERY_CACHE_LOOKUPS.value(function='get_user_preferences', outcome='disk_hit'), 1)
+        self.assertEqual(self.calls, [1, 1])
+
+        with self.other_process():
+            self.get_user_preferences(1)
+        self.assertEqual(metrics.QUERY_CACHE_LOOKUPS.value(function='get_user_preferences', outcome='disk_hit'), 2)
+        self.assertEqual(self.calls, [1, 1])
+
+    def test_memory_hits_read_tag_files_once_per_interval(self):
+        self.get_user_preferences(1)
+        with patch('builtins.open', side_effect=AssertionError("tag file read")):
+            self.get_user_preferences(1)
+
+        with self.other_process():
+            self.add_preferences_to_db({'userID': 1})
+        # Another process's invalidation is seen once the interval has passed
+        self.get_user_preferences(1)
+        with patch.object(query_cache, 'TAG_CHECK_INTERVAL', 0):
+            self.get_user_preferences(1)
+        self.assertEqual(self.calls, [1, 1])
+
+    def test_disk_is_pruned_to_its_bound(self):
+        for user_id in range(5):
+            self.get_user_preferences(user_id)
+        with patch.object(query_cache, 'QUERY_CACHE_DISK_MB', 0):
+            query_cache.prune_disk()
+
+        self.assertEqual([name for name in os.listdir(self.cache_dir) if name.endswith('.pkl')], [])
+
+
+if __name__ == '__main__':
+    unittest.main()
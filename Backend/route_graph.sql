@@ -0,0 +1,30 @@
+-- Adds airport coordinates to an existing database (new installs get them from database.sql).
+-- Used by the route index to rank /connections results by distance.
+
+ALTER TABLE Airports
+  ADD COLUMN latitude DOUBLE,
+  ADD COLUMN longitude DOUBLE;
+
+DROP TABLE IF EXISTS TempAirportCoordinates;
+CREATE TABLE TempAirportCoordinates (
+  airportID int,
+  latitude DOUBLE,
+  longitude DOUBLE,
+
+  PRIMARY KEY (airportID)
+);
+
+LOAD DATA INFILE 'C:/ProgramData/MySQL/MySQL Server 8.0/Uploads/airports.csv'
+IGNORE INTO TABLE TempAirportCoordinates
+FIELDS TERMINATED BY ','
+OPTIONALLY ENCLOSED BY '"'
+LINES TERMINATED BY '\n'
+IGNORE 1 LINES
+(airportID, @dummy, @dummy, @dummy, @dummy, @dummy, latitude, longitude, @dummy, @dummy, @dummy, @dummy, @dummy, @dummy);
+
+UPDATE Airports a
+JOIN TempAirportCoordinates t ON a.airportID = t.airportID
+SET a.latitude = t.latitude,
+    a.longitude = t.longitude;
+
+DROP TABLE TempAirportCoordinates;
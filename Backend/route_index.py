@@ -0,0 +1,405 @@
+import os
+import threading
+import time
+import numpy as np
+import pandas as pd
+import query_cache
+
+# Enable with ROUTE_INDEX=1; the index is rebuilt every ROUTE_INDEX_TTL seconds (0 = only on explicit refresh)
+ROUTE_INDEX_ENABLED = os.getenv('ROUTE_INDEX', '0') == '1'
+ROUTE_INDEX_TTL = int(os.getenv('ROUTE_INDEX_TTL', '3600'))
+
+# Maximum number of intermediate airports considered by the connection search
+MAX_CONNECTION_STOPS = 2
+# Most itineraries one connection search returns
+MAX_CONNECTIONS = 100
+# Most 2-stop itineraries a connection search ranks; between two hubs there are millions
+MAX_TWO_STOP_CANDIDATES = 200000
+
+# Alliance members by airline IATA code, used by the connection search filters
+ALLIANCES = {
+    'star': {'A3', 'AC', 'CA', 'AI', 'NZ', 'NH', 'OZ', 'OS', 'AV', 'SN', 'CM', 'OU', 'MS', 'ET', 'BR',
+             'LO', 'LH', 'ZH', 'SQ', 'SA', 'LX', 'TP', 'TG', 'TK', 'UA'},
+    'oneworld': {'AS', 'AA', 'BA', 'CX', 'AY', 'IB', 'JL', 'MH', 'QF', 'QR', 'AT', 'RJ', 'UL'},
+    'skyteam': {'AR', 'AM', 'UX', 'AF', 'CI', 'MU', 'DL', 'GA', 'KQ', 'KL', 'KE', 'ME', 'SV', 'RO',
+                'VN', 'VS', 'MF'},
+}
+
+EARTH_RADIUS_KM = 6371.0
+
+_index = None
+_index_lock = threading.Lock()
+_timer_thread = None
+
+
+def _csr_rows(offsets, rows):
+    # Concatenate the CSR slices offsets[r]:offsets[r + 1] of the given rows without a Python loop
+    if rows is None or len(rows) == 0:
+        return np.empty(0, dtype=np.int64)
+    starts = offsets[rows]
+    lengths = offsets[np.asarray(rows) + 1] - starts
+    shifts = np.repeat(starts - (np.cumsum(lengths) - lengths), lengths)
+
+    return shifts + np.arange(lengths.sum())
+
+
+def _known(distances):
+    # Unknown (NaN) distances as infinitely long, so they sort last
+    return np.where(np.isnan(distances), np.inf, distances)
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+
+class RouteIndex:
+    """
+    In-memory copy of the route reference data (Airports, Cities, Airline, AirlineRoutes).
+
+    Every entity is integer coded by its position in the loaded table and routes are kept
+    sorted by source airport, so the routes leaving an airport are one contiguous slice.
+    """
+
+    def __init__(self, airports, cities, airlines, routes):
+        airports = airports.reset_index(drop=True)
+        cities = cities.reset_index(drop=True)
+        airlines = airlines.reset_index(drop=True)
+
+        # Airports
+        self.airport_id = airports['airportID'].to_numpy(dtype=np.int64)
+        self.airport_iata = airports['iata'].to_numpy(dtype=object)
+        self.airport_name = airports['airportName'].to_numpy(dtype=object)
+        self.airport_city = pd.Index(cities['cityID']).get_indexer(airports['cityID']).astype(np.int32)
+        if {'latitude', 'longitude'} <= set(airports.columns):
+            self.airport_lat = pd.to_numeric(airports['latitude'], errors='coerce').to_numpy(dtype=np.float64)
+            self.airport_lon = pd.to_numeric(airports['longitude'], errors='coerce').to_numpy(dtype=np.float64)
+        else:
+            self.airport_lat = self.airport_lon = np.full(len(airports), np.nan)
+
+        # Cities
+        self.city_name = cities['cityName'].to_numpy(dtype=object)
+        self.city_country = cities['country'].to_numpy(dtype=object)
+
+        # Airlines
+        self.airline_name = airlines['airlineName'].to_numpy(dtype=object)
+        self.airline_iata = airlines['iata'].to_numpy(dtype=object) if 'iata' in airlines else np.full(len(airlines), None)
+
+        # Routes; -1 marks a reference to a row that does not exist (dropped by the SQL joins)
+        airport_lookup = pd.Index(airports['airportID'])
+        src = airport_lookup.get_indexer(routes['sourceAirportID']).astype(np.int32)
+        dst = airport_lookup.get_indexer(routes['destinationAirportID']).astype(np.int32)
+        airline = pd.Index(airlines['airlineID']).get_indexer(routes['airlineID']).astype(np.int32)
+
+        known = (src >= 0) & (dst >= 0)
+        src, dst, airline = src[known], dst[known], airline[known]
+        order = np.lexsort((airline, dst, src))
+        self.route_src = src[order]
+        self.route_dst = dst[order]
+        self.route_airline = airline[order]
+
+        # CSR offsets: routes leaving airport i are route_*[route_offsets[i]:route_offsets[i + 1]]
+        counts = np.bincount(self.route_src, minlength=len(self.airport_id))
+        self.route_offsets = np.concatenate(([0], np.cumsum(counts))).astype(np.int64)
+
+        # Airport pairs: routes with the same (source, destination) form one run in the sorted arrays.
+        # The connection search walks pairs instead of routes so parallel airlines don't multiply paths.
+        new_pair = np.ones(len(self.route_src), dtype=bool)
+        new_pair[1:] = (self.route_src[1:] != self.route_src[:-1]) | (self.route_dst[1:] != self.route_dst[:-1])
+        self.pair_start = np.flatnonzero(new_pair)
+        self.pair_src = self.route_src[self.pair_start]
+        self.pair_dst = self.route_dst[self.pair_start]
+        self.pair_route_offsets = np.append(self.pair_start, len(self.route_src))
+        self.pair_distance = haversine_km(
+            self.airport_lat[self.pair_src], self.airport_lon[self.pair_src],
+            self.airport_lat[self.pair_dst], self.airport_lon[self.pair_dst])
+
+        # Forward CSR over pairs by source airport and reverse CSR by destination airport
+        pair_counts = np.bincount(self.pair_src, minlength=len(self.airport_id))
+        self.pair_offsets = np.concatenate(([0], np.cumsum(pair_counts))).astype(np.int64)
+        self.pair_in = np.argsort(self.pair_dst, kind='stable')
+        in_counts = np.bincount(self.pair_dst, minlength=len(self.airport_id))
+        self.pair_in_offsets = np.concatenate(([0], np.cumsum(in_counts))).astype(np.int64)
+
+        # Hash maps from lookup keys to airport codes / route positions
+        self.iata_airports = pd.Series(self.airport_iata).groupby(self.airport_iata).indices
+
+        with_city = np.flatnonzero(self.airport_city >= 0)
+        self.country_airports = {
+            country: with_city[positions]
+            for country, positions in pd.Series(with_city).groupby(self.city_country[self.airport_city[with_city]]).indices.items()}
+
+        named = np.flatnonzero(self.route_airline >= 0)
+        self.airline_routes = {
+            name: named[positions]
+            for name, positions in pd.Series(named).groupby(self.airline_name[self.route_airline[named]]).indices.items()}
+
+        self.loaded_at = time.time()
+
+    def __len__(self):
+        return len(self.route_src)
+
+    def _routes_from(self, airport_codes):
+        return _csr_rows(self.route_offsets, airport_codes)
+
+    def _airport_mask(self, airport_codes):
+        mask = np.zeros(len(self.airport_id), dtype=bool)
+        if airport_codes is not None:
+            mask[airport_codes] = True
+
+        return mask
+
+    def query_routes(self, source_iata, destination_iata):
+        """
+        Query available routes from source to destination using IATA codes.
+        """
+        routes = self._routes_from(self.iata_airports.get(source_iata))
+        destinations = self._airport_mask(self.iata_airports.get(destination_iata))
+        routes = routes[destinations[self.route_dst[routes]] & (self.route_airline[routes] >= 0)]
+
+        return pd.DataFrame({
+            'sourceIATA': self.airport_iata[self.route_src[routes]],
+            'destinationIATA': self.airport_iata[self.route_dst[routes]],
+            'airlineName': self.airline_name[self.route_airline[routes]],
+        })
+
+    def query_airline_routes(self, airline_name):
+        """
+        Query available routes for a specific airline.
+        """
+        routes = self.airline_routes.get(airline_name, np.empty(0, dtype=np.int64))
+
+        return pd.DataFrame({
+            'airlineName': self.airline_name[self.route_airline[routes]],
+            'sourceIATA': self.airport_iata[self.route_src[routes]],
+            'destinationIATA': self.airport_iata[self.route_dst[routes]],
+        })
+
+    def query_routes_by_countries(self, source_country, destination_country):
+        """
+        Query available routes between source and destination countries.
+        """
+        routes = self._routes_from(self.country_airports.get(source_country))
+        destinations = self._airport_mask(self.country_airports.get(destination_country))
+        routes = routes[destinations[self.route_dst[routes]] & (self.route_airline[routes] >= 0)]
+
+        src, dst = self.route_src[routes], self.route_dst[routes]
+
+        return pd.DataFrame({
+            'sourceCountry': self.city_country[self.airport_city[src]],
+            'destinationCountry': self.city_country[self.airport_city[dst]],
+            'sourceIATA': self.airport_iata[src],
+            'destinationIATA': self.airport_iata[dst],
+            'airlineName': self.airline_name[self.route_airline[routes]],
+        })
+
+    def query_by_country(self, country_name):
+        """
+        Query all airports within a specific country and the routes they offer.
+        """
+        routes = self._routes_from(self.country_airports.get(country_name))
+        routes = routes[self.airport_city[self.route_dst[routes]] >= 0]
+
+        src, dst = self.route_src[routes], self.route_dst[routes]
+
+        return pd.DataFrame({
+            'sourceAirportID': self.airport_id[src],
+            'sourceIATA': self.airport_iata[src],
+            'sourceAirportName': self.airport_name[src],
+            'sourceCityName': self.city_name[self.airport_city[src]],
+            'destinationIATA': self.airport_iata[dst],
+            'destinationAirportName': self.airport_name[dst],
+            'destinationCityName': self.city_name[self.airport_city[dst]],
+        })
+
+    # ------------------- Connection search ---------------------
+
+    def airline_codes(self, airline_names=None, alliance=None):
+        """
+        Airline codes allowed by an explicit list of airline names and/or an alliance; None means no filter.
+        """
+        if not airline_names and not alliance:
+            return None
+
+        allowed = np.zeros(len(self.airline_name), dtype=bool)
+        if airline_names:
+            allowed |= np.isin(self.airline_name, list(airline_names))
+        if alliance:
+            allowed |= np.isin(self.airline_iata, list(ALLIANCES.get(alliance.lower(), ())))
+
+        return np.flatnonzero(allowed)
+
+    def _pair_airlines(self, pair, allowed_routes):
+        routes = np.arange(self.pair_route_offsets[pair], self.pair_route_offsets[pair + 1])
+
+        return set(self.route_airline[routes[allowed_routes[routes]]].tolist())
+
+    def find_connections(self, source_iata, destination_iata, max_stops=MAX_CONNECTION_STOPS,
+                         airline_codes=None, same_airline=False, sort='hops', limit=10):
+        """
+        Find itineraries of up to max_stops intermediate airports between two IATA codes.
+
+        Results are ranked by number of stops then distance (sort='hops') or by distance only
+        (sort='distance'), and the top `limit` are returned.
+        """
+        max_stops = max(0, min(int(max_stops), MAX_CONNECTION_STOPS))
+        sources = self.iata_airports.get(source_iata, np.empty(0, dtype=np.int64))
+        destinations = self.iata_airports.get(destination_iata, np.empty(0, dtype=np.int64))
+        is_source = self._airport_mask(sources)
+        is_destination = self._airport_mask(destinations)
+        endpoint = is_source | is_destination
+
+        # A pair is usable if at least one (allowed) airline flies it
+        allowed_routes = self.route_airline >= 0
+        if airline_codes is not None:
+            allowed_routes &= np.isin(self.route_airline, airline_codes)
+        if len(self.pair_start):
+            pair_ok = np.logical_or.reduceat(allowed_routes, self.pair_start) & (self.pair_src != self.pair_dst)
+        else:
+            pair_ok = np.zeros(0, dtype=bool)
+
+        first = _csr_rows(self.pair_offsets, sources)
+        first = first[pair_ok[first]]
+        direct = first[is_destination[self.pair_dst[first]]]
+        first = first[~endpoint[self.pair_dst[first]]]
+
+        last = self.pair_in[_csr_rows(self.pair_in_offsets, destinations)]
+        last = last[pair_ok[last] & ~endpoint[self.pair_src[last]]]
+
+        # Candidate itineraries as rows of pair ids, -1 padded to MAX_CONNECTION_STOPS + 1 legs
+        candidates = [np.column_stack((direct, np.full((len(direct), 2), -1)))]
+
+        if max_stops >= 1:
+            legs = pd.DataFrame({'first': first, 'mid': self.pair_dst[first]}).merge(
+                pd.DataFrame({'last': last, 'mid': self.pair_src[last]}), on='mid')
+            candidates.append(np.column_stack((legs['first'], legs['last'], np.full(len(legs), -1))))
+
+        enough = sort == 'hops' and not same_airline and sum(len(c) for c in candidates) >= limit
+        if max_stops >= 2 and not enough:
+            before_last = self._airport_mask(self.pair_src[last])
+            middle = _csr_rows(self.pair_offsets, np.unique(self.pair_dst[first]))
+            middle = middle[pair_ok[middle] & before_last[self.pair_dst[middle]]]
+            # Each middle leg makes (first legs into it) x (last legs out of it) itineraries. Beyond
+            # MAX_TWO_STOP_CANDIDATES of them, only the middle legs with the shortest possible itinerary
+            # (shortest first leg + middle leg + shortest last leg) are kept: the shortest 2-stop itinerary
+            # is always a candidate, but further ones can be missed in favour of longer ones
+            airports = len(self.airport_iata)
+            first_into = np.bincount(self.pair_dst[first], minlength=airports)
+            last_out = np.bincount(self.pair_src[last], minlength=airports)
+            combinations = first_into[self.pair_src[middle]].astype(np.int64) * last_out[self.pair_dst[middle]]
+            if combinations.sum() > MAX_TWO_STOP_CANDIDATES:
+                shortest_into = np.full(airports, np.inf)
+                np.minimum.at(shortest_into, self.pair_dst[first], _known(self.pair_distance[first]))
+                shortest_out = np.full(airports, np.inf)
+                np.minimum.at(shortest_out, self.pair_src[last], _known(self.pair_distance[last]))
+                bound = (shortest_into[self.pair_src[middle]] + _known(self.pair_distance[middle])
+                         + shortest_out[self.pair_dst[middle]])
+                shortest = np.argsort(bound, kind='stable')
+                keep = np.cumsum(combinations[shortest]) <= MAX_TWO_STOP_CANDIDATES
+                keep[:1] = True
+                middle = middle[np.sort(shortest[keep])]
+            legs = pd.DataFrame({'first': first, 'a': self.pair_dst[first]}).merge(
+                pd.DataFrame({'middle': middle, 'a': self.pair_src[middle], 'b': self.pair_dst[middle]}), on='a').merge(
+                pd.DataFrame({'last': last, 'b': self.pair_src[last]}), on='b')
+            candidates.append(np.column_stack((legs['first'], legs['middle'], legs['last'])))
+
+        paths = np.concatenate(candidates).astype(np.int64)
+        used = paths >= 0
+        stops = used.sum(axis=1) - 1
+        distance = np.where(used, self.pair_distance[np.where(used, paths, 0)], 0).sum(axis=1)
+
+        # NaN distances (airports without coordinates) rank after every known distance
+        known_distance = _known(distance)
+        order = np.lexsort((known_distance, stops) if sort == 'hops' else (stops, known_distance))
+
+        results = []
+        for position in order:
+            if len(results) >= limit:
+                break
+            legs = [pair for pair in paths[position] if pair >= 0]
+            airlines = [self._pair_airlines(pair, allowed_routes) for pair in legs]
+            if same_airline:
+                common = set.intersection(*airlines)
+                if not common:
+                    continue
+                airlines = [common] * len(legs)
+
+            results.append({
+                'stops': int(stops[position]),
+                'distance': None if np.isnan(distance[position]) else round(float(distance[position]), 1),
+                'legs': [{
+                    'sourceIATA': self.airport_iata[self.pair_src[pair]],
+                    'destinationIATA': self.airport_iata[self.pair_dst[pair]],
+                    'distance': None if np.isnan(self.pair_distance[pair]) else round(float(self.pair_distance[pair]), 1),
+                    'airlines': sorted(self.airline_name[code] for code in leg_airlines),
+                } for pair, leg_airlines in zip(legs, airlines)],
+            })
+
+        return results
+
+
+# ------------------- Index lifecycle -----------------------
+# -----------------------------------------------------------
+
+def is_enabled():
+    return ROUTE_INDEX_ENABLED
+
+
+def data_version():
+    # Generation of the routes the index answers with, for HTTP validators; None when the index is off
+    if not is_enabled():
+        return None
+
+    return get_route_index().loaded_at
+
+
+def load_route_index():
+    from db import get_route_reference_data
+
+    airports, cities, airlines, routes = get_route_reference_data()
+
+    return RouteIndex(airports, cities, airlines, routes)
+
+
+def refresh_route_index():
+    """
+    Rebuild the index from the database and swap it in; readers keep using the old one until then.
+    Cached route query results are dropped once the new index is in place, so none read from the old
+    one outlives it.
+    """
+    global _index
+
+    index = load_route_index()
+    with _index_lock:
+        _index = index
+    query_cache.invalidate('routes')
+
+    return index
+
+
+def _refresh_periodically(interval):
+    while True:
+        time.sleep(interval)
+        try:
+            refresh_route_index()
+        except Exception as e:
+            print(f"Error refreshing route index: {str(e)}")
+
+
+def get_route_index():
+    global _index, _timer_thread
+
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = load_route_index()
+
+            # /connections loads the index even when it is disabled; it is then reloaded only on request
+            if is_enabled() and ROUTE_INDEX_TTL > 0 and _timer_thread is None:
+                _timer_thread = threading.Thread(
+                    target=_refresh_periodically, args=(ROUTE_INDEX_TTL,), daemon=True)
+                _timer_thread.start()
+
+    return _index
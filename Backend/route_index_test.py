@@ -0,0 +1,219 @@
+import sqlite3
+import unittest
+from unittest.mock import patch
+import pandas as pd
+import query_cache
+import route_index
+from route_index import RouteIndex
+
+AIRPORTS = pd.DataFrame({
+    'airportID': [1, 2, 3, 4, 5, 6],
+    'airportName': ['John F Kennedy Intl', 'Los Angeles Intl', 'Toronto Pearson', 'Heathrow', 'Newark', 'Nowhere'],
+    'cityID': [10, 11, 12, 13, 10, 99],  # 99 has no matching city
+    'iata': ['JFK', 'LAX', 'YYZ', 'LHR', 'EWR', 'NWH'],
+    'latitude': [40.64, 33.94, 43.68, 51.47, 40.69, None],
+    'longitude': [-73.78, -118.41, -79.63, -0.46, -74.17, None],
+})
+CITIES = pd.DataFrame({
+    'cityID': [10, 11, 12, 13],
+    'cityName': ['New York', 'Los Angeles', 'Toronto', 'London'],
+    'country': ['United States', 'United States', 'Canada', 'United Kingdom'],
+})
+AIRLINES = pd.DataFrame({
+    'airlineID': [100, 101, 102],
+    'airlineName': ['Delta', 'Air Canada', 'British Airways'],
+    'iata': ['DL', 'AC', 'BA'],
+})
+ROUTES = pd.DataFrame({
+    'airlineID': [100, 100, 101, 101, 102, 102, 100, 999, 100],
+    'sourceAirportID': [1, 2, 1, 3, 1, 4, 5, 1, 1],
+    'destinationAirportID': [2, 1, 3, 1, 4, 1, 3, 2, 6],
+})
+
+SQL = {
+    'query_routes': """
+        SELECT a1.iata AS sourceIATA, a2.iata AS destinationIATA, al.airlineName
+        FROM AirlineRoutes hr
+        JOIN Airports a1 ON hr.sourceAirportID = a1.airportID
+        JOIN Airports a2 ON hr.destinationAirportID = a2.airportID
+        JOIN Airline al ON hr.airlineID = al.airlineID
+        WHERE a1.iata = ? AND a2.iata = ?
+    """,
+    'query_airline_routes': """
+        SELECT al.airlineName, a1.iata AS sourceIATA, a2.iata AS destinationIATA
+        FROM AirlineRoutes hr
+        JOIN Airports a1 ON hr.sourceAirportID = a1.airportID
+        JOIN Airports a2 ON hr.destinationAirportID = a2.airportID
+        JOIN Airline al ON hr.airlineID = al.airlineID
+        WHERE al.airlineName = ?
+    """,
+    'query_routes_by_countries': """
+        SELECT c1.country AS sourceCountry, c2.country AS destinationCountry, a1.iata AS sourceIATA, a2.iata AS destinationIATA, al.airlineName
+        FROM AirlineRoutes hr
+        JOIN Airports a1 ON hr.sourceAirportID = a1.airportID
+        JOIN Airports a2 ON hr.destinationAirportID = a2.airportID
+        JOIN Cities c1 ON a1.cityID = c1.cityID
+        JOIN Cities c2 ON a2.cityID = c2.cityID
+        JOIN Airline al ON hr.airlineID = al.airlineID
+        WHERE c1.country = ? AND c2.country = ?
+    """,
+    'query_by_country': """
+        SELECT a1.airportID AS sourceAirportID, a1.iata AS sourceIATA, a1.airportName AS sourceAirportName,
+               c1.cityName AS sourceCityName, a2.iata AS destinationIATA, a2.airportName AS destinationAirportName,
+               c2.cityName AS destinationCityName
+        FROM Airports a1
+        JOIN Cities c1 ON a1.cityID = c1.cityID
+        JOIN AirlineRoutes hr ON a1.airportID = hr.sourceAirportID
+        JOIN Airports a2 ON hr.destinationAirportID = a2.airportID
+        JOIN Cities c2 ON a2.cityID = c2.cityID
+        WHERE c1.country = ?
+    """,
+}
+
+
+def normalize(df):
+    return df.astype(str).sort_values(list(df.columns)).reset_index(drop=True)
+
+
+class TestRouteIndex(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.index = RouteIndex(AIRPORTS, CITIES, AIRLINES, ROUTES)
+        cls.connection = sqlite3.connect(':memory:')
+        AIRPORTS.to_sql('Airports', cls.connection, index=False)
+        CITIES.to_sql('Cities', cls.connection, index=False)
+        AIRLINES.to_sql('Airline', cls.connection, index=False)
+        ROUTES.to_sql('AirlineRoutes', cls.connection, index=False)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.connection.close()
+
+    def assert_matches_sql(self, name, *args):
+        expected = pd.read_sql(SQL[name], self.connection, params=args)
+        result = getattr(self.index, name)(*args)
+
+        self.assertEqual(list(result.columns), list(expected.columns))
+        pd.testing.assert_frame_equal(normalize(result), normalize(expected))
+
+    def test_query_routes(self):
+        self.assert_matches_sql('query_routes', 'JFK', 'LAX')
+        self.assert_matches_sql('query_routes', 'JFK', 'NWH')
+        self.assert_matches_sql('query_routes', 'XXX', 'LAX')
+
+    def test_query_airline_routes(self):
+        self.assert_matches_sql('query_airline_routes', 'Delta')
+        self.assert_matches_sql('query_airline_routes', 'Unknown Air')
+
+    def test_query_routes_by_countries(self):
+        self.assert_matches_sql('query_routes_by_countries', 'United States', 'Canada')
+        self.assert_matches_sql('query_routes_by_countries', 'United States', 'United States')
+        self.assert_matches_sql('query_routes_by_countries', 'Atlantis', 'Canada')
+
+    def test_query_by_country(self):
+        self.assert_matches_sql('query_by_country', 'United States')
+        self.assert_matches_sql('query_by_country', 'United Kingdom')
+        self.assert_matches_sql('query_by_country', 'Atlantis')
+
+    def test_routes_sorted_by_source(self):
+        self.assertEqual(self.index.route_offsets[-1], len(self.index))
+        self.assertTrue((self.index.route_src[:-1] <= self.index.route_src[1:]).all())
+
+
+class TestConnections(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.index = RouteIndex(AIRPORTS, CITIES, AIRLINES, ROUTES)
+
+    def airports(self, connection):
+        return [leg['sourceIATA'] for leg in connection['legs']] + [connection['legs'][-1]['destinationIATA']]
+
+    def test_direct_route_ranks_first(self):
+        connections = self.index.find_connections('JFK', 'LHR')
+
+        self.assertEqual(connections[0]['stops'], 0)
+        self.assertEqual(connections[0]['legs'][0]['airlines'], ['British Airways'])
+        self.assertAlmostEqual(connections[0]['distance'], 5540, delta=20)
+
+    def test_one_stop(self):
+        connections = self.index.find_connections('YYZ', 'LAX')
+
+        self.assertEqual([self.airports(c) for c in connections], [['YYZ', 'JFK', 'LAX']])
+        self.assertEqual(connections[0]['stops'], 1)
+        self.assertEqual(self.index.find_connections('YYZ', 'LAX', same_airline=True), [])
+
+    def test_two_stops_respects_max_stops(self):
+        connections = self.index.find_connections('EWR', 'LHR')
+
+        self.assertEqual([self.airports(c) for c in connections], [['EWR', 'YYZ', 'JFK', 'LHR']])
+
+    def test_capped_search_keeps_the_shortest_itinerary(self):
+        # On the equator: S-A-B-D has the shortest middle leg (1 degree) but is 50 degrees long, S-C-E-D is 10
+        airports = pd.DataFrame({'airportID': [1, 2, 3, 4, 5, 6], 'airportName': list('SABCED'),
+                                 'cityID': [10] * 6, 'iata': list('SABCED'), 'latitude': [0.0] * 6,
+                                 'longitude': [0.0, -20.0, -19.0, 3.0, 7.0, 10.0]})
+        routes = pd.DataFrame({'airlineID': [100] * 6, 'sourceAirportID': [1, 2, 3, 1, 4, 5],
+                               'destinationAirportID': [2, 3, 6, 4, 5, 6]})
+        index = RouteIndex(airports, CITIES, AIRLINES, routes)
+
+        with patch.object(route_index, 'MAX_TWO_STOP_CANDIDATES', 1):
+            connections = index.find_connections('S', 'D', sort='distance', limit=1)
+
+        self.assertEqual([self.airports(c) for c in connections], [['S', 'C', 'E', 'D']])
+        self.assertEqual(self.index.find_connections('EWR', 'LHR', max_stops=1), [])
+
+    def test_two_stop_candidates_are_capped(self):
+        # Over the cap, the middle leg of the shortest possible itinerary is still searched
+        with patch.object(route_index, 'MAX_TWO_STOP_CANDIDATES', 0):
+            connections = self.index.find_connections('EWR', 'LHR', sort='distance')
+
+        self.assertEqual([self.airports(c) for c in connections], [['EWR', 'YYZ', 'JFK', 'LHR']])
+
+    def test_capped_search_keeps_the_shortest_itinerary(self):
+        # On the equator: S-A-B-D has the shortest middle leg (1 degree) but is 50 degrees long, S-C-E-D is 10
+        airports = pd.DataFrame({'airportID': [1, 2, 3, 4, 5, 6], 'airportName': list('SABCED'),
+                                 'cityID': [10] * 6, 'iata': list('SABCED'), 'latitude': [0.0] * 6,
+                                 'longitude': [0.0, -20.0, -19.0, 3.0, 7.0, 10.0]})
+        routes = pd.DataFrame({'airlineID': [100] * 6, 'sourceAirportID': [1, 2, 3, 1, 4, 5],
+                               'destinationAirportID': [2, 3, 6, 4, 5, 6]})
+        index = RouteIndex(airports, CITIES, AIRLINES, routes)
+
+        with patch.object(route_index, 'MAX_TWO_STOP_CANDIDATES', 1):
+            connections = index.find_connections('S', 'D', sort='distance', limit=1)
+
+        self.assertEqual([self.airports(c) for c in connections], [['S', 'C', 'E', 'D']])
+
+    def test_airline_filters(self):
+        skyteam = self.index.airline_codes(alliance='skyteam')
+
+        self.assertEqual(len(self.index.find_connections('JFK', 'LAX', airline_codes=skyteam)), 1)
+        self.assertEqual(self.index.find_connections('YYZ', 'LAX', airline_codes=skyteam), [])
+        self.assertEqual(
+            len(self.index.find_connections('YYZ', 'LAX', airline_codes=self.index.airline_codes(['Delta', 'Air Canada']))), 1)
+
+    def test_unknown_distance_and_limit(self):
+        connections = self.index.find_connections('JFK', 'NWH')
+
+        self.assertIsNone(connections[0]['distance'])
+        self.assertEqual(len(self.index.find_connections('JFK', 'LHR', limit=0)), 0)
+
+
+
+class TestRefresh(unittest.TestCase):
+    def test_refresh_drops_cached_routes_after_the_swap(self):
+        old, new = RouteIndex(AIRPORTS, CITIES, AIRLINES, ROUTES), RouteIndex(AIRPORTS, CITIES, AIRLINES, ROUTES)
+
+        @query_cache.cached(3600, tags=('routes',))
+        def query_routes(source_iata, destination_iata):
+            return route_index._index
+
+        self.addCleanup(query_cache.clear)
+        with patch.object(query_cache, 'QUERY_CACHE_ENABLED', True), patch.object(route_index, '_index', old), \
+                patch.object(route_index, 'load_route_index', return_value=new):
+            self.assertIs(query_routes('JFK', 'LAX'), old)
+            route_index.refresh_route_index()
+
+            self.assertIs(query_routes('JFK', 'LAX'), new)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,154 @@
+import json
+import numpy as np
+import pandas as pd
+from flask import Response, jsonify, request
+from flask.json.provider import DefaultJSONProvider
+
+# orjson encodes several times faster than the json module; without it responses are encoded as before
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Forms of a tabular answer (rows of records), picked by the request's Accept header:
+# JSON is a list of records, as jsonify always returned; COLUMNS is {"columns": [...], "data": [[...], ...]},
+# which names every column once instead of once per row; NDJSON is one record per line, streamed in batches
+JSON = 'application/json'
+COLUMNS = 'application/vnd.flights.columns+json'
+NDJSON = 'application/x-ndjson'
+MEDIA_TYPES = (JSON, COLUMNS, NDJSON)
+
+# Rows encoded per chunk of a streamed NDJSON response
+STREAM_BATCH_ROWS = 5000
+
+
+def _rows(df):
+    # Row tuples of native Python values, read a column at a time: several times faster than
+    # DataFrame.to_dict(orient='records'), which boxes every value on its own
+    if not len(df.columns):
+        return []
+
+    return list(zip(*(df[column].tolist() for column in df.columns)))
+
+
+def to_records(value):
+    # DataFrames as a list of records; anything else unchanged
+    if isinstance(value, pd.DataFrame):
+        columns = [str(column) for column in value.columns]
+
+        return [dict(zip(columns, row)) for row in _rows(value)]
+
+    return value
+
+
+def _default(value):
+    if isinstance(value, pd.DataFrame):
+        return to_records(value)
+    if isinstance(value, np.generic):
+        return value.item()
+    if value is pd.NaT:
+        return None
+
+    # Dates as HTTP dates, Decimal and UUID as strings, dataclasses as dicts, like Flask's own provider
+    return DefaultJSONProvider.default(value)
+
+
+def dumps(value, sort_keys=False):
+    """
+    Encode value as JSON bytes. Also takes DataFrames and numpy scalars and arrays; NaN becomes null with
+    orjson (NaN without it, as the json module writes it).
+    """
+    if orjson is not None:
+        option = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+
+        return orjson.dumps(value, default=_default, option=option)
+
+    return json.dumps(value, default=_default, sort_keys=sort_keys, separators=(',', ':')).encode()
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    # jsonify and request.get_json through orjson when it is installed
+    def dumps(self, obj, **kwargs):
+        if orjson is None:
+            return super().dumps(obj, **kwargs)
+
+        return dumps(obj, self.sort_keys).decode()
+
+    def loads(self, s, **kwargs):
+        if orjson is None:
+            return super().loads(s, **kwargs)
+
+        return orjson.loads(s)
+
+
+# ---- Tabular responses ----
+
+def response_type():
+    # Form the client asked for; plain JSON for no Accept header or */*
+    return request.accept_mimetypes.best_match(MEDIA_TYPES, default=JSON)
+
+
+def columns_body(rows):
+    """
+    {"columns": [...], "data": [[...], ...]} of a DataFrame or a list of records (which all have the keys
+    of the first). A DataFrame is read a column at a time, without building a dict per row.
+    """
+    if isinstance(rows, pd.DataFrame):
+        columns = [str(column) for column in rows.columns]
+        data = _rows(rows)
+    else:
+        columns = list(rows[0]) if rows else []
+        data = [[row.get(column) for column in columns] for row in rows]
+
+    return {'columns': columns, 'data': data}
+
+
+def _batches(rows):
+    if isinstance(rows, pd.DataFrame):
+        for start in range(0, len(rows), STREAM_BATCH_ROWS):
+            yield rows.iloc[start:start + STREAM_BATCH_ROWS]
+    else:
+        yield rows
+
+
+def _ndjson(batches):
+    for batch in batches:
+        records = to_records(batch)
+        if records:
+            yield b''.join(dumps(record) + b'\n' for record in records)
+
+
+def ndjson_response(batches, status=200, headers=None):
+    """
+    Stream batches (DataFrames or lists of records, e.g. straight from a database cursor) as NDJSON,
+    encoding each batch only when the previous one has been sent.
+    """
+    return Response(_ndjson(batches), status=status, headers=headers, mimetype=NDJSON)
+
+
+def rows_response(rows, status=200, headers=None):
+    """
+    Respond with a DataFrame or list of records in the form the Accept header asks for.
+    """
+    kind = response_type()
+    if kind == NDJSON:
+        return ndjson_response(_batches(rows), status, headers)
+
+    response = jsonify(columns_body(rows) if kind == COLUMNS else to_records(rows))
+    if kind == COLUMNS:
+        response.mimetype = COLUMNS
+    response.status_code = status
+    if headers:
+        response.headers.update(headers)
+
+    return response
+
+
+def result_response(result):
+    # Analytics and job results: tables as rows_response, anything else (a dict of values) as plain JSON
+    if isinstance(result, pd.DataFrame) or (isinstance(result, list) and all(isinstance(row, dict) for row in result)):
+        return rows_response(result)
+
+    return jsonify(result)
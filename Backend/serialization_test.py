@@ -0,0 +1,93 @@
+import datetime
+import json
+import unittest
+from unittest.mock import patch
+import numpy as np
+import pandas as pd
+from flask import Flask, jsonify, request
+import serialization
+
+ROUTES = pd.DataFrame({'sourceIATA': ['ATL', 'ATL', 'JFK'], 'destinationIATA': ['LAX', 'JFK', 'ATL'],
+                       'distance': [3100.5, np.nan, 1200.0]})
+
+
+class TestEncoding(unittest.TestCase):
+    def test_frames_and_numpy_values(self):
+        encoded = json.loads(serialization.dumps({'routes': ROUTES.head(1), 'count': np.int64(3)}))
+
+        self.assertEqual(encoded, {'routes': [{'sourceIATA': 'ATL', 'destinationIATA': 'LAX', 'distance': 3100.5}],
+                                   'count': 3})
+
+    def test_dates_match_flask(self):
+        flask_encoded = Flask(__name__).json.dumps({'flightDate': datetime.date(2022, 4, 17)})
+
+        self.assertEqual(json.loads(serialization.dumps({'flightDate': datetime.date(2022, 4, 17)})),
+                         json.loads(flask_encoded))
+
+    def test_columns_body(self):
+        body = serialization.columns_body(ROUTES)
+        records = serialization.columns_body([{'legID': 'a1', 'totalFare': 300.0}, {'legID': 'a2', 'totalFare': 340.0}])
+
+        self.assertEqual(body['columns'], ['sourceIATA', 'destinationIATA', 'distance'])
+        self.assertEqual(list(body['data'][2]), ['JFK', 'ATL', 1200.0])
+        self.assertEqual(records, {'columns': ['legID', 'totalFare'], 'data': [['a1', 300.0], ['a2', 340.0]]})
+        self.assertEqual(serialization.columns_body([]), {'columns': [], 'data': []})
+
+
+class TestNegotiation(unittest.TestCase):
+    def setUp(self):
+        app = Flask(__name__)
+        app.json = serialization.FastJSONProvider(app)
+
+        @app.route('/routes')
+        def routes():
+            return serialization.rows_response(ROUTES, headers={'X-Next-Cursor': 'abc'})
+
+        @app.route('/correlations')
+        def correlations():
+            return serialization.result_response({'a': {'a': 1.0}})
+
+        @app.route('/echo', methods=['POST'])
+        def echo():
+            return jsonify(request.get_json())
+
+        self.client = app.test_client()
+
+    def test_plain_json_by_default(self):
+        for accept in (None, '*/*', 'application/json', 'text/html,*/*;q=0.8'):
+            response = self.client.get('/routes', headers={'Accept': accept} if accept else {})
+
+            self.assertEqual(response.mimetype, serialization.JSON)
+            self.assertEqual(response.get_json()[0], {'destinationIATA': 'LAX', 'distance': 3100.5, 'sourceIATA': 'ATL'})
+            self.assertEqual(response.headers['X-Next-Cursor'], 'abc')
+
+    def test_columns(self):
+        response = self.client.get('/routes', headers={'Accept': f'{serialization.COLUMNS}, application/json;q=0.9'})
+        body = json.loads(response.data)
+
+        self.assertEqual(response.mimetype, serialization.COLUMNS)
+        self.assertEqual(body['columns'], ['sourceIATA', 'destinationIATA', 'distance'])
+        self.assertEqual(body['data'][0], ['ATL', 'LAX', 3100.5])
+
+    def test_ndjson_is_streamed_in_batches(self):
+        with patch.object(serialization, 'STREAM_BATCH_ROWS', 2):
+            response = self.client.get('/routes', headers={'Accept': serialization.NDJSON})
+            chunks = list(response.response)
+
+        self.assertTrue(response.is_streamed)
+        self.assertEqual(len(chunks), 2)
+        lines = b''.join(chunks).decode().splitlines()
+        self.assertEqual([json.loads(line)['destinationIATA'] for line in lines], ['LAX', 'JFK', 'ATL'])
+
+    def test_non_tabular_results_stay_json(self):
+        response = self.client.get('/correlations', headers={'Accept': serialization.COLUMNS})
+
+        self.assertEqual(response.mimetype, serialization.JSON)
+        self.assertEqual(response.get_json(), {'a': {'a': 1.0}})
+
+    def test_request_bodies_are_decoded(self):
+        self.assertEqual(self.client.post('/echo', json={'legIDs': ['a1']}).get_json(), {'legIDs': ['a1']})
+
+
+if __name__ == '__main__':
+    unittest.main()
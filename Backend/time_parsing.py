@@ -0,0 +1,204 @@
+import re
+import numpy as np
+import pandas as pd
+
+# Multi-segment legs join their per-segment values with this separator
+SEGMENT_SEPARATOR = '||'
+
+# Expedia timestamps look like 2022-04-17T12:57:00.000-04:00; the first 19 characters are local wall-clock time
+LOCAL_TIMESTAMP_LENGTH = 19
+
+# ISO-8601 durations such as PT2H29M or P1DT3H5M
+DURATION_PATTERN = re.compile(r'^P(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?(?:(\d+(?:\.\d+)?)S)?)?$')
+
+NAT = np.iinfo(np.int64).min
+NS_PER_MINUTE = 60 * 10**9
+MINUTES_PER_DAY = 1440
+
+# Character positions of the digits in YYYY-MM-DDTHH:MM:SS
+_DIGIT_POSITIONS = [0, 1, 2, 3, 5, 6, 8, 9, 11, 12, 14, 15, 17, 18]
+_FRACTION_START = 20
+_MAX_FRACTION_DIGITS = 9
+_ZERO, _PLUS, _MINUS, _DOT, _COLON, _SPACE, _T, _Z = (ord(c) for c in '0+-.: TZ')
+
+
+def _as_series(values):
+    if isinstance(values, pd.Series):
+        return values
+
+    return pd.Series(values, dtype=object)
+
+
+def _factorize_segments(values, segment):
+    # Each distinct string is split once; callers expand results back with codes (-1 = missing)
+    values = _as_series(values)
+    codes, uniques = pd.factorize(values)
+    uniques = np.asarray(uniques, dtype=object)
+    if segment == 'first':
+        picked = [str(value).partition(SEGMENT_SEPARATOR)[0] for value in uniques]
+    else:
+        picked = [str(value).rpartition(SEGMENT_SEPARATOR)[2] for value in uniques]
+
+    return values.index, codes, picked
+
+
+def _expand(unique_values, codes, missing):
+    return np.append(unique_values, np.asarray([missing], dtype=unique_values.dtype))[codes]
+
+
+def select_segment(values, segment='first'):
+    """
+    Pick one segment ('first' or 'last') of ||-joined values; single segment values are returned as they are.
+    """
+    index, codes, picked = _factorize_segments(values, segment)
+
+    return pd.Series(_expand(np.array(picked, dtype=object), codes, None), index=index, dtype=object)
+
+
+def _parse_layout(strings):
+    """
+    Parse YYYY-MM-DDTHH:MM:SS[.fff][Z|+HH:MM|+HHMM|+HH] timestamps with array arithmetic on their characters.
+    Returns local wall-clock nanoseconds since the epoch, the UTC offset in minutes and a mask of rows
+    that follow the layout.
+    """
+    chars = np.array(strings, dtype=str)
+    width = chars.dtype.itemsize // 4
+    codes = chars.view(np.uint32).reshape(len(strings), width) if len(strings) else np.zeros((0, 1), np.uint32)
+    # Zero padding: the fraction and offset lookups below never run past the end
+    target = max(width, _FRACTION_START + _MAX_FRACTION_DIGITS) + 7
+    codes = np.pad(codes, ((0, 0), (0, target - codes.shape[1]))).astype(np.int64)
+
+    is_digit = (codes >= _ZERO) & (codes <= _ZERO + 9)
+    digits = codes - _ZERO
+
+    def number(*positions):
+        value = np.zeros(len(codes), dtype=np.int64)
+        for position in positions:
+            value = value * 10 + digits[:, position]
+        return value
+
+    year, month, day = number(0, 1, 2, 3), number(5, 6), number(8, 9)
+    hour, minute, second = number(11, 12), number(14, 15), number(17, 18)
+
+    valid = (is_digit[:, _DIGIT_POSITIONS].all(axis=1)
+             & (codes[:, 4] == _MINUS) & (codes[:, 7] == _MINUS) & np.isin(codes[:, 10], [_T, _SPACE])
+             & (codes[:, 13] == _COLON) & (codes[:, 16] == _COLON)
+             & (year >= 1678) & (year <= 2261) & (month >= 1) & (month <= 12)
+             & (hour < 24) & (minute < 60) & (second < 60))
+
+    # Day must exist in its month
+    month_start = ((np.clip(year, 1678, 2261) - 1970) * 12 + np.clip(month, 1, 12) - 1).astype('datetime64[M]')
+    days_in_month = ((month_start + 1).astype('datetime64[D]') - month_start.astype('datetime64[D]')).astype(np.int64)
+    valid &= (day >= 1) & (day <= days_in_month)
+
+    # Fractional seconds run from position 20 to the first non-digit
+    has_fraction = codes[:, 19] == _DOT
+    fraction_end = _FRACTION_START + np.argmax(~is_digit[:, _FRACTION_START:], axis=1)
+    offset_start = np.where(has_fraction, fraction_end, 19)
+    fraction = np.zeros(len(codes), dtype=np.int64)
+    for k in range(_MAX_FRACTION_DIGITS):
+        column = _FRACTION_START + k
+        fraction += np.where(column < fraction_end, digits[:, column], 0) * 10 ** (_MAX_FRACTION_DIGITS - 1 - k)
+    valid &= ~has_fraction | ((fraction_end > _FRACTION_START) & (fraction_end <= _FRACTION_START + _MAX_FRACTION_DIGITS))
+
+    tz = np.take_along_axis(codes, offset_start[:, None] + np.arange(7), axis=1)
+    tz_digit = (tz >= _ZERO) & (tz <= _ZERO + 9)
+    tz_digits = tz - _ZERO
+    signed = np.isin(tz[:, 0], [_PLUS, _MINUS]) & tz_digit[:, 1] & tz_digit[:, 2]
+    hh_mm = signed & (tz[:, 3] == _COLON) & tz_digit[:, 4] & tz_digit[:, 5] & (tz[:, 6] == 0)
+    hhmm = signed & tz_digit[:, 3] & tz_digit[:, 4] & (tz[:, 5] == 0)
+    hh = signed & (tz[:, 3] == 0)
+    # A missing offset is read as UTC, like pd.to_datetime(..., utc=True)
+    utc = (tz[:, 0] == 0) | ((tz[:, 0] == _Z) & (tz[:, 1] == 0))
+    valid &= utc | hh_mm | hhmm | hh
+
+    offset_minutes = np.where(hh_mm, tz_digits[:, 4] * 10 + tz_digits[:, 5], 0)
+    offset_minutes = np.where(hhmm, tz_digits[:, 3] * 10 + tz_digits[:, 4], offset_minutes)
+    offset_minutes += (tz_digits[:, 1] * 10 + tz_digits[:, 2]) * 60
+    offset_minutes = np.where(utc, 0, np.where(tz[:, 0] == _MINUS, -offset_minutes, offset_minutes))
+
+    days = month_start.astype('datetime64[D]').astype(np.int64) + day - 1
+    local = (((days * 24 + hour) * 60 + minute) * 60 + second) * 10**9 + fraction
+
+    return np.where(valid, local, NAT), offset_minutes, valid
+
+
+def _parse_unique(values, segment, utc):
+    # Nanoseconds since the epoch (NAT when unparseable) of each distinct value, plus codes to expand them
+    index, codes, picked = _factorize_segments(values, segment)
+    local, offset_minutes, valid = _parse_layout(picked)
+    parsed = np.where(valid, local - offset_minutes * NS_PER_MINUTE, NAT) if utc else local
+
+    if not valid.all():
+        # Anything outside the fast layout (dates only, week dates, ...) goes through pandas
+        others = pd.Series(np.array(picked, dtype=object)[~valid], dtype=object)
+        if utc:
+            fallback = pd.to_datetime(others, format='ISO8601', utc=True, errors='coerce').dt.tz_convert(None)
+        else:
+            fallback = pd.to_datetime(others.str.slice(0, LOCAL_TIMESTAMP_LENGTH), format='ISO8601', errors='coerce')
+        parsed[~valid] = fallback.to_numpy(dtype='datetime64[ns]').view(np.int64)
+
+    return index, codes, parsed
+
+
+def parse_timestamps(values, segment='first'):
+    """
+    Parse ISO-8601 timestamps into a UTC datetime Series; unparseable values become NaT.
+    """
+    index, codes, parsed = _parse_unique(values, segment, utc=True)
+
+    return pd.Series(_expand(parsed, codes, NAT).view('datetime64[ns]'), index=index).dt.tz_localize('UTC')
+
+
+def parse_local_timestamps(values, segment='first'):
+    """
+    Parse ISO-8601 timestamps as local wall-clock time, ignoring fractional seconds and the UTC offset.
+    """
+    index, codes, parsed = _parse_unique(values, segment, utc=False)
+    seconds = np.where(parsed == NAT, NAT, parsed // 10**9 * 10**9)
+
+    return pd.Series(_expand(seconds, codes, NAT).view('datetime64[ns]'), index=index)
+
+
+def minutes_of_day(values, segment='first', utc=True):
+    """
+    Minutes since midnight of each timestamp, in UTC or local wall-clock time; NaN when unparseable.
+    """
+    index, codes, parsed = _parse_unique(values, segment, utc)
+    minutes = np.where(parsed == NAT, np.nan, (parsed // NS_PER_MINUTE) % MINUTES_PER_DAY)
+
+    return pd.Series(_expand(minutes, codes, np.nan), index=index, dtype='float64')
+
+
+def minutes_between(start, end, start_segment='last', end_segment='first'):
+    """
+    Whole minutes from each start timestamp to the matching end timestamp (e.g. a layover); NaN when unparseable.
+    """
+    start = parse_timestamps(start, start_segment).reset_index(drop=True)
+    end = parse_timestamps(end, end_segment).reset_index(drop=True)
+
+    return ((end - start).dt.total_seconds() // 60).to_numpy()
+
+
+def _duration_minutes(duration):
+    total = 0.0
+    for part in duration.split(SEGMENT_SEPARATOR):
+        match = DURATION_PATTERN.match(part)
+        if not match or match.end() == 1:  # a bare 'P' is not a duration
+            return np.nan
+        days, hours, minutes, seconds = (float(group) if group else 0.0 for group in match.groups())
+        total += days * MINUTES_PER_DAY + hours * 60 + minutes + seconds / 60
+
+    return total
+
+
+def durations_to_minutes(values):
+    """
+    Total minutes of ISO-8601 durations, summing the segments of ||-joined values; NaN when unparseable.
+    """
+    values = _as_series(values)
+    # Durations repeat heavily, so each distinct string is parsed once
+    codes, uniques = pd.factorize(values)
+    parsed = np.array([_duration_minutes(value) if isinstance(value, str) else np.nan for value in uniques])
+
+    return pd.Series(_expand(parsed, codes, np.nan), index=values.index, dtype='float64')
@@ -0,0 +1,47 @@
+import unittest
+import numpy as np
+import pandas as pd
+from time_parsing import durations_to_minutes, minutes_between, minutes_of_day, parse_local_timestamps, select_segment
+
+TWO_SEGMENTS = '2022-04-17T23:57:00.000-07:00||2022-04-18T03:10:00.000-04:00'
+
+
+class TestTimeParsing(unittest.TestCase):
+    def test_select_segment(self):
+        values = pd.Series(['a', 'a||b||c', None], index=[5, 6, 7])
+
+        self.assertEqual(select_segment(values, 'first').tolist(), ['a', 'a', None])
+        self.assertEqual(select_segment(values, 'last').tolist(), ['a', 'c', None])
+        self.assertEqual(list(select_segment(values).index), [5, 6, 7])
+
+    def test_minutes_of_day(self):
+        values = ['2022-04-17T12:57:00.000-04:00', TWO_SEGMENTS, None, 'invalid-time']
+
+        np.testing.assert_array_equal(minutes_of_day(values), [16 * 60 + 57, 6 * 60 + 57, np.nan, np.nan])
+        np.testing.assert_array_equal(minutes_of_day(values, 'last', utc=False), [12 * 60 + 57, 3 * 60 + 10, np.nan, np.nan])
+
+    def test_matches_row_by_row_parsing(self):
+        rng = np.random.default_rng(0)
+        stamps = pd.Timestamp('2022-04-16') + pd.to_timedelta(rng.integers(0, 60 * 1440, 500), unit='min')
+        offsets = rng.choice(['-04:00', '-07:00', '+00:00'], 500)
+        values = pd.Series([f"{stamp:%Y-%m-%dT%H:%M:%S}.000{offset}" for stamp, offset in zip(stamps, offsets)])
+
+        expected = values.apply(lambda value: pd.to_datetime(value, utc=True)).dt
+        np.testing.assert_array_equal(minutes_of_day(values), expected.hour * 60 + expected.minute)
+        pd.testing.assert_series_equal(parse_local_timestamps(values), pd.Series(stamps).astype(parse_local_timestamps(values).dtype),
+                                       check_names=False)
+
+    def test_minutes_between(self):
+        layovers = minutes_between(['2024-01-01T12:00:00.000-05:00', TWO_SEGMENTS],
+                                   ['2024-01-01T15:00:00.000-04:00', '2022-04-18T05:10:00.000-04:00'])
+
+        np.testing.assert_array_equal(layovers, [120, 120])
+
+    def test_durations_to_minutes(self):
+        values = pd.Series(['PT2H30M', 'PT45M', 'PT3H', 'P1DT2M', 'PT1H||PT20M', 'Invalid', None, 'PT2H30M'])
+
+        np.testing.assert_array_equal(durations_to_minutes(values), [150, 45, 180, 1442, 80, np.nan, np.nan, 150])
+
+
+if __name__ == '__main__':
+    unittest.main()
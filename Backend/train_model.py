@@ -3,12 +3,15 @@ import pandas as pd
 from sklearn.tree import DecisionTreeClassifier
 from sklearn.model_selection import train_test_split
 import joblib
+from tree_model import export_tree
 
-# Load prepared data
-df = pd.read_csv('prepared_data.csv')
+from data_preparation import MODEL_FEATURES, load_prepared_data
+
+# Load prepared data, reading only the columns the model needs
+df = load_prepared_data(columns=MODEL_FEATURES + ['ArrDelayMinutes'])
 
 # Split your dataset into features and target variable
-X = df.drop(['FlightDate', 'ArrDelayMinutes', 'DepDelayMinutes'], axis=1)
+X = df[MODEL_FEATURES]
 y = df['ArrDelayMinutes']
 
 # Split the data into training and testing sets
@@ -18,8 +21,9 @@ X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2)
 clf = DecisionTreeClassifier()
 clf.fit(X_train, y_train)
 
-# Save the trained model
+# Save the trained model, plus the flattened copy used for serving
 joblib.dump(clf, 'flight_delay_predictor.joblib')
+export_tree(clf, 'flight_delay_predictor.npz')
 
 if __name__ == '__main__':
     print("Model training complete.")
@@ -0,0 +1,106 @@
+import numpy as np
+
+# children_left/children_right value of a leaf, same as sklearn.tree._tree.TREE_LEAF
+TREE_LEAF = -1
+
+# Batches up to this size are walked row by row instead of level by level
+SCALAR_BATCH_SIZE = 64
+
+
+class CompiledTree:
+    """
+    A fitted DecisionTreeClassifier flattened into NumPy arrays.
+
+    predict() walks every row of a batch down the tree at once, one level per iteration, so
+    serving doesn't need scikit-learn. Small batches take a plain Python walk instead, which
+    beats per-level NumPy overhead on deep trees.
+    """
+
+    def __init__(self, feature, threshold, left, right, value, missing_go_to_left=None, feature_names=None):
+        self.feature = np.asarray(feature, dtype=np.int32)
+        self.threshold = np.asarray(threshold, dtype=np.float64)
+        self.left = np.asarray(left, dtype=np.int32)
+        self.right = np.asarray(right, dtype=np.int32)
+        self.value = np.asarray(value)
+        if missing_go_to_left is None:
+            missing_go_to_left = np.zeros(len(self.feature), dtype=bool)
+        self.missing_go_to_left = np.asarray(missing_go_to_left, dtype=bool)
+        self.feature_names = list(feature_names) if feature_names is not None else None
+        self._lists = None
+
+    def apply(self, X):
+        """
+        Leaf node index reached by each row.
+        """
+        if self.feature_names is not None and hasattr(X, 'columns'):
+            X = X[self.feature_names]
+        # sklearn compares float32 features against float64 thresholds
+        X = np.asarray(X, dtype=np.float32)
+
+        if len(X) <= SCALAR_BATCH_SIZE:
+            return np.array([self._apply_row(row) for row in X.tolist()], dtype=np.int32)
+
+        has_missing = np.isnan(X).any()
+        node = np.zeros(len(X), dtype=np.int32)
+        active = np.arange(len(X)) if self.left[0] != TREE_LEAF else np.empty(0, dtype=np.int64)
+        while active.size:
+            current = node[active]
+            values = X[active, self.feature[current]]
+            go_left = values <= self.threshold[current]
+            if has_missing:
+                go_left = np.where(np.isnan(values), self.missing_go_to_left[current], go_left)
+            node[active] = np.where(go_left, self.left[current], self.right[current])
+            active = active[self.left[node[active]] != TREE_LEAF]
+
+        return node
+
+    def _apply_row(self, row):
+        # Plain Python walk; per-level NumPy overhead dominates for a handful of rows on deep trees
+        if self._lists is None:
+            self._lists = (self.feature.tolist(), self.threshold.tolist(), self.left.tolist(),
+                           self.right.tolist(), self.missing_go_to_left.tolist())
+        feature, threshold, left, right, missing_go_to_left = self._lists
+
+        node = 0
+        while left[node] != TREE_LEAF:
+            value = row[feature[node]]
+            if value != value:  # NaN
+                go_left = missing_go_to_left[node]
+            else:
+                go_left = value <= threshold[node]
+            node = left[node] if go_left else right[node]
+
+        return node
+
+    def predict(self, X):
+        return self.value[self.apply(X)]
+
+
+def export_tree(clf, path):
+    """
+    Save a fitted DecisionTreeClassifier as an .npz file loadable with load_tree.
+    """
+    tree = clf.tree_
+    # Predicted class of every node; only leaves are ever read
+    value = clf.classes_[np.argmax(tree.value[:, 0, :], axis=1)]
+    feature_names = getattr(clf, 'feature_names_in_', None)
+
+    np.savez(
+        path,
+        feature=tree.feature.astype(np.int32),
+        threshold=tree.threshold,
+        left=tree.children_left.astype(np.int32),
+        right=tree.children_right.astype(np.int32),
+        value=value,
+        missing_go_to_left=getattr(tree, 'missing_go_to_left', np.zeros(tree.node_count, dtype=np.uint8)).astype(bool),
+        feature_names=np.asarray(feature_names if feature_names is not None else [], dtype=str),
+    )
+
+
+def load_tree(path):
+    with np.load(path, allow_pickle=False) as arrays:
+        feature_names = arrays['feature_names'].tolist() or None
+
+        return CompiledTree(
+            arrays['feature'], arrays['threshold'], arrays['left'], arrays['right'], arrays['value'],
+            missing_go_to_left=arrays['missing_go_to_left'], feature_names=feature_names)
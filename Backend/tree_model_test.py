@@ -0,0 +1,69 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+from sklearn.tree import DecisionTreeClassifier
+from tree_model import export_tree, load_tree
+
+
+def make_delay_frame(rows, rng):
+    # Same shape as the prepared delay data: minute-of-day times and encoded categoricals
+    return pd.DataFrame({
+        'DepTime': rng.integers(0, 1440, rows).astype(float),
+        'ArrTime': rng.integers(0, 1440, rows).astype(float),
+        'IATA_Code_Operating_Airline': rng.integers(-1, 20, rows),
+        'Origin': rng.integers(-1, 300, rows),
+        'Dest': rng.integers(-1, 300, rows),
+    })
+
+
+class TestCompiledTree(unittest.TestCase):
+    def setUp(self):
+        self.rng = np.random.default_rng(42)
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'model.npz')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def assert_equivalent(self, clf, X):
+        export_tree(clf, self.path)
+        compiled = load_tree(self.path)
+
+        np.testing.assert_array_equal(compiled.predict(X), clf.predict(X))
+        np.testing.assert_array_equal(compiled.apply(X), clf.apply(X))
+
+    def test_matches_sklearn_predict(self):
+        X = make_delay_frame(5000, self.rng)
+        # Delay minutes as class labels, like train_model.py
+        y = np.round(self.rng.gamma(1.0, 15.0, len(X)))
+        clf = DecisionTreeClassifier(random_state=0).fit(X, y)
+
+        self.assert_equivalent(clf, make_delay_frame(2000, self.rng))
+        self.assert_equivalent(clf, X)
+
+    def test_reorders_dataframe_columns(self):
+        X = make_delay_frame(1000, self.rng)
+        clf = DecisionTreeClassifier(max_depth=6, random_state=0).fit(X, X['DepTime'] > 720)
+        export_tree(clf, self.path)
+
+        shuffled = X[['Dest', 'Origin', 'ArrTime', 'IATA_Code_Operating_Airline', 'DepTime']]
+        np.testing.assert_array_equal(load_tree(self.path).predict(shuffled), clf.predict(X))
+
+    def test_missing_values(self):
+        X = make_delay_frame(2000, self.rng)
+        X.loc[self.rng.random(len(X)) < 0.1, 'DepTime'] = np.nan
+        clf = DecisionTreeClassifier(max_depth=8, random_state=0).fit(X, self.rng.integers(0, 3, len(X)))
+
+        self.assert_equivalent(clf, X)
+
+    def test_single_leaf_and_numpy_input(self):
+        X = self.rng.random((50, 3))
+        clf = DecisionTreeClassifier().fit(X, np.ones(50))
+
+        self.assert_equivalent(clf, X)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,184 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Backend the GUI (and any script importing this module) talks to
+API_URL = os.getenv('FLIGHTS_API_URL', 'http://127.0.0.1:5000')
+# Seconds to connect to the backend and to wait for its answer
+REQUEST_TIMEOUT = (3.05, 60)
+# Connection failures (any method) and 502/503/504 answers to GETs are retried with exponential backoff:
+# RETRY_BACKOFF, then twice that, ...
+RETRIES = 3
+RETRY_BACKOFF = 0.3
+# Keep-alive connections kept open to the backend; at least one per dispatcher worker
+POOL_SIZE = 8
+
+# Successful GETs of these endpoints are cached for CACHE_TTL seconds, the CACHE_SIZE most recently used
+CACHE_SIZE = 128
+CACHE_TTL = int(os.getenv('FLIGHTS_API_CACHE_TTL', '300'))
+ROUTE_PATHS = ('/airports', '/airline', '/country', '/countries', '/connections')
+CACHED_PATHS = ROUTE_PATHS + ('/flight_details', '/get_preferences')
+
+# Tables are asked for in the backend's compact column form, {"columns": [...], "data": [[...], ...]}, which
+# names each column once instead of once per row, and turned back into records here
+COLUMNS_MEDIA_TYPE = 'application/vnd.flights.columns+json'
+ACCEPT = f'{COLUMNS_MEDIA_TYPE}, application/json;q=0.9'
+
+# Header with the cursor of the next page of a paginated answer (?limit=N&cursor=...)
+NEXT_CURSOR_HEADER = 'X-Next-Cursor'
+
+# Cached endpoints whose answers a successful POST makes stale
+INVALIDATES = {
+    '/add_preferences': ('/get_preferences',),
+    '/refresh_routes': ROUTE_PATHS,
+}
+
+
+class ResponseCache:
+    """
+    LRU cache of decoded response bodies with a time-to-live. Cached bodies are shared between callers,
+    who must not modify them. Bodies that came with an ETag are also kept as validators after they expire,
+    so the backend can confirm them with a 304 instead of sending them again.
+    """
+
+    def __init__(self, size=CACHE_SIZE, ttl=CACHE_TTL):
+        self.size = size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._validators = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.monotonic() - entry[0] > self.ttl:
+                self._entries.pop(key, None)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+
+            return entry[1]
+
+    def put(self, key, value, etag=None):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+            if etag is not None:
+                self._validators[key] = (etag, value)
+                self._validators.move_to_end(key)
+                while len(self._validators) > self.size:
+                    self._validators.popitem(last=False)
+
+    def validator(self, key):
+        # (ETag, body) of the last answer for key, fresh or not; None when there is none
+        with self._lock:
+            return self._validators.get(key)
+
+    def invalidate(self, paths=None):
+        # Drops the entries of the given endpoints, or everything
+        with self._lock:
+            for entries in (self._entries, self._validators):
+                for key in list(entries):
+                    if paths is None or key[0] in paths:
+                        del entries[key]
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def records_from_columns(body):
+    columns = body['columns']
+
+    return [dict(zip(columns, row)) for row in body['data']]
+
+
+class ApiClient:
+    """
+    Talks to the Flask backend over one pooled keep-alive session. Calls return (status code, decoded body)
+    and are safe to make from several threads at once.
+    """
+
+    def __init__(self, base_url=API_URL, timeout=REQUEST_TIMEOUT, retries=RETRIES, backoff=RETRY_BACKOFF,
+                 cache_size=CACHE_SIZE, cache_ttl=CACHE_TTL):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.cache = ResponseCache(cache_size, cache_ttl)
+
+        retry = Retry(total=retries, connect=retries, read=retries, status=retries, backoff_factor=backoff,
+                      status_forcelist=(502, 503, 504), allowed_methods=frozenset({'GET', 'HEAD'}),
+                      raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE, max_retries=retry)
+        self.session = requests.Session()
+        self.session.headers['Accept'] = ACCEPT
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def url(self, path):
+        return f"{self.base_url}/{path.lstrip('/')}"
+
+    def _send(self, method, path, params=None, json=None, headers=None):
+        response = self.session.request(method, self.url(path), params=params, json=json, headers=headers,
+                                        timeout=self.timeout)
+        try:
+            body = response.json()
+        except ValueError:
+            body = response.text
+        else:
+            if response.headers.get('Content-Type', '').startswith(COLUMNS_MEDIA_TYPE):
+                body = records_from_columns(body)
+
+        return response.status_code, body, response.headers
+
+    def request(self, method, path, params=None, json=None):
+        return self._send(method, path, params, json)[:2]
+
+    def get(self, path, params=None, cache=True):
+        """
+        GET path; answers from CACHED_PATHS come from the cache while fresh, unless cache is False.
+        """
+        return self.get_page(path, params, cache)[:2]
+
+    def get_page(self, path, params=None, cache=True):
+        """
+        GET path like get, also returning the cursor of the next page (None on the last page or when the
+        answer isn't paginated). Expired answers with an ETag are revalidated rather than fetched again.
+        """
+        cacheable = cache and path in CACHED_PATHS
+        key = (path, tuple(sorted((params or {}).items())))
+        validator = None
+        if cacheable:
+            entry = self.cache.get(key)
+            if entry is not None:
+                return (200,) + entry
+            validator = self.cache.validator(key)
+
+        status, body, headers = self._send('GET', path, params=params,
+                                           headers={'If-None-Match': validator[0]} if validator else None)
+        if status == 304 and validator is not None:
+            status, (body, cursor) = 200, validator[1]
+        else:
+            cursor = headers.get(NEXT_CURSOR_HEADER)
+        if cacheable and status == 200:
+            self.cache.put(key, (body, cursor), headers.get('ETag'))
+
+        return status, body, cursor
+
+    def post(self, path, json=None, params=None):
+        status, body = self.request('POST', path, params=params, json=json)
+        if 200 <= status < 300 and path in INVALIDATES:
+            self.cache.invalidate(INVALIDATES[path])
+
+        return status, body
+
+    def close(self):
+        self.session.close()
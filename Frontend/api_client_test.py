@@ -0,0 +1,171 @@
+import json
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+import api_client
+from api_client import ApiClient, ResponseCache
+
+
+class Backend(BaseHTTPRequestHandler):
+    # Minimal stand-in for the Flask backend that records what it was asked
+    protocol_version = 'HTTP/1.1'
+    requests = []
+    failures = {}
+
+    def _answer(self, status, body, cursor=None, content_type='application/json'):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        if self.path.startswith('/trends'):
+            self.send_header('ETag', 'W/"v1"')
+        if cursor is not None:
+            self.send_header(api_client.NEXT_CURSOR_HEADER, cursor)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _handle(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = json.loads(self.rfile.read(length)) if length else None
+        self.requests.append((self.command, self.path, body, self.client_address[1]))
+        path = self.path.split('?')[0]
+        if self.failures.get(path):
+            self.failures[path] -= 1
+            self._answer(503, {'error': 'busy'})
+        elif path == '/trends' and self.headers.get('If-None-Match') == 'W/"v1"':
+            self.send_response(304)
+            self.send_header('ETag', 'W/"v1"')
+            self.end_headers()
+        elif path == '/countries' and api_client.COLUMNS_MEDIA_TYPE in self.headers.get('Accept', ''):
+            self._answer(200, {'columns': ['sourceIATA', 'destinationIATA'], 'data': [['ATL', 'LAX'], ['JFK', 'SEA']]},
+                         content_type=api_client.COLUMNS_MEDIA_TYPE)
+        else:
+            cursor = f'after-{len(self.requests)}' if 'limit=' in self.path else None
+            self._answer(201 if self.command == 'POST' else 200, {'path': self.path, 'calls': len(self.requests)},
+                         cursor)
+
+    do_GET = do_POST = _handle
+
+    def log_message(self, *args):
+        pass
+
+
+class TestApiClient(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), Backend)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        Backend.requests = []
+        Backend.failures = {}
+        self.client = ApiClient(f'http://127.0.0.1:{self.server.server_port}/', backoff=0)
+        self.addCleanup(self.client.close)
+
+    def test_repeated_route_search_is_served_from_cache(self):
+        first = self.client.get('/airports', {'source': 'ATL', 'destination': 'LAX'})
+        second = self.client.get('/airports', {'destination': 'LAX', 'source': 'ATL'})
+
+        self.assertEqual(first, second)
+        self.assertEqual(len(Backend.requests), 1)
+        self.assertEqual(Backend.requests[0][1], '/airports?source=ATL&destination=LAX')
+        self.assertEqual((self.client.cache.hits, self.client.cache.misses), (1, 1))
+
+    def test_uncached_endpoints_and_opt_out_always_hit_the_backend(self):
+        self.client.get('/jobs/abc')
+        self.client.get('/jobs/abc')
+        self.client.get('/airline', {'airline_name': 'Delta'}, cache=False)
+
+        self.assertEqual(len(Backend.requests), 3)
+        self.assertEqual(len(self.client.cache), 0)
+
+    def test_saving_preferences_invalidates_cached_preferences(self):
+        self.client.get('/get_preferences', {'userID': 1})
+        self.client.get('/airports', {'source': 'ATL', 'destination': 'LAX'})
+        status, _ = self.client.post('/add_preferences', json={'userID': 1})
+        self.client.get('/get_preferences', {'userID': 1})
+        self.client.get('/airports', {'source': 'ATL', 'destination': 'LAX'})
+
+        self.assertEqual(status, 201)
+        self.assertEqual([request[1] for request in Backend.requests],
+                         ['/get_preferences?userID=1', '/airports?source=ATL&destination=LAX', '/add_preferences',
+                          '/get_preferences?userID=1'])
+        self.assertEqual(Backend.requests[2][2], {'userID': 1})
+
+    def test_gets_are_retried_on_unavailable_backend(self):
+        Backend.failures['/airline'] = 2
+        status, _ = self.client.get('/airline', {'airline_name': 'Delta'})
+
+        self.assertEqual(status, 200)
+        self.assertEqual(len(Backend.requests), 3)
+
+    def test_posts_are_not_retried(self):
+        Backend.failures['/create_user'] = 1
+        status, body = self.client.post('/create_user', json={})
+
+        self.assertEqual(status, 503)
+        self.assertEqual(body, {'error': 'busy'})
+        self.assertEqual(len(Backend.requests), 1)
+
+    def test_page_cursor_is_returned_and_cached_with_the_page(self):
+        first = self.client.get_page('/airline', {'airline_name': 'Delta', 'limit': 2})
+        second = self.client.get_page('/airline', {'airline_name': 'Delta', 'limit': 2})
+        _, _, cursor = self.client.get_page('/airline', {'airline_name': 'Delta'})
+
+        self.assertEqual(first[2], 'after-1')
+        self.assertEqual(first, second)
+        self.assertIsNone(cursor)
+        self.assertEqual(len(Backend.requests), 2)
+
+    def test_compact_tables_are_decoded_into_records(self):
+        status, body = self.client.get('/countries', {'source': 'United States', 'destination': 'Canada'})
+
+        self.assertEqual(status, 200)
+        self.assertEqual(body, [{'sourceIATA': 'ATL', 'destinationIATA': 'LAX'},
+                                {'sourceIATA': 'JFK', 'destinationIATA': 'SEA'}])
+
+    def test_expired_answers_are_revalidated(self):
+        with patch.object(api_client, 'CACHED_PATHS', ('/trends',)):
+            client = ApiClient(f'http://127.0.0.1:{self.server.server_port}', backoff=0, cache_ttl=-1)
+            self.addCleanup(client.close)
+            first = client.get('/trends', {'start_date': '2022-04-01'})
+            second = client.get('/trends', {'start_date': '2022-04-01'})
+
+        self.assertEqual(first, second)
+        self.assertEqual(first[1]['calls'], 1)
+        self.assertEqual(len(Backend.requests), 2)
+
+    def test_connection_is_kept_alive(self):
+        for airline in ('Delta', 'United', 'Alaska'):
+            self.client.get('/airline', {'airline_name': airline})
+
+        self.assertEqual(len({request[3] for request in Backend.requests}), 1)
+
+
+class TestResponseCache(unittest.TestCase):
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = ResponseCache(size=2, ttl=60)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        cache.get('a')
+        cache.put('c', 3)
+
+        self.assertEqual((cache.get('a'), cache.get('b'), cache.get('c')), (1, None, 3))
+
+    def test_entries_expire(self):
+        cache = ResponseCache(size=2, ttl=10)
+        with patch.object(api_client.time, 'monotonic', return_value=100.0):
+            cache.put('a', 1)
+        with patch.object(api_client.time, 'monotonic', return_value=111.0):
+            self.assertIsNone(cache.get('a'))
+        self.assertEqual(len(cache), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,145 @@
+import queue
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Worker threads running backend calls, and how often finished calls are handed back to the Tk main loop
+DISPATCH_WORKERS = 4
+DISPATCH_POLL_MS = 25
+
+
+class Call:
+    """
+    A function submitted to the Dispatcher. Its callbacks run on the Tk main thread, unless the call is
+    cancelled or times out first, in which case a late result is dropped.
+    """
+
+    def __init__(self, key, message, timeout, on_success, on_error):
+        self.key = key
+        self.message = message
+        self.timeout = timeout
+        self.deadline = time.monotonic() + timeout if timeout else None
+        self.on_success = on_success
+        self.on_error = on_error
+        self.future = None
+        self.cancelled = False
+        self.done = False
+
+
+class Dispatcher:
+    """
+    Runs blocking calls (HTTP requests, decoding, formatting) on a thread pool so the Tk window stays
+    responsive. Workers never touch Tk: they put their results on a queue that the main thread drains
+    with root.after while calls are pending.
+    """
+
+    def __init__(self, root, workers=DISPATCH_WORKERS, poll_ms=DISPATCH_POLL_MS, timeout=None, on_busy=None,
+                 on_error=None):
+        self.root = root
+        self.poll_ms = poll_ms
+        self.timeout = timeout
+        self.on_busy = on_busy
+        self.on_error = on_error
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='gui-dispatch')
+        self._results = queue.SimpleQueue()
+        self._pending = []
+        self._latest = {}
+        self._polling = False
+        self._busy_message = None
+
+    def submit(self, function, *args, on_success=None, on_error=None, key=None, timeout=None, message='Working...',
+               **kwargs):
+        """
+        Run function(*args, **kwargs) on a worker, then on_success(result) or on_error(exception) on the main
+        thread. A call with the same key as one still pending supersedes it; timeout (seconds, defaulting to
+        the dispatcher's) gives up on a call that has not finished by then.
+        """
+        if key is not None and key in self._latest:
+            self.cancel(self._latest[key])
+
+        call = Call(key, message, self.timeout if timeout is None else timeout, on_success, on_error or self.on_error)
+        self._pending.append(call)
+        if key is not None:
+            self._latest[key] = call
+        call.future = self._executor.submit(self._run, call, function, args, kwargs)
+
+        self._update_busy()
+        if not self._polling:
+            self._polling = True
+            self.root.after(self.poll_ms, self._poll)
+
+        return call
+
+    def cancel(self, call):
+        # A running worker can't be interrupted, but nothing it returns reaches the callbacks
+        if call.done:
+            return
+        call.cancelled = True
+        call.future.cancel()
+        self._finish(call)
+
+    def pending(self):
+        return len(self._pending)
+
+    def shutdown(self):
+        for call in list(self._pending):
+            self.cancel(call)
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _run(self, call, function, args, kwargs):
+        # Worker thread: no Tk calls here
+        try:
+            self._results.put((call, function(*args, **kwargs), None))
+        except Exception as e:
+            self._results.put((call, None, e))
+
+    def _finish(self, call):
+        call.done = True
+        self._pending.remove(call)
+        if self._latest.get(call.key) is call:
+            del self._latest[call.key]
+        self._update_busy()
+
+    def _callback(self, callback, value):
+        if callback is None:
+            return
+        try:
+            callback(value)
+        except Exception:
+            # Same reporting as an exception raised by any other Tk callback
+            self.root.report_callback_exception(*sys.exc_info())
+
+    def _poll(self):
+        try:
+            while True:
+                try:
+                    call, result, error = self._results.get_nowait()
+                except queue.Empty:
+                    break
+                if call.done:
+                    continue  # cancelled, superseded or timed out
+                self._finish(call)
+                if error is None:
+                    self._callback(call.on_success, result)
+                else:
+                    self._callback(call.on_error, error)
+
+            now = time.monotonic()
+            for call in [call for call in self._pending if call.deadline is not None and now >= call.deadline]:
+                self.cancel(call)
+                self._callback(call.on_error, TimeoutError(f"No answer from the backend after {call.timeout:g} s"))
+        finally:
+            if self._pending:
+                self.root.after(self.poll_ms, self._poll)
+            else:
+                self._polling = False
+
+    def _update_busy(self):
+        # Reports the message of the newest pending call that has one (message=None keeps a call quiet, like
+        # a background poll), or None once nothing is pending
+        messages = [call.message for call in self._pending if call.message]
+        message = messages[-1] if messages else None
+        if message != self._busy_message:
+            self._busy_message = message
+            if self.on_busy is not None:
+                self.on_busy(message)
@@ -0,0 +1,107 @@
+import threading
+import time
+import unittest
+from async_dispatch import Dispatcher
+
+
+class FakeRoot:
+    # Stands in for tk.Tk: after() callbacks are run by pump() on the test thread, like the Tk main loop would
+    def __init__(self):
+        self.scheduled = []
+        self.errors = []
+
+    def after(self, ms, callback):
+        self.scheduled.append(callback)
+
+    def report_callback_exception(self, exc_type, exc, traceback):
+        self.errors.append(exc)
+
+    def pump(self, until, timeout=5):
+        deadline = time.monotonic() + timeout
+        while not until() and time.monotonic() < deadline:
+            scheduled, self.scheduled = self.scheduled, []
+            for callback in scheduled:
+                callback()
+            time.sleep(0.005)
+
+
+class TestDispatcher(unittest.TestCase):
+    def setUp(self):
+        self.root = FakeRoot()
+        self.busy = []
+        self.dispatcher = Dispatcher(self.root, poll_ms=1, on_busy=self.busy.append)
+        self.addCleanup(self.dispatcher.shutdown)
+
+    def test_result_is_delivered_on_the_polling_thread(self):
+        results = []
+        self.dispatcher.submit(lambda x: (x * 2, threading.get_ident()), 21, on_success=results.append,
+                               message="Doubling")
+        self.root.pump(lambda: results)
+
+        value, worker = results[0]
+        self.assertEqual(value, 42)
+        self.assertNotEqual(worker, threading.get_ident())
+        self.assertEqual(self.busy, ["Doubling", None])
+        self.assertEqual(self.dispatcher.pending(), 0)
+        self.assertEqual(self.root.scheduled, [])  # polling stops once nothing is pending
+
+    def test_errors_go_to_on_error(self):
+        errors = []
+
+        def fail():
+            raise ConnectionError('backend down')
+
+        self.dispatcher.submit(fail, on_error=errors.append)
+        self.root.pump(lambda: errors)
+
+        self.assertIsInstance(errors[0], ConnectionError)
+
+    def test_newer_call_supersedes_pending_one_with_same_key(self):
+        release = threading.Event()
+        results = []
+        self.dispatcher.submit(lambda: release.wait(5) and 'old', key='search', on_success=results.append)
+        self.dispatcher.submit(lambda: 'new', key='search', on_success=results.append)
+        self.root.pump(lambda: results)
+        release.set()
+        self.root.pump(lambda: False, timeout=0.05)
+
+        self.assertEqual(results, ['new'])
+
+    def test_timed_out_call_reports_timeout_and_drops_late_result(self):
+        release = threading.Event()
+        results, errors = [], []
+        self.dispatcher.submit(lambda: release.wait(5), timeout=0.02, on_success=results.append,
+                               on_error=errors.append)
+        self.root.pump(lambda: errors)
+        release.set()
+        self.root.pump(lambda: False, timeout=0.05)
+
+        self.assertIsInstance(errors[0], TimeoutError)
+        self.assertEqual(results, [])
+
+    def test_failing_callback_is_reported_and_polling_continues(self):
+        results = []
+
+        def broken(result):
+            raise KeyError(result)
+
+        self.dispatcher.submit(lambda: 1, on_success=broken)
+        self.dispatcher.submit(lambda: 2, on_success=results.append)
+        self.root.pump(lambda: results and self.root.errors)
+
+        self.assertEqual(results, [2])
+        self.assertIsInstance(self.root.errors[0], KeyError)
+
+    def test_quiet_calls_do_not_change_the_busy_message(self):
+        release = threading.Event()
+        done = []
+        self.dispatcher.submit(lambda: release.wait(5), message="Searching", on_success=done.append)
+        self.dispatcher.submit(lambda: None, message=None, on_success=done.append)
+        release.set()
+        self.root.pump(lambda: len(done) == 2)
+
+        self.assertEqual(self.busy, ["Searching", None])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,9 +1,10 @@
 import tkinter.simpledialog as sd
 import tkinter as tk
 from tkinter import ttk, messagebox
-import requests
 from style_config import configure_styles
-import datetime
+from async_dispatch import Dispatcher
+from api_client import ApiClient
+from virtual_views import VirtualListbox, VirtualTreeview
 import json
 import urllib.parse
 import pandas as pd
@@ -14,9 +15,7 @@ import itertools
 
 import sys
 sys.path.append('../Backend')  # Adds the Backend folder to the system path
-
-global flight_listbox
-flight_listbox = None
+from time_parsing import parse_local_timestamps
 
 global current_user_id
 current_user_id = None
@@ -27,6 +26,78 @@ root.title("Flights Planner")
 
 configure_styles()  # Apply styles configured in style_config.py
 
+# The dispatcher gives up on a call after CALL_TIMEOUT seconds, retries included
+CALL_TIMEOUT = 90
+
+# Rows fetched per page from the paginated endpoints; scrolling near the end of a list fetches the next one
+PAGE_SIZE = 200
+# Route searches whose endpoint pages its answer
+PAGED_SEARCHES = {'airline', 'country'}
+# Flight columns the flights window shows or acts on; the backend sends only these
+FLIGHT_FIELDS = ('legID', 'startingAirport', 'destinationAirport', 'flightDate', 'baseFare', 'totalFare',
+                 'seatsRemaining', 'segmentsDepartureTimeRaw', 'segmentsArrivalTimeRaw', 'segmentsCabinCode')
+# Most legIDs /predict_delay_batch scores per request (the backend's MAX_PREDICTION_BATCH)
+PREDICTION_BATCH_SIZE = 1000
+
+# Shows what the window is waiting for while backend calls run
+status_var = tk.StringVar(root)
+ttk.Label(root, textvariable=status_var, anchor='w').pack(side='bottom', fill='x', padx=10)
+
+
+def show_busy(message):
+    status_var.set(message or '')
+    root.config(cursor='watch' if message else '')
+
+
+def show_request_error(error):
+    messagebox.showerror("Error", str(error))
+
+
+# Every backend call runs on a worker thread; results come back to the main loop through root.after
+dispatcher = Dispatcher(root, timeout=CALL_TIMEOUT, on_busy=show_busy, on_error=show_request_error)
+# Pooled keep-alive session to the backend (FLIGHTS_API_URL), with retries and a cache of route searches,
+# flight details and preferences
+client = ApiClient()
+
+
+def next_page_loader(path, params, cursor, view, key, prepare=None):
+    # load_more callback for a virtual view: fetches the page after cursor and appends it, passing the rows
+    # through prepare (on the worker) first. None when there is no next page.
+    if cursor is None:
+        return None
+
+    def load(client_params):
+        status, body, next_cursor = client.get_page(path, client_params)
+        if status == 200 and prepare is not None:
+            body = prepare(body)
+        return status, body, next_cursor
+
+    def loaded(result):
+        status, body, next_cursor = result
+        if not view.winfo_exists():
+            return  # the window was closed meanwhile
+        if status != 200:
+            view.load_failed()
+            messagebox.showerror("Error", f"Could not load more rows: {message_of(body, 'Error')}")
+            return
+        view.append(body, next_page_loader(path, params, next_cursor, view, key, prepare))
+
+    def failed(error):
+        if view.winfo_exists():
+            view.load_failed()
+        show_request_error(error)
+
+    return lambda: dispatcher.submit(load, dict(params, cursor=cursor), key=key, message="Loading more...",
+                                     on_success=loaded, on_error=failed)
+
+
+def message_of(body, default):
+    # Error text of a decoded response body
+    if isinstance(body, dict):
+        return body.get('message') or body.get('error') or default
+
+    return body or default
+
 
 def update_input_fields(event=None):
     mode = search_mode_combobox.get()
@@ -57,23 +128,53 @@ def search_routes():
     destination = destination_entry.get().strip() if search_mode in [
         "airports", "countries"] else ''
 
-    url = f'http://127.0.0.1:5000/{search_mode.lower()}'
+    path = f'/{search_mode.lower()}'
     if search_mode in ["airports", "countries"]:
-        url += f'?source={source}&destination={destination}'
+        params = {'source': source, 'destination': destination}
     elif search_mode == "airline":
-        url += f'?airline_name={source}'
-    elif search_mode == "country":
-        url += f'?source_country={source}'
-
-    response = requests.get(url)
-    if response.status_code == 200:
-        for i in tree.get_children():
-            tree.delete(i)
-        for route in response.json():
-            tree.insert('', 'end', values=(route.get('sourceIATA', ''), route.get(
-                'destinationIATA', ''), route.get('airlineName', '')))
+        params = {'airline_name': source}
+    else:
+        params = {'source_country': source}
+    if search_mode in PAGED_SEARCHES:
+        params['limit'] = PAGE_SIZE
+
+    # A new search supersedes one still running, whose results are then dropped
+    dispatcher.submit(client.get_page, path, params, key='search', message="Searching routes...",
+                      on_success=lambda result: show_routes(result, search_mode, source, destination, path, params))
+
+
+def show_routes(result, search_mode, source, destination, path, params):
+    status, body, cursor = result
+    if status == 200:
+        route_view.set_rows(body, next_page_loader(path, params, cursor, route_view, 'search'))
+    elif status == 404 and search_mode == "airports":
+        show_connections(source, destination)
     else:
-        messagebox.showinfo("Result", response.json().get('message', 'Error'))
+        messagebox.showinfo("Result", message_of(body, 'Error'))
+
+
+def show_connections(source, destination):
+    # No direct route; offer itineraries with stops instead
+    dispatcher.submit(client.get, '/connections',
+                      params={'source': source, 'destination': destination, 'limit': 5},
+                      key='search', message="Looking for connecting routes...",
+                      on_success=lambda result: show_connection_list(result, destination))
+
+
+def show_connection_list(result, destination):
+    status, body = result
+    if status != 200:
+        messagebox.showinfo("Result", message_of(body, 'Error'))
+        return
+
+    lines = []
+    for connection in body:
+        path = ' -> '.join([leg['sourceIATA'] for leg in connection['legs']] + [destination])
+        airlines = ' / '.join(leg['airlines'][0] for leg in connection['legs'])
+        distance = f", {connection['distance']:,.0f} km" if connection['distance'] is not None else ''
+        lines.append(f"{path} ({connection['stops']} stop(s){distance}) - {airlines}")
+
+    messagebox.showinfo("No direct routes", "Connecting routes:\n" + "\n".join(lines))
 
 
 def create_user_window():
@@ -117,19 +218,19 @@ def submit_user_data(entries):
             messagebox.showerror("Error", f"Please fill out the {key} field.")
             return
 
-    url = 'http://127.0.0.1:5000/create_user'
+    dispatcher.submit(client.post, '/create_user', json=user_data, message="Creating user...", on_success=user_created,
+                      on_error=lambda e: messagebox.showerror("Error", f"Failed to create user: {e}"))
 
-    try:
-        response = requests.post(url, json=user_data)
-        if response.status_code == 201:
-            messagebox.showinfo("Success", "User created successfully!")
-            global current_user_id
-            current_user_id = response.json().get('userID')
-        else:
-            messagebox.showerror(
-                "Error", f"Failed to create user: {response.json().get('message')}")
-    except requests.exceptions.RequestException as e:
-        messagebox.showerror("Error", f"Failed to create user: {e}")
+
+def user_created(result):
+    status, body = result
+    if status == 201:
+        messagebox.showinfo("Success", "User created successfully!")
+        global current_user_id
+        current_user_id = body.get('userID')
+    else:
+        messagebox.showerror(
+            "Error", f"Failed to create user: {message_of(body, None)}")
 
 
 def open_preferences_window():
@@ -181,16 +282,18 @@ def submit_preferences_data(entries):
     }
 
     # Send preference data to the backend
-    url = 'http://127.0.0.1:5000/add_preferences'
-    try:
-        response = requests.post(url, json=preferences_data)
-        if response.status_code == 201:
-            messagebox.showinfo("Success", "Preferences saved successfully!")
-        else:
-            messagebox.showerror(
-                "Error", f"Failed to save preferences: {response.json().get('message')}")
-    except requests.exceptions.RequestException as e:
-        messagebox.showerror("Error", f"Failed to save preferences: {e}")
+    dispatcher.submit(client.post, '/add_preferences', json=preferences_data, message="Saving preferences...",
+                      on_success=preferences_saved,
+                      on_error=lambda e: messagebox.showerror("Error", f"Failed to save preferences: {e}"))
+
+
+def preferences_saved(result):
+    status, body = result
+    if status == 201:
+        messagebox.showinfo("Success", "Preferences saved successfully!")
+    else:
+        messagebox.showerror(
+            "Error", f"Failed to save preferences: {message_of(body, None)}")
 
 # Setup input and interface elements
 input_frame = ttk.Frame(root)
@@ -211,121 +314,144 @@ search_button = ttk.Button(root, text="Search", command=search_routes)
 search_button.pack(side='left', padx=(10, 10))
 
 columns = ('source', 'destination', 'airline')
-tree = ttk.Treeview(root, columns=columns, show='headings')
 
 
-def parse_datetime(raw_datetime):
-    """Parse and format the datetime string."""
-    # Remove the milliseconds and timezone information for simplicity
-
-    datetime_obj = datetime.datetime.strptime(
-        raw_datetime.split('.')[0], "%Y-%m-%dT%H:%M:%S")
+def format_datetimes(raw_datetimes, segment='first'):
+    """Parse and format a list of datetime strings in one pass."""
+    # Local wall-clock time of the chosen segment; milliseconds and timezone are dropped
+    parsed = parse_local_timestamps(raw_datetimes, segment)
 
     # Format the datetime as 'Month day, Year, Hour:Minute AM/PM'
-    return datetime_obj.strftime("%B %d, %Y, %I:%M %p")
+    return parsed.dt.strftime("%B %d, %Y, %I:%M %p").fillna('Unknown').tolist()
 
 
 def save_itinerary_details(leg_id, user_id):
-    url = 'http://127.0.0.1:5000/add_to_itinerary'
     itinerary_data = {
         'userID': user_id,
         'legID': leg_id
     }
 
-    try:
-        response = requests.post(url, json=itinerary_data)
-        if response.status_code == 201:
-            messagebox.showinfo(
-                "Success", "Flight added to itinerary successfully!")
-        else:
-            messagebox.showerror("Error", response.json().get(
-                'message', 'Failed to add flight to itinerary'))
-    except requests.exceptions.RequestException as e:
-        messagebox.showerror("Error", str(e))
+    dispatcher.submit(client.post, '/add_to_itinerary', json=itinerary_data, message="Adding to itinerary...",
+                      on_success=itinerary_saved)
+
 
+def itinerary_saved(result):
+    status, body = result
+    if status == 201:
+        messagebox.showinfo(
+            "Success", "Flight added to itinerary successfully!")
+    else:
+        messagebox.showerror("Error", message_of(body, 'Failed to add flight to itinerary'))
 
-def add_to_itinerary(selection):
-    global flight_listbox  # Use the global declaration
 
-    if selection:
-        selection_index = flight_listbox.curselection()[0]
-        display_text, flight_id = flight_listbox.get(
-            selection_index)  # Corrected to unpack three values
+def add_to_itinerary(row):
+    if row:
+        save_itinerary_details(row['flight']['legID'], current_user_id)
 
-        save_itinerary_details(flight_id, current_user_id)
 
+def flight_rows(flights):
+    # Runs on a dispatcher worker: decoding and formatting a page of flights stays off the Tk thread
+    if not flights:
+        return []
 
-def display_flight_details(source_iata, destination_iata, airline_name, is_non_stop, preferences):
-    global flight_listbox  # Use the global declaration
+    departures = format_datetimes(
+        [flight['segmentsDepartureTimeRaw'] for flight in flights], 'first')
+    arrivals = format_datetimes(
+        [flight['segmentsArrivalTimeRaw'] for flight in flights], 'last')
 
+    rows = []
+    for flight, formatted_departure, formatted_arrival in zip(flights, departures, arrivals):
+        rows.append({'flight': flight, 'text': (
+            f"Depart: {formatted_departure} - "
+            f"Arrive: {formatted_arrival} - "
+            f"Fare: ${flight['totalFare']:.2f} (Base: ${flight['baseFare']:.2f}) - "
+            f"Seats Left: {flight['seatsRemaining']} - "
+            f"Cabin: {flight['segmentsCabinCode']}"
+        )})
+
+    return rows
+
+
+def load_flight_details(params):
+    status, flights, cursor = client.get_page('/flight_details', params)
+    if status != 200:
+        return status, flights, cursor
+
+    return status, flight_rows(flights), cursor
+
+
+def display_flight_details(source_iata, destination_iata, airline_name, is_non_stop, preferences):
     # Convert preferences dictionary into a JSON string
     preferences_json = json.dumps(preferences)
     # URL encode the JSON string
     encoded_preferences = urllib.parse.quote(preferences_json)
 
-    url = f'http://127.0.0.1:5000/flight_details?source_iata={source_iata}&destination_iata={destination_iata}&airline_name={airline_name}&is_non_stop={is_non_stop}&prefs={encoded_preferences}'
-    response = requests.get(url)
-
-    if response.status_code == 200:
-        flights_window = tk.Toplevel(root)
-        flights_window.title(
-            f"Flights for {airline_name} from {source_iata} to {destination_iata}")
+    params = {'source_iata': source_iata, 'destination_iata': destination_iata, 'airline_name': airline_name,
+              'is_non_stop': is_non_stop, 'prefs': encoded_preferences, 'limit': PAGE_SIZE,
+              'fields': ','.join(FLIGHT_FIELDS)}
+    dispatcher.submit(load_flight_details, params, key='flight_details', message="Loading flights...",
+                      on_success=lambda result: show_flight_details(result, source_iata, destination_iata,
+                                                                    airline_name, params))
 
-        flight_listbox = tk.Listbox(flights_window, width=120)
-        flight_listbox.pack()
-        flight_listbox.delete(0, tk.END)  # Ensure the Listbox is cleared
 
-        flights = response.json()
+# Orderings of the loaded flights offered by the flights window; None keeps the backend's departure order
+FLIGHT_SORTS = {
+    'Departure': None,
+    'Fare': lambda row: row['flight']['totalFare'],
+    'Seats Left': lambda row: row['flight']['seatsRemaining'],
+}
 
-        if flights:
-            for flight in flights:
-                formatted_departure = parse_datetime(
-                    flight['segmentsDepartureTimeRaw'])
-                formatted_arrival = parse_datetime(
-                    flight['segmentsArrivalTimeRaw'])
 
-                display_text = (
-                    f"Depart: {formatted_departure} - "
-                    f"Arrive: {formatted_arrival} - "
-                    f"Fare: ${flight['totalFare']:.2f} (Base: ${flight['baseFare']:.2f}) - "
-                    f"Seats Left: {flight['seatsRemaining']} - "
-                    f"Cabin: {flight['segmentsCabinCode']}"
-                )
+def show_flight_details(result, source_iata, destination_iata, airline_name, params):
+    status, rows, cursor = result
+    if status == 200:
+        if not rows:
+            messagebox.showinfo("Result", "No flights found matching the criteria.")
+            return
 
-                flight_id = flight['legID']
+        flights_window = tk.Toplevel(root)
+        flights_window.title(
+            f"Flights for {airline_name} from {source_iata} to {destination_iata}")
 
-                # Store display text, flight ID in the Listbox
-                flight_listbox.insert(tk.END, (display_text, flight_id))
-        else:
-            flight_listbox.insert(
-                tk.END, "No flights found matching the criteria.")
+        sort_bar = ttk.Frame(flights_window)
+        sort_bar.pack(side='top', fill='x')
+        ttk.Label(sort_bar, text="Sort by:").pack(side='left', padx=(0, 5))
+        sort_combobox = ttk.Combobox(sort_bar, values=list(FLIGHT_SORTS), state="readonly")
+        sort_combobox.set('Departure')
+        sort_combobox.pack(side='left')
+
+        # Only the flights on screen are Listbox lines; further pages load while scrolling towards the end
+        flight_view = VirtualListbox(flights_window, text=lambda row: row['text'],
+                                     color=lambda row: 'red' if row.get('delayed') else 'black')
+        flight_view.pack(fill='both', expand=True)
+        flight_view.set_rows(rows, next_page_loader('/flight_details', params, cursor, flight_view,
+                                                    f'flights:{id(flight_view)}', flight_rows))
+        sort_combobox.bind('<<ComboboxSelected>>',
+                           lambda event: flight_view.sort(FLIGHT_SORTS[sort_combobox.get()]))
 
         right_click_menu = tk.Menu(flights_window, tearoff=0)
         right_click_menu.add_command(
-            label="Add to Itinerary", command=lambda: add_to_itinerary(flight_listbox.curselection()))
-        right_click_menu.add_command(label="Predict Delay", command=lambda: predict_delay(flight_id))
+            label="Add to Itinerary", command=lambda: add_to_itinerary(flight_view.selected_row()))
+        right_click_menu.add_command(
+            label="Predict Delay", command=lambda: predict_delay(flight_view.selected_row()['flight']['legID']))
+        right_click_menu.add_command(
+            label="Predict Delays (All Flights)", command=lambda: predict_delays(flight_view))
+        right_click_menu.add_command(
+            label="Compare Fare", command=lambda: compare_fare(flight_view.selected_row()['flight']))
 
         def on_right_click(event):
-            try:
-                selection_index = flight_listbox.nearest(event.y)
-                flight_listbox.selection_clear(0, tk.END)
-                flight_listbox.selection_set(selection_index)
-                flight_listbox.activate(selection_index)
-                # selected_item = flight_listbox.get(selection_index)
-                # display_text, flight_id = selected_item  # Unpack the tuple
+            if flight_view.row_at(event.y) is not None:
                 right_click_menu.post(event.x_root, event.y_root)
-            except Exception as e:
-                print(f"Error: {e}")
 
         # Bind right-click event
-        flight_listbox.bind('<Button-3>', on_right_click)
+        flight_view.listbox.bind('<Button-3>', on_right_click)
     else:
-        error_message = response.json().get('message', 'Error fetching flight details')
+        error_message = message_of(rows, 'Error fetching flight details')
         messagebox.showerror(
             "Error", f"Could not fetch flight details: {error_message}")
 
 
-def on_route_select(event):
+def on_route_select(route):
     # Check if current_user_id is defined and has a meaningful value
     global current_user_id
     if current_user_id is None or current_user_id == '':
@@ -333,18 +459,18 @@ def on_route_select(event):
         
         return
     
-    if tree.selection():
-        selected_item = tree.selection()[0]
-        route_details = tree.item(selected_item, 'values')
+    if route:
+        route_details = (route.get('sourceIATA'), route.get('destinationIATA'), route.get('airlineName'))
 
-        if len(route_details) >= 3:
-            source_iata, destination_iata, airline_name = route_details[:3]
+        if all(route_details):
+            source_iata, destination_iata, airline_name = route_details
 
-            preferences = choose_preference(current_user_id)
+            def show_flights(preferences):
+                if preferences:
+                    display_flight_details(
+                        source_iata, destination_iata, airline_name, 1, preferences)
 
-            if preferences:
-                display_flight_details(
-                    source_iata, destination_iata, airline_name, 1, preferences)
+            choose_preference(current_user_id, show_flights)
         else:
             messagebox.showerror(
                 "Error", "Selected item does not contain enough data.")
@@ -352,13 +478,17 @@ def on_route_select(event):
         messagebox.showinfo("Info", "Please select a route from the list.")
 
 
-def choose_preference(user_id):
-    url = f'http://127.0.0.1:5000/get_preferences?userID={user_id}'
-    response = requests.get(url)
+def choose_preference(user_id, on_chosen):
+    # Fetches the user's presets in the background, then calls on_chosen with the one picked
+    dispatcher.submit(client.get, '/get_preferences', {'userID': user_id}, key='flight_details',
+                      message="Loading preferences...",
+                      on_success=lambda result: on_chosen(select_preference(result)))
+
 
-    if response.status_code == 200:
-        preferences = response.json()
+def select_preference(result):
+    status, preferences = result
 
+    if status == 200:
         if len(preferences) > 1:
             # Create a mapping from preference ID to preference object for easy access
             preferences_dict = {
@@ -387,7 +517,7 @@ def choose_preference(user_id):
             return None
     else:
         messagebox.showerror(
-            "Error", f"Failed to fetch preferences: {response.json().get('message', 'An error occurred')}")
+            "Error", f"Failed to fetch preferences: {message_of(preferences, 'An error occurred')}")
         return None
 
 def format_year_week(year_week_int):
@@ -409,59 +539,125 @@ def open_analyze_price_trends_window():
     ttk.Label(trend_window, text="End Date (YYYY-MM-DD):").pack()
     end_date_entry = ttk.Entry(trend_window)
     end_date_entry.pack()
+
+    # Optional breakdown of every cabin class trend by route or airline
+    ttk.Label(trend_window, text="Breakdown:").pack()
+    group_by_var = tk.StringVar(trend_window)
+    ttk.OptionMenu(trend_window, group_by_var, "none", "none", "route", "airline").pack()
     
     submit_button = ttk.Button(trend_window, text="Analyze", 
-        command=lambda: analyze_price_trends(start_date_entry.get(), end_date_entry.get()))
+        command=lambda: analyze_price_trends(start_date_entry.get(), end_date_entry.get(), group_by_var.get()))
     submit_button.pack()
 
+# How often a running background job is polled, in milliseconds
+JOB_POLL_INTERVAL_MS = 500
+
+def run_job(task, params, on_result, error_message):
+    """Submit a backend job and poll it through the dispatcher, so the window stays responsive."""
+    dispatcher.submit(client.post, f'/jobs/{task}', json=params, message="Submitting job...",
+                      on_success=lambda result: track_job(result, on_result, error_message))
+
+
+def track_job(result, on_result, error_message):
+    status_code, body = result
+    if status_code != 202:
+        messagebox.showerror("Error", f"{error_message}: {message_of(body, 'Error')}")
+        return
+
+    job_id = body['jobID']
+
+    progress_window = tk.Toplevel(root)
+    progress_window.title("Working...")
+    progress_label = ttk.Label(progress_window, text="Queued", width=50)
+    progress_label.pack(padx=10, pady=5)
+    progress_bar = ttk.Progressbar(progress_window, length=300, maximum=1.0)
+    progress_bar.pack(padx=10, pady=(0, 10))
+
+    def poll():
+        if not progress_window.winfo_exists():
+            return  # closed by the user; the job still finishes and stays cached on the server
+
+        # The progress window is the busy indicator here, so polls leave the status bar alone
+        dispatcher.submit(client.get, f'/jobs/{job_id}', key=f'job:{job_id}', message=None,
+                          on_success=update, on_error=failed)
+
+    def failed(error):
+        if progress_window.winfo_exists():
+            progress_window.destroy()
+        messagebox.showerror("Error", str(error))
+
+    def update(result):
+        if not progress_window.winfo_exists():
+            return
+        status = result[1] if isinstance(result[1], dict) else {}
+
+        if status.get('status') == 'done':
+            progress_window.destroy()
+            dispatcher.submit(client.get, f'/jobs/{job_id}/result', message="Loading results...",
+                              on_success=show_result)
+        elif status.get('status') in ('failed', None):
+            progress_window.destroy()
+            messagebox.showerror("Error", f"{error_message}: {status.get('error', 'unknown job')}")
+        else:
+            progress_label.config(text=status.get('message') or status['status'].capitalize())
+            progress_bar['value'] = status.get('progress', 0)
+            root.after(JOB_POLL_INTERVAL_MS, poll)
+
+    def show_result(result):
+        status_code, body = result
+        if status_code == 200:
+            on_result(body)
+        else:
+            messagebox.showerror("Error", f"{error_message}: {message_of(body, 'Error')}")
+
+    poll()
+
 # Function to send request and display results
-def analyze_price_trends(start_date, end_date):
-    # Send request to Flask backend
-    url = 'http://127.0.0.1:5000/analyze_price_trends'
+def analyze_price_trends(start_date, end_date, group_by="none"):
+    # Runs as a background job on the Flask backend
     params = {'start_date': start_date, 'end_date': end_date}
-    response = requests.get(url, params=params)
-    
+    if group_by != "none":
+        params['group_by'] = group_by
+    run_job('analyze_price_trends', params, show_price_trends, "Failed to retrieve trends")
+
+def show_price_trends(json_data):
     # Open a new window to display the JSON results
     results_window = tk.Toplevel(root)
     results_window.title("Trend Analysis Results")
+
+    results_text = tk.Text(results_window)
+    results_text.insert(tk.END, json.dumps(json_data, indent=2))
+    results_text.pack()
     
-    if response.status_code == 200:
-        json_data = response.json()
-        results_text = tk.Text(results_window)
-        results_text.insert(tk.END, json.dumps(json_data, indent=2))
-        results_text.pack()
-        
-        # Convert JSON data to DataFrame and process
-        df = pd.DataFrame(json_data)
-        df['formatted_year_week'] = df['month'].apply(format_year_week)
-        df.sort_values(by=['formatted_year_week'], inplace=True)  # Ensure data is sorted by time
-        
-        # Open another window for the plot
-        plot_window = tk.Toplevel(root)
-        plot_window.title("Price Trend Plot by Cabin Class")
-        
-        # Create a figure for plotting
-        figure = plt.Figure(figsize=(10, 6), dpi=100)
-        ax = figure.add_subplot(111)
-        
-        # Plotting the average total fare trends by cabin class
-        cabin_classes = df['cabinClass'].unique()
-        for cabin in cabin_classes:
-            subset = df[df['cabinClass'] == cabin]
-            subset.plot(x='formatted_year_week', y='avgTotalFare', kind='line', ax=ax, label=cabin, marker='o', linestyle='-')
-        
-        ax.set_title('Average Total Fare Trends by Cabin Class')
-        ax.set_xlabel('Year-Week')
-        ax.set_ylabel('Average Total Fare')
-        ax.legend(title='Cabin Class')
-        
-        # Embedding the plot in Tkinter
-        canvas = FigureCanvasTkAgg(figure, master=plot_window)
-        canvas.draw()
-        canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
-        
-    else:
-        messagebox.showerror("Error", "Failed to retrieve trends.")
+    # Convert JSON data to DataFrame and process
+    df = pd.DataFrame(json_data)
+    df['formatted_year_week'] = df['month'].apply(format_year_week)
+    df.sort_values(by=['formatted_year_week'], inplace=True)  # Ensure data is sorted by time
+    
+    # Open another window for the plot
+    plot_window = tk.Toplevel(root)
+    plot_window.title("Price Trend Plot by Cabin Class")
+    
+    # Create a figure for plotting
+    figure = plt.Figure(figsize=(10, 6), dpi=100)
+    ax = figure.add_subplot(111)
+    
+    # Plotting the average total fare trends by cabin class (and route/airline when broken down)
+    df['route'] = df['startingAirport'] + '-' + df['destinationAirport'] if 'startingAirport' in df else ''
+    group_columns = ['cabinClass'] + [col for col in ('route', 'airline') if col in df and df[col].any()]
+    for group, subset in df.groupby(group_columns):
+        label = ' '.join(group) if isinstance(group, tuple) else group
+        subset.plot(x='formatted_year_week', y='avgTotalFare', kind='line', ax=ax, label=label, marker='o', linestyle='-')
+    
+    ax.set_title('Average Total Fare Trends by Cabin Class')
+    ax.set_xlabel('Year-Week')
+    ax.set_ylabel('Average Total Fare')
+    ax.legend(title='Cabin Class')
+    
+    # Embedding the plot in Tkinter
+    canvas = FigureCanvasTkAgg(figure, master=plot_window)
+    canvas.draw()
+    canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
 
 def open_cluster_flights_window():
     cluster_window = tk.Toplevel(root)
@@ -486,9 +682,14 @@ def open_cluster_flights_window():
     n_clusters_entry.pack()
     n_clusters_entry.insert(0, "3")  # Default value
 
+    # Sampled mode streams the whole view and returns centroids plus a sample of labelled points
+    sampled_var = tk.BooleanVar(cluster_window, value=True)
+    ttk.Checkbutton(cluster_window, text="Sampled (large views)", variable=sampled_var).pack()
+
     # Button to submit and perform clustering
     submit_button = ttk.Button(cluster_window, text="Cluster",
-                               command=lambda: perform_clustering(features_entry.get(), n_clusters_entry.get(), view_var.get()))
+                               command=lambda: perform_clustering(features_entry.get(), n_clusters_entry.get(), view_var.get(),
+                                                                  sampled_var.get()))
     submit_button.pack()
 
 def generate_marker_dict(unique_categories):
@@ -497,54 +698,65 @@ def generate_marker_dict(unique_categories):
 
     return {category: next(markers) for category in unique_categories}
 
-def perform_clustering(features, n_clusters, selected_view):
-    split_features = features.split(',')
-    url = f'http://127.0.0.1:5000/cluster_flights?features={features}&n_clusters={n_clusters}&view={selected_view}'
-    response = requests.get(url)
+def perform_clustering(features, n_clusters, selected_view, sampled=False):
+    # Runs as a background job on the Flask backend
+    params = {'features': features, 'n_clusters': n_clusters, 'view': selected_view}
+    if sampled:
+        params['mode'] = 'sampled'
+    run_job('cluster_flights', params, lambda data: show_clustering(data, features.split(',')),
+            "Failed to retrieve clustering results")
 
+def show_clustering(data, split_features):
     results_window = tk.Toplevel(root)
     results_window.title("Clustering Results")
 
-    if response.status_code == 200:
-        df = pd.DataFrame(response.json())
+    # Sampled mode answers with a summary; plot its labelled sample and mark the centroids
+    centroids = None
+    if isinstance(data, dict):
+        centroids = pd.DataFrame(data['centroids'])
+        sizes = ", ".join(f"{cluster}: {size:,}" for cluster, size in enumerate(data['sizes']))
+        ttk.Label(results_window, text=f"{data['rows']:,} flights clustered ({sizes})").pack()
+        data = data['sample']
 
-        # Handling categorical
-        df['category: '] = df[[col for col in df.columns if f"{split_features[2]}_" in col]].idxmax(axis=1)
-        df['category: '] = df['category: '].apply(lambda x: x.split('_')[-1])
+    df = pd.DataFrame(data)
 
-        # Create a marker dictionary based on unique cabin codes
-        unique_categories = df['category: '].unique()
-        marker_dict = generate_marker_dict(unique_categories)
+    # Handling categorical
+    df['category: '] = df[[col for col in df.columns if f"{split_features[2]}_" in col]].idxmax(axis=1)
+    df['category: '] = df['category: '].apply(lambda x: x.split('_')[-1])
 
-        # Create a figure for plotting
-        figure = plt.Figure(figsize=(10, 10), dpi=100)
-        ax = figure.add_subplot(111)
+    # Create a marker dictionary based on unique cabin codes
+    unique_categories = df['category: '].unique()
+    marker_dict = generate_marker_dict(unique_categories)
 
-        # Create a scatter plot
-        for category in unique_categories:
-            subset = df[df['category: '] == category]
-            sns.scatterplot(x=f"{split_features[0]}", y=f"{split_features[1]}", style='category: ',
-                            markers=marker_dict, hue='cluster', data=subset, ax=ax, palette='viridis', legend='full')
+    # Create a figure for plotting
+    figure = plt.Figure(figsize=(10, 10), dpi=100)
+    ax = figure.add_subplot(111)
 
-        #ax.set_title('Scatter Plot of Total Fare vs. Travel Duration by Cabin Code')
-        #ax.set_xlabel('Total Fare ($)')
-        #ax.set_ylabel('Travel Duration (minutes)')
+    # Create a scatter plot
+    for category in unique_categories:
+        subset = df[df['category: '] == category]
+        sns.scatterplot(x=f"{split_features[0]}", y=f"{split_features[1]}", style='category: ',
+                        markers=marker_dict, hue='cluster', data=subset, ax=ax, palette='viridis', legend='full')
 
-        # Get the legend object from the scatterplot
-        leg = ax.get_legend()
+    if centroids is not None:
+        ax.scatter(centroids[split_features[0]], centroids[split_features[1]], marker='X', s=200, c='red', label='Centroids')
 
-        # Set the font size for the labels and title
-        leg.set_title('Cluster', prop={'size': 13})  # Set font size for the legend title
-        for text in leg.get_texts():
-            text.set_fontsize('6')  # Set font size for the labels
+    #ax.set_title('Scatter Plot of Total Fare vs. Travel Duration by Cabin Code')
+    #ax.set_xlabel('Total Fare ($)')
+    #ax.set_ylabel('Travel Duration (minutes)')
 
-        # Embedding the plot in Tkinter
-        canvas = FigureCanvasTkAgg(figure, master=results_window)
-        canvas.draw()
-        canvas.get_tk_widget().pack()
-        
-    else:
-        messagebox.showerror("Error", f"Failed to retrieve clustering results: {response.text}")
+    # Get the legend object from the scatterplot
+    leg = ax.get_legend()
+
+    # Set the font size for the labels and title
+    leg.set_title('Cluster', prop={'size': 13})  # Set font size for the legend title
+    for text in leg.get_texts():
+        text.set_fontsize('6')  # Set font size for the labels
+
+    # Embedding the plot in Tkinter
+    canvas = FigureCanvasTkAgg(figure, master=results_window)
+    canvas.draw()
+    canvas.get_tk_widget().pack()
 
 def open_correlation_analysis_window():
     correlation_window = tk.Toplevel(root)
@@ -553,60 +765,136 @@ def open_correlation_analysis_window():
     # List of features available for correlation
     features = ['totalFare', 'seatsRemaining', 'baseFare', 'travelDuration']  # Add other relevant features
 
-    # Setup dropdowns for selecting features to correlate
-    ttk.Label(correlation_window, text="Select Feature 1:").grid(row=0, column=0, padx=10, pady=5)
-    feature1_var = tk.StringVar()
-    feature1_dropdown = ttk.Combobox(correlation_window, textvariable=feature1_var, values=features, state="readonly")
-    feature1_dropdown.grid(row=0, column=1, padx=10, pady=5)
-    feature1_dropdown.set('totalFare')  # Default value
+    # Any number of features can be correlated at once
+    ttk.Label(correlation_window, text="Select Features:").grid(row=0, column=0, padx=10, pady=5, sticky='n')
+    features_listbox = tk.Listbox(correlation_window, selectmode=tk.MULTIPLE, height=len(features), exportselection=False)
+    for feature in features:
+        features_listbox.insert(tk.END, feature)
+    features_listbox.grid(row=0, column=1, padx=10, pady=5)
+    features_listbox.selection_set(0, 1)  # Default: totalFare and seatsRemaining
 
-    ttk.Label(correlation_window, text="Select Feature 2:").grid(row=1, column=0, padx=10, pady=5)
-    feature2_var = tk.StringVar()
-    feature2_dropdown = ttk.Combobox(correlation_window, textvariable=feature2_var, values=features, state="readonly")
-    feature2_dropdown.grid(row=1, column=1, padx=10, pady=5)
-    feature2_dropdown.set('seatsRemaining')  # Default value
+    spearman_var = tk.BooleanVar(correlation_window, value=False)
+    ttk.Checkbutton(correlation_window, text="Rank (Spearman) correlation", variable=spearman_var).grid(
+        row=1, column=0, columnspan=2, padx=10, pady=5)
 
     # Button to submit and fetch correlation
     submit_button = ttk.Button(correlation_window, text="Analyze Correlation",
-                               command=lambda: fetch_and_display_correlation(feature1_var.get(), feature2_var.get()))
+                               command=lambda: fetch_and_display_correlation(
+                                   [features_listbox.get(i) for i in features_listbox.curselection()],
+                                   'spearman' if spearman_var.get() else 'pearson'))
     submit_button.grid(row=2, column=0, columnspan=2, pady=10)
 
-def fetch_and_display_correlation(feature1, feature2):
-    url = f"http://127.0.0.1:5000/correlations?feature1={feature1}&feature2={feature2}"
-    response = requests.get(url)
-    if response.status_code == 200:
-        correlation_data = response.json()
-        print(correlation_data)  # This print is useful for debugging and can be removed in production.
+def fetch_and_display_correlation(features, method='pearson'):
+    if len(features) < 2:
+        messagebox.showerror("Error", "Select at least two features")
+        return
+
+    dispatcher.submit(client.get, '/correlations', params={'features': ','.join(features), 'method': method},
+                      message="Computing correlations...",
+                      on_success=lambda result: show_correlation(result, features, method))
 
-        df_corr = pd.DataFrame(correlation_data)
+def show_correlation(result, features, method):
+    status, correlation_data = result
+    if status == 200:
+        df_corr = pd.DataFrame(correlation_data).loc[features, features].astype(float)
 
         # Create a heatmap
         plt.figure(figsize=(8, 6))
         sns.heatmap(df_corr, annot=True, cmap='coolwarm', fmt=".2f")
-        plt.title(f'Correlation between {feature1} and {feature2}')  # Dynamic title based on features
+        plt.title(f"{method.capitalize()} correlation between {', '.join(features)}")  # Dynamic title based on features
         plt.show()
     else:
         messagebox.showerror("Error", "Failed to fetch correlation data")
 
 def predict_delay(flight_id):
-    try:
-        response = requests.get(f'http://127.0.0.1:5000/predict_delay/{flight_id}')
-        
-        if response.status_code == 200:
-            result = response.json()
+    def show_prediction(response):
+        status, result = response
+        if status == 200:
             messagebox.showinfo("Prediction Result", f"Delay Prediction: {'Delayed' if result['delayed'] else 'On Time'}")
         else:
-            messagebox.showerror("Prediction Error", f"Failed to predict the delay: {response.text}")
-    except requests.exceptions.RequestException as e:
-        messagebox.showerror("Error", str(e))
+            messagebox.showerror("Prediction Error", f"Failed to predict the delay: {message_of(result, 'Error')}")
+
+    dispatcher.submit(client.get, f'/predict_delay/{flight_id}', message="Predicting delay...",
+                      on_success=show_prediction)
+
+
+def predict_delay_batches(flight_ids):
+    # Scores the flights PREDICTION_BATCH_SIZE at a time; the first failed batch's answer is returned as is
+    predictions = []
+    for start in range(0, len(flight_ids), PREDICTION_BATCH_SIZE):
+        status, result = client.post('/predict_delay_batch',
+                                     json={'legIDs': flight_ids[start:start + PREDICTION_BATCH_SIZE]})
+        if status != 200:
+            return status, result
+        predictions.extend(result['predictions'])
+
+    return 200, {'predictions': predictions}
+
+
+def predict_delays(view):
+    # Scores every loaded flight and highlights the ones predicted to be delayed
+    rows = list(view.rows())
+    flight_ids = [row['flight']['legID'] for row in rows]
+
+    def show_predictions(response):
+        status, result = response
+        if status != 200:
+            messagebox.showerror("Prediction Error", f"Failed to predict delays: {message_of(result, 'Error')}")
+            return
+        if not view.winfo_exists():
+            return  # the flights window was closed meanwhile
+
+        delayed = {p['legID'] for p in result['predictions'] if p['delayed']}
+        for row in rows:
+            row['delayed'] = row['flight']['legID'] in delayed
+        view.render()
+
+        messagebox.showinfo("Prediction Result", f"{len(delayed)} of {len(flight_ids)} flights predicted to be delayed (shown in red)")
+
+    dispatcher.submit(predict_delay_batches, flight_ids, message="Predicting delays...",
+                      on_success=show_predictions)
+
+
+# Days either side of a flight's date whose fares it is compared against
+FARE_COMPARISON_DAYS = 14
+
+def compare_fare(flight):
+    # Ranks the flight's fare among fares on the same route and cabin from the backend's fare sketches
+    flight_date = pd.to_datetime(flight['flightDate'])
+    params = {
+        'origin': flight['startingAirport'],
+        'destination': flight['destinationAirport'],
+        'cabin': flight['segmentsCabinCode'],
+        'start_date': (flight_date - pd.Timedelta(days=FARE_COMPARISON_DAYS)).strftime('%Y-%m-%d'),
+        'end_date': (flight_date + pd.Timedelta(days=FARE_COMPARISON_DAYS)).strftime('%Y-%m-%d'),
+        'fare': flight['totalFare'],
+    }
+
+    def show_comparison(response):
+        status, result = response
+        if status == 200:
+            quantiles = result['quantiles']
+            share = result['fareRank'] * 100
+            verdict = f"cheaper than {100 - share:.0f}% of" if share <= 50 else f"more expensive than {share:.0f}% of"
+            messagebox.showinfo(
+                "Fare Comparison",
+                f"${flight['totalFare']:.2f} is {verdict} {result['count']:,} fares on this route and cabin "
+                f"within {FARE_COMPARISON_DAYS} days.\n\n"
+                f"10th percentile: ${quantiles['p10']:.2f}\n"
+                f"Median: ${quantiles['p50']:.2f}\n"
+                f"90th percentile: ${quantiles['p90']:.2f}")
+        else:
+            messagebox.showerror("Error", f"Failed to fetch fare distribution: {message_of(result, 'Error')}")
 
+    dispatcher.submit(client.get, '/fare_distribution', params=params,
+                      message="Comparing fare...", on_success=show_comparison)
 
-tree.bind('<<TreeviewSelect>>', on_route_select)
 
-for col in columns:
-    tree.heading(col, text=col.capitalize())
-    tree.column(col, width=120)
-tree.pack(side='left', fill='both', expand=True)
+# Only the routes on screen are Treeview items; clicking a heading sorts the routes loaded so far
+route_view = VirtualTreeview(root, columns, on_select=on_route_select,
+                             values=lambda route: (route.get('sourceIATA', ''), route.get('destinationIATA', ''),
+                                                   route.get('airlineName', '')))
+route_view.pack(side='left', fill='both', expand=True)
 
 # Setup menus
 menu_bar = tk.Menu(root)
@@ -629,4 +917,12 @@ data_mining_menu.add_command(label="Cluster Flights", command=open_cluster_fligh
 data_mining_menu.add_command(label="Correlation Analysis", command=open_correlation_analysis_window)
 
 
+def close_window():
+    # Calls still running are abandoned rather than waited for
+    dispatcher.shutdown()
+    client.close()
+    root.destroy()
+
+root.protocol("WM_DELETE_WINDOW", close_window)
+
 root.mainloop()
@@ -0,0 +1,322 @@
+import abc
+import tkinter as tk
+from tkinter import ttk
+
+# Rows shown at once, and how close to the end of the loaded rows scrolling asks for the next page
+VISIBLE_ROWS = 20
+PREFETCH_ROWS = 40
+# Pages loaded in a row without scrolling while a filter is active; a filter matching few rows would
+# otherwise keep the view short and page through the whole server result
+FILTERED_PAGES = 3
+# Rows moved per mouse wheel notch
+WHEEL_ROWS = 3
+
+
+class RowWindow:
+    """
+    The rows loaded so far, the filtered and sorted view over them, and the slice of that view on screen.
+    Rows are identified by their position in load order, which sorting and filtering leave alone.
+    """
+
+    def __init__(self, height=VISIBLE_ROWS, text=str):
+        self.height = height
+        self.text = text
+        self.rows = []
+        self.view = []
+        self.offset = 0
+        self.filter = ''
+        self.sort_key = None
+        self.reverse = False
+
+    def set_rows(self, rows):
+        self.rows = list(rows)
+        self.offset = 0
+        self._rebuild()
+
+    def append(self, rows):
+        self.rows.extend(rows)
+        self._rebuild()
+
+    def set_filter(self, text):
+        self.filter = text.strip().lower()
+        self._rebuild()
+
+    def sort(self, key=None, reverse=False):
+        # key maps a row to its sort value; None restores load order
+        self.sort_key, self.reverse = key, reverse
+        self._rebuild()
+
+    def _rebuild(self):
+        self.view = [i for i, row in enumerate(self.rows) if not self.filter or self.filter in self.text(row).lower()]
+        if self.sort_key is not None:
+            self.view.sort(key=lambda i: self.sort_key(self.rows[i]), reverse=self.reverse)
+        self.scroll_to(self.offset)
+
+    def scroll_to(self, offset):
+        self.offset = max(0, min(int(offset), len(self.view) - self.height))
+
+    def visible(self):
+        # (row index, row) of every row on screen, top to bottom
+        return [(i, self.rows[i]) for i in self.view[self.offset:self.offset + self.height]]
+
+    def position(self, index):
+        # Place of a row in the view, or None when it is filtered out
+        try:
+            return self.view.index(index)
+        except ValueError:
+            return None
+
+    def show(self, position):
+        # Scroll just enough for the view position to be on screen
+        if position < self.offset:
+            self.scroll_to(position)
+        elif position >= self.offset + self.height:
+            self.scroll_to(position - self.height + 1)
+
+    def fractions(self):
+        # Scrollbar slider: first and last visible fraction of the view
+        if not self.view:
+            return 0.0, 1.0
+
+        return self.offset / len(self.view), min(1.0, (self.offset + self.height) / len(self.view))
+
+    def near_end(self, prefetch=PREFETCH_ROWS):
+        return self.offset + self.height + prefetch >= len(self.view)
+
+    def wants_page(self, pages, prefetch=PREFETCH_ROWS):
+        # Whether to load the next page, pages having been loaded since the user last scrolled
+        return self.near_end(prefetch) and (not self.filter or pages < FILTERED_PAGES)
+
+
+class VirtualView(ttk.Frame, metaclass=abc.ABCMeta):
+    """
+    Base of the virtualized widgets: only the rows on screen exist as widget items, however many are
+    loaded. Scrolling re-fills them from a RowWindow, and nearing the end of the loaded rows calls the
+    load_more callback given with the last page (None once there are no more pages). While a filter is
+    active, at most FILTERED_PAGES pages are loaded before the user scrolls again.
+    """
+
+    def __init__(self, master, text, height=VISIBLE_ROWS, on_select=None):
+        super().__init__(master)
+        self.window = RowWindow(height, text)
+        self.on_select = on_select
+        self.selected = None
+        self.load_more = None
+        self.loading = False
+        self.pages = 0
+
+        filter_bar = ttk.Frame(self)
+        filter_bar.pack(side='top', fill='x')
+        ttk.Label(filter_bar, text="Filter:").pack(side='left', padx=(0, 5))
+        self.filter_var = tk.StringVar(self)
+        self.filter_var.trace_add('write', lambda *args: self.set_filter(self.filter_var.get()))
+        ttk.Entry(filter_bar, textvariable=self.filter_var, width=30).pack(side='left')
+        self.status_label = ttk.Label(filter_bar)
+        self.status_label.pack(side='right')
+
+        self.scrollbar = ttk.Scrollbar(self, orient='vertical', command=self._on_scrollbar)
+        self.scrollbar.pack(side='right', fill='y')
+
+    def _bind_scrolling(self, widget):
+        widget.bind('<MouseWheel>', lambda event: self.scroll(-WHEEL_ROWS if event.delta > 0 else WHEEL_ROWS))
+        widget.bind('<Button-4>', lambda event: self.scroll(-WHEEL_ROWS))
+        widget.bind('<Button-5>', lambda event: self.scroll(WHEEL_ROWS))
+        widget.bind('<Up>', lambda event: self._move_selection(-1))
+        widget.bind('<Down>', lambda event: self._move_selection(1))
+        widget.bind('<Prior>', lambda event: self._move_selection(-self.window.height))
+        widget.bind('<Next>', lambda event: self._move_selection(self.window.height))
+
+    # ---- Data ----
+
+    def set_rows(self, rows, load_more=None):
+        self.selected = None
+        self.load_more = load_more
+        self.loading = False
+        self.pages = 0
+        self.window.set_rows(rows)
+        self.render()
+
+    def append(self, rows, load_more=None):
+        self.load_more = load_more
+        self.loading = False
+        self.window.append(rows)
+        self.render()
+
+    def load_failed(self):
+        # Scrolling near the end tries the page again
+        self.loading = False
+        self._update_status()
+
+    def rows(self):
+        return self.window.rows
+
+    def selected_row(self):
+        return None if self.selected is None else self.window.rows[self.selected]
+
+    def set_filter(self, text):
+        self.window.set_filter(text)
+        self.render()
+
+    def sort(self, key=None, reverse=False):
+        self.window.sort(key, reverse)
+        self.render()
+
+    # ---- Scrolling ----
+
+    def scroll(self, rows):
+        self.pages = 0
+        self.window.scroll_to(self.window.offset + rows)
+        self.render()
+
+        return 'break'
+
+    def _on_scrollbar(self, action, amount, unit=None):
+        if action == 'moveto':
+            self.pages = 0
+            self.window.scroll_to(float(amount) * len(self.window.view))
+            self.render()
+        else:
+            self.scroll(int(amount) * (self.window.height if unit == 'pages' else 1))
+
+    def _move_selection(self, step):
+        if not self.window.view:
+            return 'break'
+        self.pages = 0
+        position = self.window.position(self.selected) if self.selected is not None else None
+        position = 0 if position is None else max(0, min(position + step, len(self.window.view) - 1))
+        self.window.show(position)
+        self.render()
+        self._select(self.window.view[position])
+
+        return 'break'
+
+    def _select(self, index):
+        if index == self.selected:
+            return
+        self.selected = index
+        self._show_selection()
+        if self.on_select is not None:
+            self.on_select(self.window.rows[index])
+
+    def render(self):
+        self._fill(self.window.visible())
+        self._show_selection()
+        self.scrollbar.set(*self.window.fractions())
+        self._update_status()
+
+        if self.load_more is not None and not self.loading and self.window.wants_page(self.pages):
+            self.loading = True
+            self.pages += 1
+            self._update_status()
+            self.load_more()
+
+    def _update_status(self):
+        shown, loaded = len(self.window.view), len(self.window.rows)
+        text = f"{shown:,} of {loaded:,}" if shown != loaded else f"{loaded:,}"
+        if self.loading:
+            text += " (loading more...)"
+        elif self.load_more is not None:
+            text += "+"
+        self.status_label.config(text=text)
+
+    @abc.abstractmethod
+    def _fill(self, visible):
+        pass
+
+    @abc.abstractmethod
+    def _show_selection(self):
+        pass
+
+
+class VirtualTreeview(VirtualView):
+    """
+    Treeview showing values(row) per row; clicking a heading sorts the loaded rows by that column.
+    """
+
+    def __init__(self, master, columns, values, height=VISIBLE_ROWS, on_select=None, width=120):
+        super().__init__(master, lambda row: ' '.join(str(value) for value in values(row)), height, on_select)
+        self.columns = columns
+        self.values = values
+        self.sorted_column = None
+
+        self.tree = ttk.Treeview(self, columns=columns, show='headings', height=height, selectmode='browse')
+        for i, column in enumerate(columns):
+            self.tree.heading(column, text=column.capitalize(), command=lambda i=i: self.sort_by_column(i))
+            self.tree.column(column, width=width)
+        self.tree.pack(side='left', fill='both', expand=True)
+        self.tree.bind('<<TreeviewSelect>>', self._on_tree_select)
+        self._bind_scrolling(self.tree)
+
+    def sort_by_column(self, i):
+        # Ascending first, then descending, then back to load order
+        if self.sorted_column != i:
+            self.sorted_column, reverse = i, False
+        elif not self.window.reverse:
+            reverse = True
+        else:
+            self.sorted_column, reverse = None, False
+        key = None if self.sorted_column is None else (lambda row: str(self.values(row)[i]))
+        self.sort(key, reverse)
+
+    def _fill(self, visible):
+        # Item ids are row indexes, so a selection survives scrolling, sorting and filtering
+        self.tree.delete(*self.tree.get_children())
+        for index, row in visible:
+            self.tree.insert('', 'end', iid=str(index), values=self.values(row))
+
+    def _show_selection(self):
+        if self.selected is not None and self.tree.exists(str(self.selected)):
+            if self.tree.selection() != (str(self.selected),):
+                self.tree.selection_set(str(self.selected))
+
+    def _on_tree_select(self, event):
+        selection = self.tree.selection()
+        if selection:
+            self._select(int(selection[0]))
+
+
+class VirtualListbox(VirtualView):
+    """
+    Listbox showing text(row) per row, coloured by color(row) when given.
+    """
+
+    def __init__(self, master, text, height=VISIBLE_ROWS, on_select=None, color=None, width=120):
+        super().__init__(master, text, height, on_select)
+        self.color = color
+        self._indexes = []
+
+        self.listbox = tk.Listbox(self, width=width, height=height, exportselection=False)
+        self.listbox.pack(side='left', fill='both', expand=True)
+        self.listbox.bind('<<ListboxSelect>>', self._on_listbox_select)
+        self._bind_scrolling(self.listbox)
+
+    def row_at(self, y):
+        # Selects and returns the row under a mouse position (None past the last row)
+        line = self.listbox.nearest(y)
+        if not 0 <= line < len(self._indexes):
+            return None
+        self._select(self._indexes[line])
+
+        return self.selected_row()
+
+    def _fill(self, visible):
+        self._indexes = [index for index, row in visible]
+        self.listbox.delete(0, tk.END)
+        for line, (index, row) in enumerate(visible):
+            self.listbox.insert(tk.END, self.window.text(row))
+            if self.color is not None:
+                color = self.color(row)
+                if color:
+                    self.listbox.itemconfig(line, foreground=color)
+
+    def _show_selection(self):
+        self.listbox.selection_clear(0, tk.END)
+        if self.selected in self._indexes:
+            line = self._indexes.index(self.selected)
+            self.listbox.selection_set(line)
+            self.listbox.activate(line)
+
+    def _on_listbox_select(self, event):
+        selection = self.listbox.curselection()
+        if selection and selection[0] < len(self._indexes):
+            self._select(self._indexes[selection[0]])
@@ -0,0 +1,56 @@
+import unittest
+from virtual_views import FILTERED_PAGES, RowWindow
+
+
+class TestRowWindow(unittest.TestCase):
+    def setUp(self):
+        self.window = RowWindow(height=3, text=lambda row: row['name'])
+        self.window.set_rows([{'name': name, 'fare': fare} for name, fare in
+                              [('ATL', 300), ('LAX', 100), ('JFK', 200), ('BOS', 150), ('LAS', 250)]])
+
+    def names(self):
+        return [row['name'] for index, row in self.window.visible()]
+
+    def test_only_the_rows_on_screen_are_visible(self):
+        self.assertEqual(self.names(), ['ATL', 'LAX', 'JFK'])
+        self.window.scroll_to(10)
+        self.assertEqual(self.names(), ['JFK', 'BOS', 'LAS'])
+        self.assertEqual(self.window.fractions(), (0.4, 1.0))
+
+    def test_sort_and_filter_keep_row_indexes(self):
+        self.window.set_filter('la')
+        self.window.sort(lambda row: row['fare'], reverse=True)
+
+        self.assertEqual(self.window.visible(), [(4, {'name': 'LAS', 'fare': 250}), (1, {'name': 'LAX', 'fare': 100})])
+        self.assertIsNone(self.window.position(0))
+
+        self.window.sort(None)
+        self.assertEqual(self.names(), ['LAX', 'LAS'])
+
+    def test_appended_pages_are_sorted_in(self):
+        self.window.sort(lambda row: row['fare'])
+        self.window.append([{'name': 'SEA', 'fare': 50}])
+
+        self.assertEqual(self.names(), ['SEA', 'LAX', 'BOS'])
+
+    def test_show_scrolls_just_enough(self):
+        self.window.show(4)
+        self.assertEqual(self.window.offset, 2)
+        self.window.show(3)
+        self.assertEqual(self.window.offset, 2)
+        self.window.show(0)
+        self.assertEqual(self.window.offset, 0)
+
+    def test_near_end_asks_for_the_next_page(self):
+        self.assertFalse(self.window.near_end(prefetch=1))
+        self.assertTrue(self.window.near_end(prefetch=2))
+
+    def test_filtered_pages_are_capped(self):
+        self.assertTrue(self.window.wants_page(10, prefetch=2))
+        self.window.set_filter('zzz')
+        self.assertTrue(self.window.wants_page(FILTERED_PAGES - 1))
+        self.assertFalse(self.window.wants_page(FILTERED_PAGES))
+
+
+if __name__ == '__main__':
+    unittest.main()